@@ -0,0 +1,801 @@
+# Copyright (c) 2021, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+Offline build of the real-world data of the COVID-19 simulation.
+
+This is the data processing of the "gather_real_world_data.ipynb" notebook, as a
+pipeline over raw source files saved in a local directory:
+    1) fetch_raw_files downloads the raw files of each source (see README.md), from
+       their upstream locations or from a mirror (e.g. a local server).
+    2) build_artifacts processes each source into a columnar artifact (a .npz of
+       plain arrays), concurrently. A manifest records the hash of the raw files
+       of each source and the content hash of its artifact: only the sources whose
+       raw files changed are processed again.
+    3) combine_artifacts aligns the artifacts on the dates and US states of the
+       policy data, and computes the SIR and unemployment numbers.
+The result is written as the "real_world_data.npz" and "model_constants.json"
+files read by CovidAndEconomyEnvironment (the "fitted_params.json" file is the
+output of the "fit_model_parameters.ipynb" notebook). Example:
+
+    python -m ai_economist.datasets.covid19_datasets.build_real_world_data \\
+        --raw-dir /tmp/covid19_data/raw --output-dir /tmp/covid19_data/latest --fetch
+"""
+
+import argparse
+import concurrent.futures
+import csv
+import hashlib
+import json
+import os
+import urllib.request
+from datetime import datetime
+from html.parser import HTMLParser
+
+import numpy as np
+import scipy.signal
+import scipy.stats
+
+# Bump when the processing of the sources changes, to invalidate the artifacts
+PIPELINE_VERSION = 1
+
+DATE_FORMAT = "%Y-%m-%d"
+STRINGENCY_POLICY_KEY = "StringencyIndex"
+NUM_STRINGENCY_LEVELS = 10
+# STD of the Gaussian smoothing window applied to the death data.
+SIR_SMOOTHING_STD = 10
+# Death rate: fraction of infected persons who die
+SIR_MORTALITY = 0.02
+# Recovery rate: the inverse of expected time someone remains infected
+SIR_GAMMA = 1 / 14
+# 2019: https://data.worldbank.org/indicator/NY.GDP.PCAP.CD?locations=US&view=chart
+GDP_PER_CAPITA = 65300
+# Direct payments provided by the Federal Government (date: amount). Source:
+# https://www.covidmoneytracker.org/
+DIRECT_PAYMENTS = {"2020-04-15": 274e9, "2020-12-27": 142e9, "2021-03-11": 386e9}
+
+# FIPS codes of the US states (used by the Bureau of Labor Statistics)
+US_STATE_TO_FIPS = {
+    "Alabama": 1,
+    "Alaska": 2,
+    "Arizona": 4,
+    "Arkansas": 5,
+    "California": 6,
+    "Colorado": 8,
+    "Connecticut": 9,
+    "Delaware": 10,
+    "District of Columbia": 11,
+    "Florida": 12,
+    "Georgia": 13,
+    "Hawaii": 15,
+    "Idaho": 16,
+    "Illinois": 17,
+    "Indiana": 18,
+    "Iowa": 19,
+    "Kansas": 20,
+    "Kentucky": 21,
+    "Louisiana": 22,
+    "Maine": 23,
+    "Maryland": 24,
+    "Massachusetts": 25,
+    "Michigan": 26,
+    "Minnesota": 27,
+    "Mississippi": 28,
+    "Missouri": 29,
+    "Montana": 30,
+    "Nebraska": 31,
+    "Nevada": 32,
+    "New Hampshire": 33,
+    "New Jersey": 34,
+    "New Mexico": 35,
+    "New York": 36,
+    "North Carolina": 37,
+    "North Dakota": 38,
+    "Ohio": 39,
+    "Oklahoma": 40,
+    "Oregon": 41,
+    "Pennsylvania": 42,
+    "Rhode Island": 44,
+    "South Carolina": 45,
+    "South Dakota": 46,
+    "Tennessee": 47,
+    "Texas": 48,
+    "Utah": 49,
+    "Vermont": 50,
+    "Virginia": 51,
+    "Washington": 53,
+    "West Virginia": 54,
+    "Wisconsin": 55,
+    "Wyoming": 56,
+}
+
+SOURCES = ("policies", "deaths", "vaccinations", "unemployment")
+
+MANIFEST_FILE = "manifest.json"
+
+
+def raw_files(source):
+    """
+    Return the [(relative path, upstream URL)] raw files of a source.
+    """
+    if source == "policies":
+        return [
+            (
+                "OxCGRT_US_latest.csv",
+                "https://raw.githubusercontent.com/OxCGRT/USA-covid-policy/master/"
+                "data/OxCGRT_US_latest.csv",
+            )
+        ]
+    if source == "deaths":
+        return [
+            (
+                "time_series_covid19_deaths_US.csv",
+                "https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/"
+                "csse_covid_19_data/csse_covid_19_time_series/"
+                "time_series_covid19_deaths_US.csv",
+            )
+        ]
+    if source == "vaccinations":
+        return [
+            (
+                "us_state_vaccinations.csv",
+                "https://raw.githubusercontent.com/owid/covid-19-data/master/"
+                "public/data/vaccinations/us_state_vaccinations.csv",
+            )
+        ]
+    if source == "unemployment":
+        return [
+            (
+                "bls/LASST{:02d}0000000000003.html".format(fips),
+                "https://data.bls.gov/timeseries/LASST{:02d}0000000000003".format(fips),
+            )
+            for fips in US_STATE_TO_FIPS.values()
+        ]
+    raise KeyError("Unknown source: {}".format(source))
+
+
+def fetch_raw_files(raw_dir, base_url=None, sources=SOURCES, max_workers=16):
+    """
+    Download the raw files of the sources into raw_dir (overwriting them).
+
+    Args:
+        raw_dir (dirpath): Directory of the raw files.
+        base_url (str): If given, download the files from base_url/<relative path>
+            (e.g. a local server) instead of their upstream URLs.
+        sources (list): Names of the sources to download.
+        max_workers (int): Number of concurrent downloads.
+    """
+
+    def fetch(relative_path, url):
+        if base_url is not None:
+            url = "{}/{}".format(base_url.rstrip("/"), relative_path)
+        with urllib.request.urlopen(url) as response:
+            content = response.read()
+        path = os.path.join(raw_dir, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as fp:
+            fp.write(content)
+
+    files = [f for source in sources for f in raw_files(source)]
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+        for future in [executor.submit(fetch, *f) for f in files]:
+            future.result()
+
+
+# Processing of the raw files of each source into columnar arrays
+# ---------------------------------------------------------------
+
+
+def _read_csv(path):
+    with open(path, "r", newline="") as fp:
+        reader = csv.reader(fp)
+        header = next(reader)
+        return header, list(reader)
+
+
+def _to_float(value):
+    return float(value) if value not in ("", "NA", "NaN", "nan") else np.nan
+
+
+def _pivot(rows, dates, states):
+    """[(date, state, value)] rows --> [date, state] array (NaN where missing)."""
+    date_idx = {d: i for i, d in enumerate(dates)}
+    state_idx = {s: i for i, s in enumerate(states)}
+    values = np.full((len(dates), len(states)), np.nan)
+    for date, state, value in rows:
+        values[date_idx[date], state_idx[state]] = value
+    return values
+
+
+def process_policies(raw_dir, stringency_policy_key=STRINGENCY_POLICY_KEY):
+    """
+    State-wide policies of the Oxford Covid-19 Government Response Tracker.
+
+    Returns:
+        "dates" [dates], "states" [states] and the (undiscretized) policy indicator
+        "stringency_index" [dates, states] (NaN where missing).
+    """
+    header, rows = _read_csv(os.path.join(raw_dir, raw_files("policies")[0][0]))
+    col = {name: i for i, name in enumerate(header)}
+    records = []
+    for row in rows:
+        # Fetch only the state-wide policies
+        if row[col["Jurisdiction"]] == "NAT_GOV":
+            continue
+        # Replace Washington DC by District of Columbia to keep consistent
+        # (with the other data sources)
+        state = row[col["RegionName"]]
+        if state == "Washington DC":
+            state = "District of Columbia"
+        date = np.datetime64(datetime.strptime(row[col["Date"]], "%Y%m%d"), "D")
+        records.append((date, state, _to_float(row[col[stringency_policy_key]])))
+
+    dates = np.unique([r[0] for r in records])
+    states = np.array(sorted({r[1] for r in records}))
+    return {
+        "dates": dates,
+        "states": states,
+        "stringency_index": _pivot(records, dates, states),
+    }
+
+
+def process_deaths(raw_dir):
+    """
+    Cumulative COVID-19 deaths of the CSSE COVID-19 Data Repository.
+
+    Returns:
+        "dates" [dates], "states" [states], the cumulative "deaths" [dates, states]
+        and the "population" [states] of each state.
+    """
+    header, rows = _read_csv(os.path.join(raw_dir, raw_files("deaths")[0][0]))
+    state_col = header.index("Province_State")
+    population_col = header.index("Population")
+    date_cols = []
+    for i, name in enumerate(header):
+        try:
+            date_cols.append((i, np.datetime64(datetime.strptime(name, "%m/%d/%y"))))
+        except ValueError:
+            continue
+
+    states = np.array(sorted({row[state_col] for row in rows}))
+    state_idx = {s: i for i, s in enumerate(states)}
+    dates = np.array([d for _, d in date_cols], dtype="datetime64[D]")
+    deaths = np.zeros((len(dates), len(states)))
+    population = np.zeros(len(states), dtype=np.int64)
+    for row in rows:
+        # Sum over the counties of each state
+        idx = state_idx[row[state_col]]
+        deaths[:, idx] += [_to_float(row[i]) for i, _ in date_cols]
+        population[idx] += int(float(row[population_col] or 0))
+
+    order = np.argsort(dates, kind="stable")
+    return {
+        "dates": dates[order],
+        "states": states,
+        "deaths": deaths[order],
+        "population": population,
+    }
+
+
+def process_vaccinations(raw_dir):
+    """
+    Number of people fully vaccinated, from Our World in Data.
+
+    Returns:
+        "dates" [dates], "states" [states] and "people_fully_vaccinated"
+        [dates, states] (linearly interpolated over the missing dates of each state,
+        NaN before the first report).
+    """
+    header, rows = _read_csv(os.path.join(raw_dir, raw_files("vaccinations")[0][0]))
+    col = {name: i for i, name in enumerate(header)}
+    records = []
+    for row in rows:
+        # Rename New York State to New York for consistency with other datasets
+        state = row[col["location"]]
+        if state == "New York State":
+            state = "New York"
+        date = np.datetime64(row[col["date"]], "D")
+        records.append((date, state, _to_float(row[col["people_fully_vaccinated"]])))
+
+    dates = np.unique([r[0] for r in records])
+    states = np.array(sorted({r[1] for r in records}))
+    vaccinated = _pivot(records, dates, states)
+
+    # Interpolate missing values
+    t = np.arange(len(dates))
+    for idx in range(len(states)):
+        valid = ~np.isnan(vaccinated[:, idx])
+        if valid.any():
+            start = np.argmax(valid)
+            vaccinated[start:, idx] = np.interp(
+                t[start:], t[valid], vaccinated[valid, idx]
+            )
+    return {"dates": dates, "states": states, "people_fully_vaccinated": vaccinated}
+
+
+class _TableParser(HTMLParser):
+    """Collects the rows of the tables of a page, as [(tag, text)] cells."""
+
+    def __init__(self):
+        super().__init__()
+        self.tables = []
+        self._cell = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "table":
+            self.tables.append([])
+        elif tag == "tr" and self.tables:
+            self.tables[-1].append([])
+        elif tag in ["td", "th"] and self.tables and self.tables[-1]:
+            self._cell = (tag, [])
+
+    def handle_endtag(self, tag):
+        if tag in ["td", "th"] and self._cell is not None:
+            self.tables[-1][-1].append((self._cell[0], "".join(self._cell[1])))
+            self._cell = None
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell[1].append(data)
+
+
+def parse_bls_unemployment_page(html):
+    """
+    Parse the monthly unemployment rates of a Bureau of Labor Statistics timeseries
+    page (see us_unemployment.py), as {(year, month): rate}.
+    """
+    month_names = [
+        "Jan",
+        "Feb",
+        "Mar",
+        "Apr",
+        "May",
+        "Jun",
+        "Jul",
+        "Aug",
+        "Sep",
+        "Oct",
+        "Nov",
+        "Dec",
+    ]
+    parser = _TableParser()
+    parser.feed(html)
+    rates = {}
+    for row in parser.tables[1][1:-1]:
+        th = [text.strip() for tag, text in row if tag == "th"]
+        td = [text for tag, text in row if tag == "td"]
+        rate = float("".join([c for c in td[-1] if c.isdigit() or c == "."]))
+        rates[(int(th[0]), month_names.index(th[1]) + 1)] = rate
+    return rates
+
+
+def process_unemployment(raw_dir):
+    """
+    Monthly unemployment rates of the Bureau of Labor Statistics.
+
+    Returns:
+        "months" [months], "states" [states] and "unemployment_rate" (in %)
+        [months, states] (NaN where missing).
+    """
+    records = []
+    for (relative_path, _), state in zip(raw_files("unemployment"), US_STATE_TO_FIPS):
+        with open(os.path.join(raw_dir, relative_path), "r") as fp:
+            rates = parse_bls_unemployment_page(fp.read())
+        for (year, month), rate in rates.items():
+            records.append(
+                (np.datetime64("{:04d}-{:02d}".format(year, month), "M"), state, rate)
+            )
+
+    months = np.unique([r[0] for r in records])
+    states = np.array(sorted(US_STATE_TO_FIPS))
+    return {
+        "months": months,
+        "states": states,
+        "unemployment_rate": _pivot(records, months, states),
+    }
+
+
+_PROCESSORS = {
+    "policies": process_policies,
+    "deaths": process_deaths,
+    "vaccinations": process_vaccinations,
+    "unemployment": process_unemployment,
+}
+
+
+# Artifacts
+# ---------
+
+
+def content_hash(arrays):
+    """Hash of a dictionary of arrays (of their names, types, shapes and data)."""
+    sha = hashlib.sha256()
+    for key in sorted(arrays):
+        array = np.ascontiguousarray(arrays[key])
+        sha.update("{}:{}:{}".format(key, array.dtype.str, array.shape).encode())
+        sha.update(array.tobytes())
+    return sha.hexdigest()
+
+
+def input_hash(raw_dir, source, params):
+    """Hash of the raw files of a source and of its processing parameters."""
+    sha = hashlib.sha256(
+        json.dumps([PIPELINE_VERSION, source, params], sort_keys=True).encode()
+    )
+    for relative_path, _ in raw_files(source):
+        sha.update(relative_path.encode())
+        with open(os.path.join(raw_dir, relative_path), "rb") as fp:
+            sha.update(hashlib.sha256(fp.read()).digest())
+    return sha.hexdigest()
+
+
+def _process_source(raw_dir, artifact_dir, source, params):
+    arrays = _PROCESSORS[source](raw_dir, **params)
+    np.savez(os.path.join(artifact_dir, source + ".npz"), **arrays)
+    return content_hash(arrays)
+
+
+def load_artifact(artifact_dir, source):
+    """Load the arrays of the artifact of a source."""
+    with np.load(os.path.join(artifact_dir, source + ".npz")) as data:
+        return {key: data[key] for key in data}
+
+
+def build_artifacts(
+    raw_dir,
+    artifact_dir,
+    stringency_policy_key=STRINGENCY_POLICY_KEY,
+    max_workers=None,
+):
+    """
+    Process the raw files of each source whose artifact is missing or out of date.
+
+    Args:
+        raw_dir (dirpath): Directory of the raw files (see fetch_raw_files).
+        artifact_dir (dirpath): Directory of the artifacts and their manifest.
+        stringency_policy_key (str): Policy indicator to use as the stringency
+            level (see DatasetCovidPoliciesUS.process_policy_data).
+        max_workers (int): Number of sources processed concurrently (in separate
+            processes). If 1, the sources are processed in this process.
+
+    Returns:
+        List of the sources that were processed.
+    """
+    os.makedirs(artifact_dir, exist_ok=True)
+    manifest_path = os.path.join(artifact_dir, MANIFEST_FILE)
+    manifest = {}
+    if os.path.isfile(manifest_path):
+        with open(manifest_path, "r") as fp:
+            manifest = json.load(fp)
+
+    params = {source: {} for source in SOURCES}
+    params["policies"]["stringency_policy_key"] = stringency_policy_key
+
+    stale = []
+    for source in SOURCES:
+        key = input_hash(raw_dir, source, params[source])
+        entry = manifest.get(source, {})
+        if entry.get("input_hash") == key and os.path.isfile(
+            os.path.join(artifact_dir, source + ".npz")
+        ):
+            if content_hash(load_artifact(artifact_dir, source)) == entry.get(
+                "content_hash"
+            ):
+                continue
+        manifest[source] = {"input_hash": key}
+        stale.append(source)
+
+    hashes = []
+    if max_workers == 1:
+        hashes = [
+            _process_source(raw_dir, artifact_dir, source, params[source])
+            for source in stale
+        ]
+    elif stale:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers or len(stale)
+        ) as executor:
+            futures = [
+                executor.submit(
+                    _process_source, raw_dir, artifact_dir, source, params[source]
+                )
+                for source in stale
+            ]
+            hashes = [future.result() for future in futures]
+    for source, artifact_hash in zip(stale, hashes):
+        manifest[source]["content_hash"] = artifact_hash
+
+    with open(manifest_path, "w") as fp:
+        json.dump(manifest, fp, indent=2, sort_keys=True)
+    return stale
+
+
+# Combination of the artifacts into the simulation data
+# -----------------------------------------------------
+
+
+def discretize(policies, num_indicator_levels=10):
+    """
+    Discretize the policies (an array of indices in [0, 100]) into
+    num_indicator_levels (see DatasetCovidPoliciesUS.process_policy_data).
+    """
+    bins = np.linspace(0, 100, num_indicator_levels)
+    # Find left and right values of bin and find the nearer edge
+    bin_index = np.digitize(policies, bins, right=True)
+    bin_left_edges = bins[bin_index - 1]
+    bin_right_edges = bins[bin_index]
+    return bin_index + np.argmin(
+        np.stack(
+            (np.abs(policies - bin_left_edges), np.abs(policies - bin_right_edges))
+        ),
+        axis=0,
+    )
+
+
+def smooth(x, gauss_std=10):
+    """
+    Gaussian smoothing of the columns of x (NaN where the window is incomplete).
+
+    gauss_std: standard deviation of the Gaussian smoothing window.
+    """
+    if gauss_std <= 0:
+        return x
+    # To invalidate the near-edge results, bookend the input x with nans
+    nans = np.full((1,) + x.shape[1:], np.nan)
+    x = np.concatenate([nans, x, nans])
+
+    kernel = scipy.stats.norm.pdf(
+        np.linspace(-3 * gauss_std, 3 * gauss_std, 1 + 6 * gauss_std),
+        scale=gauss_std,
+    )
+    smoothed_x = np.zeros_like(x)
+    normer = scipy.signal.convolve(
+        np.ones(len(x)), kernel, mode="same", method="direct"
+    )
+    for idx in range(x.shape[1]):
+        smoothed_x[:, idx] = (
+            scipy.signal.convolve(x[:, idx], kernel, mode="same", method="direct")
+            / normer
+        )
+
+    # Remove the indices added by the nan padding
+    return smoothed_x[1:-1]
+
+
+def infer_sir_and_beta(smoothed_deaths, vaccinated, population):
+    """
+    Infer the S, I, R numbers and Beta at each date ([dates, states] arrays) from
+    the deaths and vaccinations, with the SIR equations.
+    """
+    # Helpful to do this math in normalized numbers
+    dead = smoothed_deaths / population
+    vaccinated = vaccinated / population
+
+    # Dead is the fraction of "recovered" that did not survive
+    # Also, the vaccinated lot is part of the recovered
+    recovered = dead / SIR_MORTALITY + vaccinated
+
+    # The daily change in recovered (ignoring the vaccinated) is a fraction of the
+    # infected population on the previous day
+    infected = np.nan * np.zeros_like(dead)
+    infected[:-1] = (
+        recovered[1:] - recovered[:-1] - (vaccinated[1:] - vaccinated[:-1])
+    ) / SIR_GAMMA
+
+    # S+I+R must always = 1
+    susceptible = 1 - infected - recovered
+
+    # The change in infected is due to...
+    change_in_i = infected[1:] - infected[:-1]
+    # ... infected people that transition to the recovered state (decreases I)...
+    expected_change_from_recovery = -infected[:-1] * SIR_GAMMA
+    # ... and susceptible people that transition to the infected state (increases I).
+    new_infections = change_in_i - expected_change_from_recovery
+
+    # With these pieces, we can solve for Beta.
+    beta_ = new_infections / (infected[:-1] * susceptible[:-1] + 1e-6)
+    beta_ = np.clip(beta_, 0, 1)
+    # Apply a threshold in terms of normalized daily deaths (if too low, beta
+    # estimates are bad)
+    normalized_daily_deaths = dead[1:] - dead[:-1]
+    ndd_lookback = np.zeros_like(new_infections)
+    lookback_window = 3 * SIR_SMOOTHING_STD
+    ndd_lookback[lookback_window:] = normalized_daily_deaths[:-lookback_window]
+    with np.errstate(invalid="ignore"):
+        beta_[np.logical_not(ndd_lookback > 1e-8)] = np.nan
+
+    beta = np.nan * np.zeros_like(dead)
+    beta[:-1] = beta_
+
+    # Undo normalization
+    return (
+        susceptible * population,
+        infected * population,
+        recovered * population,
+        beta,
+    )
+
+
+def _state_columns(states, new_states):
+    """Indices of new_states in states."""
+    state_idx = {s: i for i, s in enumerate(states)}
+    missing = [s for s in new_states if s not in state_idx]
+    assert not missing, "No data for {}".format(missing)
+    return [state_idx[s] for s in new_states]
+
+
+def _reindex(values, index, states, new_index, new_states, fill_value=np.nan):
+    """Align the [index, states] values to [new_index, new_states]."""
+    columns = values[:, _state_columns(states, new_states)]
+    rows = np.searchsorted(index, new_index)
+    found = (rows < len(index)) & (index[np.minimum(rows, len(index) - 1)] == new_index)
+    aligned = np.full((len(new_index), len(new_states)), fill_value, dtype=np.float64)
+    aligned[found] = columns[rows[found]]
+    return aligned
+
+
+def combine_artifacts(
+    artifact_dir,
+    stringency_policy_key=STRINGENCY_POLICY_KEY,
+    num_stringency_levels=NUM_STRINGENCY_LEVELS,
+):
+    """
+    Combine the artifacts into the real-world data and model constants of the
+    simulation, on the dates and US states of the policy data.
+
+    Returns:
+        real_world_data (dict): The [dates, states] arrays of "real_world_data.npz"
+            (and the [dates, 1] "subsidy" array).
+        model_constants (dict): The contents of "model_constants.json".
+    """
+    policies = load_artifact(artifact_dir, "policies")
+    deaths = load_artifact(artifact_dir, "deaths")
+    vaccinations = load_artifact(artifact_dir, "vaccinations")
+    unemployment = load_artifact(artifact_dir, "unemployment")
+
+    # This is the common date index and the list of states (in order) of all the data
+    dates = policies["dates"]
+    states = policies["states"]
+
+    # 1. Policies: fill in null values via a "forward fill", and discretize
+    stringency_index = policies["stringency_index"].copy()
+    for t in range(1, len(dates)):
+        missing = np.isnan(stringency_index[t])
+        stringency_index[t, missing] = stringency_index[t - 1, missing]
+    stringency_index[np.isnan(stringency_index)] = 0
+    policy = discretize(stringency_index, num_stringency_levels).astype(np.int64)
+
+    # 2. Federal government subsidies (direct payments), at the USA level
+    subsidy = np.zeros((len(dates), 1))
+    for date, amount in DIRECT_PAYMENTS.items():
+        subsidy[dates == np.datetime64(date, "D")] = amount
+
+    # 3. Deaths
+    population = deaths["population"][_state_columns(deaths["states"], states)]
+    cumulative_deaths = _reindex(
+        deaths["deaths"], deaths["dates"], deaths["states"], dates, states
+    )
+    smoothed_deaths = smooth(cumulative_deaths, gauss_std=SIR_SMOOTHING_STD)
+
+    # 4. Vaccinations
+    vaccinated = _reindex(
+        vaccinations["people_fully_vaccinated"],
+        vaccinations["dates"],
+        vaccinations["states"],
+        dates,
+        states,
+        fill_value=0,
+    )
+    vaccinated[np.isnan(vaccinated)] = 0
+
+    susceptible, infected, recovered, beta = infer_sir_and_beta(
+        smoothed_deaths, vaccinated, population
+    )
+
+    # 5. Unemployment: monthly rate --> daily rate and number of unemployed people
+    unemployment_rate = _reindex(
+        unemployment["unemployment_rate"],
+        unemployment["months"],
+        unemployment["states"],
+        dates.astype("datetime64[M]"),
+        states,
+    )
+    unemployed = unemployment_rate * population / 100.0
+
+    real_world_data = {
+        "policy": policy,
+        "subsidy": subsidy,
+        "deaths": cumulative_deaths,
+        "vaccinated": vaccinated,
+        "smoothed_deaths": smoothed_deaths,
+        "susceptible": susceptible,
+        "infected": infected,
+        "recovered": recovered,
+        "beta": beta,
+        "unemployment": unemployment_rate,
+        "unemployed": unemployed,
+    }
+    model_constants = {
+        "DATE_FORMAT": DATE_FORMAT,
+        "STRINGENCY_POLICY_KEY": stringency_policy_key,
+        "NUM_STRINGENCY_LEVELS": int(num_stringency_levels),
+        "SIR_SMOOTHING_STD": SIR_SMOOTHING_STD,
+        "SIR_MORTALITY": SIR_MORTALITY,
+        "SIR_GAMMA": SIR_GAMMA,
+        "US_STATE_IDX_TO_STATE_NAME": {
+            str(idx): str(state) for idx, state in enumerate(states)
+        },
+        "US_STATE_POPULATION": [int(p) for p in population],
+        "US_POPULATION": int(np.sum(population)),
+        "GDP_PER_CAPITA": GDP_PER_CAPITA,
+    }
+    return real_world_data, model_constants
+
+
+def build_real_world_data(
+    raw_dir,
+    output_dir,
+    stringency_policy_key=STRINGENCY_POLICY_KEY,
+    num_stringency_levels=NUM_STRINGENCY_LEVELS,
+    max_workers=None,
+):
+    """
+    Build "real_world_data.npz" and "model_constants.json" in output_dir from the
+    raw files in raw_dir (keeping the artifacts in output_dir/artifacts).
+
+    Returns:
+        List of the sources that were processed (see build_artifacts).
+    """
+    artifact_dir = os.path.join(output_dir, "artifacts")
+    processed = build_artifacts(
+        raw_dir,
+        artifact_dir,
+        stringency_policy_key=stringency_policy_key,
+        max_workers=max_workers,
+    )
+    real_world_data, model_constants = combine_artifacts(
+        artifact_dir,
+        stringency_policy_key=stringency_policy_key,
+        num_stringency_levels=num_stringency_levels,
+    )
+    np.savez(os.path.join(output_dir, "real_world_data.npz"), **real_world_data)
+    with open(os.path.join(output_dir, "model_constants.json"), "w") as fp:
+        json.dump(model_constants, fp)
+    return processed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--raw-dir", required=True, help="Directory of raw files.")
+    parser.add_argument("--output-dir", required=True, help="Output directory.")
+    parser.add_argument(
+        "--fetch", action="store_true", help="Download the raw files first."
+    )
+    parser.add_argument(
+        "--base-url", default=None, help="Download the raw files from this mirror."
+    )
+    parser.add_argument(
+        "--stringency-policy-key", default=STRINGENCY_POLICY_KEY, type=str
+    )
+    parser.add_argument(
+        "--num-stringency-levels", default=NUM_STRINGENCY_LEVELS, type=int
+    )
+    parser.add_argument(
+        "--workers", default=None, type=int, help="Concurrent source processes."
+    )
+    args = parser.parse_args()
+
+    if args.fetch:
+        fetch_raw_files(args.raw_dir, base_url=args.base_url)
+    processed_sources = build_real_world_data(
+        args.raw_dir,
+        args.output_dir,
+        stringency_policy_key=args.stringency_policy_key,
+        num_stringency_levels=args.num_stringency_levels,
+        max_workers=args.workers,
+    )
+    print("Processed sources: {}".format(processed_sources or "none (up to date)"))
+    print("path_to_data_and_fitted_params = '{}'".format(args.output_dir))
@@ -0,0 +1,136 @@
+# Copyright (c) 2020, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+from collections.abc import MutableMapping
+
+import numpy as np
+
+
+class AgentActionTable:
+    """Contiguous, array-backed action buffers of agents sharing one action layout.
+
+    The table holds an int64 array shaped [n_rows, n_action_names], with one row per
+    agent and one column per registered action subspace (in the order of the
+    agents' _action_names).
+
+    The decoding of actions is compiled when the table is built, so that a whole
+    population's actions can be written with a few array operations (see
+    parse_actions) instead of one dictionary update per agent and subspace:
+        - in multi action mode, an action row holds one index per subspace and is
+          stored as is;
+        - in single action mode, an action is an index into the concatenation of
+          the subspaces (0 being the universal NO-OP). It is decoded into a column
+          and a sub-action with two lookup arrays built from single_action_map.
+
+    Agents access their row through AgentActions (see below), which behaves like the
+    action dictionary agents have always used, whereas components can read whole
+    columns (see World.actions).
+
+    Args:
+        n_rows (int): The number of agents (rows) stored in the table.
+        action_names (list): The names of the action subspaces (columns).
+        multi_action_mode (bool): Whether the agents use multi action mode.
+        single_action_map (dict): {action index: [action name, sub-action]} map of
+            single action mode agents (see BaseAgent).
+    """
+
+    def __init__(self, n_rows, action_names, multi_action_mode, single_action_map):
+        self.n_rows = int(n_rows)
+        self.columns = {name: col for col, name in enumerate(action_names)}
+        assert len(self.columns) == len(action_names)
+        self.data = np.zeros((self.n_rows, len(self.columns)), dtype=np.int64)
+        self.multi_action_mode = bool(multi_action_mode)
+
+        n_indices = 1 + len(single_action_map)
+        self._decode_column = np.zeros(n_indices, dtype=np.int64)
+        self._decode_action = np.zeros(n_indices, dtype=np.int64)
+        for index, (action_name, action) in single_action_map.items():
+            self._decode_column[index] = self.columns[action_name]
+            self._decode_action[index] = action
+
+    def column(self, name):
+        """Return a (writable) [n_rows] view of the actions of subspace name."""
+        return self.data[:, self.columns[name]]
+
+    def reset(self):
+        """Reset all actions to the NO-OP action."""
+        self.data.fill(0)
+
+    def bind_storage(self, data):
+        """Copy the actions into data (an int64 array shaped like the table) and use
+        it as the table's storage from now on (see EnvironmentBatch)."""
+        assert data.shape == self.data.shape and data.dtype == self.data.dtype
+        data[...] = self.data
+        self.data = data
+
+    def parse_actions(self, actions):
+        """Write the actions of all rows at once.
+
+        Args:
+            actions (ndarray): Integer array shaped [n_rows, n_action_names] in multi
+                action mode, or [n_rows] (indices into the combined action space) in
+                single action mode.
+        """
+        actions = np.asarray(actions)
+        if self.multi_action_mode:
+            assert actions.shape == self.data.shape
+            self.data[...] = actions
+            return
+
+        assert actions.shape == (self.n_rows,)
+        self.data.fill(0)
+        rows = np.flatnonzero(actions)
+        if len(rows) == 0:
+            return
+        indices = actions[rows]
+        if indices.min() < 0 or indices.max() >= len(self._decode_column):
+            raise IndexError(
+                "Actions must be in [0, {})".format(len(self._decode_column))
+            )
+        self.data[rows, self._decode_column[indices]] = self._decode_action[indices]
+
+
+class AgentActions(MutableMapping):
+    """Dictionary-style view of one agent's row of an AgentActionTable.
+
+    Keys are the names of the agent's action subspaces; values are the chosen
+    action indices (as ints). The set of keys is fixed by the table.
+
+    Args:
+        table (AgentActionTable): The table holding this agent's actions.
+        row (int): The row of the table that belongs to this agent.
+    """
+
+    __slots__ = ("_table", "_row")
+
+    def __init__(self, table, row):
+        self._table = table
+        self._row = int(row)
+
+    def __getitem__(self, key):
+        return int(self._table.data[self._row, self._table.columns[key]])
+
+    def __setitem__(self, key, value):
+        self._table.data[self._row, self._table.columns[key]] = value
+
+    def __delitem__(self, key):
+        raise TypeError("Action subspaces of an AgentActionTable cannot be removed.")
+
+    def __contains__(self, key):
+        return key in self._table.columns
+
+    def __iter__(self):
+        return iter(self._table.columns)
+
+    def __len__(self):
+        return len(self._table.columns)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def copy(self):
+        """Return a plain dictionary copy of this view."""
+        return dict(self.items())
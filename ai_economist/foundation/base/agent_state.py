@@ -0,0 +1,266 @@
+# Copyright (c) 2020, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+from collections.abc import MutableMapping
+from copy import deepcopy
+
+import numpy as np
+
+
+class AgentStateTable:
+    """Contiguous, array-backed storage for the numeric state of a set of agents.
+
+    The table keeps one float64 array per state block ("inventory", "escrow",
+    "endogenous" and "extra"), each shaped [n_rows, n_fields]. Rows correspond to
+    agents and columns to the fields (resources, endogenous quantities, or scalar
+    state fields added by components) registered during environment construction.
+
+    Agents access their row through AgentState (see below), which behaves like the
+    nested state dictionary agents have always used, whereas components and
+    scenarios can read/write whole-population columns through the table (or the
+    World accessors built on top of it) without any per-agent dictionary traffic.
+
+    Args:
+        n_rows (int): The number of agents (rows) stored in the table.
+    """
+
+    blocks = ("inventory", "escrow", "endogenous", "extra")
+
+    def __init__(self, n_rows):
+        self.n_rows = int(n_rows)
+        assert self.n_rows >= 1
+        self.columns = {block: {} for block in self.blocks}
+        self.data = {block: np.zeros((self.n_rows, 0)) for block in self.blocks}
+
+    def add_field(self, block, name):
+        """Return the column index of field name in block, adding it if needed.
+
+        Note: Adding a field re-allocates the block; it is meant to happen during
+        environment construction only.
+        """
+        columns = self.columns[block]
+        if name not in columns:
+            columns[name] = len(columns)
+            self.data[block] = np.concatenate(
+                [self.data[block], np.zeros((self.n_rows, 1))], axis=1
+            )
+        return columns[name]
+
+    def has_field(self, block, name):
+        """Return True if field name has been registered in block."""
+        return name in self.columns[block]
+
+    def column(self, block, name):
+        """Return a (writable) [n_rows] view of field name in block."""
+        return self.data[block][:, self.columns[block][name]]
+
+    def get_state(self):
+        """Return the table contents, as {"columns": ..., "data": ...}."""
+        return dict(columns=self.columns, data=self.data)
+
+    def set_state(self, state):
+        """Restore table contents saved by get_state (into the existing arrays)."""
+        assert state["columns"] == self.columns
+        for block, data in state["data"].items():
+            self.data[block][...] = data
+
+    def bind_storage(self, data):
+        """Copy the table contents into the given arrays and use them from now on.
+
+        This lets the tables of several worlds live in one stacked array (see
+        EnvironmentBatch).
+
+        Args:
+            data (dict): {block: array}, with arrays of the same shapes as the
+                current blocks.
+        """
+        assert set(data) == set(self.blocks)
+        for block, array in data.items():
+            assert array.shape == self.data[block].shape
+            array[...] = self.data[block]
+            self.data[block] = array
+
+
+class AgentStateBlock(MutableMapping):
+    """Dictionary-style view of one agent's row in one block of an AgentStateTable.
+
+    Only the fields registered through this view are visible, so agents of different
+    types sharing a table keep their own set of keys.
+    """
+
+    __slots__ = ("_table", "_block", "_row", "_cols")
+
+    def __init__(self, table, block, row):
+        self._table = table
+        self._block = block
+        self._row = row
+        self._cols = {}
+
+    def __getitem__(self, key):
+        return self._table.data[self._block][self._row, self._cols[key]]
+
+    def __setitem__(self, key, value):
+        col = self._cols.get(key)
+        if col is None:
+            col = self._table.add_field(self._block, key)
+            self._cols[key] = col
+        self._table.data[self._block][self._row, col] = value
+
+    def __delitem__(self, key):
+        raise TypeError("Fields of an AgentStateTable cannot be removed.")
+
+    def __iter__(self):
+        return iter(self._cols)
+
+    def __len__(self):
+        return len(self._cols)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def copy(self):
+        """Return a plain dictionary copy of this view."""
+        return {k: float(v) for k, v in self.items()}
+
+
+class AgentState(MutableMapping):
+    """The state of a single agent, backed by a row of an AgentStateTable.
+
+    Behaves like the original nested state dictionary:
+        state["loc"], state["inventory"]["Coin"], state["escrow"]["Wood"],
+        state["endogenous"]["Labor"], state["build_skill"], ...
+
+    The "inventory", "escrow" and "endogenous" entries are AgentStateBlock views.
+    Assigning a dictionary to one of them writes its values into the table.
+    Scalar fields registered by components (see register_field) live in the
+    table's "extra" block; every other entry (such as "loc", or non-scalar fields)
+    is stored in an ordinary dictionary.
+
+    Use copy() to get a plain nested dictionary snapshot (as used for dense logs).
+
+    Args:
+        table (AgentStateTable): The table holding this agent's row.
+        row (int): The row of the table that belongs to this agent.
+    """
+
+    _block_keys = ("inventory", "escrow", "endogenous")
+
+    def __init__(self, table, row):
+        self._table = table
+        self._row = int(row)
+        self._blocks = {
+            k: AgentStateBlock(table, k, self._row) for k in self._block_keys
+        }
+        self._extra_cols = {}
+        self._plain = {"loc": [0, 0]}
+        self._order = ["loc"] + list(self._block_keys)
+
+    @property
+    def table(self):
+        """The AgentStateTable backing this state."""
+        return self._table
+
+    @property
+    def row(self):
+        """The row of the backing table that belongs to this agent."""
+        return self._row
+
+    def register_field(self, key, value):
+        """Add a component state field. Scalar numeric fields are table-backed."""
+        if key in self._block_keys:
+            self[key] = value
+            return
+        is_scalar = isinstance(value, (int, float, np.integer, np.floating))
+        if is_scalar and not isinstance(value, bool) and key not in self._plain:
+            if key not in self._extra_cols:
+                self._extra_cols[key] = self._table.add_field("extra", key)
+                self._order.append(key)
+            self._table.data["extra"][self._row, self._extra_cols[key]] = value
+        else:
+            self[key] = value
+
+    def layout(self):
+        """Return where each state field lives, as a dictionary with keys:
+        "row" (the table row), "order" (the state keys, in order), "blocks"
+        ({block: {field: column}}) and "extra" ({field: column} of the extra block).
+        Keys in "order" that are in neither are plain (non-table) entries."""
+        return dict(
+            row=self._row,
+            order=list(self._order),
+            blocks={k: dict(block._cols) for k, block in self._blocks.items()},
+            extra=dict(self._extra_cols),
+        )
+
+    def get_state(self):
+        """Return the non-table part of this state (see AgentStateTable.get_state)."""
+        return dict(plain=self._plain, extra=self._extra_cols, order=self._order)
+
+    def set_state(self, state):
+        """Restore the non-table part of this state saved by get_state."""
+        self._plain = deepcopy(state["plain"])
+        self._extra_cols = dict(state["extra"])
+        self._order = list(state["order"])
+
+    def __getitem__(self, key):
+        if key in self._blocks:
+            return self._blocks[key]
+        col = self._extra_cols.get(key)
+        if col is not None:
+            return self._table.data["extra"][self._row, col]
+        return self._plain[key]
+
+    def __setitem__(self, key, value):
+        if key in self._blocks:
+            block = self._blocks[key]
+            if value is block:
+                return
+            for k, v in value.items():
+                block[k] = v
+            return
+        col = self._extra_cols.get(key)
+        if col is not None:
+            if np.ndim(value) == 0:
+                self._table.data["extra"][self._row, col] = value
+                return
+            # A non-scalar value no longer fits the table; keep it as a plain entry.
+            del self._extra_cols[key]
+        elif key not in self._plain:
+            self._order.append(key)
+        self._plain[key] = value
+
+    def __delitem__(self, key):
+        if key in self._blocks:
+            raise TypeError("State block {} cannot be removed.".format(key))
+        if key in self._extra_cols:
+            del self._extra_cols[key]
+        else:
+            del self._plain[key]
+        self._order.remove(key)
+
+    def __iter__(self):
+        return iter(list(self._order))
+
+    def __len__(self):
+        return len(self._order)
+
+    def __contains__(self, key):
+        return key in self._blocks or key in self._extra_cols or key in self._plain
+
+    def __repr__(self):
+        return repr(self.copy())
+
+    def copy(self):
+        """Return a plain nested-dictionary snapshot of this state."""
+        snapshot = {}
+        for k in self._order:
+            v = self[k]
+            if isinstance(v, AgentStateBlock):
+                snapshot[k] = v.copy()
+            elif k in self._extra_cols:
+                snapshot[k] = float(v)
+            else:
+                snapshot[k] = deepcopy(v)
+        return snapshot
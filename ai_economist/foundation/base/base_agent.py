@@ -8,6 +8,8 @@ import random
 
 import numpy as np
 
+from ai_economist.foundation.base.agent_actions import AgentActions
+from ai_economist.foundation.base.agent_state import AgentState, AgentStateTable
 from ai_economist.foundation.base.registrar import Registry
 
 
@@ -23,6 +25,10 @@ class BaseAgent:
     registered action subspaces (which depend on the components used to build
     the environment).
 
+    The agent state behaves like a nested dictionary but its numeric fields are
+    stored in a row of an AgentStateTable (see agent_state.py). When built as part
+    of a World, all agents share the world's table (see bind_state_table).
+
     Args:
         idx (int or str): Index that uniquely identifies the agent object amongst the
             other agent objects registered in its environment.
@@ -33,6 +39,17 @@ class BaseAgent:
 
     name = ""
 
+    # Attributes that branches created by BaseEnvironment.fork share (the layout of
+    # the action space, which is fixed once components are registered)
+    _fork_shared = (
+        "single_action_map",
+        "action_dim",
+        "_action_names",
+        "_multi_action_dict",
+        "_noop_action_dict",
+        "_component_action_names",
+    )
+
     def __init__(self, idx=None, multi_action_mode=None):
         assert self.name
 
@@ -59,12 +76,13 @@ class BaseAgent:
         self._unique_actions = 0
         self._total_actions = 0
 
-        self.state = dict(loc=[0, 0], inventory={}, escrow={}, endogenous={})
+        self.state = AgentState(AgentStateTable(1), 0)
 
         self._registered_inventory = False
         self._registered_endogenous = False
         self._registered_components = False
         self._noop_action_dict = dict()
+        self._component_action_names = {}  # Cache for get_component_action
 
         # Special flag to allow logic for multi-action-mode agents
         # that are not given any actions.
@@ -79,6 +97,23 @@ class BaseAgent:
         """Index used to identify this agent. Must be unique within the environment."""
         return self._idx
 
+    def bind_state_table(self, table, row):
+        """Used during world construction to store this agent's state in table."""
+        assert not (self._registered_inventory or self._registered_endogenous)
+        assert not self._registered_components
+        state = AgentState(table, row)
+        if "loc" not in self.state:
+            del state["loc"]
+        self.state = state
+
+    def bind_action_table(self, table, row):
+        """Used during environment construction (once the components are registered)
+        to store this agent's actions in row of table (see AgentActionTable)."""
+        assert self._registered_components
+        assert list(table.columns) == self._action_names
+        assert not any(self._multi_action_dict.values())
+        self.action = AgentActions(table, row)
+
     def register_inventory(self, resources):
         """Used during environment construction to populate inventory/escrow fields."""
         assert not self._registered_inventory
@@ -153,7 +188,7 @@ class BaseAgent:
                 )
 
             for k, v in component.get_additional_state_fields(self.name).items():
-                self.state[k] = v
+                self.state.register_field(k, v)
 
         # Currently no actions are available to this agent. Give it a placeholder.
         if len(self.action) == 0 and self.multi_action_mode:
@@ -371,9 +406,12 @@ class BaseAgent:
         """
         if sub_action_name is not None:
             return self.action.get(component_name + "." + sub_action_name, None)
-        matching_names = [
-            m for m in self._action_names if m.split(".")[0] == component_name
-        ]
+        matching_names = self._component_action_names.get(component_name)
+        if matching_names is None:
+            matching_names = [
+                m for m in self._action_names if m.split(".")[0] == component_name
+            ]
+            self._component_action_names[component_name] = matching_names
         if len(matching_names) == 0:
             return None
         if len(matching_names) == 1:
@@ -5,10 +5,12 @@
 # or https://opensource.org/licenses/BSD-3-Clause
 
 from abc import ABC, abstractmethod
+from collections import deque
 
 import numpy as np
 
 from ai_economist.foundation.agents import agent_registry
+from ai_economist.foundation.base.env_state import get_attributes, set_attributes
 from ai_economist.foundation.base.registrar import Registry
 from ai_economist.foundation.base.world import World
 
@@ -33,6 +35,10 @@ class BaseComponent(ABC):
         get_metrics
         get_dense_log
 
+    Environments snapshot and restore the component's state by querying:
+        get_state
+        set_state
+
     Because they are built as Python objects, component instances can also be
     stateful. Stateful attributes are reset via calls to:
         additional_reset_steps
@@ -60,7 +66,14 @@ class BaseComponent(ABC):
     # The (non-agent) game entities that are expected to be in play
     required_entities = None  # Replace with list or tuple (can be empty)
 
-    def __init__(self, world, episode_length, inventory_scale=1):
+    def __init__(
+        self,
+        world,
+        episode_length,
+        inventory_scale=1,
+        rng=None,
+        event_history_length=None,
+    ):
         assert self.name
 
         assert isinstance(self.agent_subclasses, (tuple, list))
@@ -91,6 +104,16 @@ class BaseComponent(ABC):
 
         self._inventory_scale = float(inventory_scale)
 
+        # Random number stream of the component (see BaseEnvironment.seed)
+        self.rng = np.random.default_rng() if rng is None else rng
+
+        # How many timesteps of events to keep (None for the whole episode, see
+        # new_event_history)
+        if event_history_length is not None:
+            event_history_length = int(event_history_length)
+            assert event_history_length >= 0
+        self._event_history_length = event_history_length
+
     @property
     def world(self):
         """The world object of the environment this component instance is part of.
@@ -126,6 +149,19 @@ class BaseComponent(ABC):
         """The shorthand name, or name if no component_type is defined."""
         return self.name if self.component_type is None else self.component_type
 
+    def new_event_history(self):
+        """Return an empty history of per-timestep events (e.g. trades, builds).
+
+        The history is a list, or, if the environment bounds the memory of its
+        components (see BaseEnvironment's event_history_length), a ring buffer of the
+        events of the most recent timesteps. Either way, append one entry per
+        timestep, and compute metrics from running totals rather than by scanning
+        the history.
+        """
+        if self._event_history_length is None:
+            return []
+        return deque(maxlen=self._event_history_length)
+
     @staticmethod
     def check_world(world):
         """Validate the world object."""
@@ -374,6 +410,39 @@ class BaseComponent(ABC):
         """
         return None
 
+    # Attributes that are not part of the state returned by get_state
+    _state_exclude = ("_world", "rng")
+
+    def get_state(self):
+        """
+        Return the mutable state of the component (order books, buffers, counters,
+        ...) as plain data: numbers, strings, arrays, and lists/tuples/dicts thereof.
+        Used by BaseEnvironment.get_state to snapshot the environment.
+
+        By default, this collects all attributes of the component except those in
+        _state_exclude (and classes/functions). Components that keep state in other
+        kinds of objects should exclude them and extend get_state and set_state.
+        The returned values may be references; they are serialized right away.
+        """
+        return get_attributes(self, self._state_exclude)
+
+    def set_state(self, state):
+        """
+        Restore the state returned by get_state (into an already constructed
+        component with the same configuration).
+        """
+        set_attributes(self, state)
+
+    # Attributes that branches created by BaseEnvironment.fork share with the
+    # original component, rather than copy. Only list attributes that do not change
+    # during an episode (e.g. lookup tables built from the configuration).
+    _fork_shared = ()
+
+    # Append-only histories of past events (see new_event_history). Branches created
+    # by BaseEnvironment.fork get a shallow copy of each, which shares the events
+    # recorded so far with the original component.
+    _fork_history = ()
+
 
 component_registry = Registry(BaseComponent)
 """The registry for Component classes.
@@ -4,14 +4,25 @@
 # For full license text, see the LICENSE file in the repo root
 # or https://opensource.org/licenses/BSD-3-Clause
 
-import random
+import os
+import uuid
 from abc import ABC, abstractmethod
-from copy import deepcopy
+from collections import deque
+from copy import copy, deepcopy
 
+import lz4.frame
 import numpy as np
 
 from ai_economist.foundation.agents import agent_registry
+from ai_economist.foundation.base.dense_log import DenseLogWriter
+from ai_economist.foundation.base.env_state import (
+    get_attributes,
+    pack_state,
+    set_attributes,
+    unpack_state,
+)
 from ai_economist.foundation.base.registrar import Registry
+from ai_economist.foundation.base.step_profiler import StepProfiler
 from ai_economist.foundation.base.world import World
 from ai_economist.foundation.components import component_registry
 from ai_economist.foundation.entities import (
@@ -21,6 +32,28 @@ from ai_economist.foundation.entities import (
 )
 
 
+def _stream_seed(seed_sequence, key):
+    """Return the SeedSequence of random number stream key, spawned from
+    seed_sequence (see BaseEnvironment.seed)."""
+    return np.random.SeedSequence(
+        seed_sequence.entropy, spawn_key=tuple(seed_sequence.spawn_key) + (key,)
+    )
+
+
+def _check_replay_log(replay_log):
+    """Raise a ValueError if replay_log is in the format of the replay logs that
+    recorded the numpy random state (seed_state), which can't be replayed."""
+    if "seed_state" in replay_log["reset"] or any(
+        "seed_state" in step for step in replay_log["step"]
+    ):
+        raise ValueError(
+            "Replay logs that record numpy random states (seed_state) are not "
+            "supported: environments draw from their own random number streams, "
+            "and replay logs record the episode seed instead (see "
+            "BaseEnvironment.seed)."
+        )
+
+
 class BaseEnvironment(ABC):
     """
     Base Environment class. Should be used as the parent class for Scenario classes.
@@ -31,7 +64,11 @@ class BaseEnvironment(ABC):
         obs, rew, done, info <-- env.step(actions)
 
     Also provides Gym-style API for controlling random behavior:
-        env.seed(seed) # Sets numpy and built-in RNG seeds to seed
+        env.seed(seed) # Seeds the environment's random number streams
+
+    Snapshots and counterfactual branches of the simulation state:
+        state    <-- env.get_state()  # And env.set_state(state)
+        branches <-- env.fork(n)
 
     Reference: OpenAI Gym [https://github.com/openai/gym]
 
@@ -160,9 +197,33 @@ class BaseEnvironment(ABC):
             (the default), the world state will be included in the dense log for
             timesteps where t is a multiple of 50.
             Note: More frequent world snapshots increase the dense log memory footprint.
-        seed (int, optional): If provided, sets the numpy and built-in random number
-            generator seeds to seed. You can control the seed after env construction
-            using the 'seed' method.
+        dense_log_directory (str, optional): If provided, dense logs are streamed
+            to (binary, columnar) files in this directory while the episode is
+            played, rather than kept in memory. Either way, the dense log properties
+            return DenseLog objects, which read like the usual nested dictionaries.
+        replay_checkpoint_frequency (int, optional): If provided, how often (in
+            timesteps) to add a checkpoint of the environment state to the replay
+            log, so that replay can start from the checkpoint nearest to the
+            requested timestep (see replay). Default is None (no checkpoints).
+        reuse_observation_buffers (bool): When flattening observations, whether to
+            write the "flat" observation of each agent into a persistent, preallocated
+            float32 buffer (laid out once, on the first observation). If True, reset
+            and step return views of these buffers, which are overwritten by the next
+            call to reset or step; copy them if they need to be kept. If False
+            (default), a new array is returned each time.
+        profile_steps (bool): Whether to time the phases of reset and step (see
+            profile_report). When enabled, the mean and 99th percentile duration of
+            each phase are also included in the metrics. Default is False.
+        event_history_length (int, optional): If provided, components only keep the
+            events (trades, builds, taxes, etc.) of the last event_history_length
+            timesteps, and their dense logs only hold those timesteps. Their metrics
+            are kept as running totals either way, so that long or continuing
+            episodes run in constant memory. By default, the events of the whole
+            episode are kept.
+        seed (int or np.random.SeedSequence, optional): If provided, seeds the
+            random number streams of the environment (see seed). Otherwise, the
+            seed is drawn from the global numpy RNG. You can control the seed after
+            env construction using the 'seed' method.
     """
 
     # The name associated with this Scenario class (must be unique)
@@ -190,7 +251,12 @@ class BaseEnvironment(ABC):
         allow_observation_scaling=True,
         dense_log_frequency=None,
         world_dense_log_frequency=50,
+        dense_log_directory=None,
+        replay_checkpoint_frequency=None,
         collate_agent_step_and_reset_data=False,
+        reuse_observation_buffers=False,
+        profile_steps=False,
+        event_history_length=None,
         seed=None,
         mobile_agent_class = "BasicMobileAgent",#new
         
@@ -292,6 +358,11 @@ class BaseEnvironment(ABC):
         # Whether to flatten the mask dictionaries before putting them in the obs
         self._flatten_masks = bool(flatten_masks)
 
+        # Whether the "flat" observations are written into persistent buffers
+        # (returned as views that get overwritten by the next reset/step) instead of
+        # freshly allocated arrays
+        self._reuse_observation_buffers = bool(reuse_observation_buffers)
+
         # How often (in episode completions) to create a dense log
         self._dense_log_this_episode = False
         if dense_log_frequency is None:  # Only create a dense log
@@ -305,9 +376,31 @@ class BaseEnvironment(ABC):
         self._world_dense_log_frequency = int(world_dense_log_frequency)
         assert self._world_dense_log_frequency >= 1
 
-        # Seed control
-        if seed is not None:
-            self.seed(seed)
+        # Where to stream dense logs to (None to keep them in memory)
+        self._dense_log_directory = dense_log_directory
+        if self._dense_log_directory is not None:
+            assert os.path.isdir(self._dense_log_directory)
+        self._dense_log_id = uuid.uuid4().hex[:8]
+
+        # How to record the replay log (see replay)
+        self._episode_seed = None
+        if replay_checkpoint_frequency is None:
+            self._replay_checkpoint_frequency = None
+        else:
+            self._replay_checkpoint_frequency = int(replay_checkpoint_frequency)
+            assert self._replay_checkpoint_frequency >= 1
+
+        # Timing of the phases of reset and step (None if not profiling)
+        self._profiler = StepProfiler() if profile_steps else None
+
+        # Random number streams (see seed): the scenario uses self.rng, the world
+        # and each component their own rng, all derived from self._seed_sequence
+        if seed is None:
+            seed = np.random.randint(2 ** 31)
+        self._seed_sequence = None
+        self._episode_seeds = None
+        self.rng = None
+        self.seed(seed)
 
         # Initialize the set of entities used in the game that's being created.
         # Coin and Labor are always included.
@@ -348,14 +441,17 @@ class BaseEnvironment(ABC):
             self.env_weighting,
             self.mobile_agent_class,
             self.equ_weighting,
+            rng=self._random_stream(self._seed_sequence, 1),
         )
 
         # Initialize the component objects.
-        for component_cls, component_kwargs in component_classes:
+        for i, (component_cls, component_kwargs) in enumerate(component_classes):
             component_object = component_cls(
                 self.world,
                 self._episode_length,
                 inventory_scale=self.inv_scale,
+                rng=self._random_stream(self._seed_sequence, 2 + i),
+                event_history_length=event_history_length,
                 **component_kwargs
             )
             self._components.append(component_object)
@@ -370,6 +466,7 @@ class BaseEnvironment(ABC):
             agent.register_components(self._components)
         self.world.planner.register_inventory(self.resources)
         self.world.planner.register_components(self._components)
+        self.world.build_action_table()
 
         self._agent_lookup = {str(agent.idx): agent for agent in self.all_agents}
 
@@ -378,14 +475,15 @@ class BaseEnvironment(ABC):
         self._last_ep_metrics = None
 
         # For dense logging
-        self._dense_log = {"world": [], "states": [], "actions": [], "rewards": []}
+        self._dense_log = None  # DenseLogWriter of the episode (if dense logging)
         self._last_ep_dense_log = self.dense_log.copy()
 
         # For episode replay
-        self._replay_log = {"reset": dict(seed_state=None), "step": []}
+        self._replay_log = {"reset": dict(episode_seed=None), "step": []}
         self._last_ep_replay_log = self.replay_log.copy()
 
         self._packagers = {}
+        self._flat_obs_buffers = {}
 
         # To collate all the agents ('0', '1', ...) data during reset and step
         # into a single agent with index 'a'
@@ -455,8 +553,45 @@ class BaseEnvironment(ABC):
             for k, v in m_metrics.items():
                 metrics["{}/{}".format(component.shorthand, k)] = v
 
+        if self._profiler is not None:
+            for phase, entry in self._profiler.report().items():
+                metrics["profile/{}/mean_us".format(phase)] = entry["mean_us"]
+                metrics["profile/{}/p99_us".format(phase)] = entry["p99_us"]
+
         return metrics
 
+    def profile_report(self, clear=False):
+        """
+        Return the timing statistics of the phases of reset and step, if the
+        environment was created with profile_steps=True (None otherwise).
+
+        The phases are:
+            step, reset: The whole call.
+            parse_actions, replay_checkpoint, dense_log, finalize_logs.
+            component_step/<component>, scenario_step.
+            observations/scenario, observations/<component>: Generating observations.
+            masks: Generating and flattening action masks, including the
+                masks/<component> phases (each component's generate_masks).
+            packaging/observations, packaging/collate: Flattening and collating.
+            compute_reward.
+            scenario_reset, component_reset/<component>, additional_reset_steps.
+
+        Args:
+            clear (bool): Whether to start over after reporting.
+
+        Returns:
+            report (dict): {phase: statistics}, as plain data (see StepProfiler).
+                Reports of several environments, e.g. collected from RLlib rollout
+                workers, can be combined with merge_profile_reports (see
+                step_profiler.py).
+        """
+        if self._profiler is None:
+            return None
+        report = self._profiler.report()
+        if clear:
+            self._profiler.clear()
+        return report
+
     @property
     def components(self):
         """The list of components associated with this scenario."""
@@ -465,7 +600,9 @@ class BaseEnvironment(ABC):
     @property
     def dense_log(self):
         """The contents of the current (potentially incomplete) dense log."""
-        return self._dense_log
+        if self._dense_log is None:
+            return {"world": [], "states": [], "actions": [], "rewards": []}
+        return self._dense_log.view()
 
     @property
     def replay_log(self):
@@ -493,6 +630,9 @@ class BaseEnvironment(ABC):
                 _ = env.step(**replay_step)
             dense_log = env.previous_episode_dense_log
             metrics = env.previous_episode_metrics
+
+            # or only regenerate the dense log of timesteps 900 to 950
+            dense_log = env.replay(replay_log, start=900, end=950)
         """
         return self._last_ep_replay_log
 
@@ -504,20 +644,285 @@ class BaseEnvironment(ABC):
     # Seed control
     # -----------------
 
+    def seed(self, seed):
+        """Seed the random number streams of the environment.
+
+        All the randomness of the simulation comes from independent np.random
+        Generator (PCG64) streams owned by the environment: self.rng (used by the
+        scenario), self.world.rng and the rng of each component. At each reset, the
+        streams are re-seeded from an episode seed (see reset), which is drawn from
+        a sequence of episode seeds derived from seed. Environments therefore never
+        share random numbers, and the randomness of an episode only depends on its
+        episode seed and the actions taken.
+
+        Args:
+            seed (int, float or np.random.SeedSequence): Seed value to use. Must be
+                >= 0. Converted to int internally if provided value is a float.
+        """
+        if not isinstance(seed, np.random.SeedSequence):
+            assert isinstance(seed, (int, float, np.integer))
+            seed = int(seed)
+            assert seed >= 0
+            seed = np.random.SeedSequence(seed)
+        self._seed_sequence = seed
+        self._episode_seeds = np.random.Generator(np.random.PCG64(seed))
+        if self.rng is None:  # During construction (see __init__)
+            self.rng = self._random_stream(seed, 0)
+        else:
+            self._seed_random_streams(seed)
+
     @staticmethod
-    def seed(seed):
-        """Sets the numpy and built-in random number generator seed.
+    def _random_stream(seed_sequence, key):
+        """Return the Generator of stream key (0: scenario, 1: world, 2 + i:
+        component i) derived from seed_sequence."""
+        return np.random.Generator(np.random.PCG64(_stream_seed(seed_sequence, key)))
+
+    def _random_streams(self):
+        """Return the Generators of the environment, in stream order."""
+        return [self.rng, self.world.rng] + [c.rng for c in self._components]
+
+    def _seed_random_streams(self, seed_sequence):
+        """Re-seed the random number streams (in place) from seed_sequence."""
+        for key, stream in enumerate(self._random_streams()):
+            stream.bit_generator.state = np.random.PCG64(
+                _stream_seed(seed_sequence, key)
+            ).state
+
+    # Snapshots
+    # ---------
+
+    # Attributes that are not part of the environment state returned by get_state
+    # (objects that save their own state, logs, logging settings and output buffers)
+    _state_exclude = (
+        "world",
+        "_components",
+        "_components_dict",
+        "_shorthand_lookup",
+        "_agent_lookup",
+        "_dense_log",
+        "_dense_log_this_episode",
+        "_last_ep_dense_log",
+        "_create_dense_log_every",
+        "_dense_log_directory",
+        "_dense_log_id",
+        "_replay_log",
+        "_last_ep_replay_log",
+        "_replay_checkpoint_frequency",
+        "_packagers",
+        "_flat_obs_buffers",
+        "_profiler",
+        "_seed_sequence",
+        "_episode_seeds",
+        "rng",
+    )
+
+    def get_state(self):
+        """Return a snapshot of the environment state, as a (versioned, binary)
+        bytes blob.
+
+        The snapshot holds only the mutable simulation state: the world (maps, agent
+        states and timestep), the state of each component (see
+        BaseComponent.get_state), the plain-data attributes of the scenario, the
+        episode counters and the states of the random number streams (see seed).
+        It does not include the
+        dense/replay logs. Compared to pickling the environment object, snapshots
+        are small, fast to create and restore, and loading one never executes code.
+
+        Example:
+            state = env.get_state()
+            obs, rew, done, info = env.step(actions)
+            env.set_state(state)  # Back to before the step
+
+        Returns:
+            state (bytes): The snapshot (see set_state and base/env_state.py).
+        """
+        state = dict(
+            scenario=self.name,
+            components=[component.name for component in self._components],
+            n_agents=self.n_agents,
+            env=get_attributes(self, self._state_exclude),
+            world=self.world.get_state(),
+            component_states=[component.get_state() for component in self._components],
+            rng=dict(
+                episode_seeds=self._episode_seeds.bit_generator.state,
+                streams=[rng.bit_generator.state for rng in self._random_streams()],
+            ),
+        )
+        return pack_state(state)
+
+    def set_state(self, state):
+        """Restore a snapshot created by get_state.
+
+        The environment must have been constructed with the same configuration
+        (scenario, components and number of agents) as the one that created the
+        snapshot. Dense logging of the current episode stops, and its replay log
+        starts over from the restored state.
+
+        Args:
+            state (bytes): A snapshot returned by get_state.
+        """
+        state = unpack_state(state)
+        assert state["scenario"] == self.name
+        assert state["components"] == [c.name for c in self._components]
+        assert state["n_agents"] == self.n_agents
+
+        set_attributes(self, state["env"])
+        self.world.set_state(state["world"])
+        for component, component_state in zip(
+            self._components, state["component_states"]
+        ):
+            component.set_state(component_state)
+
+        self._episode_seeds.bit_generator.state = state["rng"]["episode_seeds"]
+        for rng, rng_state in zip(self._random_streams(), state["rng"]["streams"]):
+            rng.bit_generator.state = rng_state
+
+        if self._dense_log is not None:
+            self._dense_log.close()
+            self._dense_log = None
+        self._dense_log_this_episode = False
+        self._replay_log = self._restart_replay_log()
+
+    def _restart_replay_log(self):
+        """Return an empty replay log that starts from the current state."""
+        return {"reset": dict(episode_seed=self._episode_seed), "step": []}
+
+    # Attributes that branches created by fork share with the environment, rather
+    # than copy (they do not change during an episode)
+    _fork_shared = ("_packagers", "_last_ep_dense_log", "_last_ep_replay_log")
+
+    def fork(self, n):
+        """Return n branches of the environment, cloned from its current state.
+
+        Each branch is an independent environment that continues the current
+        episode, so that e.g. candidate planner actions can be compared by stepping
+        each branch under a different one. Branches use common random numbers: each
+        has a private copy of the random number streams of the environment (see
+        seed), so all branches (and the environment itself) see the same random
+        draws.
+
+        Forking is cheaper than deepcopy(env), and its cost does not grow over the
+        episode: logs are not copied (branches start new replay logs and do not
+        dense log, unless forced at reset), large structures that stay fixed during
+        an episode (layouts, source probability maps, tax bracket tables, real-world
+        data, ...) are shared with the environment rather than copied (see
+        _fork_shared of the environment, world, maps, agents and components), and
+        the histories of past events (trades, builds, taxes, ...) are shallow copies
+        that share the recorded events (see _fork_history of the components). The
+        rest of the state is copied. E.g., with 4 agents on a 15x15 map, fork(1)
+        takes about 0.6x the time of deepcopy(env) at timestep 10 and 0.1x at
+        timestep 500.
 
         Args:
-            seed (int, float): Seed value to use. Must be > 0. Converted to int
-                internally if provided value is a float.
+            n (int): The number of branches.
+
+        Returns:
+            branches (list): n environment objects.
         """
-        assert isinstance(seed, (int, float))
-        seed = int(seed)
-        assert seed > 0
+        n = int(n)
+        assert n >= 1
+
+        memo = {}
+        shared_objects = [self, self.world, self.world.maps]
+        for obj in shared_objects + self.all_agents + self._components:
+            for name in obj._fork_shared:
+                value = getattr(obj, name)
+                memo[id(value)] = value
+        for log in [self._dense_log, self._replay_log]:
+            memo[id(log)] = None
+        histories = [
+            getattr(component, name)
+            for component in self._components
+            for name in component._fork_history
+        ]
+
+        branches = []
+        for _ in range(n):
+            branch_memo = dict(memo)
+            for history in histories:
+                branch_memo[id(history)] = copy(history)
+            branch = deepcopy(self, branch_memo)
+            branch._dense_log_this_episode = False
+            branch._create_dense_log_every = None
+            branch._dense_log_id = uuid.uuid4().hex[:8]
+            branch._replay_log = branch._restart_replay_log()
+            branches.append(branch)
+        return branches
+
+    # Replay
+    # ------
+
+    def replay(self, replay_log, start=0, end=None):
+        """Replay the episode recorded in replay_log and return the dense log of
+        timesteps start to end.
+
+        Replay starts from the latest checkpoint in the replay log at or before
+        start (see replay_checkpoint_frequency) or from the reset otherwise, steps
+        through the recorded actions up to start without logging, and then dense logs
+        timesteps start to end. The returned DenseLog has the usual format, except
+        that it covers end - start timesteps; its last "states" and "world" entries
+        are those after timestep end. Component logs are those of the components
+        when the replay stopped.
+
+        Note: replay overwrites the current state of the environment (but not the
+        logs or metrics of the previous episode).
 
-        np.random.seed(seed)
-        random.seed(seed)
+        Args:
+            replay_log (dict): A replay log (see previous_episode_replay_log). Replay
+                logs that record numpy random states ("seed_state" entries) are
+                not supported.
+            start (int): The first timestep to dense log.
+            end (int, optional): The timestep to stop at. Defaults to the end of the
+                recorded episode.
+
+        Returns:
+            dense_log (DenseLog): The dense log of timesteps start to end.
+        """
+        _check_replay_log(replay_log)
+        steps = replay_log["step"]
+        end = len(steps) if end is None else int(end)
+        start = int(start)
+        assert 0 <= start <= end <= len(steps)
+
+        kept = {
+            k: self.__dict__[k]
+            for k in [
+                "_last_ep_dense_log",
+                "_last_ep_replay_log",
+                "_last_ep_metrics",
+                "_completions",
+                "_create_dense_log_every",
+                "_replay_checkpoint_frequency",
+            ]
+        }
+        self._create_dense_log_every = None
+        self._replay_checkpoint_frequency = None
+
+        checkpoints = replay_log.get("checkpoints", {})
+        restart = max([t for t in checkpoints if t <= start], default=None)
+        if restart is None:
+            self.reset(**replay_log["reset"])
+            restart = 0
+        else:
+            self.set_state(lz4.frame.decompress(checkpoints[restart]))
+            self._replay_log = {"reset": dict(replay_log["reset"]), "step": []}
+        assert self.world.timestep == restart
+
+        for t in range(restart, end):
+            if t == start:
+                self._dense_log = DenseLogWriter(self.all_agents)
+                self._dense_log_this_episode = True
+            self.step(**steps[t])
+
+        if start == end:
+            self._dense_log = DenseLogWriter(self.all_agents)
+        if not self._dense_log.closed:
+            # Stopped before the end of the episode
+            self._complete_dense_log()
+        dense_log = self._dense_log.close()
+
+        self.__dict__.update(kept)
+        return dense_log
 
     # Getters & Setters
     # -----------------
@@ -615,48 +1020,51 @@ class BaseEnvironment(ABC):
         return keep_as_is, flatten, wrap_as_list
 
     @staticmethod
-    def _package(obs_dict, keep_as_is, flatten, wrap_as_list):
+    def _build_obs_layout(sub_obs, flatten, wrap_as_list):
+        """
+        Compiles the layout of the "flat" observation: each flattened key gets a
+        fixed [start, stop) slice of a single float32 buffer.
+        Returns the list of (key, start, stop, wrap_as_list) and the buffer size.
+        """
+        layout = []
+        start = 0
+        for k in flatten:
+            size = 1 if wrap_as_list[k] else int(np.size(sub_obs[k]))
+            layout.append((k, start, start + size, wrap_as_list[k]))
+            start += size
+        return layout, start
+
+    @staticmethod
+    def _package(obs_dict, keep_as_is, layout, flat_buffer):
+        """
+        Writes the flattened keys of obs_dict into their slices of flat_buffer.
+        """
         new_obs = {k: obs_dict[k] for k in keep_as_is}
-        if len(flatten) == 1:
-            k = flatten[0]
-            o = obs_dict[k]
-            if wrap_as_list[k]:
-                o = [o]
-            new_obs["flat"] = np.array(o, dtype=np.float32)
-        else:
-            to_flatten = [
-                [obs_dict[k]] if wrap_as_list[k] else obs_dict[k] for k in flatten
-            ]
-            try:
-                new_obs["flat"] = np.concatenate(to_flatten).astype(np.float32)
-            except ValueError:
-                for k, v in zip(flatten, to_flatten):
-                    print(k, np.array(v).shape)
-                    print(v)
-                    print("")
-                raise
+        try:
+            for k, start, stop, wrap in layout:
+                if wrap:
+                    flat_buffer[start] = obs_dict[k]
+                else:
+                    flat_buffer[start:stop] = obs_dict[k]
+        except ValueError:
+            for k, start, stop, _ in layout:
+                print(k, (stop - start), np.array(obs_dict[k]).shape)
+                print(obs_dict[k])
+                print("")
+            raise
+        new_obs["flat"] = flat_buffer
         return new_obs
 
-    def _generate_observations(self, flatten_observations=False, flatten_masks=False):
-        def recursive_listify(d):
-            assert isinstance(d, dict)
-            for k, v in d.items():
-                if isinstance(v, dict):
-                    d[k] = recursive_listify(v)
-                elif isinstance(v, (int, float)):
-                    d[k] = v
-                elif isinstance(v, (list, tuple, set)):
-                    d[k] = list(v)
-                elif isinstance(v, (np.ndarray, np.integer, np.floating)):
-                    d[k] = v.tolist()
-                else:
-                    raise NotImplementedError(
-                        "Not clear how to handle {} with type {}".format(k, type(v))
-                    )
-                if isinstance(d[k], list) and len(d[k]) == 1:
-                    d[k] = d[k][0]
-            return d
+    def _get_flat_buffer(self, aidx):
+        """
+        Returns the float32 buffer for the "flat" observation of aidx. This is a
+        persistent buffer if reuse_observation_buffers is set, otherwise a new one.
+        """
+        if self._reuse_observation_buffers:
+            return self._flat_obs_buffers[aidx]
+        return np.empty(self._flat_obs_buffers[aidx].shape, dtype=np.float32)
 
+    def _generate_observations(self, flatten_observations=False, flatten_masks=False):
         # Initialize empty observations
         if self.collate_agent_step_and_reset_data:
             obs = {"a": {}, "p": {}}
@@ -666,8 +1074,14 @@ class BaseEnvironment(ABC):
             "p" + str(agent.idx): {} for agent in self.world.agents
         }
 
+        profiler = self._profiler
+        if profiler is not None:
+            t = profiler.clock()
+
         # Get/process observations generated by the scenario
         world_obs = {str(k): v for k, v in self.generate_observations().items()}
+        if profiler is not None:
+            profiler.add("observations/scenario", t)
         time_scale = self.episode_length if self._allow_observation_scaling else 1.0
         for idx, o in world_obs.items():
             if idx in obs:
@@ -690,7 +1104,12 @@ class BaseEnvironment(ABC):
 
         # Get/process observations generated by the components
         for component in self._components:
-            for idx, o in component.obs().items():
+            if profiler is not None:
+                t = profiler.clock()
+            component_obs = component.obs()
+            if profiler is not None:
+                profiler.add("observations/" + component.name, t)
+            for idx, o in component_obs.items():
                 if idx in obs:
                     obs[idx].update({component.name + "-" + k: v for k, v in o.items()})
                 elif idx in agent_wise_planner_obs:
@@ -701,17 +1120,28 @@ class BaseEnvironment(ABC):
                     raise KeyError
 
         # Process the observations
+        if profiler is not None:
+            t = profiler.clock()
         if flatten_observations:
             for o_dict in [obs, agent_wise_planner_obs]:
                 for aidx, aobs in o_dict.items():
                     if not aobs:
                         continue
                     if aidx not in self._packagers:
-                        self._packagers[aidx] = self._build_packager(
+                        keep_as_is, flatten, wrap_as_list = self._build_packager(
                             aobs, put_in_both=["time"]
                         )
+                        layout, size = self._build_obs_layout(
+                            aobs, flatten, wrap_as_list
+                        )
+                        self._packagers[aidx] = (keep_as_is, layout)
+                        self._flat_obs_buffers[aidx] = np.zeros(
+                            size, dtype=np.float32
+                        )
                     try:
-                        o_dict[aidx] = self._package(aobs, *self._packagers[aidx])
+                        o_dict[aidx] = self._package(
+                            aobs, *self._packagers[aidx], self._get_flat_buffer(aidx)
+                        )
                     except ValueError:
                         print("Error when packaging obs.")
                         print("Agent index: {}\nRaw obs: {}\n".format(aidx, aobs))
@@ -722,9 +1152,16 @@ class BaseEnvironment(ABC):
                 obs[self.world.planner.idx][k] = (
                     v["flat"] if flatten_observations else v
                 )
+        if profiler is not None:
+            profiler.add("packaging/observations", t)
 
         # Get each agent's action masks and incorporate them into the observations
-        for aidx, amask in self._generate_masks(flatten_masks=flatten_masks).items():
+        if profiler is not None:
+            t = profiler.clock()
+        masks = self._generate_masks(flatten_masks=flatten_masks)
+        if profiler is not None:
+            profiler.add("masks", t)
+        for aidx, amask in masks.items():
             obs[aidx]["action_mask"] = amask
 
         return obs
@@ -734,9 +1171,14 @@ class BaseEnvironment(ABC):
             masks = {"a": {}, "p": {}}
         else:
             masks = {agent.idx: {} for agent in self.all_agents}
+        profiler = self._profiler
         for component in self._components:
             # Use the component's generate_masks method to get action masks
+            if profiler is not None:
+                t = profiler.clock()
             component_masks = component.generate_masks(completions=self._completions)
+            if profiler is not None:
+                profiler.add("masks/" + component.name, t)
 
             for idx, mask in component_masks.items():
                 if isinstance(mask, dict):
@@ -793,35 +1235,10 @@ class BaseEnvironment(ABC):
         if not self._dense_log_this_episode:
             return
 
-        def recursive_cast(d):
-            if isinstance(d, (list, tuple, set)):
-                new_d = [recursive_cast(v_) for v_ in d]
-                return new_d
-            if isinstance(d, dict):
-                for k, v in d.items():
-                    if isinstance(v, (list, tuple, set, dict)):
-                        d[k] = recursive_cast(v)
-                    elif isinstance(v, (int, float, str)):
-                        d[k] = v
-                    elif isinstance(v, (np.ndarray, np.integer, np.floating)):
-                        d[k] = v.tolist()
-                    else:
-                        raise NotImplementedError(
-                            "Not clear how to handle {} with type {}".format(k, type(v))
-                        )
-                return d
-            if isinstance(d, (int, float, str)):
-                return d
-            if isinstance(d, (np.ndarray, np.integer, np.floating)):
-                return d.tolist()
-            raise NotImplementedError(
-                "Not clear how to handle {} with type {}".format(d, type(d))
-            )
+        self._complete_dense_log()
 
-        self._dense_log["world"].append(deepcopy(self.world.maps.state_dict))
-        self._dense_log["states"].append(
-            {str(agent.idx): deepcopy(agent.state) for agent in self.all_agents}
-        )
+    def _complete_dense_log(self):
+        self._dense_log.log_states(maps=self.world.maps)
 
         # Back-fill the log with each component's dense log to complete the aggregate
         # dense log
@@ -831,13 +1248,13 @@ class BaseEnvironment(ABC):
                 continue
             if isinstance(component_log, dict):
                 for k, v in component_log.items():
-                    self._dense_log[component.shorthand + "-" + k] = v
-            elif isinstance(component_log, (tuple, list)):
-                self._dense_log[component.shorthand] = list(component_log)
+                    self._dense_log.log_component(component.shorthand + "-" + k, v)
+            elif isinstance(component_log, (tuple, list, deque)):
+                self._dense_log.log_component(component.shorthand, list(component_log))
             else:
                 raise TypeError
 
-        self._last_ep_dense_log = recursive_cast(self._dense_log)
+        self._last_ep_dense_log = self._dense_log.close()
 
     def collate_agent_obs(self, obs):
         # Collating observations from all agents
@@ -875,17 +1292,17 @@ class BaseEnvironment(ABC):
             del info[str(agent_idx)]
         return info
 
-    def reset(self, seed_state=None, force_dense_logging=False):
+    def reset(self, force_dense_logging=False, episode_seed=None):
         """
         Reset the state of the environment to initialize a new episode.
 
         Arguments:
-            seed_state (tuple or list): Optional state that the numpy RNG should be set
-                to prior to the reset cycle must be length 5, following the format
-                expected by np.random.set_state()
             force_dense_logging (bool): Optional whether to force dense logging to take
                 place this episode; default behavior is to do dense logging every
                 create_dense_log_every episodes
+            episode_seed (int): Optional seed of the episode, from which the random
+                number streams are re-seeded (see seed). By default, the next seed
+                of the sequence of episode seeds is used.
 
         Returns:
             obs (dict): A dictionary of {"agent_idx": agent_obs} with an entry for
@@ -894,17 +1311,14 @@ class BaseEnvironment(ABC):
                 which itself is a dictionary. The "agent_idx" key matches the
                 agent.idx property for the given agent.
         """
-        if seed_state is not None:
-            assert isinstance(seed_state, (tuple, list))
-            assert len(seed_state) == 5
-            seed_state = (
-                str(seed_state[0]),
-                np.array(seed_state[1], dtype=np.uint32),
-                int(seed_state[2]),
-                int(seed_state[3]),
-                float(seed_state[4]),
-            )
-            np.random.set_state(seed_state)
+        profiler = self._profiler
+        if profiler is not None:
+            reset_start = profiler.clock()
+
+        if episode_seed is None:
+            episode_seed = self._episode_seeds.integers(2 ** 63)
+        self._episode_seed = int(episode_seed)
+        self._seed_random_streams(np.random.SeedSequence(self._episode_seed))
 
         if force_dense_logging:
             self._dense_log_this_episode = True
@@ -916,30 +1330,52 @@ class BaseEnvironment(ABC):
             ) == 0
 
         # For dense logging
-        self._dense_log = {"world": [], "states": [], "actions": [], "rewards": []}
+        if self._dense_log is not None:
+            self._dense_log.close()
+        self._dense_log = None
+        if self._dense_log_this_episode:
+            path = None
+            if self._dense_log_directory is not None:
+                path = os.path.join(
+                    self._dense_log_directory,
+                    "dense_log_{}_{:06d}.dlog".format(
+                        self._dense_log_id, self._completions
+                    ),
+                )
+            self._dense_log = DenseLogWriter(self.all_agents, path=path)
 
         # For episode replay
-        self._replay_log = {"reset": dict(seed_state=np.random.get_state()), "step": []}
+        self._replay_log = self._restart_replay_log()
+        if self._replay_checkpoint_frequency is not None:
+            self._replay_log["checkpoints"] = {}
 
         # Reset the timestep counter
         self.world.timestep = 0
 
         # Perform the scenario reset,
         # which includes resetting the world and agent states
+        if profiler is not None:
+            t = profiler.clock()
         self.reset_starting_layout()
         self.reset_agent_states()
+        if profiler is not None:
+            t = profiler.add("scenario_reset", t)
 
         # Perform the component resets for each registered component
         for component in self._components:
             component.reset()
+            if profiler is not None:
+                t = profiler.add("component_reset/" + component.name, t)
 
         # Take any customized reset actions
         self.additional_reset_steps()
+        if profiler is not None:
+            profiler.add("additional_reset_steps", t)
 
         # By default, agents take the NO-OP action for each action space.
         # Reset actions to that default.
-        for agent in self.all_agents:
-            agent.reset_actions()
+        self.world.action_table.reset()
+        self.world.planner.reset_actions()
 
         # Produce observations
         obs = self._generate_observations(
@@ -950,9 +1386,12 @@ class BaseEnvironment(ABC):
         if self.collate_agent_step_and_reset_data:
             obs = self.collate_agent_obs(obs)
 
+        if profiler is not None:
+            profiler.add("reset", reset_start)
+
         return obs
 
-    def step(self, actions=None, seed_state=None):
+    def step(self, actions=None, planner_actions=None):
         """
         Execute the components, perform the scenario step, collect observations and
         return observations, rewards, dones, and infos.
@@ -969,9 +1408,17 @@ class BaseEnvironment(ABC):
                 specifying the chosen action for each action subspace.
                 Otherwise, action must be a single integer specifying the chosen
                 action (where the action space is the concatenation of the subspaces).
-            seed_state (tuple or list): Optional state that the numpy RNG should be set
-                to prior to the reset cycle must be length 5, following the format
-                expected by np.random.set_state().
+                Alternatively, the actions of all the mobile agents can be given as
+                a single integer array, shaped [n_agents, n_subactions] in multi
+                action mode or [n_agents] otherwise (row i holding the action of
+                agent i, in the formats above). It is decoded with lookup tables
+                compiled during construction and written directly into the agents'
+                action buffers, skipping the per-agent parsing of the dictionary
+                format.
+            planner_actions (list or ndarray): Optional action of the planner, in
+                the format described above. Useful along with an array of mobile
+                agent actions (the planner action may also be given in a dictionary
+                of actions, under the "p" key).
 
         Returns:
             obs (dict): A dictionary of {"agent_idx": agent_obs} with an entry for
@@ -987,73 +1434,96 @@ class BaseEnvironment(ABC):
             info (dict): Placeholder dictionary with structure {"agent_idx": {}},
                 with the same keys as obs and rew.
         """
-        if actions is not None:
-            assert isinstance(actions, dict)
-            self.parse_actions(actions)
-
-        if seed_state is not None:
-            assert isinstance(seed_state, (tuple, list))
-            assert len(seed_state) == 5
-            seed_state = (
-                str(seed_state[0]),
-                np.array(seed_state[1], dtype=np.uint32),
-                int(seed_state[2]),
-                int(seed_state[3]),
-                float(seed_state[4]),
+        profiler = self._profiler
+        if profiler is not None:
+            step_start = t = profiler.clock()
+
+        if self._replay_checkpoint_frequency is not None and (
+            self.world.timestep % self._replay_checkpoint_frequency == 0
+        ):
+            self._replay_log["checkpoints"][self.world.timestep] = lz4.frame.compress(
+                self.get_state()
             )
-            np.random.set_state(seed_state)
+            if profiler is not None:
+                t = profiler.add("replay_checkpoint", t)
 
-        self._replay_log["step"].append(
-            dict(actions=actions, seed_state=np.random.get_state())
-        )
+        if isinstance(actions, dict):
+            self.parse_actions(actions)
+        elif actions is not None:
+            # Copy the array for the replay log (the caller may reuse its buffer)
+            actions = np.array(actions, dtype=np.int64)
+            self.world.action_table.parse_actions(actions)
+        if planner_actions is not None:
+            planner_actions = np.array(planner_actions, dtype=np.int64)
+            self.world.planner.parse_actions(planner_actions)
+        if profiler is not None:
+            t = profiler.add("parse_actions", t)
+
+        # The random number streams continue from the reset, so the actions are all
+        # that is needed to replay the step
+        replay_step = dict(actions=actions)
+        if planner_actions is not None:
+            replay_step["planner_actions"] = planner_actions
+        self._replay_log["step"].append(replay_step)
 
         if self._dense_log_this_episode:
-            self._dense_log["world"].append(
-                deepcopy(self.world.maps.state_dict)
-                if (self.world.timestep % self._world_dense_log_frequency) == 0
-                else {}
-            )
-            self._dense_log["states"].append(
-                {str(agent.idx): deepcopy(agent.state) for agent in self.all_agents}
-            )
-            self._dense_log["actions"].append(
-                {
-                    str(agent.idx): {k: v for k, v in agent.action.items() if v > 0}
-                    for agent in self.all_agents
-                }
-            )
+            log_world = (self.world.timestep % self._world_dense_log_frequency) == 0
+            self._dense_log.log_states(maps=self.world.maps if log_world else None)
+            self._dense_log.log_actions()
+            if profiler is not None:
+                t = profiler.add("dense_log", t)
 
         self.world.timestep += 1
 
-        for component in self._components:
-            component.component_step()
-
-        self.scenario_step()
+        if profiler is None:
+            for component in self._components:
+                component.component_step()
+            self.scenario_step()
+        else:
+            t = profiler.clock()
+            for component in self._components:
+                component.component_step()
+                t = profiler.add("component_step/" + component.name, t)
+            self.scenario_step()
+            profiler.add("scenario_step", t)
 
         obs = self._generate_observations(
             flatten_observations=self._flatten_observations,
             flatten_masks=self._flatten_masks,
         )
+        if profiler is not None:
+            t = profiler.clock()
         rew = self._generate_rewards()
         done = {"__all__": self.world.timestep >= self._episode_length}
         info = {k: {} for k in obs.keys()}
+        if profiler is not None:
+            t = profiler.add("compute_reward", t)
 
         if self._dense_log_this_episode:
-            self._dense_log["rewards"].append(rew)
+            self._dense_log.log_rewards(rew)
+            if profiler is not None:
+                t = profiler.add("dense_log", t)
 
-        for agent in self.all_agents:
-            agent.reset_actions()
+        self.world.action_table.reset()
+        self.world.planner.reset_actions()
 
         if done[
             "__all__"
         ]:  # Complete the dense log and stash it as well as the metrics
             self._finalize_logs()
             self._completions += 1
+            if profiler is not None:
+                t = profiler.add("finalize_logs", t)
 
         if self.collate_agent_step_and_reset_data:
             obs = self.collate_agent_obs(obs)
             rew = self.collate_agent_rew(rew)
             info = self.collate_agent_info(info)
+            if profiler is not None:
+                t = profiler.add("packaging/collate", t)
+
+        if profiler is not None:
+            profiler.add("step", step_start)
 
         return obs, rew, done, info
 
@@ -0,0 +1,557 @@
+# Copyright (c) 2020, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+import struct
+from collections.abc import Mapping, Sequence
+from copy import deepcopy
+
+import lz4.frame
+import numpy as np
+
+from ai_economist.foundation.base.agent_state import AgentState
+from ai_economist.foundation.base.env_state import pack_state, unpack_state
+
+DENSE_LOG_VERSION = 1
+
+# Dense log files start with this magic, followed by the records, each stored as
+# its (uint64) length and the record in the snapshot format of env_state
+DENSE_LOG_MAGIC = b"AIEDENSE"
+_RECORD_LENGTH = struct.Struct("<Q")
+
+_LZ4_MAGIC = b"\x04\x22\x4d\x18"
+
+_MAIN_KEYS = ("world", "states", "actions", "rewards")
+
+
+def to_builtin(d):
+    """Return a copy of d with numpy arrays/scalars converted to python types.
+
+    This is the format of dense logs, which keeps them JSON-serializable."""
+    if isinstance(d, (list, tuple, set)):
+        return [to_builtin(v) for v in d]
+    if isinstance(d, dict):
+        return {k: to_builtin(v) for k, v in d.items()}
+    if isinstance(d, (int, float, str)):
+        return d
+    if isinstance(d, (np.ndarray, np.integer, np.floating)):
+        return d.tolist()
+    raise NotImplementedError(
+        "Not clear how to handle {} with type {}".format(d, type(d))
+    )
+
+
+def _write_record(f, record):
+    blob = pack_state(record)
+    f.write(_RECORD_LENGTH.pack(len(blob)))
+    f.write(blob)
+
+
+def _maps_equal(a, b):
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(np.array_equal(a[k], b[k]) for k in a)
+    return np.array_equal(a, b)
+
+
+class _ArrayColumn:
+    """A column of fixed-shape rows, stored in preallocated chunks."""
+
+    def __init__(self, name, dtype, chunk_size, emit, reuse_buffer):
+        self.name = name
+        self.dtype = dtype
+        self.chunk_size = chunk_size
+        self._emit = emit
+        self._reuse_buffer = reuse_buffer
+        self._buffer = None
+        self._n = 0
+
+    def append(self, row):
+        if self._buffer is None:
+            self._buffer = np.empty(
+                (self.chunk_size,) + np.shape(row), dtype=self.dtype
+            )
+        self._buffer[self._n] = row
+        self._n += 1
+        if self._n == self.chunk_size:
+            self.flush()
+
+    def pending(self):
+        """Return the rows that have not been flushed yet."""
+        if self._buffer is None:
+            return None
+        return self._buffer[: self._n].copy()
+
+    def flush(self):
+        if self._n == 0:
+            return
+        data = self._buffer if self._n == self.chunk_size else self.pending()
+        self._emit(dict(type="column", name=self.name, data=data))
+        if not self._reuse_buffer:
+            self._buffer = None
+        self._n = 0
+
+
+class _ObjectColumn:
+    """A column of python objects (plain data, see env_state.is_plain_data)."""
+
+    def __init__(self, name, chunk_size, emit):
+        self.name = name
+        self.chunk_size = chunk_size
+        self._emit = emit
+        self._items = []
+
+    def append(self, item):
+        self._items.append(item)
+        if len(self._items) == self.chunk_size:
+            self.flush()
+
+    def pending(self):
+        return list(self._items) if self._items else None
+
+    def flush(self):
+        if self._items:
+            self._emit(dict(type="column", name=self.name, data=self._items))
+            self._items = []
+
+
+class DenseLogWriter:
+    """Columnar writer of an episode's dense log.
+
+    Rather than building a nested dictionary every timestep, the writer appends
+    each timestep's agent states (the rows of the agents' AgentStateTable, plus
+    agent locations), actions and rewards as rows of typed arrays, which are kept
+    in fixed-size chunks. World map snapshots refer to the entity maps, each of
+    which is only stored again when it changes. Non-table agent state entries and
+    component logs are kept as python objects.
+
+    Completed chunks are either kept in memory or, if path is given, streamed to an
+    append-only binary file during the episode, as a sequence of records in the
+    snapshot format of env_state (a JSON header and raw array data), so that
+    reading a log file never executes code. Use DenseLog to read the result back in
+    the usual dictionary format.
+
+    Note: The state layout of each agent (see AgentState.layout) is read once,
+    when the writer is created; state fields are expected to be registered
+    during environment construction.
+
+    Args:
+        agents (list): The agents whose states and actions are logged (typically
+            the mobile agents and the planner).
+        path (str, optional): If given, stream the log to this file.
+        chunk_size (int): Number of rows per chunk.
+    """
+
+    def __init__(self, agents, path=None, chunk_size=256):
+        self.path = path
+        self.chunk_size = int(chunk_size)
+        assert self.chunk_size >= 1
+        self._records = []
+        self._file = None
+        if path is not None:
+            self._file = open(path, "wb")
+            self._file.write(DENSE_LOG_MAGIC)
+
+        self._table = None
+        self._agents = []
+        header_agents = []
+        for agent in agents:
+            layout = None
+            if isinstance(agent.state, AgentState):
+                layout = agent.state.layout()
+                if self._table is None:
+                    self._table = agent.state.table
+                assert agent.state.table is self._table
+                plain_keys = [
+                    k
+                    for k in layout["order"]
+                    if k not in layout["blocks"] and k not in layout["extra"]
+                ]
+                layout["has_loc"] = "loc" in plain_keys
+                layout["plain"] = [k for k in plain_keys if k != "loc"]
+            action_keys = list(agent.action.keys())
+            self._agents.append((agent, str(agent.idx), layout, action_keys))
+            header_agents.append(
+                dict(idx=str(agent.idx), layout=layout, action_keys=action_keys)
+            )
+        self._loc_agents = [
+            agent
+            for agent, _, layout, _ in self._agents
+            if layout is not None and layout["has_loc"]
+        ]
+
+        self._columns = {}
+        self._columnar_rewards = None
+        self._reward_keys = None
+        self._world_snapshot = None  # (maps version, snapshot id) of the last one
+        self._n_snapshots = 0
+        self._last_maps = {}  # {entity: (map id, map)} of the last stored maps
+        self._n_maps = 0
+        self._components = {}
+        self._closed = False
+        self._log = None
+
+        self._emit(
+            dict(type="header", version=DENSE_LOG_VERSION, agents=header_agents)
+        )
+
+    def _emit(self, record):
+        if self._file is None:
+            self._records.append(record)
+        else:
+            _write_record(self._file, record)
+
+    def _column(self, name, dtype=None):
+        column = self._columns.get(name)
+        if column is None:
+            if dtype is None:
+                column = _ObjectColumn(name, self.chunk_size, self._emit)
+            else:
+                column = _ArrayColumn(
+                    name,
+                    dtype,
+                    self.chunk_size,
+                    self._emit,
+                    reuse_buffer=self._file is not None,
+                )
+            self._columns[name] = column
+        return column
+
+    def log_states(self, maps=None):
+        """Append the current agent states (and a world snapshot, if maps is given).
+
+        Args:
+            maps (Maps, optional): The world maps to snapshot at this timestep.
+        """
+        assert not self._closed
+        if self._table is not None:
+            for block in self._table.blocks:
+                self._column("states/" + block, np.float64).append(
+                    self._table.data[block]
+                )
+        if self._loc_agents:
+            self._column("states/loc", np.int64).append(
+                [agent.state["loc"] for agent in self._loc_agents]
+            )
+
+        plain = {}
+        for agent, idx, layout, _ in self._agents:
+            if layout is None:
+                plain[idx] = agent.state.copy()
+            elif layout["plain"]:
+                plain[idx] = {k: deepcopy(agent.state[k]) for k in layout["plain"]}
+        self._column("states/plain").append(plain)
+
+        snapshot_id = -1
+        if maps is not None:
+            if self._world_snapshot is None or self._world_snapshot[0] != maps.version:
+                self._emit(
+                    dict(
+                        type="snapshot",
+                        id=self._n_snapshots,
+                        maps=self._map_refs(maps),
+                    )
+                )
+                self._world_snapshot = (maps.version, self._n_snapshots)
+                self._n_snapshots += 1
+            snapshot_id = self._world_snapshot[1]
+        self._column("world", np.int64).append(snapshot_id)
+
+    def _map_refs(self, maps):
+        """Return {entity: map id} for the current maps, storing any changed map."""
+        refs = {}
+        for entity_name, entity_map in maps.state_dict.items():
+            last = self._last_maps.get(entity_name)
+            if last is None or not _maps_equal(last[1], entity_map):
+                last = (self._n_maps, deepcopy(entity_map))
+                self._emit(dict(type="map", id=last[0], data=last[1]))
+                self._last_maps[entity_name] = last
+                self._n_maps += 1
+            refs[entity_name] = last[0]
+        return refs
+
+    def log_actions(self):
+        """Append the current actions of the agents."""
+        assert not self._closed
+        for agent, idx, _, action_keys in self._agents:
+            self._column("actions/" + idx, np.int64).append(
+                [agent.action[k] for k in action_keys]
+            )
+
+    def log_rewards(self, rew):
+        """Append a {"agent_idx": reward} dictionary of rewards."""
+        assert not self._closed
+        if self._columnar_rewards is None:
+            # Scalar rewards are stored as rows; anything else as objects
+            self._columnar_rewards = all(np.ndim(v) == 0 for v in rew.values())
+            if self._columnar_rewards:
+                self._reward_keys = list(rew.keys())
+                self._emit(dict(type="reward_keys", keys=self._reward_keys))
+        if self._columnar_rewards:
+            assert len(rew) == len(self._reward_keys)
+            self._column("rewards", np.float64).append(
+                [rew[k] for k in self._reward_keys]
+            )
+        else:
+            self._column("rewards").append(to_builtin(rew))
+
+    def log_component(self, key, value):
+        """Add a component's (episode-level) dense log under key."""
+        assert not self._closed
+        self._components[key] = to_builtin(value)
+
+    @property
+    def closed(self):
+        """Whether the log has been closed (see close)."""
+        return self._closed
+
+    def _pending_records(self):
+        records = []
+        for name, column in self._columns.items():
+            data = column.pending()
+            if data is not None:
+                records.append(dict(type="column", name=name, data=data))
+        return records
+
+    def view(self):
+        """Return a DenseLog of what has been logged so far."""
+        if self._closed:
+            return self.close()
+        if self._file is None:
+            return DenseLog(records=self._records + self._pending_records())
+        self._file.flush()
+        return DenseLog(path=self.path, extra_records=self._pending_records())
+
+    def close(self):
+        """Flush and finalize the log, and return it as a DenseLog."""
+        if not self._closed:
+            for column in self._columns.values():
+                column.flush()
+            self._emit(dict(type="components", logs=self._components))
+            self._emit(dict(type="end"))
+            if self._file is None:
+                self._log = DenseLog(records=self._records)
+            else:
+                self._file.close()
+                self._log = DenseLog(path=self.path)
+            self._closed = True
+        return self._log
+
+
+class _LazySequence(Sequence):
+    """Read-only sequence whose items are built on access."""
+
+    def __init__(self, length, getter):
+        self._length = length
+        self._getter = getter
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, t):
+        if isinstance(t, slice):
+            return [self._getter(i) for i in range(*t.indices(self._length))]
+        if t < 0:
+            t += self._length
+        if not 0 <= t < self._length:
+            raise IndexError("dense log index out of range")
+        return self._getter(t)
+
+    def __repr__(self):
+        return "<{} of {} entries>".format(type(self).__name__, self._length)
+
+
+class DenseLog(Mapping):
+    """Read access to a dense log written by DenseLogWriter.
+
+    Behaves like the dense log dictionary:
+        dense_log["world"][t], dense_log["states"][t]["0"]["inventory"]["Coin"],
+        dense_log["actions"][t], dense_log["rewards"][t], dense_log["Build"], ...
+    The "world", "states", "actions" and "rewards" entries are sequences whose
+    items are rebuilt from the columnar data when accessed, in the same format as
+    before (python types; world maps as nested lists). The raw arrays are available
+    through column (e.g. column("states/inventory") is [n_timesteps, n_agents + 1,
+    n_resources]). to_dict returns the whole log as a plain dictionary.
+
+    The log is read from path (a file written by DenseLogWriter, or by save) on
+    first access.
+
+    Args:
+        records (list, optional): In-memory records of a DenseLogWriter.
+        path (str, optional): Log file to read the records from.
+        extra_records (list, optional): Records to append to those read from path.
+    """
+
+    def __init__(self, records=None, path=None, extra_records=None):
+        assert (records is None) != (path is None)
+        self._records = records
+        self.path = path
+        self._extra_records = extra_records or []
+        self._data = None
+
+    @staticmethod
+    def _read_records(path):
+        with open(path, "rb") as f:
+            compressed = f.read(4) == _LZ4_MAGIC
+        opener = lz4.frame.open if compressed else open
+        records = []
+        with opener(path, "rb") as f:
+            if f.read(len(DENSE_LOG_MAGIC)) != DENSE_LOG_MAGIC:
+                raise ValueError("'{}' is not a dense log file".format(path))
+            while True:
+                prefix = f.read(_RECORD_LENGTH.size)
+                if not prefix:
+                    break
+                blob = None
+                if len(prefix) == _RECORD_LENGTH.size:
+                    (length,) = _RECORD_LENGTH.unpack(prefix)
+                    blob = f.read(length)
+                if blob is None or len(blob) != length:
+                    raise ValueError("Dense log file '{}' is truncated".format(path))
+                records.append(unpack_state(blob))
+        return records
+
+    def _load(self):
+        if self._data is not None:
+            return self._data
+        records = self._records
+        if records is None:
+            records = self._read_records(self.path) + self._extra_records
+
+        chunks = {}
+        data = dict(snapshots={}, maps={}, components={}, reward_keys=None)
+        for record in records:
+            kind = record["type"]
+            if kind == "header":
+                assert record["version"] == DENSE_LOG_VERSION
+                data["agents"] = record["agents"]
+            elif kind == "column":
+                chunks.setdefault(record["name"], []).append(record["data"])
+            elif kind == "snapshot":
+                data["snapshots"][record["id"]] = record["maps"]
+            elif kind == "map":
+                data["maps"][record["id"]] = record["data"]
+            elif kind == "reward_keys":
+                data["reward_keys"] = record["keys"]
+            elif kind == "components":
+                data["components"] = record["logs"]
+
+        columns = {}
+        for name, parts in chunks.items():
+            if isinstance(parts[0], np.ndarray):
+                columns[name] = np.concatenate(parts)
+            else:
+                columns[name] = [item for part in parts for item in part]
+        data["columns"] = columns
+        self._data = data
+        return data
+
+    def column(self, name):
+        """Return the raw data of a column (e.g. "states/inventory" or "rewards")."""
+        return self._load()["columns"][name]
+
+    @property
+    def reward_keys(self):
+        """The agent indices of the columns of the "rewards" column."""
+        return self._load()["reward_keys"]
+
+    def _length(self, name):
+        return len(self._load()["columns"].get(name, []))
+
+    def _world(self, t):
+        snapshot_id = int(self.column("world")[t])
+        if snapshot_id < 0:
+            return {}
+        data = self._load()
+        return {
+            entity_name: to_builtin(data["maps"][map_id])
+            for entity_name, map_id in data["snapshots"][snapshot_id].items()
+        }
+
+    def _states(self, t):
+        data = self._load()
+        columns = data["columns"]
+        plain = columns["states/plain"][t]
+        n_loc = 0
+        states = {}
+        for agent in data["agents"]:
+            idx, layout = agent["idx"], agent["layout"]
+            if layout is None:
+                states[idx] = deepcopy(plain[idx])
+                continue
+            row = layout["row"]
+            state = {}
+            for k in layout["order"]:
+                if k in layout["blocks"]:
+                    values = columns["states/" + k][t, row]
+                    state[k] = {
+                        name: float(values[col])
+                        for name, col in layout["blocks"][k].items()
+                    }
+                elif k in layout["extra"]:
+                    col = layout["extra"][k]
+                    state[k] = float(columns["states/extra"][t, row, col])
+                elif k == "loc":
+                    state[k] = columns["states/loc"][t, n_loc].tolist()
+                else:
+                    state[k] = deepcopy(plain[idx][k])
+            if layout["has_loc"]:
+                n_loc += 1
+            states[idx] = state
+        return states
+
+    def _actions(self, t):
+        columns = self._load()["columns"]
+        actions = {}
+        for agent in self._load()["agents"]:
+            row = columns["actions/" + agent["idx"]][t].tolist()
+            actions[agent["idx"]] = {
+                k: v for k, v in zip(agent["action_keys"], row) if v > 0
+            }
+        return actions
+
+    def _rewards(self, t):
+        rewards = self.column("rewards")[t]
+        if self.reward_keys is None:
+            return deepcopy(rewards)
+        return dict(zip(self.reward_keys, rewards.tolist()))
+
+    def keys(self):
+        return list(_MAIN_KEYS) + list(self._load()["components"].keys())
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __getitem__(self, key):
+        if key == "world":
+            return _LazySequence(self._length("world"), self._world)
+        if key == "states":
+            return _LazySequence(self._length("states/plain"), self._states)
+        if key == "actions":
+            n = self._length("actions/" + self._load()["agents"][0]["idx"])
+            return _LazySequence(n, self._actions)
+        if key == "rewards":
+            return _LazySequence(self._length("rewards"), self._rewards)
+        return self._load()["components"][key]
+
+    def to_dict(self):
+        """Return the dense log as a plain (JSON-serializable) dictionary."""
+        return {
+            k: list(v) if k in _MAIN_KEYS else deepcopy(v) for k, v in self.items()
+        }
+
+    def save(self, filepath, compression_level=16):
+        """Save the log as a lz4-compressed file, readable with DenseLog(path=...)."""
+        records = self._records
+        if records is None:
+            records = self._read_records(self.path) + self._extra_records
+        with lz4.frame.open(
+            filepath, mode="wb", compression_level=compression_level
+        ) as log_file:
+            log_file.write(DENSE_LOG_MAGIC)
+            for record in records:
+                _write_record(log_file, record)
@@ -0,0 +1,209 @@
+# Copyright (c) 2020, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+Flat binary format of environment snapshots (see BaseEnvironment.get_state).
+
+A snapshot is a tree of plain data: None, bools, numbers, strings, bytes,
+datetimes, numpy arrays/scalars, and lists, tuples, deques and dictionaries of
+those. It is
+stored as:
+    8-byte magic, uint32 format version, uint64 header length,
+    header (UTF-8 JSON describing the tree, with arrays replaced by references),
+    array data (each array's raw bytes, aligned to 64 bytes).
+Loading a snapshot never executes code (unlike unpickling).
+"""
+
+import datetime
+import json
+import struct
+import types
+from collections import deque
+
+import numpy as np
+
+MAGIC = b"AIESTATE"
+VERSION = 1
+
+_PREFIX = struct.Struct("<8sIQ")
+_ALIGNMENT = 64
+
+# Values that are part of an object's configuration, not of its state
+_STATIC_TYPES = (
+    type,
+    types.FunctionType,
+    types.BuiltinFunctionType,
+    types.MethodType,
+)
+
+
+def is_plain_data(value):
+    """Return True if value can be stored in a snapshot."""
+    if value is None or isinstance(
+        value, (bool, int, float, str, bytes, np.generic, datetime.date)
+    ):
+        return True
+    if isinstance(value, np.ndarray):
+        return value.dtype != object
+    if isinstance(value, (list, tuple, deque)):
+        return all(is_plain_data(v) for v in value)
+    if isinstance(value, dict):
+        return all(is_plain_data(k) and is_plain_data(v) for k, v in value.items())
+    return False
+
+
+def get_attributes(obj, exclude=()):
+    """Return the plain-data attributes of obj, as {name: value}.
+
+    Attributes named in exclude and attributes holding classes or functions are
+    skipped. Any other attribute must hold plain data (see is_plain_data): objects
+    with other kinds of state need to save it themselves.
+    """
+    state = {}
+    for name, value in vars(obj).items():
+        if name in exclude or isinstance(value, _STATIC_TYPES):
+            continue
+        if not is_plain_data(value):
+            raise TypeError(
+                "Attribute {} of {} is not plain data; exclude it from (or add it "
+                "explicitly to) the state.".format(name, type(obj).__name__)
+            )
+        state[name] = value
+    return state
+
+
+def set_attributes(obj, state):
+    """Restore attributes saved by get_attributes.
+
+    Arrays are copied into the existing arrays when their shapes and dtypes match,
+    so that views of them (held elsewhere) stay valid.
+    """
+    for name, value in state.items():
+        current = getattr(obj, name, None)
+        if (
+            isinstance(value, np.ndarray)
+            and isinstance(current, np.ndarray)
+            and current.shape == value.shape
+            and current.dtype == value.dtype
+            and current.flags.writeable
+        ):
+            current[...] = value
+        else:
+            setattr(obj, name, value)
+
+
+def _encode(value, arrays):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, np.ndarray):
+        assert value.dtype != object
+        arrays.append(np.ascontiguousarray(value))
+        return {"@": "array", "i": len(arrays) - 1}
+    if isinstance(value, np.generic):
+        arrays.append(np.asarray(value))
+        return {"@": "scalar", "i": len(arrays) - 1}
+    if isinstance(value, bytes):
+        arrays.append(np.frombuffer(value, dtype=np.uint8))
+        return {"@": "bytes", "i": len(arrays) - 1}
+    if isinstance(value, datetime.datetime):
+        return {"@": "datetime", "v": value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {"@": "date", "v": value.isoformat()}
+    if isinstance(value, list):
+        return [_encode(v, arrays) for v in value]
+    if isinstance(value, tuple):
+        return {"@": "tuple", "v": [_encode(v, arrays) for v in value]}
+    if isinstance(value, deque):
+        return {
+            "@": "deque",
+            "n": value.maxlen,
+            "v": [_encode(v, arrays) for v in value],
+        }
+    if isinstance(value, dict):
+        return {
+            "@": "dict",
+            "k": [_encode(k, arrays) for k in value.keys()],
+            "v": [_encode(v, arrays) for v in value.values()],
+        }
+    raise TypeError("Cannot store {} in a snapshot".format(type(value).__name__))
+
+
+def _decode(node, arrays):
+    if isinstance(node, list):
+        return [_decode(v, arrays) for v in node]
+    if not isinstance(node, dict):
+        return node
+    tag = node["@"]
+    if tag == "array":
+        return arrays[node["i"]]
+    if tag == "scalar":
+        return arrays[node["i"]][()]
+    if tag == "bytes":
+        return arrays[node["i"]].tobytes()
+    if tag == "datetime":
+        return datetime.datetime.fromisoformat(node["v"])
+    if tag == "date":
+        return datetime.date.fromisoformat(node["v"])
+    if tag == "tuple":
+        return tuple(_decode(v, arrays) for v in node["v"])
+    if tag == "deque":
+        return deque((_decode(v, arrays) for v in node["v"]), maxlen=node["n"])
+    if tag == "dict":
+        return {
+            _decode(k, arrays): _decode(v, arrays) for k, v in zip(node["k"], node["v"])
+        }
+    raise ValueError("Unknown snapshot node {}".format(tag))
+
+
+def _aligned(n_bytes):
+    return -(-n_bytes // _ALIGNMENT) * _ALIGNMENT
+
+
+def pack_state(state):
+    """Serialize the plain-data tree state into a snapshot (bytes)."""
+    arrays = []
+    tree = _encode(state, arrays)
+    specs = []
+    offset = 0
+    for array in arrays:
+        specs.append([array.dtype.str, list(array.shape), offset])
+        offset += _aligned(array.nbytes)
+    header = json.dumps({"tree": tree, "arrays": specs}).encode("utf-8")
+
+    data_start = _aligned(_PREFIX.size + len(header))
+    blob = bytearray(data_start + offset)
+    _PREFIX.pack_into(blob, 0, MAGIC, VERSION, len(header))
+    blob[_PREFIX.size : _PREFIX.size + len(header)] = header
+    for array, (_, _, array_offset) in zip(arrays, specs):
+        start = data_start + array_offset
+        blob[start : start + array.nbytes] = array.tobytes()
+    return bytes(blob)
+
+
+def unpack_state(blob):
+    """Deserialize a snapshot created by pack_state. Arrays are writable copies."""
+    magic, version, header_length = _PREFIX.unpack_from(blob, 0)
+    if magic != MAGIC:
+        raise ValueError("Not an environment snapshot")
+    if version > VERSION:
+        raise ValueError("Unsupported snapshot format version {}".format(version))
+    header = json.loads(
+        bytes(blob[_PREFIX.size : _PREFIX.size + header_length]).decode("utf-8")
+    )
+
+    data_start = _aligned(_PREFIX.size + header_length)
+    arrays = []
+    for dtype, shape, offset in header["arrays"]:
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape))
+        if count == 0:
+            arrays.append(np.empty(shape, dtype=dtype))
+            continue
+        array = np.frombuffer(
+            blob, dtype=dtype, count=count, offset=data_start + offset
+        )
+        arrays.append(array.reshape(shape).copy())
+    return _decode(header["tree"], arrays)
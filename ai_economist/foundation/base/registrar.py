@@ -4,6 +4,8 @@
 # For full license text, see the LICENSE file in the repo root
 # or https://opensource.org/licenses/BSD-3-Clause
 
+import importlib
+
 
 class Registry:
     """Utility for registering sets of similar classes and looking them up by name.
@@ -13,6 +15,11 @@ class Registry:
     Components, Scenarios, Agents) for easy reference as well as to ensure that all
     classes within a particular registry inherit from the same Base Class.
 
+    Entries can also be declared lazily (see add_lazy): only the name of the module
+    defining the class is recorded, and that module is imported the first time the
+    class is requested with get. This keeps importing a registry cheap when its
+    entries live in modules with heavy dependencies.
+
     Args:
         base_class (class): The class that all entries in the registry must be a
             subclass of.
@@ -38,12 +45,17 @@ class Registry:
 
         assert registry.has("ExampleA")
         assert registry.get("ExampleB") is ExampleSubclassB
+
+        # Import my_package.example_c when "ExampleC" is first requested
+        registry.add_lazy("ExampleC", "my_package.example_c")
+        assert registry.has("ExampleC")
     """
 
     def __init__(self, base_class=None):
         self.base_class = base_class
         self._entries = []
         self._lookup = dict()
+        self._lazy = dict()
 
     def add(self, cls):
         """Add cls to this registry.
@@ -60,11 +72,38 @@ class Registry:
         assert "." not in cls.name
         if self.base_class:
             assert issubclass(cls, self.base_class)
+        module = self._lazy.get(cls.name.lower())
+        if (
+            module is not None
+            and module != cls.__module__
+            and module.split(".")[0] == cls.__module__.split(".")[0]
+        ):
+            # The name is bound to another module of the same package
+            return cls
         self._lookup[cls.name.lower()] = cls
         if cls.name not in self._entries:
             self._entries.append(cls.name)
         return cls
 
+    def add_lazy(self, cls_name, module):
+        """Declare that the class with name cls_name is added to this registry by
+        module, which is imported the first time the class is requested (see get).
+
+        Once declared, cls_name is bound to module: classes with the same name
+        defined in other modules of the same top-level package are not added.
+
+        Args:
+            cls_name (str): Name of the class.
+            module (str): Absolute name of the module defining (and adding) the
+                class.
+
+        See Registry class docstring for example.
+        """
+        assert "." not in cls_name
+        self._lazy[cls_name.lower()] = module
+        if cls_name not in self._entries:
+            self._entries.append(cls_name)
+
     def get(self, cls_name):
         """Return registered class with name cls_name.
 
@@ -76,9 +115,12 @@ class Registry:
 
         See Registry class docstring for example.
         """
-        if cls_name.lower() not in self._lookup:
+        key = cls_name.lower()
+        if key not in self._lookup and key in self._lazy:
+            importlib.import_module(self._lazy[key])
+        if key not in self._lookup:
             raise KeyError('"{}" is not a name of a registered class'.format(cls_name))
-        return self._lookup[cls_name.lower()]
+        return self._lookup[key]
 
     def has(self, cls_name):
         """Return True if a class with name cls_name is registered.
@@ -88,7 +130,7 @@ class Registry:
 
         See Registry class docstring for example.
         """
-        return cls_name.lower() in self._lookup
+        return cls_name.lower() in self._lookup or cls_name.lower() in self._lazy
 
     @property
     def entries(self):
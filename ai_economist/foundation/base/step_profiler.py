@@ -0,0 +1,147 @@
+# Copyright (c) 2020, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+Lightweight timing of the phases of BaseEnvironment.reset and step.
+
+For each phase, StepProfiler keeps a call count, the total/min/max duration and a
+histogram of durations in log-spaced nanosecond bins (each power-of-2 interval is
+split into 4 equal bins, so percentiles are estimated to within ~12%). Recording a
+duration is a few integer operations, so the profiler can stay on in production
+runs.
+
+Reports (see StepProfiler.report) are plain dictionaries: they can be pickled or
+sent to JSON, and reports from different environments or processes (e.g. RLlib
+rollout workers) can be combined with merge_profile_reports.
+"""
+
+from time import perf_counter_ns
+
+# Durations of up to 2 ** 47 ns (~39 hours), see _bin
+N_BINS = 184
+
+PERCENTILES = (50, 90, 99)
+
+
+class StepProfiler:
+    """Running per-phase duration statistics.
+
+    Example:
+        profiler = StepProfiler()
+        start = profiler.clock()
+        ...  # The work of the phase
+        profiler.add("phase", start)
+    """
+
+    clock = staticmethod(perf_counter_ns)
+
+    def __init__(self):
+        # {phase: [count, total_ns, min_ns, max_ns, histogram]}
+        self._phases = {}
+
+    def add(self, phase, start_ns):
+        """Record a call of phase that started at start_ns (see clock), ending now.
+        Returns the current clock value, so that consecutive phases can be chained.
+        """
+        end_ns = perf_counter_ns()
+        duration = end_ns - start_ns
+        stats = self._phases.get(phase)
+        if stats is None:
+            stats = self._phases[phase] = [0, 0, duration, duration, [0] * N_BINS]
+        stats[0] += 1
+        stats[1] += duration
+        if duration < stats[2]:
+            stats[2] = duration
+        if duration > stats[3]:
+            stats[3] = duration
+        stats[4][_bin(duration)] += 1
+        return end_ns
+
+    def clear(self):
+        """Forget all the recorded durations."""
+        self._phases = {}
+
+    def merge(self, report):
+        """Add the durations of a report (see report) to this profiler."""
+        for phase, entry in report.items():
+            stats = self._phases.get(phase)
+            if stats is None:
+                self._phases[phase] = [
+                    entry["count"],
+                    entry["total_ns"],
+                    entry["min_ns"],
+                    entry["max_ns"],
+                    list(entry["histogram"]),
+                ]
+                continue
+            stats[0] += entry["count"]
+            stats[1] += entry["total_ns"]
+            stats[2] = min(stats[2], entry["min_ns"])
+            stats[3] = max(stats[3], entry["max_ns"])
+            stats[4] = [a + b for a, b in zip(stats[4], entry["histogram"])]
+
+    def report(self):
+        """Return the statistics of each phase as a plain dictionary:
+            {phase: {"count", "total_ns", "min_ns", "max_ns", "histogram",
+                     "mean_us", "p50_us", "p90_us", "p99_us"}}
+        Percentiles are estimated from the histogram.
+        """
+        report = {}
+        for phase, (count, total_ns, min_ns, max_ns, histogram) in sorted(
+            self._phases.items()
+        ):
+            entry = dict(
+                count=count,
+                total_ns=total_ns,
+                min_ns=min_ns,
+                max_ns=max_ns,
+                histogram=list(histogram),
+                mean_us=total_ns / count / 1000,
+            )
+            for q in PERCENTILES:
+                entry["p{}_us".format(q)] = (
+                    _percentile(histogram, count, min_ns, max_ns, q) / 1000
+                )
+            report[phase] = entry
+        return report
+
+
+def _bin(duration):
+    """Histogram bin of duration (in ns): durations below 4 have their own bins;
+    [2 ** b, 2 ** (b + 1)) is split into 4 bins for b >= 2."""
+    n_bits = duration.bit_length()
+    if n_bits <= 2:
+        return duration
+    return min((n_bits - 2) * 4 + ((duration >> (n_bits - 3)) & 3), N_BINS - 1)
+
+
+def _bin_center(k):
+    """Center of the durations (in ns) falling in histogram bin k (see _bin)."""
+    if k < 4:
+        return float(k)
+    width = 2 ** (k // 4 - 1)
+    return (4 + k % 4) * width + width / 2
+
+
+def _percentile(histogram, count, min_ns, max_ns, q):
+    """Estimate the q-th percentile duration (in ns) from a histogram, using the
+    center of the bin it falls in (clipped to [min_ns, max_ns])."""
+    rank = q / 100 * count
+    seen = 0
+    for k, n in enumerate(histogram):
+        seen += n
+        if n and seen >= rank:
+            return min(max(_bin_center(k), min_ns), max_ns)
+    return max_ns
+
+
+def merge_profile_reports(reports):
+    """Combine reports (see StepProfiler.report), e.g. from several environments
+    or worker processes, into a single report."""
+    profiler = StepProfiler()
+    for report in reports:
+        profiler.merge(report)
+    return profiler.report()
@@ -5,8 +5,12 @@
 # or https://opensource.org/licenses/BSD-3-Clause
 
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 
 from ai_economist.foundation.agents import agent_registry
+from ai_economist.foundation.base.agent_actions import AgentActionTable
+from ai_economist.foundation.base.agent_state import AgentStateTable
+from ai_economist.foundation.base.env_state import get_attributes, set_attributes
 from ai_economist.foundation.entities import landmark_registry, resource_registry
 
 
@@ -23,6 +27,18 @@ class Maps:
     such as which locations agents can occupy based on other agent locations and
     locations of various landmarks.
 
+    Besides the per-entity maps (see get/set), Maps keeps persistent tensors of the
+    full map state: a [n_entities, H, W] float32 tensor of all entity maps, an
+    [n_private_landmarks, H, W] int16 tensor of landmark ownership, and an [H, W]
+    int16 map of agent locations. These are updated in place by the set*/clear
+    methods and by set_agent_loc/clear_agent_loc, so the state, owner_state and
+    loc_map properties return them without recomputation. Maps changes should go
+    through these methods (modifying the arrays returned by get or state_dict in
+    place leaves the tensors stale). The version property increases with every
+    change, so callers can tell whether anything changed since they last looked.
+    The tensors live inside padded buffers, from which egocentric_windows gathers
+    the windows around a batch of locations without re-padding the map.
+
     Args:
         size (list): A length-2 list specifying the dimensions of the 2D world.
             Interpreted as [height, width].
@@ -111,6 +127,131 @@ class Maps:
         self._agent_locs = [None for _ in range(self.n_agents)]
         self._unoccupied = np.ones(self.size, dtype=bool)
 
+        # Persistent tensors of the full map state (see class docstring). They are
+        # the interiors of zero-/(-1)-padded buffers, which are grown as needed to
+        # serve egocentric windows.
+        self._state_lookup = {k: i for i, k in enumerate(self._maps.keys())}
+        self._owner_lookup = {
+            k: i for i, k in enumerate(self._private_landmark_types)
+        }
+        self._padding = 0
+        self._padded_state = np.zeros(
+            [len(self._state_lookup) + 1] + self.size, dtype=np.float32
+        )
+        self._padded_state[-1] = 1
+        self._padded_idx = -np.ones(
+            [len(self._owner_lookup) + 1] + self.size, dtype=np.int16
+        )
+        self._bind_padded_views()
+        self._version = 0
+
+    def __getstate__(self):
+        # The tensors are views into the padded buffers; rebuild them after
+        # copying/unpickling so they keep sharing memory.
+        state = self.__dict__.copy()
+        for k in ["_state", "_owner_state", "_loc_map"]:
+            del state[k]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._bind_padded_views()
+
+    def _bind_padded_views(self):
+        p = self._padding
+        interior = (slice(p, p + self.sz_h), slice(p, p + self.sz_w))
+        self._state = self._padded_state[(slice(0, -1),) + interior]
+        self._owner_state = self._padded_idx[(slice(0, -1),) + interior]
+        self._loc_map = self._padded_idx[(-1,) + interior]
+
+    def _grow_padding(self, padding):
+        """Re-allocate the padded buffers with (at least) the given padding."""
+        if padding <= self._padding:
+            return
+        padded_size = [self.sz_h + 2 * padding, self.sz_w + 2 * padding]
+        padded_state = np.zeros(
+            [self._padded_state.shape[0]] + padded_size, dtype=np.float32
+        )
+        padded_idx = -np.ones([self._padded_idx.shape[0]] + padded_size, np.int16)
+        interior = (slice(padding, -padding), slice(padding, -padding))
+        padded_state[(slice(0, -1),) + interior] = self._state
+        padded_state[(-1,) + interior] = 1
+        padded_idx[(slice(0, -1),) + interior] = self._owner_state
+        padded_idx[(-1,) + interior] = self._loc_map
+
+        self._padding = padding
+        self._padded_state = padded_state
+        self._padded_idx = padded_idx
+        self._bind_padded_views()
+
+    @property
+    def padding(self):
+        """The padding of the buffers behind the state, owner_state and loc_map."""
+        return self._padding
+
+    def storage_arrays(self):
+        """Return {name: array} of the arrays that hold the map state.
+
+        These are the padded state and index buffers ("padded_state", "padded_idx"),
+        the "unoccupied" and (if there are blocking or private landmarks)
+        "accessibility" maps, and the entity maps (keyed by entity name, or
+        "<name>/owner" and "<name>/health" for private landmarks). See bind_storage.
+        """
+        arrays = dict(
+            padded_state=self._padded_state,
+            padded_idx=self._padded_idx,
+            unoccupied=self._unoccupied,
+        )
+        if self._accessibility is not None:
+            arrays["accessibility"] = self._accessibility
+        for entity_name, map_state in self._maps.items():
+            if entity_name in self._private_landmark_types:
+                arrays[entity_name + "/owner"] = map_state["owner"]
+                arrays[entity_name + "/health"] = map_state["health"]
+            else:
+                arrays[entity_name] = map_state
+        return arrays
+
+    def bind_storage(self, arrays):
+        """Copy the map state into the given arrays and use them from now on.
+
+        This lets the maps of several worlds live in stacked arrays (see
+        EnvironmentBatch). Changes made through the set*/clear methods and agent
+        location updates keep going to these arrays, except for those that replace
+        whole maps (set, clear and set_state, as used on reset) or grow the padding,
+        after which the arrays need to be bound again.
+
+        Args:
+            arrays (dict): {name: array}, matching storage_arrays() in names, shapes
+                and dtypes.
+        """
+        current = self.storage_arrays()
+        assert set(arrays) == set(current)
+        for name, array in arrays.items():
+            assert array.shape == current[name].shape
+            assert array.dtype == current[name].dtype
+            array[...] = current[name]
+
+        self._padded_state = arrays["padded_state"]
+        self._padded_idx = arrays["padded_idx"]
+        self._unoccupied = arrays["unoccupied"]
+        if self._accessibility is not None:
+            self._accessibility = arrays["accessibility"]
+        for entity_name in self._maps:
+            if entity_name in self._private_landmark_types:
+                self._maps[entity_name] = dict(
+                    owner=arrays[entity_name + "/owner"],
+                    health=arrays[entity_name + "/health"],
+                )
+            else:
+                self._maps[entity_name] = arrays[entity_name]
+        self._bind_padded_views()
+
+    def _read_only(self, array):
+        view = array.view()
+        view.flags.writeable = False
+        return view
+
     def clear(self, entity_name=None):
         """Clear resource and landmark maps."""
         if entity_name is not None:
@@ -120,8 +261,11 @@ class Maps:
                     owner=-np.ones(shape=self.size, dtype=np.int16),
                     health=np.zeros(shape=self.size),
                 )
+                self._owner_state[self._owner_lookup[entity_name]] = -1
             else:
                 self._maps[entity_name] *= 0
+            self._state[self._state_lookup[entity_name]] = 0
+            self._version += 1
 
         else:
             for name in self.keys():
@@ -137,6 +281,7 @@ class Maps:
         if agent is None:
             self._agent_locs = [None for _ in range(self.n_agents)]
             self._unoccupied[:, :] = 1
+            self._loc_map[:, :] = -1
 
         # Clear the location of the provided agent
         else:
@@ -145,6 +290,7 @@ class Maps:
                 return
             r, c = self._agent_locs[i]
             self._unoccupied[r, c] = 1
+            self._loc_map[r, c] = -1
             self._agent_locs[i] = None
 
     def set_agent_loc(self, agent, r, c):
@@ -165,12 +311,14 @@ class Maps:
             # Make the location the agent is currently at as unoccupied
             # (since the agent is going to move)
             self._unoccupied[curr_r, curr_c] = 1
+            self._loc_map[curr_r, curr_c] = -1
 
         # Set the agent location to the specified coordinates
         # and update the occupation map
         agent.state["loc"] = [r, c]
         self._agent_locs[i] = [r, c]
         self._unoccupied[r, c] = 0
+        self._loc_map[r, c] = i
 
     def keys(self):
         """Return an iterable over map keys."""
@@ -209,6 +357,8 @@ class Maps:
                 assert np.min(tmp) >= 0
 
             self._maps[entity_name] = dict(owner=o, health=h)
+            self._state[self._state_lookup[entity_name]] = h
+            self._owner_state[self._owner_lookup[entity_name]] = o
 
             owned_by_agent = o[None] == self._idx_map
             owned_by_none = o[None] == -1
@@ -220,6 +370,7 @@ class Maps:
         else:
             assert self.get(entity_name).shape == map_state.shape
             self._maps[entity_name] = np.maximum(0, map_state)
+            self._state[self._state_lookup[entity_name]] = self._maps[entity_name]
 
             if entity_name in self._blocked:
                 self._accessibility[
@@ -227,6 +378,8 @@ class Maps:
                 ] = np.repeat(map_state[None] == 0, self.n_agents, axis=0)
                 self._net_accessibility = None
 
+        self._version += 1
+
     def set_add(self, entity_name, map_state):
         """Add map_state to the existing map for entity_name."""
         assert entity_name not in self._private_landmark_types
@@ -250,8 +403,8 @@ class Maps:
             else:
                 o[r, c] = int(owner)
 
-            self._maps[entity_name]["owner"] = o
-            self._maps[entity_name]["health"] = h
+            self._state[self._state_lookup[entity_name], r, c] = h[r, c]
+            self._owner_state[self._owner_lookup[entity_name], r, c] = o[r, c]
 
             self._accessibility[
                 self._accessibility_lookup[entity_name], :, r, c
@@ -260,6 +413,9 @@ class Maps:
 
         else:
             self._maps[entity_name][r, c] = np.maximum(0, val)
+            self._state[self._state_lookup[entity_name], r, c] = self._maps[
+                entity_name
+            ][r, c]
 
             if entity_name in self._blocked:
                 self._accessibility[
@@ -267,6 +423,27 @@ class Maps:
                 ] = np.repeat(np.array([val]) == 0, self.n_agents, axis=0)
                 self._net_accessibility = None
 
+        self._version += 1
+
+    def set_points(self, entity_name, idx, values):
+        """Set the entity state at the locations with flat (row-major) indices idx.
+
+        Only applies to resources and public landmarks.
+        """
+        assert entity_name not in self._private_landmark_types
+        values = np.maximum(0, values)
+        np.put(self._maps[entity_name], idx, values)
+        np.put(self._state[self._state_lookup[entity_name]], idx, values)
+
+        if entity_name in self._blocked:
+            rows, cols = np.unravel_index(idx, self.size)
+            self._accessibility[
+                self._accessibility_lookup[entity_name], :, rows, cols
+            ] = (values == 0)[:, None]
+            self._net_accessibility = None
+
+        self._version += 1
+
     def set_point_add(self, entity_name, r, c, value, **kwargs):
         """Add value to the existing entity state at the specified coordinates."""
         self.set_point(
@@ -313,21 +490,94 @@ class Maps:
 
     @property
     def state(self):
-        """Return the concatenated maps of landmark and resources."""
-        return np.stack([self.get(k) for k in self.keys()]).astype(np.float32)
+        """Return the concatenated maps of landmark and resources.
+
+        This is a read-only view of a persistent float32 tensor, which reflects
+        subsequent map changes; copy it to keep a snapshot."""
+        return self._read_only(self._state)
 
     @property
     def owner_state(self):
-        """Return the concatenated ownership maps of private landmarks."""
-        return np.stack(
-            [self.get(k, owner=True) for k in self._private_landmark_types]
-        ).astype(np.int16)
+        """Return the concatenated ownership maps of private landmarks.
+
+        This is a read-only view of a persistent int16 tensor (see state)."""
+        return self._read_only(self._owner_state)
+
+    @property
+    def loc_map(self):
+        """Return a map indicating the agent index occupying each location.
+
+        Locations with a value of -1 are not occupied by an agent. This is a
+        read-only view of a persistent int16 map (see state)."""
+        return self._read_only(self._loc_map)
+
+    @property
+    def version(self):
+        """A counter that increases whenever any entity map changes."""
+        return self._version
+
+    def egocentric_windows(self, locs, halfwidth):
+        """Return the map windows centered on each of the given locations.
+
+        The windows are gathered in one batch from persistent padded copies of the
+        state, owner_state and loc_map tensors (no per-call padding), so locations
+        near the edges see padding beyond the map boundary.
+
+        Args:
+            locs (ndarray): [n, 2] array of (row, col) window centers.
+            halfwidth (int): Window halfwidth; windows are 1 + (2 * halfwidth) wide.
+
+        Returns:
+            map_windows (ndarray): [n, n_entities + 1, d, d] float32 windows of the
+                state tensor, plus a final channel that is 1 inside the map and 0 in
+                the padding.
+            idx_windows (ndarray): [n, n_private_landmarks + 1, d, d] int16 windows
+                of the owner_state tensor followed by the loc_map. Padding is -1.
+        """
+        w = int(halfwidth)
+        assert w >= 0
+        self._grow_padding(w)
+        d = 1 + (2 * w)
+
+        locs = np.asarray(locs, dtype=np.int64).reshape(-1, 2)
+        rows = locs[:, 0] + (self._padding - w)
+        cols = locs[:, 1] + (self._padding - w)
+
+        map_windows = sliding_window_view(self._padded_state, (d, d), axis=(1, 2))
+        idx_windows = sliding_window_view(self._padded_idx, (d, d), axis=(1, 2))
+        return (
+            map_windows.transpose(1, 2, 0, 3, 4)[rows, cols],
+            idx_windows.transpose(1, 2, 0, 3, 4)[rows, cols],
+        )
 
     @property
     def state_dict(self):
         """Return a dictionary of the map states."""
         return self._maps
 
+    # Attributes that branches created by BaseEnvironment.fork share (never change)
+    _fork_shared = ("_idx_map", "_idx_array")
+
+    def get_state(self):
+        """Return the entity maps and agent locations (see World.get_state)."""
+        return dict(maps=self._maps, agent_locs=self._agent_locs)
+
+    def set_state(self, state):
+        """Restore the entity maps and agent locations saved by get_state.
+
+        The derived tensors (state, owner_state, loc_map, accessibility) are rebuilt
+        from them."""
+        for entity_name, map_state in state["maps"].items():
+            self.set(entity_name, map_state)
+        self.clear_agent_loc()
+        for i, loc in enumerate(state["agent_locs"]):
+            if loc is None:
+                continue
+            r, c = loc
+            self._agent_locs[i] = [r, c]
+            self._unoccupied[r, c] = 0
+            self._loc_map[r, c] = i
+
 
 class World:
     """Manages the environment's spatial- and agent-states.
@@ -346,6 +596,17 @@ class World:
     (the maps object) and setting/resetting agent locations. But its function is
     mostly to wrap the stateful, non-component environment objects.
 
+    The numeric agent states (inventory, escrow, endogenous quantities and scalar
+    component fields) of all agents are stored in a single AgentStateTable owned by
+    the world, with one row per mobile agent (row = agent.idx) and a final row for
+    the planner. Use the population accessors (inventory, escrow, endogenous,
+    total_endowment) to read or write the mobile agents' values as arrays.
+
+    Likewise, once the components are registered, the actions of the mobile agents
+    are stored in an AgentActionTable (see build_action_table), which components
+    can read by column (see actions) and which can be filled from a single array
+    of actions (see BaseEnvironment.step).
+
     Args:
         world_size (list): A length-2 list specifying the dimensions of the 2D world.
             Interpreted as [height, width].
@@ -358,6 +619,8 @@ class World:
             (see BaseEnvironment in base_env.py).
         multi_action_mode_planner (bool): Whether the planner agent uses multi action
             mode (see BaseEnvironment in base_env.py).
+        rng (np.random.Generator, optional): The random number stream of the world
+            (see BaseEnvironment.seed), e.g. for get_random_order_agents.
     """
 
     def __init__(
@@ -371,6 +634,7 @@ class World:
         env_weighting = None,# new
         mobile_agent_class = "BasicMobileAgent",#new
         equ_weighting = None,#new
+        rng=None,
     ):
         self.world_size = world_size
         self.env_weighting = env_weighting
@@ -395,8 +659,17 @@ class World:
             ]
         self._planner = planner_class(multi_action_mode=self.multi_action_mode_planner)
 
+        # Array-backed storage for the numeric state of all agents (+ the planner)
+        self.state_table = AgentStateTable(self.n_agents + 1)
+        for agent in self._agents:
+            agent.bind_state_table(self.state_table, agent.idx)
+        self._planner.bind_state_table(self.state_table, self.n_agents)
+        self.action_table = None  # Built once the components are registered
+
         self.timestep = 0
 
+        self.rng = np.random.default_rng() if rng is None else rng
+
         # CUDA-related attributes (for GPU simulations).
         # These will be set via the env_wrapper, if required.
         self.use_cuda = False
@@ -419,15 +692,54 @@ class World:
 
         Locations with a value of -1 are not occupied by an agent.
         """
-        idx_map = -np.ones(shape=self.world_size, dtype=np.int16)
-        for agent in self.agents:
-            r, c = agent.loc
-            idx_map[r, c] = int(agent.idx)
-        return idx_map
+        return self.maps.loc_map
+
+    def inventory(self, resource):
+        """Return a (writable) [n_agents] view of the mobile agents' inventory of
+        resource."""
+        return self.state_table.column("inventory", resource)[: self.n_agents]
+
+    def escrow(self, resource):
+        """Return a (writable) [n_agents] view of the mobile agents' escrow of
+        resource."""
+        return self.state_table.column("escrow", resource)[: self.n_agents]
+
+    def endogenous(self, name):
+        """Return a (writable) [n_agents] view of the mobile agents' endogenous
+        quantity name (i.e. "Labor")."""
+        return self.state_table.column("endogenous", name)[: self.n_agents]
+
+    def total_endowment(self, resource):
+        """Return the [n_agents] array of the mobile agents' combined inventory +
+        escrow endowment of resource."""
+        return self.inventory(resource) + self.escrow(resource)
+
+    def build_action_table(self):
+        """Used during environment construction (once the components are registered
+        with the agents) to store the mobile agents' actions in an AgentActionTable.
+        """
+        agent = self._agents[0]
+        self.action_table = AgentActionTable(
+            self.n_agents,
+            agent._action_names,
+            self.multi_action_mode_agents,
+            agent.single_action_map,
+        )
+        for agent in self._agents:
+            agent.bind_action_table(self.action_table, agent.idx)
+
+    def actions(self, action_name):
+        """Return a (writable) [n_agents] view of the mobile agents' actions for the
+        action subspace action_name (i.e. "Build", or "<component>.<sub-action>" for
+        components with several subspaces), or None if the mobile agents do not have
+        that subspace."""
+        if action_name not in self.action_table.columns:
+            return None
+        return self.action_table.column(action_name)
 
     def get_random_order_agents(self):
         """The agent list in a randomized order."""
-        agent_order = np.random.permutation(self.n_agents)
+        agent_order = self.rng.permutation(self.n_agents)
         agents = self.agents
         return [agents[i] for i in agent_order]
 
@@ -491,3 +803,41 @@ class World:
     def consume_resource(self, resource_name, r, c):
         """Consume a unit of resource_name from location [r, c]."""
         self.maps.set_point_add(resource_name, r, c, -1)
+
+    # Attributes that are not part of the state returned by get_state
+    _state_exclude = (
+        "maps",
+        "_agents",
+        "_planner",
+        "state_table",
+        "action_table",
+        "rng",
+        "use_cuda",
+        "cuda_function_manager",
+        "cuda_data_manager",
+    )
+
+    # Attributes that branches created by BaseEnvironment.fork share
+    _fork_shared = ()
+
+    def get_state(self):
+        """Return the mutable state of the world (maps, agent states, timestep and
+        any other plain-data attributes) as plain data (see BaseEnvironment.get_state).
+        """
+        return dict(
+            maps=self.maps.get_state(),
+            state_table=self.state_table.get_state(),
+            agent_states=[agent.state.get_state() for agent in self._agents]
+            + [self._planner.state.get_state()],
+            attributes=get_attributes(self, self._state_exclude),
+        )
+
+    def set_state(self, state):
+        """Restore the state of the world saved by get_state."""
+        self.state_table.set_state(state["state_table"])
+        for agent, agent_state in zip(
+            self._agents + [self._planner], state["agent_states"]
+        ):
+            agent.state.set_state(agent_state)
+        self.maps.set_state(state["maps"])
+        set_attributes(self, state["attributes"])
@@ -6,14 +6,23 @@
 
 from ai_economist.foundation.base.base_component import component_registry
 
-from . import (
-    build,
-    continuous_double_auction,
-    covid19_components,
-    move,
-    redistribution,
-    simple_labor,
-)
+# Declare the modules that add Component class(es) to component_registry
+# ----------------------------------------------------------------------
+# Each module is only imported when one of its components is first requested
+# (see Registry.add_lazy).
+_COMPONENT_MODULES = {
+    "build": ["Build"],
+    "continuous_double_auction": ["ContinuousDoubleAuction"],
+    "covid19_components": [
+        "ControlUSStateOpenCloseStatus",
+        "FederalGovernmentSubsidy",
+        "VaccinationCampaign",
+    ],
+    "move": ["Gather"],
+    "redistribution": ["PeriodicBracketTax", "WealthRedistribution"],
+    "simple_labor": ["SimpleLabor"],
+}
 
-# Import files that add Component class(es) to component_registry
-# ---------------------------------------------------------------
+for _module, _names in _COMPONENT_MODULES.items():
+    for _name in _names:
+        component_registry.add_lazy(_name, "{}.{}".format(__name__, _module))
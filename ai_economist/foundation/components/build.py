@@ -68,7 +68,8 @@ class Build(BaseComponent):
 
         self.sampled_skills = {}
 
-        self.builds = []
+        self.builds = self.new_event_history()
+        self._n_builds = [0 for _ in range(self.n_agents)]
 
     def agent_can_build(self, agent):
         """Return True if agent can actually build in its current location."""
@@ -120,14 +121,14 @@ class Build(BaseComponent):
         """
         world = self.world
         build = []
+        actions = world.actions(self.name)
         # Apply any building actions taken by the mobile agents
         for agent in world.get_random_order_agents():
 
-            action = agent.get_component_action(self.name)
-
-            # This component doesn't apply to this agent!
-            if action is None:
-                continue
+            # This component doesn't apply to the mobile agents!
+            if actions is None:
+                break
+            action = actions[agent.idx]
 
             # NO-OP!
             if action == 0:
@@ -157,6 +158,7 @@ class Build(BaseComponent):
                             "income": float(agent.state["build_payment"]),
                         }
                     )
+                    self._n_builds[agent.idx] += 1
 
             else:
                 raise ValueError
@@ -208,16 +210,9 @@ class Build(BaseComponent):
         """
         world = self.world
 
-        build_stats = {a.idx: {"n_builds": 0} for a in world.agents}
-        for builds in self.builds:
-            for build in builds:
-                idx = build["builder"]
-                build_stats[idx]["n_builds"] += 1
-
         out_dict = {}
         for a in world.agents:
-            for k, v in build_stats[a.idx].items():
-                out_dict["{}/{}".format(a.idx, k)] = v
+            out_dict["{}/n_builds".format(a.idx)] = self._n_builds[a.idx]
 
         num_houses = np.sum(world.maps.get("House") > 0)
         out_dict["total_builds"] = num_houses
@@ -235,18 +230,21 @@ class Build(BaseComponent):
         self.sampled_skills = {agent.idx: 1 for agent in world.agents}
 
         PMSM = self.payment_max_skill_multiplier
+        if self.skill_dist == "none":
+            sampled_skills = np.ones(self.n_agents, dtype=np.int64)
+            pay_rates = np.ones(self.n_agents, dtype=np.int64)
+        elif self.skill_dist == "pareto":
+            sampled_skills = self.rng.pareto(4, size=self.n_agents)
+            pay_rates = np.minimum(PMSM, (PMSM - 1) * sampled_skills + 1)
+        elif self.skill_dist == "lognormal":
+            sampled_skills = self.rng.lognormal(-1, 0.5, size=self.n_agents)
+            pay_rates = np.minimum(PMSM, (PMSM - 1) * sampled_skills + 1)
+        else:
+            raise NotImplementedError
+
         for agent in world.agents:
-            if self.skill_dist == "none":
-                sampled_skill = 1
-                pay_rate = 1
-            elif self.skill_dist == "pareto":
-                sampled_skill = np.random.pareto(4)
-                pay_rate = np.minimum(PMSM, (PMSM - 1) * sampled_skill + 1)
-            elif self.skill_dist == "lognormal":
-                sampled_skill = np.random.lognormal(-1, 0.5)
-                pay_rate = np.minimum(PMSM, (PMSM - 1) * sampled_skill + 1)
-            else:
-                raise NotImplementedError
+            sampled_skill = sampled_skills[agent.idx].item()
+            pay_rate = pay_rates[agent.idx]
 
             agent.state["build_payment"] = float(pay_rate * self.payment)
             agent.state["build_skill"] = float(sampled_skill)
@@ -258,7 +256,10 @@ class Build(BaseComponent):
             for i, agent in enumerate(world.agents):
                 agent.state["build_skill"]= self.build_skill[i]
                 agent.state["build_payment"] =self.build_payment[i]
-        self.builds = []
+        self.builds = self.new_event_history()
+        self._n_builds = [0 for _ in range(self.n_agents)]
+
+    _fork_history = ("builds",)
 
     def get_dense_log(self):
         """
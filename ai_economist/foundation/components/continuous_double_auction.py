@@ -4,6 +4,8 @@
 # For full license text, see the LICENSE file in the repo root
 # or https://opensource.org/licenses/BSD-3-Clause
 
+from collections import deque
+
 import numpy as np
 
 from ai_economist.foundation.base.base_component import (
@@ -13,6 +15,245 @@ from ai_economist.foundation.base.base_component import (
 from ai_economist.foundation.entities import resource_registry
 
 
+class OrderBook:
+    """Price-level order book for a single commodity traded via the CDA.
+
+    Open bids and asks are kept in one bucket per price level. Within a bucket,
+    orders are stored in the order they were created (an insertion-ordered dict
+    keyed by a global sequence number), which is also their priority: among orders
+    with the same price, the oldest order goes first. Order lifetimes are derived
+    from a clock that advances whenever the book ages (see age_orders), so aging
+    the book does not touch every open order.
+
+    The per-agent bid/ask histograms (and their sum over agents) are maintained
+    incrementally as orders are added, filled, and expire.
+
+    Args:
+        n_agents (int): Number of (mobile) agents that can place orders.
+        price_floor (int): Lowest price an order can have.
+        price_ceiling (int): Highest price an order can have.
+    """
+
+    def __init__(self, n_agents, price_floor, price_ceiling):
+        self.n_agents = int(n_agents)
+        self.price_floor = int(price_floor)
+        self.price_ceiling = int(price_ceiling)
+        n_prices = 1 + self.price_ceiling - self.price_floor
+        assert n_prices >= 1
+
+        # Per-agent and aggregate histograms of open orders, over price levels
+        self.bid_hists = np.zeros((self.n_agents, n_prices))
+        self.ask_hists = np.zeros((self.n_agents, n_prices))
+        self.bid_total = np.zeros(n_prices)
+        self.ask_total = np.zeros(n_prices)
+
+        # Number of open (bid + ask) orders of each agent
+        self.n_orders = [0 for _ in range(self.n_agents)]
+
+        # Buckets of open orders, {seq: (agent_idx, creation_time)} per price level
+        self._bid_levels = [{} for _ in range(n_prices)]
+        self._ask_levels = [{} for _ in range(n_prices)]
+        # Orders in creation order, as (creation_time, price_level, seq), used to
+        # find expired orders. Filled orders are dropped from here lazily.
+        self._bid_queue = deque()
+        self._ask_queue = deque()
+
+        self._clock = 0
+        self._seq = 0
+
+    @property
+    def bids(self):
+        """Open bids, as a list of order dictionaries in priority order."""
+        return [
+            {
+                "buyer": buyer,
+                "bid": level + self.price_floor,
+                "bid_lifetime": self._clock - created,
+            }
+            for level in reversed(range(len(self._bid_levels)))
+            for buyer, created in self._bid_levels[level].values()
+        ]
+
+    @property
+    def asks(self):
+        """Open asks, as a list of order dictionaries in priority order."""
+        return [
+            {
+                "seller": seller,
+                "ask": level + self.price_floor,
+                "ask_lifetime": self._clock - created,
+            }
+            for level in range(len(self._ask_levels))
+            for seller, created in self._ask_levels[level].values()
+        ]
+
+    def add_bid(self, buyer, price):
+        """Add a bid from agent buyer (an agent index) at the given price."""
+        level = int(price) - self.price_floor
+        self._seq += 1
+        self._bid_levels[level][self._seq] = (buyer, self._clock)
+        self._bid_queue.append((self._clock, level, self._seq))
+        self.bid_hists[buyer, level] += 1
+        self.bid_total[level] += 1
+        self.n_orders[buyer] += 1
+
+    def add_ask(self, seller, price):
+        """Add an ask from agent seller (an agent index) at the given price."""
+        level = int(price) - self.price_floor
+        self._seq += 1
+        self._ask_levels[level][self._seq] = (seller, self._clock)
+        self._ask_queue.append((self._clock, level, self._seq))
+        self.ask_hists[seller, level] += 1
+        self.ask_total[level] += 1
+        self.n_orders[seller] += 1
+
+    def _best_ask(self, excluded_seller):
+        """Highest-priority ask not placed by excluded_seller (or None)."""
+        for level, orders in enumerate(self._ask_levels):
+            for seq, (seller, created) in orders.items():
+                if seller != excluded_seller:
+                    return level, seq, seller, created
+        return None
+
+    def match_orders(self):
+        """
+        Match (and remove) crossing bids and asks.
+
+        Bids are considered from highest to lowest price (oldest first within a
+        price). A bid is matched against the best-priced ask (oldest first within a
+        price) that was not placed by the same agent. If that ask's price exceeds
+        the bid, the buyer cannot be matched and none of its other bids are
+        considered.
+
+        Returns:
+            matches (list): A list of (bid, ask) pairs of order dictionaries, in the
+                order the trades are executed.
+        """
+        matches = []
+        possible_match = [True for _ in range(self.n_agents)]
+        n_possible = self.n_agents
+
+        for bid_level in reversed(range(len(self._bid_levels))):
+            bid_orders = self._bid_levels[bid_level]
+            for bid_seq, (buyer, bid_created) in list(bid_orders.items()):
+                if n_possible == 0:
+                    return matches
+                if not possible_match[buyer]:
+                    continue
+
+                best_ask = self._best_ask(buyer)
+                if best_ask is None or bid_level < best_ask[0]:
+                    possible_match[buyer] = False
+                    n_possible -= 1
+                    continue
+
+                ask_level, ask_seq, seller, ask_created = best_ask
+                del bid_orders[bid_seq]
+                del self._ask_levels[ask_level][ask_seq]
+                self.bid_hists[buyer, bid_level] -= 1
+                self.bid_total[bid_level] -= 1
+                self.ask_hists[seller, ask_level] -= 1
+                self.ask_total[ask_level] -= 1
+                self.n_orders[buyer] -= 1
+                self.n_orders[seller] -= 1
+
+                bid = {
+                    "buyer": buyer,
+                    "bid": bid_level + self.price_floor,
+                    "bid_lifetime": self._clock - bid_created,
+                }
+                ask = {
+                    "seller": seller,
+                    "ask": ask_level + self.price_floor,
+                    "ask_lifetime": self._clock - ask_created,
+                }
+                matches.append((bid, ask))
+
+        return matches
+
+    def age_orders(self, order_duration):
+        """
+        Increment the lifetime of all open orders and remove those whose lifetime
+        exceeds order_duration.
+
+        Returns:
+            expired_bids (list): (buyer, price) of each expired bid.
+            expired_asks (list): (seller, price) of each expired ask.
+        """
+        self._clock += 1
+        oldest_allowed = self._clock - order_duration
+
+        expired_bids = []
+        while self._bid_queue and self._bid_queue[0][0] < oldest_allowed:
+            _, level, seq = self._bid_queue.popleft()
+            order = self._bid_levels[level].pop(seq, None)
+            if order is not None:
+                buyer = order[0]
+                self.bid_hists[buyer, level] -= 1
+                self.bid_total[level] -= 1
+                self.n_orders[buyer] -= 1
+                expired_bids.append((buyer, level + self.price_floor))
+
+        expired_asks = []
+        while self._ask_queue and self._ask_queue[0][0] < oldest_allowed:
+            _, level, seq = self._ask_queue.popleft()
+            order = self._ask_levels[level].pop(seq, None)
+            if order is not None:
+                seller = order[0]
+                self.ask_hists[seller, level] -= 1
+                self.ask_total[level] -= 1
+                self.n_orders[seller] -= 1
+                expired_asks.append((seller, level + self.price_floor))
+
+        return expired_bids, expired_asks
+
+    def get_state(self):
+        """Return the contents of the book as plain data."""
+        return dict(
+            bid_hists=self.bid_hists,
+            ask_hists=self.ask_hists,
+            bid_total=self.bid_total,
+            ask_total=self.ask_total,
+            n_orders=self.n_orders,
+            bid_levels=self._bid_levels,
+            ask_levels=self._ask_levels,
+            bid_queue=list(self._bid_queue),
+            ask_queue=list(self._ask_queue),
+            clock=self._clock,
+            seq=self._seq,
+        )
+
+    def set_state(self, state):
+        """Restore the contents of the book saved by get_state.
+
+        The histograms and order counts are updated in place, so views of them stay
+        valid."""
+        self.bid_hists[...] = state["bid_hists"]
+        self.ask_hists[...] = state["ask_hists"]
+        self.bid_total[...] = state["bid_total"]
+        self.ask_total[...] = state["ask_total"]
+        self.n_orders[:] = state["n_orders"]
+        self._bid_levels = [dict(level) for level in state["bid_levels"]]
+        self._ask_levels = [dict(level) for level in state["ask_levels"]]
+        self._bid_queue = deque(state["bid_queue"])
+        self._ask_queue = deque(state["ask_queue"])
+        self._clock = int(state["clock"])
+        self._seq = int(state["seq"])
+
+    def bind_storage(self, bid_hists, ask_hists, bid_total, ask_total):
+        """Copy the histograms into the given arrays and use them from now on (see
+        EnvironmentBatch)."""
+        for name, array in [
+            ("bid_hists", bid_hists),
+            ("ask_hists", ask_hists),
+            ("bid_total", bid_total),
+            ("ask_total", ask_total),
+        ]:
+            assert array.shape == getattr(self, name).shape
+            array[...] = getattr(self, name)
+            setattr(self, name, array)
+
+
 @component_registry.add
 class ContinuousDoubleAuction(BaseComponent):
     """Allows mobile agents to buy/sell collectible resources with one another.
@@ -77,27 +318,75 @@ class ContinuousDoubleAuction(BaseComponent):
         ]
 
         # These get reset at the start of an episode:
-        self.asks = {c: [] for c in self.commodities}
-        self.bids = {c: [] for c in self.commodities}
-        self.n_orders = {
-            c: {i: 0 for i in range(self.n_agents)} for c in self.commodities
-        }
+        self.books = {}
+        self.n_orders = {}
+        self.bid_hists = {}
+        self.ask_hists = {}
+        self.price_history = {}
         self.executed_trades = []
-        self.price_history = {
-            c: {i: self._price_zeros() for i in range(self.n_agents)}
+        self._trade_stats = {}
+        self._n_trades = 0
+        self._reset_order_books()
+
+    # Convenience methods
+    # -------------------
+
+    def _reset_order_books(self):
+        self.books = {
+            c: OrderBook(self.n_agents, self.price_floor, self.price_ceiling)
             for c in self.commodities
         }
-        self.bid_hists = {
+        # Views of the order book state (indexed as [resource][agent_idx])
+        self.n_orders = {c: book.n_orders for c, book in self.books.items()}
+        self.bid_hists = {c: book.bid_hists for c, book in self.books.items()}
+        self.ask_hists = {c: book.ask_hists for c, book in self.books.items()}
+
+        self.price_history = {
             c: {i: self._price_zeros() for i in range(self.n_agents)}
             for c in self.commodities
         }
-        self.ask_hists = {
-            c: {i: self._price_zeros() for i in range(self.n_agents)}
-            for c in self.commodities
+        self.executed_trades = self.new_event_history()
+
+        # Running totals of the trades, as
+        # {"Sell"/"Buy": {agent_idx: {resource: {"n_sales", "price", ...}}}}
+        self._trade_stats = {
+            prefix: {
+                i: {
+                    c: {k: 0 for k in ["price", "cost", "income", "n_sales"]}
+                    for c in self.commodities
+                }
+                for i in range(self.n_agents)
+            }
+            for prefix in ["Sell", "Buy"]
         }
+        self._n_trades = 0
 
-    # Convenience methods
-    # -------------------
+    def bind_storage(self, arrays):
+        """Copy the market histograms into the given arrays and use them from now on.
+
+        This lets the markets of several environments live in stacked arrays (see
+        EnvironmentBatch). The order books are replaced on reset, after which the
+        arrays need to be bound again.
+
+        Args:
+            arrays (dict): "price_history", "bid_hists" and "ask_hists" arrays shaped
+                [n_commodities, n_agents, n_prices], and "bid_total" and "ask_total"
+                arrays shaped [n_commodities, n_prices] (commodities in the order of
+                self.commodities).
+        """
+        for k, c in enumerate(self.commodities):
+            book = self.books[c]
+            book.bind_storage(
+                arrays["bid_hists"][k],
+                arrays["ask_hists"][k],
+                arrays["bid_total"][k],
+                arrays["ask_total"][k],
+            )
+            self.bid_hists[c] = book.bid_hists
+            self.ask_hists[c] = book.ask_hists
+            for i in range(self.n_agents):
+                arrays["price_history"][k, i] = self.price_history[c][i]
+                self.price_history[c][i] = arrays["price_history"][k, i]
 
     def _price_zeros(self):
         if 1 + self.price_ceiling - self.price_floor <= 0:
@@ -118,15 +407,10 @@ class ContinuousDoubleAuction(BaseComponent):
             ask_hist (ndarray): For each possible price level, the number of
                 available asks.
         """
+        book = self.books[resource]
         if agent is None:
-            a_idx = -1
-        else:
-            a_idx = agent.idx
-        ask_hist = self._price_zeros()
-        for i, h in self.ask_hists[resource].items():
-            if a_idx != i:
-                ask_hist += h
-        return ask_hist
+            return book.ask_total.copy()
+        return book.ask_total - book.ask_hists[agent.idx]
 
     def available_bids(self, resource, agent):
         """
@@ -141,15 +425,10 @@ class ContinuousDoubleAuction(BaseComponent):
             bid_hist (ndarray): For each possible price level, the number of
                 available bids.
         """
+        book = self.books[resource]
         if agent is None:
-            a_idx = -1
-        else:
-            a_idx = agent.idx
-        bid_hist = self._price_zeros()
-        for i, h in self.bid_hists[resource].items():
-            if a_idx != i:
-                bid_hist += h
-        return bid_hist
+            return book.bid_total.copy()
+        return book.bid_total - book.bid_hists[agent.idx]
 
     def can_bid(self, resource, agent):
         """If agent can submit a bid for resource."""
@@ -183,12 +462,8 @@ class ContinuousDoubleAuction(BaseComponent):
 
         assert self.price_floor <= max_payment <= self.price_ceiling
 
-        bid = {"buyer": agent.idx, "bid": int(max_payment), "bid_lifetime": 0}
-
         # Add this to the bid book
-        self.bids[resource].append(bid)
-        self.bid_hists[resource][bid["buyer"]][bid["bid"] - self.price_floor] += 1
-        self.n_orders[resource][agent.idx] += 1
+        self.books[resource].add_bid(agent.idx, int(max_payment))
 
         # Set aside whatever money the agent is willing to pay
         # (will get excess back if price ends up being less)
@@ -214,12 +489,8 @@ class ContinuousDoubleAuction(BaseComponent):
         # is there an upper limit?
         assert self.price_floor <= min_income <= self.price_ceiling
 
-        ask = {"seller": agent.idx, "ask": int(min_income), "ask_lifetime": 0}
-
         # Add this to the ask book
-        self.asks[resource].append(ask)
-        self.ask_hists[resource][ask["seller"]][ask["ask"] - self.price_floor] += 1
-        self.n_orders[resource][agent.idx] += 1
+        self.books[resource].add_ask(agent.idx, int(min_income))
 
         # Set aside the resource the agent is willing to sell
         amount = agent.inventory_to_escrow(resource, 1)
@@ -240,114 +511,59 @@ class ContinuousDoubleAuction(BaseComponent):
         Trading removes the payment and resource from bidder's and asker's escrow,
         respectively, and puts them in the other's inventory.
         """
-        self.executed_trades.append([])
+        trades = []
+        self.executed_trades.append(trades)
 
         for resource in self.commodities:
-            possible_match = [True for _ in range(self.n_agents)]
-            keep_checking = True
-
-            bids = sorted(
-                self.bids[resource],
-                key=lambda b: (b["bid"], b["bid_lifetime"]),
-                reverse=True,
-            )
-            asks = sorted(
-                self.asks[resource], key=lambda a: (a["ask"], -a["ask_lifetime"])
-            )
-
-            while any(possible_match) and keep_checking:
-                idx_bid, idx_ask = 0, 0
-                while True:
-                    # Out of bids to check. Exit both loops.
-                    if idx_bid >= len(bids):
-                        keep_checking = False
-                        break
-
-                    # Already know this buyer is no good for this round.
-                    # Skip to next bid.
-                    if not possible_match[bids[idx_bid]["buyer"]]:
-                        idx_bid += 1
-
-                    # Out of asks to check. This buyer won't find a match on this round.
-                    # (maybe) Restart inner loop.
-                    elif idx_ask >= len(asks):
-                        possible_match[bids[idx_bid]["buyer"]] = False
-                        break
-
-                    # Skip to next ask if this ask comes from the buyer
-                    # of the current bid.
-                    elif asks[idx_ask]["seller"] == bids[idx_bid]["buyer"]:
-                        idx_ask += 1
-
-                    # If this bid/ask pair can't be matched, this buyer
-                    # can't be matched. (maybe) Restart inner loop.
-                    elif bids[idx_bid]["bid"] < asks[idx_ask]["ask"]:
-                        possible_match[bids[idx_bid]["buyer"]] = False
-                        break
-
-                    # TRADE! (then restart inner loop)
-                    else:
-                        bid = bids.pop(idx_bid)
-                        ask = asks.pop(idx_ask)
-
-                        trade = {"commodity": resource}
-                        trade.update(bid)
-                        trade.update(ask)
-
-                        if (
-                            bid["bid_lifetime"] <= ask["ask_lifetime"]
-                        ):  # Ask came earlier. (in other words,
-                            # trade triggered by new bid)
-                            trade["price"] = int(trade["ask"])
-                        else:  # Bid came earlier. (in other words,
-                            # trade triggered by new ask)
-                            trade["price"] = int(trade["bid"])
-                        trade["cost"] = trade["price"]  # What the buyer pays in total
-                        trade["income"] = trade[
-                            "price"
-                        ]  # What the seller receives in total
-
-                        buyer = self.world.agents[trade["buyer"]]
-                        seller = self.world.agents[trade["seller"]]
-
-                        # Bookkeeping
-                        self.bid_hists[resource][bid["buyer"]][
-                            bid["bid"] - self.price_floor
-                        ] -= 1
-                        self.ask_hists[resource][ask["seller"]][
-                            ask["ask"] - self.price_floor
-                        ] -= 1
-                        self.n_orders[trade["commodity"]][seller.idx] -= 1
-                        self.n_orders[trade["commodity"]][buyer.idx] -= 1
-                        self.executed_trades[-1].append(trade)
-                        self.price_history[resource][trade["seller"]][
-                            trade["price"]
-                        ] += 1
-
-                        # The resource goes from the seller's escrow
-                        # to the buyer's inventory
-                        seller.state["escrow"][resource] -= 1
-                        buyer.state["inventory"][resource] += 1
-
-                        # Buyer's money (already set aside) leaves escrow
-                        pre_payment = int(trade["bid"])
-                        buyer.state["escrow"]["Coin"] -= pre_payment
-                        assert buyer.state["escrow"]["Coin"] >= 0
-
-                        # Payment is removed from the pre_payment
-                        # and given to the seller. Excess returned to buyer.
-                        payment_to_seller = int(trade["price"])
-                        excess_payment_from_buyer = pre_payment - payment_to_seller
-                        assert excess_payment_from_buyer >= 0
-                        seller.state["inventory"]["Coin"] += payment_to_seller
-                        buyer.state["inventory"]["Coin"] += excess_payment_from_buyer
-
-                        # Restart the inner loop
-                        break
-
-            # Keep the unfilled bids/asks
-            self.bids[resource] = bids
-            self.asks[resource] = asks
+            for bid, ask in self.books[resource].match_orders():
+                trade = {"commodity": resource}
+                trade.update(bid)
+                trade.update(ask)
+
+                if (
+                    bid["bid_lifetime"] <= ask["ask_lifetime"]
+                ):  # Ask came earlier. (in other words,
+                    # trade triggered by new bid)
+                    trade["price"] = int(trade["ask"])
+                else:  # Bid came earlier. (in other words,
+                    # trade triggered by new ask)
+                    trade["price"] = int(trade["bid"])
+                trade["cost"] = trade["price"]  # What the buyer pays in total
+                trade["income"] = trade["price"]  # What the seller receives in total
+
+                buyer = self.world.agents[trade["buyer"]]
+                seller = self.world.agents[trade["seller"]]
+
+                # Bookkeeping
+                # (the order book already removed the orders from its histograms
+                # and order counts)
+                trades.append(trade)
+                self.price_history[resource][trade["seller"]][trade["price"]] += 1
+                self._n_trades += 1
+                for prefix, idx in [("Sell", trade["seller"]), ("Buy", trade["buyer"])]:
+                    stats = self._trade_stats[prefix][idx][resource]
+                    stats["n_sales"] += 1
+                    stats["price"] += trade["price"]
+                    stats["cost"] += trade["cost"]
+                    stats["income"] += trade["income"]
+
+                # The resource goes from the seller's escrow
+                # to the buyer's inventory
+                seller.state["escrow"][resource] -= 1
+                buyer.state["inventory"][resource] += 1
+
+                # Buyer's money (already set aside) leaves escrow
+                pre_payment = int(trade["bid"])
+                buyer.state["escrow"]["Coin"] -= pre_payment
+                assert buyer.state["escrow"]["Coin"] >= 0
+
+                # Payment is removed from the pre_payment
+                # and given to the seller. Excess returned to buyer.
+                payment_to_seller = int(trade["price"])
+                excess_payment_from_buyer = pre_payment - payment_to_seller
+                assert excess_payment_from_buyer >= 0
+                seller.state["inventory"]["Coin"] += payment_to_seller
+                buyer.state["inventory"]["Coin"] += excess_payment_from_buyer
 
     def remove_expired_orders(self):
         """
@@ -361,49 +577,21 @@ class ContinuousDoubleAuction(BaseComponent):
         world = self.world
 
         for resource in self.commodities:
+            expired_bids, expired_asks = self.books[resource].age_orders(
+                self.order_duration
+            )
 
-            bids_ = []
-            for bid in self.bids[resource]:
-                bid["bid_lifetime"] += 1
-                # If the bid is not expired, keep it in the bids
-                if bid["bid_lifetime"] <= self.order_duration:
-                    bids_.append(bid)
-                # Otherwise, remove it and do the associated bookkeeping
-                else:
-                    # Return the set aside money to the buyer
-                    amount = world.agents[bid["buyer"]].escrow_to_inventory(
-                        "Coin", bid["bid"]
-                    )
-                    assert amount == bid["bid"]
-                    # Adjust the bid histogram to reflect the removal of the bid
-                    self.bid_hists[resource][bid["buyer"]][
-                        bid["bid"] - self.price_floor
-                    ] -= 1
-                    # Adjust the order counter
-                    self.n_orders[resource][bid["buyer"]] -= 1
-
-            asks_ = []
-            for ask in self.asks[resource]:
-                ask["ask_lifetime"] += 1
-                # If the ask is not expired, keep it in the asks
-                if ask["ask_lifetime"] <= self.order_duration:
-                    asks_.append(ask)
-                # Otherwise, remove it and do the associated bookkeeping
-                else:
-                    # Return the set aside resource to the seller
-                    resource_unit = world.agents[ask["seller"]].escrow_to_inventory(
-                        resource, 1
-                    )
-                    assert resource_unit == 1
-                    # Adjust the ask histogram to reflect the removal of the ask
-                    self.ask_hists[resource][ask["seller"]][
-                        ask["ask"] - self.price_floor
-                    ] -= 1
-                    # Adjust the order counter
-                    self.n_orders[resource][ask["seller"]] -= 1
+            for buyer_idx, bid in expired_bids:
+                # Return the set aside money to the buyer
+                amount = world.agents[buyer_idx].escrow_to_inventory("Coin", bid)
+                assert amount == bid
 
-            self.bids[resource] = bids_
-            self.asks[resource] = asks_
+            for seller_idx, _ in expired_asks:
+                # Return the set aside resource to the seller
+                resource_unit = world.agents[seller_idx].escrow_to_inventory(
+                    resource, 1
+                )
+                assert resource_unit == 1
 
     # Required methods for implementing components
     # --------------------------------------------
@@ -447,14 +635,14 @@ class ContinuousDoubleAuction(BaseComponent):
         world = self.world
 
         for resource in self.commodities:
+            bid_actions = world.actions("{}.Buy_{}".format(self.name, resource))
+            ask_actions = world.actions("{}.Sell_{}".format(self.name, resource))
             for agent in world.agents:
                 self.price_history[resource][agent.idx] *= 0.995
 
                 # Create bid action
                 # -----------------
-                resource_action = agent.get_component_action(
-                    self.name, "Buy_{}".format(resource)
-                )
+                resource_action = int(bid_actions[agent.idx])
 
                 
                 # No-op
@@ -470,9 +658,7 @@ class ContinuousDoubleAuction(BaseComponent):
 
                 # Create ask action
                 # -----------------
-                resource_action = agent.get_component_action(
-                    self.name, "Sell_{}".format(resource)
-                )
+                resource_action = int(ask_actions[agent.idx])
 
                 # No-op
                 if resource_action == 0:
@@ -595,49 +781,18 @@ class ContinuousDoubleAuction(BaseComponent):
 
         trade_keys = ["price", "cost", "income"]
 
-        selling_stats = {
-            a.idx: {
-                c: {k: 0 for k in trade_keys + ["n_sales"]} for c in self.commodities
-            }
-            for a in world.agents
-        }
-        buying_stats = {
-            a.idx: {
-                c: {k: 0 for k in trade_keys + ["n_sales"]} for c in self.commodities
-            }
-            for a in world.agents
-        }
-
-        n_trades = 0
-
-        for trades in self.executed_trades:
-            for trade in trades:
-                n_trades += 1
-                i_s, i_b, c = trade["seller"], trade["buyer"], trade["commodity"]
-                selling_stats[i_s][c]["n_sales"] += 1
-                buying_stats[i_b][c]["n_sales"] += 1
-                for k in trade_keys:
-                    selling_stats[i_s][c][k] += trade[k]
-                    buying_stats[i_b][c][k] += trade[k]
-
         out_dict = {}
         for a in world.agents:
             for c in self.commodities:
-                for stats, prefix in zip(
-                    [selling_stats, buying_stats], ["Sell", "Buy"]
-                ):
-                    n = stats[a.idx][c]["n_sales"]
-                    if n == 0:
-                        for k in trade_keys:
-                            stats[a.idx][c][k] = np.nan
-                    else:
-                        for k in trade_keys:
-                            stats[a.idx][c][k] /= n
-
-                    for k, v in stats[a.idx][c].items():
+                for prefix in ["Sell", "Buy"]:
+                    totals = self._trade_stats[prefix][a.idx][c]
+                    n = totals["n_sales"]
+                    for k in trade_keys:
+                        v = np.nan if n == 0 else totals[k] / n
                         out_dict["{}/{}{}/{}".format(a.idx, prefix, c, k)] = v
+                    out_dict["{}/{}{}/n_sales".format(a.idx, prefix, c)] = n
 
-        out_dict["n_trades"] = n_trades
+        out_dict["n_trades"] = self._n_trades
 
         return out_dict
 
@@ -647,26 +802,34 @@ class ContinuousDoubleAuction(BaseComponent):
 
         Reset the order books.
         """
-        self.bids = {c: [] for c in self.commodities}
-        self.asks = {c: [] for c in self.commodities}
-        self.n_orders = {
-            c: {i: 0 for i in range(self.n_agents)} for c in self.commodities
-        }
+        self._reset_order_books()
 
-        self.price_history = {
-            c: {i: self._price_zeros() for i in range(self.n_agents)}
-            for c in self.commodities
-        }
-        self.bid_hists = {
-            c: {i: self._price_zeros() for i in range(self.n_agents)}
-            for c in self.commodities
-        }
-        self.ask_hists = {
-            c: {i: self._price_zeros() for i in range(self.n_agents)}
-            for c in self.commodities
-        }
+    # The order books (and the views of their histograms) are saved separately
+    _state_exclude = BaseComponent._state_exclude + (
+        "books",
+        "n_orders",
+        "bid_hists",
+        "ask_hists",
+    )
 
-        self.executed_trades = []
+    def get_state(self):
+        """
+        Return the state of the component, including the open orders.
+        """
+        state = super().get_state()
+        state["books"] = {c: book.get_state() for c, book in self.books.items()}
+        return state
+
+    def set_state(self, state):
+        """
+        Restore the state of the component saved by get_state.
+        """
+        state = dict(state)
+        for c, book_state in state.pop("books").items():
+            self.books[c].set_state(book_state)
+        super().set_state(state)
+
+    _fork_history = ("executed_trades",)
 
     def get_dense_log(self):
         """
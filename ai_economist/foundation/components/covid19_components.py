@@ -177,6 +177,7 @@ class ControlUSStateOpenCloseStatus(BaseComponent):
                     )
                 self._checked_n_stringency_levels = True
 
+            actions = self.world.actions(self.name)
             for agent in self.world.agents:
                 if self.world.use_real_world_policies:
                     # Use the action taken in the previous timestep
@@ -184,7 +185,7 @@ class ControlUSStateOpenCloseStatus(BaseComponent):
                         self.world.timestep - 1, agent.idx
                     ]
                 else:
-                    action = agent.get_component_action(self.name)
+                    action = int(actions[agent.idx])
                 assert 0 <= action <= self.n_stringency_levels
 
                 # We only update the stringency level if the action is not a NO-OP.
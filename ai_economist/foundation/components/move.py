@@ -5,7 +5,6 @@
 # or https://opensource.org/licenses/BSD-3-Clause
 
 import numpy as np
-from numpy.random import rand
 
 from ai_economist.foundation.base.base_component import (
     BaseComponent,
@@ -59,7 +58,7 @@ class Gather(BaseComponent):
         assert self.skill_dist in ["none", "pareto", "lognormal"]
 
         self.bonus_gather_prob = bonus_gather_prob
-        self.gathers = []
+        self.gathers = self.new_event_history()
 
         self._aidx = np.arange(self.n_agents)[:, None].repeat(4, axis=1)
         self._roff = np.array([[0, 0, -1, 1]])
@@ -103,11 +102,14 @@ class Gather(BaseComponent):
         world = self.world
 
         gathers = []
+        actions = world.actions(self.name)
+        # Uniform draws deciding the bonus gathers, one per agent and resource
+        bonus_draws = self.rng.random((self.n_agents, len(self.resources)))
         for agent in world.get_random_order_agents():
 
-            if self.name not in agent.action:
+            if actions is None:
                 return
-            action = agent.get_component_action(self.name)
+            action = actions[agent.idx]
 
             r, c = [int(x) for x in agent.loc]
 
@@ -135,9 +137,12 @@ class Gather(BaseComponent):
             else:
                 raise ValueError
 
-            for resource, health in world.location_resources(new_r, new_c).items():
+            location_resources = world.location_resources(new_r, new_c)
+            for k, (resource, health) in enumerate(location_resources.items()):
                 if health >= 1:
-                    n_gathered = 1 + (rand() < agent.state["bonus_gather_prob"])
+                    n_gathered = 1 + (
+                        bonus_draws[agent.idx, k] < agent.state["bonus_gather_prob"]
+                    )
                     agent.state["inventory"][resource] += n_gathered
                     world.consume_resource(resource, new_r, new_c)
                     # Incur the labor cost of collecting a resource
@@ -198,20 +203,25 @@ class Gather(BaseComponent):
 
         Re-sample agents' collection skills.
         """
+        if self.bonus_gather_prob != None:
+            bonus_rates = self.bonus_gather_prob
+        elif self.skill_dist == "none":
+            bonus_rates = np.zeros(self.n_agents)
+        elif self.skill_dist == "pareto":
+            bonus_rates = np.minimum(2, self.rng.pareto(3, size=self.n_agents)) / 2
+        elif self.skill_dist == "lognormal":
+            bonus_rates = (
+                np.minimum(2, self.rng.lognormal(-2.022, 0.938, size=self.n_agents))
+                / 2
+            )
+        else:
+            raise NotImplementedError
         for i, agent in enumerate(self.world.agents):
-            if self.bonus_gather_prob != None:
-                bonus_rate=self.bonus_gather_prob[i]
-            elif self.skill_dist == "none":
-                bonus_rate = 0.0
-            elif self.skill_dist == "pareto":
-                bonus_rate = np.minimum(2, np.random.pareto(3)) / 2
-            elif self.skill_dist == "lognormal":
-                bonus_rate = np.minimum(2, np.random.lognormal(-2.022, 0.938)) / 2
-            else:
-                raise NotImplementedError
-            agent.state["bonus_gather_prob"] = float(bonus_rate)
+            agent.state["bonus_gather_prob"] = float(bonus_rates[i])
+
+        self.gathers = self.new_event_history()
 
-        self.gathers = []
+    _fork_history = ("gathers",)
 
     def get_dense_log(self):
         """
@@ -312,17 +312,22 @@ class PeriodicBracketTax(BaseComponent):
 
         # === tax cycle definitions ===
         self.tax_cycle_pos = 1
-        self.last_coin = [0 for _ in range(self.n_agents)]
+        self.last_coin = np.zeros(self.n_agents)
         self.last_income = [0 for _ in range(self.n_agents)]
         self.last_marginal_rate = [0 for _ in range(self.n_agents)]
         self.last_effective_tax_rate = [0 for _ in range(self.n_agents)]
 
         # === trackers ===
+        # (running totals for get_metrics; rates are kept as [sum, count])
         self.total_collected_taxes = 0
-        self.all_effective_tax_rates = []
-        self._schedules = {"{:03d}".format(int(r)): [0] for r in self.bracket_cutoffs}
+        self._effective_tax_rate_totals = [0.0, 0]
+        self._total_income = np.zeros(self.n_agents)
+        self._total_tax_paid = np.zeros(self.n_agents)
+        self._schedules = {
+            "{:03d}".format(int(r)): [0.0, 1] for r in self.bracket_cutoffs
+        }
         self._occupancy = {"{:03d}".format(int(r)): 0 for r in self.bracket_cutoffs}
-        self.taxes = []
+        self.taxes = self.new_event_history()
 
         # === tax annealing ===
         # for annealing of non-planner max taxes.
@@ -392,6 +397,7 @@ class PeriodicBracketTax(BaseComponent):
         
         # === placeholders ===
         self._curr_rates_obs = np.array(self.curr_marginal_rates)
+        self._curr_marginal_rate_obs = np.zeros(self.n_agents)
         self._last_income_obs = np.array(self.last_income) / self.period
         self._last_income_obs_sorted = self._last_income_obs[
             np.argsort(self._last_income_obs)
@@ -492,17 +498,17 @@ class PeriodicBracketTax(BaseComponent):
 
     def init_rand(self):
         if self.have_rules:
-            choices = np.random.choice(len(self.tax_rules), size = (self.num_tax_periods),
+            choices = self.rng.choice(len(self.tax_rules), size = (self.num_tax_periods),
                                                         replace=True)
             self.stashed_brackets =np.copy(self.tax_rules[choices])
             if self.has_shifts:
-                shifts = np.random.choice(self.shifts, size = (self.num_tax_periods, 1),
+                shifts = self.rng.choice(self.shifts, size = (self.num_tax_periods, 1),
                                         replace=True)
                 self.stashed_brackets += shifts
                 self.stashed_brackets  = np.clip(self.stashed_brackets, a_min=self.rate_min, a_max=self.rate_max)
 
         else:
-            self.stashed_brackets = np.random.uniform(self.rate_min, self.rate_max, 
+            self.stashed_brackets = self.rng.uniform(self.rate_min, self.rate_max, 
                                                         (self.num_tax_periods ,self.n_brackets))
         self.tax_id = 0
         #print("Generated Brackets: \n",  self.stashed_brackets)
@@ -550,7 +556,7 @@ class PeriodicBracketTax(BaseComponent):
 
         # If no enough samples, use random taxes.
         if not self._reached_min_samples:
-            self.curr_bracket_tax_rates = np.random.uniform(
+            self.curr_bracket_tax_rates = self.rng.uniform(
                 low=self.rate_min,
                 high=self.curr_rate_max,
                 size=self.curr_bracket_tax_rates.shape,
@@ -954,62 +960,101 @@ class PeriodicBracketTax(BaseComponent):
         bin_taxes = self.curr_marginal_rates * bin_income
         return np.sum(bin_taxes)
 
+    def income_bracket_indices(self, incomes):
+        """Return the index of the tax bracket in which each of incomes falls.
+
+        Negative incomes fall in the lowest bracket (as in income_bin).
+        """
+        bracket_idx = np.searchsorted(self.bracket_cutoffs, incomes, side="right") - 1
+        return np.maximum(0, bracket_idx)
+
+    def marginal_rates(self, incomes, bracket_idx=None):
+        """Return the marginal tax rate applied at each of incomes.
+
+        Batched version of marginal_rate. Pass bracket_idx (the output of
+        income_bracket_indices) to avoid recomputing it.
+        """
+        incomes = np.asarray(incomes, dtype=np.float64)
+        if bracket_idx is None:
+            bracket_idx = self.income_bracket_indices(incomes)
+        rates = np.asarray(self.curr_marginal_rates)[bracket_idx]
+        return np.where(incomes < 0, 0.0, rates)
+
+    def batch_taxes_due(self, incomes):
+        """Return the total amount of taxes due at each of incomes.
+
+        Batched version of taxes_due: the income within each bracket is computed
+        for all incomes at once, as an [n_incomes, n_brackets] array.
+        """
+        incomes = np.asarray(incomes, dtype=np.float64)
+        past_cutoff = np.maximum(0, incomes[:, None] - self.bracket_cutoffs)
+        bin_income = np.minimum(self.bracket_sizes, past_cutoff)
+        bin_taxes = np.asarray(self.curr_marginal_rates) * bin_income
+        return np.sum(bin_taxes, axis=1)
+
     def enact_taxes(self):
         """Calculate period income & tax burden. Collect taxes and redistribute."""
-        net_tax_revenue = 0
+        curr_marginal_rates = np.array(self.curr_marginal_rates)
         tax_dict = dict(
-            schedule=np.array(self.curr_marginal_rates),
+            schedule=curr_marginal_rates,
             cutoffs=np.array(self.bracket_cutoffs),
         )
 
-        for curr_rate, bracket_cutoff in zip(
-            self.curr_marginal_rates, self.bracket_cutoffs
-        ):
-            self._schedules["{:03d}".format(int(bracket_cutoff))].append(
-                float(curr_rate)
-            )
+        for curr_rate, bracket_cutoff in zip(curr_marginal_rates, self.bracket_cutoffs):
+            schedule = self._schedules["{:03d}".format(int(bracket_cutoff))]
+            schedule[0] += float(curr_rate)
+            schedule[1] += 1
+
+        # Compute incomes, taxes and rates for all agents at once.
+        coin = self.world.inventory("Coin")
+        incomes = self.world.total_endowment("Coin") - self.last_coin
+        bracket_idx = self.income_bracket_indices(incomes)
+        marginal_rates = self.marginal_rates(incomes, bracket_idx=bracket_idx)
+        tax_due = self.batch_taxes_due(incomes)
+        effective_taxes = np.minimum(coin, tax_due)  # Don't take from escrow.
+        effective_tax_rates = effective_taxes / np.maximum(0.000001, incomes)
+
+        # Actually collect the taxes.
+        coin -= effective_taxes
+        net_tax_revenue = np.sum(effective_taxes)
+
+        self.last_income = incomes.tolist()
+        self.last_marginal_rate = marginal_rates.tolist()
+        self.last_effective_tax_rate = effective_tax_rates.tolist()
+        self._effective_tax_rate_totals[0] += float(np.sum(effective_tax_rates))
+        self._effective_tax_rate_totals[1] += self.n_agents
+        self._total_income += np.maximum(0, incomes)
+        self._total_tax_paid += effective_taxes
+
+        occupancy = np.bincount(bracket_idx, minlength=self.n_brackets)
+        for bracket_cutoff, count in zip(self.bracket_cutoffs, occupancy):
+            self._occupancy["{:03d}".format(int(bracket_cutoff))] += int(count)
+
+        self.total_collected_taxes += float(net_tax_revenue)
+
+        lump_sum = float(net_tax_revenue / self.n_agents)
+        coin += lump_sum
+        self.last_coin = self.world.total_endowment("Coin")
 
-        self.last_income = []
-        self.last_effective_tax_rate = []
-        self.last_marginal_rate = []
-        for agent, last_coin in zip(self.world.agents, self.last_coin):
-            income = agent.total_endowment("Coin") - last_coin
-            tax_due = self.taxes_due(income)
-            effective_taxes = np.minimum(
-                agent.state["inventory"]["Coin"], tax_due
-            )  # Don't take from escrow.
-            marginal_rate = self.marginal_rate(income)
-            effective_tax_rate = float(effective_taxes / np.maximum(0.000001, income))
+        for agent, income, tax_paid, marginal_rate, effective_rate in zip(
+            self.world.agents,
+            self.last_income,
+            effective_taxes.tolist(),
+            self.last_marginal_rate,
+            self.last_effective_tax_rate,
+        ):
             tax_dict[str(agent.idx)] = dict(
-                income=float(income),
-                tax_paid=float(effective_taxes),
+                income=income,
+                tax_paid=tax_paid,
                 marginal_rate=marginal_rate,
-                effective_rate=effective_tax_rate,
+                effective_rate=effective_rate,
+                lump_sum=lump_sum,
             )
 
-            # Actually collect the taxes.
-            agent.state["inventory"]["Coin"] -= effective_taxes
-            net_tax_revenue += effective_taxes
-
-            self.last_income.append(float(income))
-            self.last_marginal_rate.append(float(marginal_rate))
-            self.last_effective_tax_rate.append(effective_tax_rate)
-
-            self.all_effective_tax_rates.append(effective_tax_rate)
-            self._occupancy["{:03d}".format(int(self.income_bin(income)))] += 1
-
-        self.total_collected_taxes += float(net_tax_revenue)
-
-        lump_sum = net_tax_revenue / self.n_agents
-        for agent in self.world.agents:
-            agent.state["inventory"]["Coin"] += lump_sum
-            tax_dict[str(agent.idx)]["lump_sum"] = float(lump_sum)
-            self.last_coin[agent.idx] = float(agent.total_endowment("Coin"))
-
         self.taxes.append(tax_dict)
 
         # Pre-compute some things that will be useful for generating observations.
-        self._last_income_obs = np.array(self.last_income) / self.period
+        self._last_income_obs = incomes / self.period
         self._last_income_obs_sorted = self._last_income_obs[
             np.argsort(self._last_income_obs)
         ]
@@ -1116,14 +1161,18 @@ class PeriodicBracketTax(BaseComponent):
             curr_rates=self._curr_rates_obs,
         )
 
+        # The marginal rate each agent's next unit of income would be taxed at
+        # (computed for all agents at once and cached for this step).
+        self._curr_marginal_rate_obs = self.marginal_rates(
+            self.world.total_endowment("Coin") - self.last_coin
+        )
+
         for agent in self.world.agents:
             i = agent.idx
             k = str(i)
 
-            curr_marginal_rate = self.marginal_rate(
-                agent.total_endowment("Coin") - self.last_coin[i]
-            )
-            
+            curr_marginal_rate = self._curr_marginal_rate_obs[i]
+
             if self.rand_instead:
                 obs[k] = dict(
                     is_tax_day=is_tax_day,
@@ -1256,9 +1305,7 @@ class PeriodicBracketTax(BaseComponent):
         self.curr_rate_indices = [0 for _ in range(self.n_brackets)]
 
         self.tax_cycle_pos = 1
-        self.last_coin = [
-            float(agent.total_endowment("Coin")) for agent in self.world.agents
-        ]
+        self.last_coin = self.world.total_endowment("Coin")
         self.last_income = [0 for _ in range(self.n_agents)]
         self.last_marginal_rate = [0 for _ in range(self.n_agents)]
         self.last_effective_tax_rate = [0 for _ in range(self.n_agents)]
@@ -1269,10 +1316,14 @@ class PeriodicBracketTax(BaseComponent):
             np.argsort(self._last_income_obs)
         ]
 
-        self.taxes = []
+        self.taxes = self.new_event_history()
         self.total_collected_taxes = 0
-        self.all_effective_tax_rates = []
-        self._schedules = {"{:03d}".format(int(r)): [] for r in self.bracket_cutoffs}
+        self._effective_tax_rate_totals = [0.0, 0]
+        self._total_income = np.zeros(self.n_agents)
+        self._total_tax_paid = np.zeros(self.n_agents)
+        self._schedules = {
+            "{:03d}".format(int(r)): [0.0, 0] for r in self.bracket_cutoffs
+        }
         self._occupancy = {"{:03d}".format(int(r)): 0 for r in self.bracket_cutoffs}
         self._planner_masks = None
 
@@ -1298,13 +1349,17 @@ class PeriodicBracketTax(BaseComponent):
         n_observed_incomes = np.maximum(1, np.sum(list(self._occupancy.values())))
         for c in self.bracket_cutoffs:
             k = "{:03d}".format(int(c))
-            out["avg_bracket_rate/{}".format(k)] = np.mean(self._schedules[k])
+            rate_sum, n_rates = self._schedules[k]
+            out["avg_bracket_rate/{}".format(k)] = (
+                rate_sum / n_rates if n_rates else np.nan
+            )
             out["bracket_occupancy/{}".format(k)] = (
                 self._occupancy[k] / n_observed_incomes
             )
 
         if not self.disable_taxes:
-            out["avg_effective_tax_rate"] = np.mean(self.all_effective_tax_rates)
+            rate_sum, n_rates = self._effective_tax_rate_totals
+            out["avg_effective_tax_rate"] = rate_sum / n_rates if n_rates else np.nan
             out["total_collected_taxes"] = float(self.total_collected_taxes)
 
             # Indices of richest and poorest agents.
@@ -1314,18 +1369,12 @@ class PeriodicBracketTax(BaseComponent):
             idx_poor = np.argmin(agent_coin_endows)
             idx_rich = np.argmax(agent_coin_endows)
 
-            tax_days = self.taxes[(self.period - 1) :: self.period]
             for i, tag in zip([idx_poor, idx_rich], ["poorest", "richest"]):
-                total_income = np.maximum(
-                    0, [tax_day[str(i)]["income"] for tax_day in tax_days]
-                ).sum()
-                total_tax_paid = np.sum(
-                    [tax_day[str(i)]["tax_paid"] for tax_day in tax_days]
-                )
                 # Report the overall tax rate over the episode
                 # for the richest and poorest agents.
-                out["avg_tax_rate/{}".format(tag)] = total_tax_paid / np.maximum(
-                    0.001, total_income
+                total_income = np.maximum(0.001, self._total_income[i])
+                out["avg_tax_rate/{}".format(tag)] = (
+                    self._total_tax_paid[i] / total_income
                 )
 
             if self.tax_model == "saez":
@@ -1349,3 +1398,17 @@ class PeriodicBracketTax(BaseComponent):
         if self.disable_taxes:
             return None
         return self.taxes
+
+    # Rule, rate and bracket tables (fixed by the configuration)
+    _fork_shared = (
+        "tax_rules",
+        "shifts",
+        "disc_rates",
+        "bracket_cutoffs",
+        "bracket_edges",
+        "bracket_sizes",
+        "_saez_income_bin_edges",
+        "_saez_income_bin_sizes",
+        "_planner_tax_val_dict",
+    )
+    _fork_history = ("taxes",)
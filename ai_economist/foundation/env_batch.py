@@ -0,0 +1,1284 @@
+# Copyright (c) 2020, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+Batched simulation of N copies of a scenario, over stacked state arrays.
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from ai_economist.foundation.base.agent_actions import AgentActionTable
+from ai_economist.foundation.components import component_registry
+from ai_economist.foundation.scenarios import scenario_registry
+from ai_economist.foundation.scenarios.utils import rewards, social_metrics
+
+# Scenarios whose step (with the components below) runs on the batch's stacked
+# arrays. Subclasses are included, unless they change the step, observations or
+# rewards (see _SCENARIO_METHODS).
+_BATCHED_SCENARIOS = [
+    "uniform/simple_wood_and_stone",
+    "layout_from_file/simple_wood_and_stone",
+    "layout_from_file/hetero_agents",
+]
+_SCENARIO_METHODS = [
+    "scenario_step",
+    "generate_observations",
+    "compute_reward",
+    "get_current_optimization_metrics",
+    "energy_weight",
+]
+_BATCHED_COMPONENTS = [
+    "Build",
+    "ContinuousDoubleAuction",
+    "Gather",
+    "PeriodicBracketTax",
+]
+
+# The resources that regenerate in the batched scenarios
+_REGEN_RESOURCES = ["Wood", "Stone"]
+
+# Row and column offsets of the Gather actions (NO-OP, left, right, up, down)
+_MOVE_ROWS = np.array([0, 0, 0, -1, 1])
+_MOVE_COLS = np.array([0, -1, 1, 0, 0])
+
+
+def _window_sums(maps, halfwidth):
+    """Return the sums of maps ([N, H, W]) over the (1 + 2 * halfwidth)-wide square
+    windows centered on each location (with zero padding at the edges)."""
+    if halfwidth == 0:
+        return maps
+    height, width = maps.shape[1:]
+    d = 1 + 2 * halfwidth
+    padded = np.pad(maps, ((0, 0), (halfwidth, halfwidth), (halfwidth, halfwidth)))
+    row_sums = sum(padded[:, i : i + height] for i in range(d))
+    return sum(row_sums[:, :, j : j + width] for j in range(d))
+
+
+class EnvironmentBatch:
+    """
+    Simulates N copies of a scenario as a batch.
+
+    The batch owns the simulation state of its N environments as stacked arrays:
+    the agent state tables ([N, n_agents + 1, n_fields] per block, the last row
+    being the planner), the action table, the maps (entity maps, landmark ownership,
+    occupancy and accessibility, with a leading [N] dimension), the agent locations
+    and the market order histograms. Each environment object works on its slice of
+    these arrays (through views), so its metrics, logs, get_state, fork, etc. keep
+    working as usual.
+
+    For the Uniform and LayoutFromFile scenarios (including the hetero-agent
+    variant) with any of the Build, ContinuousDoubleAuction, Gather and
+    PeriodicBracketTax components, step() advances all N environments with array
+    operations over the stacked state, following the order of
+    BaseEnvironment.step:
+        - Build: the builds of all agents of all environments at once.
+        - Gather: agents move and gather in their (random) order, one position of
+          that order at a time for all N environments.
+        - ContinuousDoubleAuction: order checks, escrow and labor for all
+          environments at once. Adding the orders to the books and matching them
+          stays per environment, since trades depend on the order in which orders
+          arrive.
+        - PeriodicBracketTax: the per-environment bookkeeping of the tax period;
+          taxes are enacted (for all agents at once) on the last day of a period.
+        - Resource regeneration, observations, action masks and rewards: for all N
+          environments at once, written straight into the output arrays.
+    Random numbers are drawn from each environment's own streams, in the same order
+    as in BaseEnvironment.step, so the environments evolve exactly as N
+    independently stepped environments would.
+
+    Other scenarios and components, as well as steps where an environment keeps a
+    dense log (or profiles its steps or checkpoints its replay log) are stepped one
+    environment at a time with BaseEnvironment.step. Environments should only be
+    reset through the batch (reset or auto_reset), and not be restored with
+    set_state, since these replace the arrays shared with the batch.
+
+    Actions are supplied as integer arrays:
+        agent_actions: [N, n_agents] in single action mode, or
+            [N, n_agents, n_subactions] in multi action mode.
+        planner_actions: [N] in single action mode, or [N, n_subactions] in multi
+            action mode.
+
+    Observations are returned as {"a": {key: array}, "p": {key: array}}, where the
+    "a" arrays have shape [N, n_agents, ...] and the "p" arrays have shape [N, ...].
+    The returned arrays are persistent buffers owned by this object; they are
+    overwritten on the next call to reset() or step(). Copy them if they need to
+    outlive that.
+
+    The simulation state of the environments can be read as stacked arrays (see
+    the "State" properties below), which are views of the batch's storage.
+
+    Example:
+        from ai_economist.foundation.env_batch import EnvironmentBatch
+
+        env_batch = EnvironmentBatch(env_config, n_envs=64, seed=1)
+        obs = env_batch.reset()
+        agent_actions = np.zeros((64, env_batch.n_agents), dtype=np.int32)
+        obs, rew, done, info = env_batch.step(agent_actions)
+        obs["a"]["flat"].shape  # --> [64, n_agents, flat_dim]
+
+    Args:
+        env_config (dict): Environment configuration, as used with
+            foundation.make_env_instance (that is, it must include "scenario_name").
+        n_envs (int): Number of environment copies to hold.
+        seed (int or list, optional): If an int, each environment is seeded (see
+            BaseEnvironment.seed) with its own child of np.random.SeedSequence(seed).
+            Can also be the length-N list of the seeds of the environments (e.g.
+            SeedSequences, see EnvPool).
+        auto_reset (bool): Whether to reset environments as soon as their episode
+            completes. If True (default), the observations returned for an
+            environment that just finished are the observations of its new episode
+            and the metrics of the finished episode are included in its info entry.
+    """
+
+    def __init__(self, env_config=None, n_envs=1, seed=None, auto_reset=True):
+        assert isinstance(env_config, dict)
+        assert "scenario_name" in env_config
+        # Collation is handled here, for all environments at once.
+        assert not env_config.get("collate_agent_step_and_reset_data", False)
+        # Masks are batched as arrays, so they need to be flat.
+        assert env_config.get("flatten_masks", True)
+
+        self.n_envs = int(n_envs)
+        assert self.n_envs >= 1
+
+        self.auto_reset = bool(auto_reset)
+
+        env_kwargs = {k: v for k, v in env_config.items() if k != "scenario_name"}
+        # Observations are copied into the stacked buffers below, so the per-env
+        # flat observation buffers can safely be reused from step to step.
+        env_kwargs.setdefault("reuse_observation_buffers", True)
+        scenario_class = scenario_registry.get(env_config["scenario_name"])
+        if seed is None:
+            self.envs = [scenario_class(**env_kwargs) for _ in range(self.n_envs)]
+        else:
+            if isinstance(seed, (int, float, np.integer)):
+                seed = np.random.SeedSequence(int(seed)).spawn(self.n_envs)
+            assert len(seed) == self.n_envs
+            self.envs = [
+                scenario_class(**dict(env_kwargs, seed=env_seed)) for env_seed in seed
+            ]
+
+        env = self.envs[0]
+        self.name = env.name
+        self.n_agents = env.n_agents
+        self.episode_length = env.episode_length
+        self.world_size = list(env.world_size)
+        self.resources = env.resources
+        self.endogenous = env.endogenous
+        self.map_keys = list(env.world.maps.keys())
+        self.multi_action_mode_agents = env.multi_action_mode_agents
+        self.multi_action_mode_planner = env.multi_action_mode_planner
+
+        # Whether steps run on the stacked arrays (see class docstring)
+        self._batched = self._supports_batched_step(env)
+        self._hetero = isinstance(
+            env, scenario_registry.get("layout_from_file/hetero_agents")
+        )
+
+        # Stacked state (allocated on the first reset, see _allocate_storage)
+        self._tables = None
+        self._action_table = None
+        self._actions = None
+        self._maps = None
+        self._locs = None
+        self._market = None
+
+        # Output buffers (built from the observation structure on the first reset)
+        self._obs_buffers = None
+        self._agent_rew = np.zeros((self.n_envs, self.n_agents), dtype=np.float32)
+        self._planner_rew = np.zeros(self.n_envs, dtype=np.float32)
+        self._done = np.zeros(self.n_envs, dtype=bool)
+
+    @staticmethod
+    def _supports_batched_step(env):
+        """Return True if the step of env can run on the stacked arrays."""
+        if not env._flatten_observations:
+            return False
+
+        scenario_classes = [scenario_registry.get(n) for n in _BATCHED_SCENARIOS]
+        scenario_class = None
+        for cls in type(env).__mro__:
+            if cls in scenario_classes:
+                scenario_class = cls
+                break
+        if scenario_class is None:
+            return False
+        for method in _SCENARIO_METHODS:
+            if getattr(type(env), method) is not getattr(scenario_class, method):
+                return False
+
+        action_names = env.world.action_table.columns
+        component_names = []
+        for component in env.components:
+            if component.name not in _BATCHED_COMPONENTS:
+                return False
+            if type(component) is not component_registry.get(component.name):
+                return False
+            component_names.append(component.name)
+            if component.name in ["Build", "Gather"]:
+                needed = [component.name]
+            elif component.name == "ContinuousDoubleAuction":
+                needed = [
+                    "{}.{}_{}".format(component.name, side, c)
+                    for c in component.commodities
+                    for side in ["Buy", "Sell"]
+                ]
+            else:
+                needed = []
+            if not all(name in action_names for name in needed):
+                return False
+        return len(set(component_names)) == len(component_names)
+
+    # Stacked storage
+    # ---------------
+
+    def _allocate_storage(self):
+        """Allocate the stacked state arrays, shaped after those of the first env."""
+        n_envs, n_agents = self.n_envs, self.n_agents
+        world = self.envs[0].world
+
+        self._tables = {
+            block: np.zeros((n_envs,) + data.shape)
+            for block, data in world.state_table.data.items()
+        }
+        self._table_columns = world.state_table.columns
+        for block, names in [
+            ("inventory", self.resources),
+            ("escrow", self.resources),
+            ("endogenous", self.endogenous),
+        ]:
+            columns = [self._table_columns[block][name] for name in names]
+            assert columns == list(range(len(names)))
+
+        table = world.action_table
+        self._action_table = AgentActionTable(
+            n_envs * n_agents,
+            list(table.columns),
+            table.multi_action_mode,
+            world.agents[0].single_action_map,
+        )
+        self._actions = self._action_table.data.reshape(n_envs, n_agents, -1)
+
+        self._maps = {
+            name: np.zeros((n_envs,) + array.shape, dtype=array.dtype)
+            for name, array in world.maps.storage_arrays().items()
+        }
+        self._locs = np.zeros((n_envs, n_agents, 2), dtype=np.int64)
+
+        if not self._batched:
+            return
+
+        self._components = [
+            {component.name: component for component in env.components}
+            for env in self.envs
+        ]
+        # Kernels of the components, in the order of the environment's components
+        kernels = {
+            "Build": (self._step_build, self._observe_build, self._mask_build),
+            "ContinuousDoubleAuction": (
+                self._step_market,
+                self._observe_market,
+                self._mask_market,
+            ),
+            "Gather": (self._step_gather, self._observe_gather, self._mask_gather),
+            "PeriodicBracketTax": (self._step_tax, self._observe_tax, None),
+        }
+        self._kernels = [
+            (kernels[component.name], [c[component.name] for c in self._components])
+            for component in self.envs[0].components
+        ]
+
+        if "ContinuousDoubleAuction" in self._components[0]:
+            market = self._components[0]["ContinuousDoubleAuction"]
+            n_prices = 1 + market.price_ceiling - market.price_floor
+            hists_shape = (n_envs, len(market.commodities), n_agents, n_prices)
+            self._market = dict(
+                price_history=np.zeros(hists_shape),
+                bid_hists=np.zeros(hists_shape),
+                ask_hists=np.zeros(hists_shape),
+                bid_total=np.zeros(hists_shape[:2] + (n_prices,)),
+                ask_total=np.zeros(hists_shape[:2] + (n_prices,)),
+            )
+        if "Build" in self._components[0]:
+            self._build_skills = np.zeros((n_envs, n_agents))
+        if "PeriodicBracketTax" in self._components[0]:
+            self._tax = None
+
+        # Maps whose positive values prevent building
+        maps = world.maps
+        self._occupying_maps = [
+            name + "/health" if name in maps._private_landmark_types else name
+            for name in maps.keys()
+        ]
+        self._regen_source_idx = {r: [None] * n_envs for r in _REGEN_RESOURCES}
+        self._regen_sources = None
+
+        self._utilities = np.zeros((n_envs, n_agents))
+        self._welfare = np.zeros(n_envs)
+        self._env_weighting = np.array(
+            [
+                [getattr(a, "env_weighting", 0) for a in env.world.agents]
+                for env in self.envs
+            ],
+            dtype=np.float64,
+        )
+        self._equality_weighting = np.array(
+            [
+                [getattr(a, "equality", 0) for a in env.world.agents]
+                for env in self.envs
+            ],
+            dtype=np.float64,
+        )
+        self._planner_mask_cache = [None] * n_envs
+        self._mask_slices, self._no_op_idx = self._mask_layout()
+        self._layouts = self._observation_layouts()
+
+    def _bind_env(self, env_idx):
+        """Move the state of env env_idx into (its slice of) the stacked arrays.
+
+        Needs to be called after every reset of the environment, which replaces
+        the maps and order books."""
+        env = self.envs[env_idx]
+        world = env.world
+        world.state_table.bind_storage(
+            {block: data[env_idx] for block, data in self._tables.items()}
+        )
+        world.action_table.bind_storage(self._actions[env_idx])
+        world.maps.bind_storage({k: v[env_idx] for k, v in self._maps.items()})
+        self._locs[env_idx] = [agent.loc for agent in world.agents]
+
+        if not self._batched:
+            return
+
+        components = self._components[env_idx]
+        if "ContinuousDoubleAuction" in components:
+            components["ContinuousDoubleAuction"].bind_storage(
+                {k: v[env_idx] for k, v in self._market.items()}
+            )
+        if "Build" in components:
+            skills = components["Build"].sampled_skills
+            self._build_skills[env_idx] = [skills[i] for i in range(self.n_agents)]
+        if "PeriodicBracketTax" in components:
+            self._cache_tax_state(env_idx, components["PeriodicBracketTax"])
+
+        for resource in _REGEN_RESOURCES:
+            source_blocks = world.maps.get(resource + "SourceBlock")
+            self._regen_source_idx[resource][env_idx] = np.flatnonzero(
+                source_blocks > 0
+            )
+        self._regen_sources = None
+
+        metric = env.curr_optimization_metric
+        self._utilities[env_idx] = [metric[i] for i in range(self.n_agents)]
+        self._welfare[env_idx] = metric[world.planner.idx]
+        self._planner_mask_cache[env_idx] = None
+
+    def _cache_tax_state(self, env_idx, tax):
+        """Cache the tax quantities of env env_idx that only change on reset, at the
+        start of a tax period, or when taxes are enacted."""
+        cached = dict(
+            curr_rates=tax._curr_rates_obs,
+            rates=np.asarray(tax.curr_marginal_rates),
+            last_incomes=tax._last_income_obs_sorted,
+            last_income=tax._last_income_obs,
+            last_marginal_rate=tax.last_marginal_rate,
+            last_coin=tax.last_coin,
+        )
+        if tax.rand_instead:
+            cached["all_taxes"] = np.reshape(tax.stashed_brackets, (-1))
+        elif tax.monte_carlo_window_size:
+            cached["all_taxes"] = np.reshape(np.mean(tax.tax_history, axis=0), (-1))
+
+        if self._tax is None:
+            self._tax = {
+                k: np.zeros((self.n_envs,) + np.shape(v)) for k, v in cached.items()
+            }
+        for k, v in cached.items():
+            self._tax[k][env_idx] = v
+
+    def _column(self, block, name):
+        """[N, n_agents] view of the mobile agents' field name in block."""
+        return self._tables[block][:, : self.n_agents, self._table_columns[block][name]]
+
+    def _action_column(self, name):
+        """[N, n_agents] view of the mobile agents' actions of subspace name."""
+        return self._actions[:, :, self._action_table.columns[name]]
+
+    # State
+    # -----
+
+    def _check_storage(self):
+        assert self._tables is not None, "Call reset() first."
+
+    @property
+    def maps(self):
+        """[N, n_map_keys, H, W] float32 array of the world maps (see map_keys).
+
+        Like the other state arrays below, this is a view of the batch's storage, so
+        it reflects later steps. Copy it to keep a snapshot."""
+        self._check_storage()
+        p = self.envs[0].world.maps.padding
+        height, width = self.world_size
+        return self._maps["padded_state"][:, :-1, p : p + height, p : p + width]
+
+    @property
+    def locs(self):
+        """[N, n_agents, 2] int array of the mobile agent [row, col] locations."""
+        self._check_storage()
+        return self._locs
+
+    @property
+    def inventory(self):
+        """[N, n_agents, n_resources] array of agent inventories (see resources)."""
+        self._check_storage()
+        return self._tables["inventory"][:, : self.n_agents, : len(self.resources)]
+
+    @property
+    def escrow(self):
+        """[N, n_agents, n_resources] array of agent escrow (see resources)."""
+        self._check_storage()
+        return self._tables["escrow"][:, : self.n_agents, : len(self.resources)]
+
+    @property
+    def endogenous_state(self):
+        """[N, n_agents, n_endogenous] array of agent endogenous quantities."""
+        self._check_storage()
+        return self._tables["endogenous"][:, : self.n_agents, : len(self.endogenous)]
+
+    @property
+    def planner_inventory(self):
+        """[N, n_resources] array of the planner inventory."""
+        self._check_storage()
+        return self._tables["inventory"][:, self.n_agents, : len(self.resources)]
+
+    def total_endowment(self, resource):
+        """[N, n_agents] array of the inventory+escrow endowment of resource."""
+        self._check_storage()
+        return self._column("inventory", resource) + self._column("escrow", resource)
+
+    # Component and scenario kernels
+    # ------------------------------
+
+    def _can_build(self, build):
+        """[N, n_agents] boolean array of the agents that can build (see
+        Build.agent_can_build)."""
+        can_build = np.ones((self.n_envs, self.n_agents), dtype=bool)
+        for resource, cost in build.resource_cost.items():
+            can_build &= self._column("inventory", resource) >= cost
+        env_idx = np.arange(self.n_envs)[:, None]
+        rows, cols = self._locs[..., 0], self._locs[..., 1]
+        for name in self._occupying_maps:
+            can_build &= ~(self._maps[name][env_idx, rows, cols] > 0)
+        return can_build
+
+    def _step_build(self, components):
+        build = components[0]
+        n_agents = self.n_agents
+        orders = [env.world.rng.permutation(n_agents) for env in self.envs]
+        actions = self._action_column(build.name)
+        if np.any((actions < 0) | (actions > 1)):
+            raise ValueError
+
+        builds = (actions == 1) & self._can_build(build)
+        env_idx, agent_idx = np.nonzero(builds)
+        if len(env_idx) > 0:
+            for resource, cost in build.resource_cost.items():
+                self._column("inventory", resource)[env_idx, agent_idx] -= cost
+
+            # Place the houses (as Maps.set_point)
+            maps = self.envs[0].world.maps
+            p = maps.padding
+            rows, cols = self._locs[env_idx, agent_idx].T
+            self._maps["House/health"][env_idx, rows, cols] = 1
+            self._maps["House/owner"][env_idx, rows, cols] = agent_idx
+            self._maps["padded_state"][
+                env_idx, maps._state_lookup["House"], rows + p, cols + p
+            ] = 1
+            self._maps["padded_idx"][
+                env_idx, maps._owner_lookup["House"], rows + p, cols + p
+            ] = agent_idx
+            self._maps["accessibility"][
+                env_idx, maps._accessibility_lookup["House"], :, rows, cols
+            ] = agent_idx[:, None] == np.arange(n_agents)
+
+            payments = self._column("extra", "build_payment")[env_idx, agent_idx]
+            self._column("inventory", "Coin")[env_idx, agent_idx] += payments
+            self._column("endogenous", "Labor")[env_idx, agent_idx] += build.build_labor
+
+        for n, (env, component) in enumerate(zip(self.envs, components)):
+            build_log = []
+            for i in orders[n][builds[n, orders[n]]]:
+                agent = env.world.agents[i]
+                build_log.append(
+                    {
+                        "builder": agent.idx,
+                        "loc": np.array(agent.loc),
+                        "income": float(agent.state["build_payment"]),
+                    }
+                )
+                component._n_builds[agent.idx] += 1
+                env.world.maps._net_accessibility = None
+                env.world.maps._version += 1
+            component.builds.append(build_log)
+
+    def _step_gather(self, components):
+        gather = components[0]
+        n_envs, n_agents = self.n_envs, self.n_agents
+        # The same draws, from the same streams, as Gather.component_step
+        bonus_draws = np.stack(
+            [c.rng.random((n_agents, len(c.resources))) for c in components]
+        )
+        orders = np.stack([env.world.rng.permutation(n_agents) for env in self.envs])
+        actions = self._action_column(gather.name)
+        if np.any((actions < 0) | (actions > 4)):
+            raise ValueError
+
+        maps = self.envs[0].world.maps
+        p = maps.padding
+        height, width = self.world_size
+        unoccupied = self._maps["unoccupied"]
+        loc_map = self._maps["padded_idx"][:, -1]
+        accessibility = self._maps.get("accessibility")
+        padded_state = self._maps["padded_state"]
+        inventory = self._tables["inventory"]
+        labor = self._column("endogenous", "Labor")
+        bonus_prob = self._column("extra", "bonus_gather_prob")
+        resources = [
+            (name, self._table_columns["inventory"][name], maps._state_lookup[name])
+            for name in maps._resources
+        ]
+
+        env_range = np.arange(n_envs)
+        moved = np.zeros((n_envs, n_agents), dtype=bool)
+        n_consumed = np.zeros(n_envs, dtype=np.int64)
+        gathers = [[] for _ in range(n_envs)]
+        for k in range(n_agents):
+            agents = orders[:, k]
+            action = actions[env_range, agents]
+
+            # Move (if the new location can be occupied)
+            rows = self._locs[env_range, agents, 0]
+            cols = self._locs[env_range, agents, 1]
+            new_rows = rows + _MOVE_ROWS[action]
+            new_cols = cols + _MOVE_COLS[action]
+            move = (
+                (action > 0)
+                & (new_rows >= 0)
+                & (new_rows < height)
+                & (new_cols >= 0)
+                & (new_cols < width)
+            )
+            e, a = env_range[move], agents[move]
+            r, c, new_r, new_c = rows[move], cols[move], new_rows[move], new_cols[move]
+            can_occupy = unoccupied[e, new_r, new_c]
+            if accessibility is not None:
+                can_occupy &= accessibility[e, :, a, new_r, new_c].all(axis=1)
+            e, a = e[can_occupy], a[can_occupy]
+            r, c = r[can_occupy], c[can_occupy]
+            new_r, new_c = new_r[can_occupy], new_c[can_occupy]
+            unoccupied[e, r, c] = True
+            loc_map[e, r + p, c + p] = -1
+            unoccupied[e, new_r, new_c] = False
+            loc_map[e, new_r + p, new_c + p] = a
+            self._locs[e, a, 0] = new_r
+            self._locs[e, a, 1] = new_c
+            labor[e, a] += gather.move_labor
+            moved[e, a] = True
+
+            # Gather the resources at the (new) location
+            rows = self._locs[env_range, agents, 0]
+            cols = self._locs[env_range, agents, 1]
+            n_present = np.zeros(n_envs, dtype=np.int64)
+            for name, inv_col, state_idx in resources:
+                health = self._maps[name][env_range, rows, cols]
+                collect = health >= 1
+                if np.any(collect):
+                    e, a = env_range[collect], agents[collect]
+                    r, c = rows[collect], cols[collect]
+                    n_gathered = 1 + (
+                        bonus_draws[e, a, n_present[collect]] < bonus_prob[e, a]
+                    )
+                    inventory[e, a, inv_col] += n_gathered
+                    remaining = np.maximum(0, health[collect] - 1)
+                    self._maps[name][e, r, c] = remaining
+                    padded_state[e, state_idx, r + p, c + p] = remaining
+                    labor[e, a] += gather.collect_labor
+                    n_consumed[e] += 1
+                    for n, i, g, loc in zip(e, a, n_gathered, zip(r, c)):
+                        gathers[n].append(
+                            dict(
+                                agent=int(i),
+                                resource=name,
+                                n=g,
+                                loc=[int(loc[0]), int(loc[1])],
+                            )
+                        )
+                n_present += health > 0
+
+        for n, i in zip(*np.nonzero(moved)):
+            world = self.envs[n].world
+            loc = self._locs[n, i].tolist()
+            world.agents[i].state["loc"] = loc
+            world.maps._agent_locs[i] = list(loc)
+        for n, component in enumerate(components):
+            component.gathers.append(gathers[n])
+            self.envs[n].world.maps._version += int(n_consumed[n])
+
+    def _step_market(self, components):
+        market = components[0]
+        hists = self._market
+        coin = self._column("inventory", "Coin")
+        coin_escrow = self._column("escrow", "Coin")
+        labor = self._column("endogenous", "Labor")
+
+        for k, resource in enumerate(market.commodities):
+            bids = self._action_column("{}.Buy_{}".format(market.name, resource))
+            asks = self._action_column("{}.Sell_{}".format(market.name, resource))
+            for actions in [bids, asks]:
+                if np.any((actions < 0) | (actions > market.max_bid_ask + 1)):
+                    raise ValueError
+
+            hists["price_history"][:, k] *= 0.995
+            n_orders = hists["bid_hists"][:, k].sum(axis=2) + hists["ask_hists"][
+                :, k
+            ].sum(axis=2)
+
+            # Bids: the payment goes to escrow
+            bid_prices = bids - 1
+            new_bids = (
+                (bids > 0) & (n_orders < market.max_num_orders) & (coin >= bid_prices)
+            )
+            coin[new_bids] -= bid_prices[new_bids]
+            coin_escrow[new_bids] += bid_prices[new_bids]
+            labor[new_bids] += market.order_labor
+            n_orders += new_bids
+
+            # Asks: one unit of the resource goes to escrow
+            ask_prices = asks - 1
+            inventory = self._column("inventory", resource)
+            new_asks = (asks > 0) & (n_orders < market.max_num_orders) & (inventory > 0)
+            inventory[new_asks] -= 1
+            self._column("escrow", resource)[new_asks] += 1
+            labor[new_asks] += market.order_labor
+
+            # The orders enter each book in agent order (bid before ask)
+            for n in np.flatnonzero(np.any(new_bids | new_asks, axis=1)):
+                book = components[n].books[resource]
+                for i in np.flatnonzero(new_bids[n] | new_asks[n]):
+                    if new_bids[n, i]:
+                        book.add_bid(int(i), int(bid_prices[n, i]))
+                    if new_asks[n, i]:
+                        book.add_ask(int(i), int(ask_prices[n, i]))
+
+        for component in components:
+            component.match_orders()
+            component.remove_expired_orders()
+
+    def _step_tax(self, components):
+        for env_idx, tax in enumerate(components):
+            tax_cycle_pos = tax.tax_cycle_pos
+            tax.component_step()
+            if tax_cycle_pos == 1 or tax_cycle_pos >= tax.period:
+                self._cache_tax_state(env_idx, tax)
+
+    def _regenerate(self):
+        """Batched scenario_step: stochastic regeneration of Wood and Stone."""
+        env = self.envs[0]
+        maps = env.world.maps
+        p = maps.padding
+        height, width = self.world_size
+
+        if self._regen_sources is None:
+            self._regen_sources = {}
+            for resource in _REGEN_RESOURCES:
+                per_env = self._regen_source_idx[resource]
+                self._regen_sources[resource] = (
+                    np.concatenate(
+                        [n * height * width + idx for n, idx in enumerate(per_env)]
+                    ),
+                    [len(idx) for idx in per_env],
+                )
+
+        for resource in _REGEN_RESOURCES:
+            spec = env.layout_specs[resource]
+            halfwidth = int(spec["regen_halfwidth"])
+            d = 1 + (2 * halfwidth)
+            kernel_value = float(spec["regen_weight"]) * 1.0 / (d ** 2)
+
+            resource_map = self._maps[resource]
+            health = np.maximum(resource_map, self._maps[resource + "SourceBlock"])
+            source_idx, n_sources = self._regen_sources[resource]
+            probabilities = (
+                _window_sums(health, halfwidth).reshape(-1)[source_idx] * kernel_value
+            )
+            draws = np.concatenate(
+                [e.rng.random(n) for e, n in zip(self.envs, n_sources)]
+            )
+            respawn_idx = source_idx[draws < probabilities]
+            flat_map = resource_map.reshape(-1)
+            new_health = np.maximum(
+                0, np.minimum(flat_map[respawn_idx] + 1, spec["max_health"])
+            )
+            flat_map[respawn_idx] = new_health
+            env_idx, rows, cols = np.unravel_index(respawn_idx, resource_map.shape)
+            self._maps["padded_state"][
+                env_idx, maps._state_lookup[resource], rows + p, cols + p
+            ] = new_health
+
+        for env in self.envs:
+            env.world.maps._version += len(_REGEN_RESOURCES)
+            # The incremental state of the env's own regenerators is now stale
+            env._regenerators = None
+
+    # Observations, masks and rewards
+    # -------------------------------
+
+    def _observe_scenario(self):
+        """Batched generate_observations of the scenario."""
+        env = self.envs[0]
+        maps = env.world.maps
+        n_agents = self.n_agents
+        height, width = self.world_size
+        p = maps.padding
+        interior = (slice(p, p + height), slice(p, p + width))
+        own_idx = (np.arange(n_agents) + 2)[None, :, None, None, None]
+
+        agent_obs, planner_obs, agent_wise_obs = {}, {}, {}
+        for name in self.resources:
+            inventory = self._tables["inventory"][
+                :, :, self._table_columns["inventory"][name]
+            ]
+            agent_obs["inventory-" + name] = inventory[:, :n_agents] * env.inv_scale
+            planner_obs["inventory-" + name] = inventory[:, n_agents] * env.inv_scale
+
+        if env._planner_gets_spatial_info or env._full_observability:
+            curr_map = self._maps["padded_state"][
+                (slice(None), slice(0, -1)) + interior
+            ]
+            idx_maps = self._maps["padded_idx"][(slice(None), slice(None)) + interior]
+            idx_maps = idx_maps + 2
+            idx_maps[idx_maps == 1] = 0
+        if env._planner_gets_spatial_info:
+            planner_obs.update(map=curr_map, idx_map=idx_maps)
+
+        if env._full_observability:
+            agent_obs["map"] = np.broadcast_to(
+                curr_map[:, None], (self.n_envs, n_agents) + curr_map.shape[1:]
+            )
+            my_maps = np.repeat(idx_maps[:, None], n_agents, axis=1)
+            my_maps[my_maps == own_idx] = 1
+            agent_obs["idx_map"] = my_maps
+            return agent_obs, planner_obs, agent_wise_obs
+
+        # Egocentric windows (see Maps.egocentric_windows)
+        w = env._mobile_agent_observation_range
+        assert p >= w
+        d = 1 + 2 * w
+        env_idx = np.arange(self.n_envs)[:, None]
+        rows = self._locs[..., 0] + (p - w)
+        cols = self._locs[..., 1] + (p - w)
+        windows = []
+        for name in ["padded_state", "padded_idx"]:
+            view = sliding_window_view(self._maps[name], (d, d), axis=(2, 3))
+            windows.append(view.transpose(0, 2, 3, 1, 4, 5)[env_idx, rows, cols])
+        visible_maps, visible_idxs = windows
+        visible_idxs = np.where(visible_idxs >= 0, visible_idxs + 2, 0)
+        visible_idxs[visible_idxs == own_idx] = 1
+        agent_obs["map"] = visible_maps
+        agent_obs["idx_map"] = visible_idxs
+        agent_obs["loc-row"] = self._locs[..., 0] / height
+        agent_obs["loc-col"] = self._locs[..., 1] / width
+
+        for name in self.resources:
+            agent_wise_obs["inventory-" + name] = agent_obs["inventory-" + name]
+        if env._planner_gets_spatial_info:
+            agent_wise_obs["loc-row"] = agent_obs["loc-row"]
+            agent_wise_obs["loc-col"] = agent_obs["loc-col"]
+        return agent_obs, planner_obs, agent_wise_obs
+
+    def _observe_build(self, components):
+        build = components[0]
+        agent_obs = dict(
+            build_payment=self._column("extra", "build_payment") / build.payment,
+            build_skill=self._build_skills,
+        )
+        return agent_obs, {}, {}
+
+    def _observe_gather(self, components):
+        agent_obs = dict(bonus_gather_prob=self._column("extra", "bonus_gather_prob"))
+        return agent_obs, {}, {}
+
+    def _observe_market(self, components):
+        market = components[0]
+        hists = self._market
+        shape = (self.n_envs, self.n_agents)
+        prices = np.arange(market.price_floor, market.price_ceiling + 1)
+
+        agent_obs, planner_obs = {}, {}
+        for k, c in enumerate(market.commodities):
+            net_price_history = hists["price_history"][:, k].sum(axis=1)
+            # (equal to the per-env market rate up to float64 rounding)
+            market_rate = net_price_history.dot(prices) / np.maximum(
+                0.001, np.sum(net_price_history, axis=-1)
+            )
+            scaled_price_history = net_price_history * market.inv_scale
+            full_asks = hists["ask_total"][:, k]
+            full_bids = hists["bid_total"][:, k]
+            my_asks = hists["ask_hists"][:, k]
+            my_bids = hists["bid_hists"][:, k]
+
+            planner_obs.update(
+                {
+                    "market_rate-{}".format(c): market_rate,
+                    "price_history-{}".format(c): scaled_price_history,
+                    "full_asks-{}".format(c): full_asks,
+                    "full_bids-{}".format(c): full_bids,
+                }
+            )
+            agent_obs.update(
+                {
+                    "market_rate-{}".format(c): np.broadcast_to(
+                        market_rate[:, None], shape
+                    ),
+                    "price_history-{}".format(c): np.broadcast_to(
+                        scaled_price_history[:, None], my_asks.shape
+                    ),
+                    "available_asks-{}".format(c): full_asks[:, None] - my_asks,
+                    "available_bids-{}".format(c): full_bids[:, None] - my_bids,
+                    "my_asks-{}".format(c): my_asks,
+                    "my_bids-{}".format(c): my_bids,
+                }
+            )
+        return agent_obs, planner_obs, {}
+
+    def _observe_tax(self, components):
+        tax = components[0]
+        cached = self._tax
+        shape = (self.n_envs, self.n_agents)
+
+        tax_cycle_pos = np.array([c.tax_cycle_pos for c in components])
+        is_tax_day = (tax_cycle_pos >= tax.period).astype(np.float64)
+        is_first_day = (tax_cycle_pos == 1).astype(np.float64)
+        tax_phase = tax_cycle_pos / tax.period
+
+        # The marginal rate each agent's next unit of income would be taxed at
+        incomes = (
+            self._column("inventory", "Coin") + self._column("escrow", "Coin")
+        ) - cached["last_coin"]
+        bracket_idx = np.maximum(
+            0, np.searchsorted(tax.bracket_cutoffs, incomes, side="right") - 1
+        )
+        curr_marginal_rate = np.where(
+            incomes < 0, 0.0, np.take_along_axis(cached["rates"], bracket_idx, axis=1)
+        )
+        for env_idx, component in enumerate(components):
+            component._curr_marginal_rate_obs = curr_marginal_rate[env_idx]
+
+        planner_obs = dict(
+            is_tax_day=is_tax_day,
+            is_first_day=is_first_day,
+            tax_phase=tax_phase,
+            last_incomes=cached["last_incomes"],
+            curr_rates=cached["curr_rates"],
+        )
+        agent_obs = dict(
+            is_tax_day=np.broadcast_to(is_tax_day[:, None], shape),
+            is_first_day=np.broadcast_to(is_first_day[:, None], shape),
+            tax_phase=np.broadcast_to(tax_phase[:, None], shape),
+            last_incomes=np.broadcast_to(
+                cached["last_incomes"][:, None], shape + (self.n_agents,)
+            ),
+            curr_rates=np.broadcast_to(
+                cached["curr_rates"][:, None], shape + cached["curr_rates"].shape[1:]
+            ),
+            marginal_rate=curr_marginal_rate,
+        )
+        if "all_taxes" in cached:
+            agent_obs["all_taxes"] = np.broadcast_to(
+                cached["all_taxes"][:, None], shape + cached["all_taxes"].shape[1:]
+            )
+        agent_wise_obs = dict(
+            last_income=cached["last_income"],
+            last_marginal_rate=cached["last_marginal_rate"],
+            curr_marginal_rate=curr_marginal_rate,
+        )
+        return agent_obs, planner_obs, agent_wise_obs
+
+    def _raw_observations(self):
+        """Return the batched (agent, planner, agent-wise planner) observations, as
+        {key: array} dictionaries with the keys of BaseEnvironment observations."""
+        scenario_obs = self._observe_scenario()
+        agent_obs, planner_obs, agent_wise_obs = [
+            {"world-" + k: v for k, v in o.items()} for o in scenario_obs
+        ]
+
+        env = self.envs[0]
+        time_scale = env.episode_length if env._allow_observation_scaling else 1.0
+        time = np.array([e.world.timestep / time_scale for e in self.envs])
+        agent_obs["time"] = np.broadcast_to(
+            time[:, None, None], (self.n_envs, self.n_agents, 1)
+        )
+        planner_obs["time"] = time[:, None]
+
+        for (_, observe, _), components in self._kernels:
+            component_obs = observe(components)
+            name = components[0].name
+            for all_obs, o in zip(
+                [agent_obs, planner_obs, agent_wise_obs], component_obs
+            ):
+                all_obs.update({name + "-" + k: v for k, v in o.items()})
+        return agent_obs, planner_obs, agent_wise_obs
+
+    def _observation_layouts(self):
+        """Return the (keep_as_is, layout) packagers (see BaseEnvironment) of the
+        agents, the planner and the agent-wise planner observations."""
+        packagers = self.envs[0]._packagers
+        layouts = [packagers["0"], packagers["p"], packagers.get("p0", ([], []))]
+        for i in range(1, self.n_agents):
+            assert packagers[str(i)][1] == layouts[0][1]
+            assert packagers.get("p" + str(i), ([], []))[1] == layouts[2][1]
+        return layouts
+
+    def _check_observations(self):
+        """Return True if the batched observations have the keys of the envs'."""
+        for (keep_as_is, layout), obs in zip(self._layouts, self._raw_observations()):
+            keys = set(k for k, _, _, _ in layout) | set(keep_as_is)
+            if keys - {"action_mask"} != set(obs):
+                return False
+        return True
+
+    def _observe(self):
+        """Write the observations of all N environments into the output buffers."""
+        layouts = self._layouts
+        raw_obs = self._raw_observations()
+        buffers = self._obs_buffers
+
+        for (keep_as_is, layout), obs, group in zip(layouts[:2], raw_obs, ["a", "p"]):
+            flat = buffers[group]["flat"]
+            lead = flat.shape[:-1]
+            for k, start, stop, _ in layout:
+                flat[..., start:stop] = np.reshape(obs[k], lead + (stop - start,))
+            for k in keep_as_is:
+                if k != "action_mask":
+                    buffers[group][k][...] = obs[k]
+
+        layout = layouts[2][1]
+        if layout:
+            agent_wise_obs = raw_obs[2]
+            for i in range(self.n_agents):
+                flat = buffers["p"]["p" + str(i)]
+                for k, start, stop, _ in layout:
+                    flat[:, start:stop] = np.reshape(
+                        agent_wise_obs[k][:, i], (self.n_envs, stop - start)
+                    )
+
+        self._mask()
+
+    def _mask_layout(self):
+        """Return the {action name: slice} and the no-op indices of the flat agent
+        action masks (see BaseAgent.flatten_masks)."""
+        agent = self.envs[0].world.agents[0]
+        slices, no_op_idx = {}, []
+        start = 0
+        if not agent.multi_action_mode:
+            no_op_idx.append(0)
+            start = 1
+        for name in agent._action_names:
+            size = agent.action_dim[name]
+            if agent.multi_action_mode:
+                no_op_idx.append(start)
+                start += 1
+                size -= 1
+            slices[name] = slice(start, start + size)
+            start += size
+        assert start == self._obs_buffers["a"]["action_mask"].shape[-1]
+        return slices, no_op_idx
+
+    def _mask_build(self, components, masks, slices):
+        masks[..., slices[components[0].name]] = self._can_build(components[0])[
+            ..., None
+        ]
+
+    def _mask_gather(self, components, masks, slices):
+        height, width = self.world_size
+        rows = self._locs[..., 0][..., None] + _MOVE_ROWS[1:]
+        cols = self._locs[..., 1][..., None] + _MOVE_COLS[1:]
+        in_bounds = (rows >= 0) & (rows < height) & (cols >= 0) & (cols < width)
+        rows = np.clip(rows, 0, height - 1)
+        cols = np.clip(cols, 0, width - 1)
+        env_idx = np.arange(self.n_envs)[:, None, None]
+        agent_idx = np.arange(self.n_agents)[None, :, None]
+        can_move = in_bounds & self._maps["unoccupied"][env_idx, rows, cols]
+        accessibility = self._maps.get("accessibility")
+        if accessibility is not None:
+            can_move &= accessibility[env_idx, :, agent_idx, rows, cols].all(axis=-1)
+        masks[..., slices[components[0].name]] = can_move
+
+    def _mask_market(self, components, masks, slices):
+        market = components[0]
+        hists = self._market
+        can_pay = (
+            np.arange(market.max_bid_ask + 1)
+            <= self._column("inventory", "Coin")[..., None]
+        )
+        for k, resource in enumerate(market.commodities):
+            n_orders = hists["bid_hists"][:, k].sum(axis=2) + hists["ask_hists"][
+                :, k
+            ].sum(axis=2)
+            can_order = n_orders < market.max_num_orders
+            can_ask = can_order & (self._column("inventory", resource) > 0)
+            buy = slices["{}.Buy_{}".format(market.name, resource)]
+            sell = slices["{}.Sell_{}".format(market.name, resource)]
+            masks[..., buy] = can_pay & can_order[..., None]
+            masks[..., sell] = can_ask[..., None]
+
+    def _mask(self):
+        """Write the action masks of all N environments into the output buffers."""
+        masks = self._obs_buffers["a"]["action_mask"]
+        masks[..., self._no_op_idx] = 1
+        for (_, _, mask), components in self._kernels:
+            if mask is not None:
+                mask(components, masks, self._mask_slices)
+
+        # Planner masks (only the tax component has planner actions)
+        planner_masks = self._obs_buffers["p"]["action_mask"]
+        for env_idx, env in enumerate(self.envs):
+            tax = self._components[env_idx].get("PeriodicBracketTax")
+            if tax is None:
+                continue
+            planner = env.world.planner
+            mask = tax.generate_masks(completions=env._completions).get(planner.idx)
+            # The tax component hands out the same (cached) masks until they change
+            if mask is None or mask is self._planner_mask_cache[env_idx]:
+                continue
+            self._planner_mask_cache[env_idx] = mask
+            if isinstance(mask, dict):
+                mask_dict = {"{}.{}".format(tax.name, k): v for k, v in mask.items()}
+            else:
+                mask_dict = {tax.name: mask}
+            planner_masks[env_idx] = planner.flatten_masks(mask_dict)
+
+    def _compute_rewards(self):
+        """Batched compute_reward of the scenario."""
+        env = self.envs[0]
+        coin_endowments = self.total_endowment("Coin")
+        labor_coefficients = np.array(
+            [[e.energy_weight * e.energy_cost] for e in self.envs]
+        )
+        utilities = rewards.isoelastic_coin_minus_labor(
+            coin_endowment=coin_endowments,
+            total_labor=self._column("endogenous", "Labor"),
+            isoelastic_eta=env.isoelastic_eta,
+            labor_coefficient=labor_coefficients,
+        )
+        welfare = rewards.planner_social_welfare(
+            env.planner_reward_type,
+            coin_endowments=coin_endowments,
+            utilities=utilities,
+            equality_weight=1 - env.mixing_weight_gini_vs_coin,
+        )
+
+        agent_rew = utilities - self._utilities
+        if self._hetero:
+            tree_count = self._maps["Wood"].sum(axis=(1, 2))
+            equality = social_metrics.get_equality(coin_endowments)
+            agent_rew += (
+                tree_count[:, None] * self._env_weighting
+                + self._equality_weighting * equality[:, None]
+            )
+        self._agent_rew[:] = agent_rew
+        self._planner_rew[:] = welfare - self._welfare
+
+        warm_up = agent_rew.mean(axis=1) > 0
+        for env_idx, e in enumerate(self.envs):
+            metric = dict(enumerate(utilities[env_idx].tolist()))
+            metric[e.world.planner.idx] = float(welfare[env_idx])
+            e.prev_optimization_metric.update(e.curr_optimization_metric)
+            e.curr_optimization_metric = metric
+            if warm_up[env_idx]:
+                e._auto_warmup_integrator += 1
+        self._utilities = utilities
+        self._welfare = welfare
+
+    # Observations
+    # ------------
+
+    @staticmethod
+    def _flat_items(obs, prefix=""):
+        """Yield (key, value) pairs of obs, joining nested dictionary keys w/ '/'."""
+        for k, v in obs.items():
+            if isinstance(v, dict):
+                yield from EnvironmentBatch._flat_items(v, prefix + k + "/")
+            else:
+                yield prefix + k, v
+
+    def _build_obs_buffers(self, obs):
+        buffers = {"a": {}, "p": {}}
+        for k, v in self._flat_items(obs["0"]):
+            v = np.asarray(v)
+            buffers["a"][k] = np.zeros(
+                (self.n_envs, self.n_agents) + v.shape, dtype=v.dtype
+            )
+        for k, v in self._flat_items(obs["p"]):
+            v = np.asarray(v)
+            buffers["p"][k] = np.zeros((self.n_envs,) + v.shape, dtype=v.dtype)
+        return buffers
+
+    def _write_obs(self, env_idx, obs):
+        if self._obs_buffers is None:
+            self._obs_buffers = self._build_obs_buffers(obs)
+        agent_buffers = self._obs_buffers["a"]
+        for i in range(self.n_agents):
+            for k, v in self._flat_items(obs[str(i)]):
+                agent_buffers[k][env_idx, i] = v
+        planner_buffers = self._obs_buffers["p"]
+        for k, v in self._flat_items(obs["p"]):
+            planner_buffers[k][env_idx] = v
+
+    # Core control of environment execution
+    # -------------------------------------
+
+    def _reset_env(self, env_idx):
+        obs = self.envs[env_idx].reset()
+        self._bind_env(env_idx)
+        self._write_obs(env_idx, obs)
+
+    def reset(self):
+        """
+        Reset all N environments.
+
+        Returns:
+            obs (dict): {"a": {key: [N, n_agents, ...] array},
+                "p": {key: [N, ...] array}}
+        """
+        for env_idx, env in enumerate(self.envs):
+            self._write_obs(env_idx, env.reset())
+        first_reset = self._tables is None
+        if first_reset:
+            self._allocate_storage()
+        for env_idx in range(self.n_envs):
+            self._bind_env(env_idx)
+        if first_reset and self._batched:
+            # Fall back to stepping env by env if the observations of the envs are
+            # not those computed here (e.g. for unexpected configurations)
+            self._batched = self._check_observations()
+        self._done[:] = False
+        return self._obs_buffers
+
+    def step(self, agent_actions=None, planner_actions=None):
+        """
+        Advance all N environments by one timestep.
+
+        Args:
+            agent_actions (ndarray): Integer array of mobile agent actions, shaped
+                [N, n_agents] (single action mode) or [N, n_agents, n_subactions]
+                (multi action mode). If None, all agents take the NO-OP action.
+            planner_actions (ndarray): Integer array of planner actions, shaped
+                [N] (single action mode) or [N, n_subactions] (multi action mode).
+                If None, the planner takes the NO-OP action.
+
+        Returns:
+            obs (dict): {"a": {key: [N, n_agents, ...] array},
+                "p": {key: [N, ...] array}}
+            rew (dict): {"a": [N, n_agents] array, "p": [N] array}
+            done (ndarray): [N] boolean array.
+            info (list): Length-N list of info dictionaries. When auto-resetting,
+                the info of an environment that just completed an episode includes
+                that episode's metrics under "metrics".
+        """
+        assert self._tables is not None, "Call reset() first."
+        if agent_actions is not None:
+            agent_actions = np.asarray(agent_actions)
+            assert agent_actions.shape[:2] == (self.n_envs, self.n_agents)
+            assert agent_actions.ndim == (3 if self.multi_action_mode_agents else 2)
+        if planner_actions is not None:
+            planner_actions = np.asarray(planner_actions)
+            assert planner_actions.shape[0] == self.n_envs
+            assert planner_actions.ndim == (2 if self.multi_action_mode_planner else 1)
+
+        if self._batched and not any(self._steps_alone(env) for env in self.envs):
+            info = self._step_batch(agent_actions, planner_actions)
+        else:
+            info = self._step_envs(agent_actions, planner_actions)
+
+        rew = {"a": self._agent_rew, "p": self._planner_rew}
+        return self._obs_buffers, rew, self._done, info
+
+    @staticmethod
+    def _steps_alone(env):
+        """Return True if env needs its own BaseEnvironment.step this timestep."""
+        return (
+            env._dense_log_this_episode
+            or env._replay_checkpoint_frequency is not None
+            or env._profiler is not None
+        )
+
+    def _step_batch(self, agent_actions, planner_actions):
+        """Step all N environments on the stacked arrays (see class docstring)."""
+        if agent_actions is not None:
+            # Copied, since the replay logs keep the actions
+            agent_actions = np.array(agent_actions, dtype=np.int64)
+            self._action_table.parse_actions(
+                agent_actions.reshape((-1,) + agent_actions.shape[2:])
+            )
+        if planner_actions is not None:
+            planner_actions = np.array(planner_actions, dtype=np.int64)
+        for env_idx, env in enumerate(self.envs):
+            replay_step = dict(
+                actions=None if agent_actions is None else agent_actions[env_idx]
+            )
+            if planner_actions is not None:
+                env.world.planner.parse_actions(planner_actions[env_idx])
+                replay_step["planner_actions"] = planner_actions[env_idx]
+            env._replay_log["step"].append(replay_step)
+            env.world.timestep += 1
+
+        for (step, _, _), components in self._kernels:
+            step(components)
+        self._regenerate()
+
+        self._observe()
+        self._compute_rewards()
+        self._done[:] = [env.world.timestep >= env.episode_length for env in self.envs]
+
+        self._action_table.reset()
+        info = []
+        for env_idx, env in enumerate(self.envs):
+            env.world.planner.reset_actions()
+            env_info = {str(agent.idx): {} for agent in env.all_agents}
+            if self._done[env_idx]:
+                env._finalize_logs()
+                env._completions += 1
+                if self.auto_reset:
+                    env_info["metrics"] = env.previous_episode_metrics
+                    self._reset_env(env_idx)
+            info.append(env_info)
+        return info
+
+    def _step_envs(self, agent_actions, planner_actions):
+        """Step the N environments one at a time, each with its own step."""
+        info = []
+        for env_idx, env in enumerate(self.envs):
+            obs, rew, done, env_info = env.step(
+                None if agent_actions is None else agent_actions[env_idx],
+                planner_actions=(
+                    None if planner_actions is None else planner_actions[env_idx]
+                ),
+            )
+            for i in range(self.n_agents):
+                self._agent_rew[env_idx, i] = rew[str(i)]
+            self._planner_rew[env_idx] = rew["p"]
+            self._done[env_idx] = done["__all__"]
+
+            if self._done[env_idx] and self.auto_reset:
+                env_info = dict(env_info, metrics=env.previous_episode_metrics)
+                self._reset_env(env_idx)
+            else:
+                self._bind_env(env_idx)
+                self._write_obs(env_idx, obs)
+            info.append(env_info)
+        return info
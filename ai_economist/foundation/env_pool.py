@@ -0,0 +1,326 @@
+# Copyright (c) 2020, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+Process-pool executor for stepping many environments in parallel on CPU.
+"""
+
+import multiprocessing as mp
+import random
+import traceback
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from ai_economist.foundation.env_batch import EnvironmentBatch
+
+
+def _array_layout(specs):
+    """Return ({name: (offset, shape, dtype)}, total_bytes) for [(name, shape, dtype)],
+    with each array aligned to 64 bytes."""
+    layout = {}
+    offset = 0
+    for name, shape, dtype in specs:
+        dtype = np.dtype(dtype)
+        layout[name] = (offset, tuple(shape), dtype.str)
+        n_bytes = int(np.prod(shape)) * dtype.itemsize
+        offset += -(-n_bytes // 64) * 64
+    return layout, max(offset, 1)
+
+
+def _array_views(buffer, layout):
+    return {
+        name: np.ndarray(shape, dtype=np.dtype(dtype), buffer=buffer, offset=offset)
+        for name, (offset, shape, dtype) in layout.items()
+    }
+
+
+def _worker(remote, parent_remote, env_config, env_slice, seeds, shm_name, layout):
+    """Run an EnvironmentBatch over env_slice, exchanging data through shm."""
+    parent_remote.close()
+    shm = shared_memory.SharedMemory(name=shm_name)
+    arrays = {}
+    try:
+        arrays.update(_array_views(shm.buf, layout))
+        if seeds is None:
+            # Don't share the (possibly forked) random state of the main process
+            np.random.seed()
+            random.seed()
+        env_batch = EnvironmentBatch(
+            env_config, n_envs=env_slice.stop - env_slice.start, seed=seeds
+        )
+
+        def write(obs, rew=None, done=None):
+            for group in ["a", "p"]:
+                for k, v in obs[group].items():
+                    arrays["obs/{}/{}".format(group, k)][env_slice] = v
+            if rew is not None:
+                arrays["rew/a"][env_slice] = rew["a"]
+                arrays["rew/p"][env_slice] = rew["p"]
+                arrays["done"][env_slice] = done
+
+        while True:
+            cmd, data = remote.recv()
+            try:
+                if cmd == "reset":
+                    write(env_batch.reset())
+                    arrays["done"][env_slice] = False
+                    remote.send(("ok", None))
+                elif cmd == "step":
+                    use_agent_actions, use_planner_actions = data
+                    agent_actions = arrays["actions/a"][env_slice]
+                    planner_actions = arrays["actions/p"][env_slice]
+                    obs, rew, done, info = env_batch.step(
+                        agent_actions if use_agent_actions else None,
+                        planner_actions if use_planner_actions else None,
+                    )
+                    write(obs, rew, done)
+                    remote.send(("ok", info))
+                elif cmd == "close":
+                    remote.send(("ok", None))
+                    break
+                else:
+                    raise NotImplementedError(cmd)
+            except Exception:  # Report to the main process, which raises
+                remote.send(("error", traceback.format_exc()))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        arrays.clear()
+        shm.close()
+        remote.close()
+
+
+class EnvPool:
+    """
+    Shards N copies of a scenario across a pool of worker processes.
+
+    Each worker process runs an EnvironmentBatch over its shard of the
+    environments. Actions, observations, rewards and dones are exchanged through
+    a single shared memory block, with arrays laid out by agent type ("a" for the
+    mobile agents, "p" for the planner), in the same format as
+    EnvironmentBatch:
+        agent actions: [N, n_agents] (or [N, n_agents, n_subactions] in multi
+            action mode), planner actions: [N] (or [N, n_subactions]);
+        observations: {"a": {key: [N, n_agents, ...]}, "p": {key: [N, ...]}};
+        rewards: {"a": [N, n_agents], "p": [N]}; dones: [N].
+    Only the (small) info dictionaries go through pipes.
+
+    step_async sends actions to all workers, which step their environments in
+    parallel while the caller does other work (e.g. computes the next actions for
+    another pool); step_wait collects the results. Environments whose episode
+    completes are reset automatically (see EnvironmentBatch).
+
+    The returned arrays are views of the shared memory block; they are overwritten
+    on the next call to reset or step_wait. Call close (or use the pool as a
+    context manager) to shut down the workers and free the shared memory.
+
+    Example:
+        from ai_economist.foundation.env_pool import EnvPool
+
+        with EnvPool(env_config, n_envs=64, n_workers=8, seed=1) as pool:
+            obs = pool.reset()
+            agent_actions = np.zeros((64, pool.n_agents), dtype=np.int64)
+            pool.step_async(agent_actions)
+            obs, rew, done, info = pool.step_wait()
+
+    Args:
+        env_config (dict): Environment configuration, as used with
+            foundation.make_env_instance (that is, it must include "scenario_name").
+        n_envs (int): Number of environment copies.
+        n_workers (int, optional): Number of worker processes. Defaults to the
+            number of CPUs (but at most n_envs). Environments are split as evenly as
+            possible across workers.
+        seed (int, optional): If provided, each environment is seeded with its own
+            child of np.random.SeedSequence(seed), as in EnvironmentBatch. The
+            random number streams therefore don't overlap across pools with
+            different seeds, and don't depend on n_workers.
+        context (str, optional): The multiprocessing start method ("fork",
+            "spawn" or "forkserver"). Defaults to the platform default.
+    """
+
+    def __init__(self, env_config, n_envs=1, n_workers=None, seed=None, context=None):
+        self.n_envs = int(n_envs)
+        assert self.n_envs >= 1
+        if n_workers is None:
+            n_workers = mp.cpu_count()
+        self.n_workers = max(1, min(int(n_workers), self.n_envs))
+
+        # Lay out the shared arrays, using a local environment to find the
+        # observation structure
+        probe = EnvironmentBatch(env_config, n_envs=1)
+        probe_obs = probe.reset()
+        self.n_agents = probe.n_agents
+        self.episode_length = probe.episode_length
+        self.multi_action_mode_agents = probe.multi_action_mode_agents
+        self.multi_action_mode_planner = probe.multi_action_mode_planner
+        env = probe.envs[0]
+        agent_action_shape = (self.n_envs, self.n_agents)
+        if self.multi_action_mode_agents:
+            agent_action_shape += (len(env.world.agents[0].action_spaces),)
+        planner_action_shape = (self.n_envs,)
+        if self.multi_action_mode_planner:
+            planner_action_shape += (len(env.world.planner.action_spaces),)
+
+        specs = [
+            ("actions/a", agent_action_shape, np.int64),
+            ("actions/p", planner_action_shape, np.int64),
+            ("rew/a", (self.n_envs, self.n_agents), np.float32),
+            ("rew/p", (self.n_envs,), np.float32),
+            ("done", (self.n_envs,), bool),
+        ]
+        for group in ["a", "p"]:
+            for k, v in probe_obs[group].items():
+                name = "obs/{}/{}".format(group, k)
+                specs.append((name, (self.n_envs,) + v.shape[1:], v.dtype))
+        del probe, env
+
+        layout, n_bytes = _array_layout(specs)
+        self._shm = shared_memory.SharedMemory(create=True, size=n_bytes)
+        self._arrays = _array_views(self._shm.buf, layout)
+        self._obs = {
+            group: {
+                name.split("/", 2)[2]: array
+                for name, array in self._arrays.items()
+                if name.startswith("obs/{}/".format(group))
+            }
+            for group in ["a", "p"]
+        }
+        self._rew = {"a": self._arrays["rew/a"], "p": self._arrays["rew/p"]}
+
+        # Start the workers
+        bounds = np.linspace(0, self.n_envs, self.n_workers + 1).astype(int)
+        self._slices = [slice(a, b) for a, b in zip(bounds[:-1], bounds[1:])]
+        # One child seed per environment, so that the random number streams don't
+        # depend on how environments are split across workers
+        env_seeds = None
+        if seed is not None:
+            env_seeds = np.random.SeedSequence(int(seed)).spawn(self.n_envs)
+        ctx = mp.get_context(context)
+        self._remotes, self._processes = [], []
+        for env_slice in self._slices:
+            remote, work_remote = ctx.Pipe()
+            process = ctx.Process(
+                target=_worker,
+                args=(
+                    work_remote,
+                    remote,
+                    env_config,
+                    env_slice,
+                    None if env_seeds is None else env_seeds[env_slice],
+                    self._shm.name,
+                    layout,
+                ),
+                daemon=True,
+            )
+            process.start()
+            work_remote.close()
+            self._remotes.append(remote)
+            self._processes.append(process)
+
+        self._waiting = False
+        self._closed = False
+
+    def _gather(self):
+        results = [remote.recv() for remote in self._remotes]
+        errors = [data for status, data in results if status == "error"]
+        if errors:
+            raise RuntimeError("EnvPool worker error:\n" + errors[0])
+        return [data for _, data in results]
+
+    def reset(self):
+        """
+        Reset all N environments.
+
+        Returns:
+            obs (dict): {"a": {key: [N, n_agents, ...] array},
+                "p": {key: [N, ...] array}}
+        """
+        assert not self._waiting
+        for remote in self._remotes:
+            remote.send(("reset", None))
+        self._gather()
+        return self._obs
+
+    def step_async(self, agent_actions=None, planner_actions=None):
+        """
+        Start advancing all N environments by one timestep (see step_wait).
+
+        Args:
+            agent_actions (ndarray): Integer array of mobile agent actions (see
+                EnvironmentBatch.step). If None, agents take the NO-OP action.
+            planner_actions (ndarray): Integer array of planner actions. If None,
+                the planner takes the NO-OP action.
+        """
+        assert not self._waiting
+        if agent_actions is not None:
+            self._arrays["actions/a"][:] = agent_actions
+        if planner_actions is not None:
+            self._arrays["actions/p"][:] = planner_actions
+        use_actions = (agent_actions is not None, planner_actions is not None)
+        for remote in self._remotes:
+            remote.send(("step", use_actions))
+        self._waiting = True
+
+    def step_wait(self):
+        """
+        Wait for the step started by step_async to complete.
+
+        Returns:
+            obs (dict): {"a": {key: [N, n_agents, ...] array},
+                "p": {key: [N, ...] array}}
+            rew (dict): {"a": [N, n_agents] array, "p": [N] array}
+            done (ndarray): [N] boolean array.
+            info (list): Length-N list of info dictionaries (see
+                EnvironmentBatch.step).
+        """
+        assert self._waiting
+        self._waiting = False
+        infos = self._gather()
+        info = [env_info for worker_info in infos for env_info in worker_info]
+        return self._obs, self._rew, self._arrays["done"], info
+
+    def step(self, agent_actions=None, planner_actions=None):
+        """step_async followed by step_wait."""
+        self.step_async(agent_actions, planner_actions)
+        return self.step_wait()
+
+    def close(self):
+        """Shut down the worker processes and free the shared memory."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._waiting:
+            try:
+                self._gather()
+            except (RuntimeError, EOFError):
+                pass
+        for remote, process in zip(self._remotes, self._processes):
+            try:
+                remote.send(("close", None))
+                remote.recv()
+            except (BrokenPipeError, EOFError):
+                pass
+            remote.close()
+            process.join()
+        self._obs = self._rew = self._arrays = None
+        try:
+            self._shm.close()
+        except BufferError:
+            # Arrays returned by the pool are still referenced; the memory is
+            # released along with them.
+            pass
+        self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __del__(self):
+        if not getattr(self, "_closed", True):
+            self.close()
@@ -6,8 +6,28 @@
 
 from ai_economist.foundation.base.base_env import scenario_registry
 
-from .one_step_economy import one_step_economy
-from .simple_wood_and_stone import dynamic_layout, layout_from_file
-from .hetero_agents import dynamic_layout, layout_from_file
-# Import files that add Scenario class(es) to scenario_registry
-# -------------------------------------------------------------
+# Declare the modules that add Scenario class(es) to scenario_registry
+# --------------------------------------------------------------------
+# Each module is only imported when one of its scenarios is first requested
+# (see Registry.add_lazy). The dynamic layouts of simple_wood_and_stone are
+# superseded by those of hetero_agents.
+_SCENARIO_MODULES = {
+    "covid19.covid19_env": ["CovidAndEconomySimulation"],
+    "hetero_agents.dynamic_layout": [
+        "multi_zone/simple_wood_and_stone",
+        "quadrant/simple_wood_and_stone",
+        "uniform/simple_wood_and_stone",
+    ],
+    "hetero_agents.layout_from_file": [
+        "layout_from_file/hetero_agents",
+        "split_layout/simple_wood_and_stone",
+    ],
+    "one_step_economy.one_step_economy": ["one-step-economy"],
+    "simple_wood_and_stone.layout_from_file": [
+        "layout_from_file/simple_wood_and_stone"
+    ],
+}
+
+for _module, _names in _SCENARIO_MODULES.items():
+    for _name in _names:
+        scenario_registry.add_lazy(_name, "{}.{}".format(__name__, _module))
@@ -0,0 +1,249 @@
+# Copyright (c) 2021, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+Loading of the real-world data and fitted model of the COVID-19 simulation.
+
+The data directory holds "model_constants.json", "fitted_params.json" and
+"real_world_data.npz". Rather than parsing these for every environment,
+load_model_data compiles them once into a cache bundle of .npy files (keyed by a
+hash of the input files), which is then memory-mapped read-only: the environments of
+all the processes of a user share a single copy of the data. The cache is private
+to the user: bundles are only trusted if they, and the cache directory, are owned by
+the user and can't be written by others.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import stat
+import tempfile
+
+import numpy as np
+
+# Bump when the contents of the cache bundles change
+CACHE_FORMAT_VERSION = 1
+
+MODEL_CONSTANTS_FILE = "model_constants.json"
+FITTED_PARAMS_FILE = "fitted_params.json"
+REAL_WORLD_DATA_FILE = "real_world_data.npz"
+_INPUT_FILES = (MODEL_CONSTANTS_FILE, FITTED_PARAMS_FILE, REAL_WORLD_DATA_FILE)
+
+_PARAMS_FILE = "params.json"
+_REAL_WORLD_DATA_DIR = "real_world_data"
+_UNEMPLOYMENT_FILTERS_DIR = "unemployment_filters"
+
+# Model data already loaded by this process, keyed by the input files' stats
+_loaded_model_data = {}
+
+
+def default_cache_dir():
+    """Default location of the cache bundles, in the cache directory of the user
+    ($XDG_CACHE_HOME, or ~/.cache)."""
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(cache_home, "ai_economist", "covid19")
+
+
+def _check_private_dir(dirname):
+    """Raise a PermissionError unless dirname is owned by the current user and can't
+    be written by other users (so that its contents can be trusted)."""
+    if not hasattr(os, "getuid"):  # No POSIX ownership (i.e. on Windows)
+        return
+    dir_stat = os.stat(dirname)
+    if dir_stat.st_uid != os.getuid() or dir_stat.st_mode & (
+        stat.S_IWGRP | stat.S_IWOTH
+    ):
+        raise PermissionError(
+            "Not using the COVID-19 data cache in '{}': it must be owned by the "
+            "current user and not writable by others. Remove it, or choose another "
+            "data cache directory.".format(dirname)
+        )
+
+
+def unemployment_filters(fitted_params, np_float_dtype=np.float32):
+    """
+    Compute the unemployment filters of the fitted model (see
+    CovidAndEconomyEnvironment.unemployment_step).
+
+    Args:
+        fitted_params (dict): Contents of "fitted_params.json".
+        np_float_dtype (type): Floating point type of the filters.
+
+    Returns:
+        Dictionary with the filter lags "f_ts" and the filters "unemp_conv_filters"
+            ([1, filters, filter_len] arrays), and the state-specific filter weights
+            "repeated_conv_weights" ([states, filters, filter_len] array).
+    """
+    filter_len = int(fitted_params["FILTER_LEN"])
+    conv_lambdas = np.array(fitted_params["CONV_LAMBDAS"], dtype=np_float_dtype)
+    num_filters = len(conv_lambdas)
+    weights = np.array(
+        fitted_params["GROUPED_CONVOLUTIONAL_FILTER_WEIGHTS"], dtype=np_float_dtype
+    )
+    f_ts = np.tile(
+        np.flip(np.arange(filter_len), (0,))[None, None], (1, num_filters, 1)
+    ).astype(np_float_dtype)
+    return {
+        "f_ts": f_ts,
+        "unemp_conv_filters": np.exp(-f_ts / conv_lambdas[None, :, None]),
+        "repeated_conv_weights": np.repeat(
+            weights.reshape(-1, num_filters)[:, :, np.newaxis], filter_len, axis=-1
+        ),
+    }
+
+
+def _check_input_files(path_to_data_and_fitted_params):
+    for filename, instructions in [
+        (
+            MODEL_CONSTANTS_FILE,
+            "Please run the 'gather_real_world_data.ipynb' notebook first",
+        ),
+        (
+            FITTED_PARAMS_FILE,
+            "If you ran the 'gather_real_world_data.ipynb' notebook to download the "
+            "latest real-world data, please also run the 'fit_parameters.ipynb' "
+            "notebook.",
+        ),
+        (
+            REAL_WORLD_DATA_FILE,
+            "Please run the 'gather_real_world_data.ipynb' notebook first",
+        ),
+    ]:
+        assert os.path.isfile(
+            os.path.join(path_to_data_and_fitted_params, filename)
+        ), "Unable to locate '{}' in '{}'.\n{}".format(
+            filename, path_to_data_and_fitted_params, instructions
+        )
+
+
+def _read_input_files(path_to_data_and_fitted_params):
+    params = {}
+    for key, filename in [
+        ("model_constants", MODEL_CONSTANTS_FILE),
+        ("fitted_params", FITTED_PARAMS_FILE),
+    ]:
+        with open(os.path.join(path_to_data_and_fitted_params, filename), "r") as fp:
+            params[key] = json.load(fp)
+    with np.load(
+        os.path.join(path_to_data_and_fitted_params, REAL_WORLD_DATA_FILE)
+    ) as real_world_data_npz:
+        real_world_data = {key: real_world_data_npz[key] for key in real_world_data_npz}
+    return params, real_world_data
+
+
+def input_files_hash(path_to_data_and_fitted_params):
+    """Return the hash of the input files, which keys their cache bundle."""
+    sha = hashlib.sha256(str(CACHE_FORMAT_VERSION).encode())
+    for filename in _INPUT_FILES:
+        sha.update(filename.encode())
+        with open(os.path.join(path_to_data_and_fitted_params, filename), "rb") as fp:
+            for chunk in iter(lambda: fp.read(1 << 20), b""):
+                sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _write_bundle(bundle_dir, path_to_data_and_fitted_params):
+    """Compile the input files into bundle_dir (unless another process did)."""
+    parent_dir = os.path.dirname(bundle_dir)
+    params, real_world_data = _read_input_files(path_to_data_and_fitted_params)
+
+    # Write to a private directory (mode 0o700) first, so other processes never see
+    # a partial bundle
+    tmp_dir = tempfile.mkdtemp(dir=parent_dir, prefix=".tmp_")
+    try:
+        with open(os.path.join(tmp_dir, _PARAMS_FILE), "w") as fp:
+            json.dump(params, fp)
+        for dirname, arrays in [
+            (_REAL_WORLD_DATA_DIR, real_world_data),
+            (_UNEMPLOYMENT_FILTERS_DIR, unemployment_filters(params["fitted_params"])),
+        ]:
+            os.makedirs(os.path.join(tmp_dir, dirname))
+            for key, array in arrays.items():
+                np.save(os.path.join(tmp_dir, dirname, key + ".npy"), array)
+        try:
+            os.rename(tmp_dir, bundle_dir)
+        except OSError:
+            # Another process wrote the same bundle in the meantime
+            if not os.path.isdir(bundle_dir):
+                raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _map_arrays(dirname):
+    return {
+        os.path.splitext(filename)[0]: np.load(
+            os.path.join(dirname, filename), mmap_mode="r"
+        )
+        for filename in sorted(os.listdir(dirname))
+        if filename.endswith(".npy")
+    }
+
+
+def load_model_data(path_to_data_and_fitted_params, cache_dir=""):
+    """
+    Load the real-world data and the fitted model of the COVID-19 simulation.
+
+    Args:
+        path_to_data_and_fitted_params (dirpath): Directory containing the data,
+            fitted parameters and model constants.
+        cache_dir (dirpath): Directory of the compiled cache bundles. Defaults to
+            the per-user directory returned by default_cache_dir(). If None, the
+            input files are loaded directly, and not shared. The directory (created
+            if needed, with mode 0o700) and its bundles must be owned by the current
+            user and not writable by others, or a PermissionError is raised.
+
+    Returns:
+        Dictionary with the contents of the model constants ("model_constants") and
+            fitted parameters ("fitted_params") files, a dictionary of the arrays of
+            the real-world data file ("real_world_data") and a dictionary of the
+            unemployment filters ("unemployment_filters"; see
+            unemployment_filters). When using the cache, the arrays are read-only
+            memory maps of the cache bundle.
+    """
+    _check_input_files(path_to_data_and_fitted_params)
+
+    if cache_dir is None:
+        params, real_world_data = _read_input_files(path_to_data_and_fitted_params)
+        return dict(
+            params,
+            real_world_data=real_world_data,
+            unemployment_filters=unemployment_filters(params["fitted_params"]),
+        )
+
+    if cache_dir == "":
+        cache_dir = default_cache_dir()
+
+    # Only hash the input files if they changed since this process loaded them
+    key = (os.path.realpath(path_to_data_and_fitted_params), os.path.abspath(cache_dir))
+    for filename in _INPUT_FILES:
+        file_stat = os.stat(os.path.join(path_to_data_and_fitted_params, filename))
+        key += (file_stat.st_size, file_stat.st_mtime_ns)
+    if key in _loaded_model_data:
+        return _loaded_model_data[key]
+
+    os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+    _check_private_dir(cache_dir)
+    bundle_dir = os.path.join(
+        cache_dir, "bundle_" + input_files_hash(path_to_data_and_fitted_params)
+    )
+    if not os.path.isdir(bundle_dir):
+        _write_bundle(bundle_dir, path_to_data_and_fitted_params)
+    _check_private_dir(bundle_dir)
+
+    with open(os.path.join(bundle_dir, _PARAMS_FILE), "r") as fp:
+        model_data = json.load(fp)
+    model_data["real_world_data"] = _map_arrays(
+        os.path.join(bundle_dir, _REAL_WORLD_DATA_DIR)
+    )
+    model_data["unemployment_filters"] = _map_arrays(
+        os.path.join(bundle_dir, _UNEMPLOYMENT_FILTERS_DIR)
+    )
+    _loaded_model_data[key] = model_data
+    return model_data
@@ -12,6 +12,7 @@ import GPUtil
 import numpy as np
 
 from ai_economist.foundation.base.base_env import BaseEnvironment, scenario_registry
+from ai_economist.foundation.scenarios.covid19.covid19_data import load_model_data
 from ai_economist.foundation.utils import verify_activation_code
 
 try:
@@ -63,6 +64,12 @@ class CovidAndEconomyEnvironment(BaseEnvironment):
             For details on obtaining these parameters, please see the notebook
             "ai-economist-foundation/ai_economist/datasets/covid19_datasets/
             gather_real_world_data_and_fit_parameters.ipynb".
+        data_cache_dir (dirpath): Directory where the data, fitted parameters and
+            model constants are compiled into a cache that is memory-mapped
+            read-only, and shared by all the environments of the user (see
+            covid19_data.load_model_data). Defaults to a per-user directory (see
+            covid19_data.default_cache_dir). If None, the data files are loaded
+            directly.
         start_date (string): Date (YYYY-MM-DD) to start the simulation.
         pop_between_age_18_65 (float): Fraction of the population between ages 18-65.
             This is the subset of the population whose employment/unemployment affects
@@ -93,6 +100,13 @@ class CovidAndEconomyEnvironment(BaseEnvironment):
         health_priority_scaling_planner (float): same as above,
             but for the federal government.
             Range: 0 <= health_priority_scaling_planner
+        unemployment_filter (string): How the unemployment model responds to
+            stringency level changes (see unemployment_step). With "recursive"
+            (default), a running response per state and filter is updated each
+            timestep, at a cost independent of the filter length. With
+            "convolution", the response is recomputed from the stringency level
+            history at each timestep. With "verify", both are computed, and a
+            RuntimeError is raised if they disagree.
     """
 
     def __init__(
@@ -101,6 +115,7 @@ class CovidAndEconomyEnvironment(BaseEnvironment):
         use_real_world_data=False,
         use_real_world_policies=False,
         path_to_data_and_fitted_params="",
+        data_cache_dir="",
         start_date="2020-03-22",
         pop_between_age_18_65=0.6,
         infection_too_sick_to_work_rate=0.1,
@@ -109,6 +124,7 @@ class CovidAndEconomyEnvironment(BaseEnvironment):
         health_priority_scaling_agents=1,
         health_priority_scaling_planner=1,
         reward_normalization_factor=1,
+        unemployment_filter="recursive",
         **base_env_kwargs,
     ):
         verify_activation_code()
@@ -153,19 +169,22 @@ class CovidAndEconomyEnvironment(BaseEnvironment):
                 self.path_to_data_and_fitted_params
             )
         )
-        real_world_data_npz = np.load(
-            os.path.join(self.path_to_data_and_fitted_params, "real_world_data.npz")
+        model_data = load_model_data(
+            self.path_to_data_and_fitted_params, cache_dir=data_cache_dir
         )
-        self._real_world_data = {}
-        for key in list(real_world_data_npz):
-            self._real_world_data[key] = real_world_data_npz[key]
+        # (Read-only, when loaded from the cache)
+        self._real_world_data = dict(model_data["real_world_data"])
 
         # Load fitted parameters
         print(
             "Loading fit parameters from {}".format(self.path_to_data_and_fitted_params)
         )
-        self.load_model_constants(self.path_to_data_and_fitted_params)
-        self.load_fitted_params(self.path_to_data_and_fitted_params)
+        self.load_model_constants(
+            self.path_to_data_and_fitted_params, model_data["model_constants"]
+        )
+        self.load_fitted_params(
+            self.path_to_data_and_fitted_params, model_data["fitted_params"]
+        )
 
         try:
             self.start_date = datetime.strptime(start_date, self.date_format)
@@ -239,20 +258,38 @@ class CovidAndEconomyEnvironment(BaseEnvironment):
         #   implemented.
         self.stringency_level_history = None
         # Each filter captures a temporally extended response to a stringency change.
+        # (These are precomputed by load_model_data; see unemployment_filters.)
         self.num_filters = len(self.conv_lambdas)
-        self.f_ts = np.tile(
-            np.flip(np.arange(self.filter_len), (0,))[None, None],
-            (1, self.num_filters, 1),
-        ).astype(self.np_float_dtype)
-        self.unemp_conv_filters = np.exp(-self.f_ts / self.conv_lambdas[None, :, None])
+        self.f_ts = model_data["unemployment_filters"]["f_ts"]
+        self.unemp_conv_filters = model_data["unemployment_filters"][
+            "unemp_conv_filters"
+        ]
         # Each state weights these filters differently.
-        self.repeated_conv_weights = np.repeat(
-            self.grouped_convolutional_filter_weights.reshape(
-                self.num_us_states, self.num_filters
-            )[:, :, np.newaxis],
+        self.repeated_conv_weights = model_data["unemployment_filters"][
+            "repeated_conv_weights"
+        ]
+        assert self.repeated_conv_weights.shape == (
+            self.num_us_states,
+            self.num_filters,
             self.filter_len,
-            axis=-1,
         )
+        # The filter responses can also be updated recursively: each timestep, a
+        #   response decays by exp(-1 / lambda), takes in the latest stringency
+        #   change and lets go of the change that leaves the filter window.
+        assert unemployment_filter in ["recursive", "convolution", "verify"]
+        self.unemployment_filter = unemployment_filter
+        self.filter_decay = np.exp(-1 / self.conv_lambdas.astype(np.float64))
+        self.filter_tail_decay = self.filter_decay**self.filter_len
+        self.filter_weights = self.grouped_convolutional_filter_weights.reshape(
+            self.num_us_states, self.num_filters
+        ).astype(np.float64)
+        # [filter_len, state] window of stringency changes, as a ring buffer whose
+        #   oldest change is at self._delta_stringency_head
+        self._delta_stringency_level = None
+        self._delta_stringency_head = 0
+        self._last_stringency_level = None
+        # [state, filter] filter responses
+        self._filter_responses = None
 
         # For manually modulating SIR/Unemployment parameters
         self._beta_intercepts_modulation = 1
@@ -379,6 +416,20 @@ class CovidAndEconomyEnvironment(BaseEnvironment):
 
     required_entities = []
 
+    # Real-world data and unemployment filters are fixed by the configuration; they
+    # are left out of snapshots and shared by forked branches
+    _fixed_attributes = (
+        "_real_world_data",
+        "f_ts",
+        "unemp_conv_filters",
+        "repeated_conv_weights",
+        "filter_decay",
+        "filter_tail_decay",
+        "filter_weights",
+    )
+    _state_exclude = BaseEnvironment._state_exclude + _fixed_attributes
+    _fork_shared = BaseEnvironment._fork_shared + _fixed_attributes
+
     def reset_starting_layout(self):
         pass
 
@@ -1216,6 +1267,19 @@ class CovidAndEconomyEnvironment(BaseEnvironment):
             [(self.filter_len, 0), (0, 0)],
             constant_values=1,
         )[-(self.filter_len + 1) :]
+        if self.unemployment_filter != "convolution":
+            self._delta_stringency_level = (
+                self.stringency_level_history[1:] - self.stringency_level_history[:-1]
+            ).astype(np.float64)
+            self._delta_stringency_head = 0
+            self._last_stringency_level = self.stringency_level_history[-1].astype(
+                np.float64
+            )
+            self._filter_responses = np.einsum(
+                "ts,ft->sf",
+                self._delta_stringency_level,
+                self.unemp_conv_filters[0].astype(np.float64),
+            )
 
         # Set the stringency level based to the real-world policy
         self.set_global_state(
@@ -1389,7 +1453,8 @@ class CovidAndEconomyEnvironment(BaseEnvironment):
         Note: Internally, unemployment is computed somewhat differently for speed.
             In particular, no convolution is used. Instead the "filter response" at
             time t is just a temporally discounted sum of past stringency changes,
-            with the discounting given by the filter decay rate.
+            with the discounting given by the filter decay rate. By default, this
+            sum is itself updated recursively (see recursive_filter_response).
         """
 
         def softplus(x, beta=1, threshold=20):
@@ -1404,17 +1469,54 @@ class CovidAndEconomyEnvironment(BaseEnvironment):
         if (
             self.world.timestep == 0
         ):  # computing unemployment at closure policy "all ones"
-            delta_stringency_level = np.zeros((self.filter_len, self.num_us_states))
+            filter_response = np.zeros(self.num_us_states)
+        elif self.unemployment_filter == "convolution":
+            filter_response = self.convolution_filter_response(
+                current_stringency_level
+            )
         else:
-            self.stringency_level_history = np.concatenate(
-                (
-                    self.stringency_level_history[1:],
-                    current_stringency_level.reshape(1, -1),
+            filter_response = self.recursive_filter_response(current_stringency_level)
+            if self.unemployment_filter == "verify":
+                reference_response = self.convolution_filter_response(
+                    current_stringency_level
                 )
+                if not np.allclose(
+                    filter_response, reference_response, rtol=1e-5, atol=1e-5
+                ):
+                    raise RuntimeError(
+                        "Recursive unemployment filter responses diverged at t={} "
+                        "(max abs diff: {})".format(
+                            self.world.timestep,
+                            np.max(np.abs(filter_response - reference_response)),
+                        )
+                    )
+
+        # Sum over channels and use a softplus to get excess unemployment.
+        excess_unemployment = softplus(filter_response, beta=1)
+
+        # Add excess unemployment to baseline unemployment
+        unemployment_rate = excess_unemployment + self.unemployment_bias
+
+        # Convert the rate (which is a percent) to raw numbers for output
+        num_unemployed_t = unemployment_rate * self.us_state_population / 100
+        return num_unemployed_t
+
+    def convolution_filter_response(self, current_stringency_level):
+        """
+        Returns the weighted sum of the unemployment filter responses of each state,
+        computed from the (updated) window of stringency level history.
+
+        The cost of each call is proportional to num_filters * filter_len.
+        """
+        self.stringency_level_history = np.concatenate(
+            (
+                self.stringency_level_history[1:],
+                current_stringency_level.reshape(1, -1),
             )
-            delta_stringency_level = (
-                self.stringency_level_history[1:] - self.stringency_level_history[:-1]
-            )
+        )
+        delta_stringency_level = (
+            self.stringency_level_history[1:] - self.stringency_level_history[:-1]
+        )
 
         # Rather than modulating the unemployment params,
         # modulate the deltas (same effect)
@@ -1427,18 +1529,38 @@ class CovidAndEconomyEnvironment(BaseEnvironment):
         weighted_x_data = x_data * self.repeated_conv_weights
 
         # Compute the discounted sum of the weighted deltas, with each channel using
-        # a discounting rate reflecting the time constant of the filter channel. Also
-        # sum over channels and use a softplus to get excess unemployment.
-        excess_unemployment = softplus(
-            np.sum(weighted_x_data * self.unemp_conv_filters, axis=(1, 2)), beta=1
-        )
+        # a discounting rate reflecting the time constant of the filter channel.
+        return np.sum(weighted_x_data * self.unemp_conv_filters, axis=(1, 2))
 
-        # Add excess unemployment to baseline unemployment
-        unemployment_rate = excess_unemployment + self.unemployment_bias
+    def recursive_filter_response(self, current_stringency_level):
+        """
+        Returns the weighted sum of the unemployment filter responses of each state,
+        updating the running response of each state and filter.
+
+        Since the filters are exponential decays over a window of filter_len
+        timesteps, each response is carried over from the previous timestep:
+            response_t = decay * response_t-1 + delta_t - decay^filter_len * delta_t-L
+        so the cost of each call is proportional to num_filters only, however long
+        the episode.
+        """
+        delta_t = current_stringency_level - self._last_stringency_level
+        self._last_stringency_level = np.array(current_stringency_level, np.float64)
 
-        # Convert the rate (which is a percent) to raw numbers for output
-        num_unemployed_t = unemployment_rate * self.us_state_population / 100
-        return num_unemployed_t
+        head = self._delta_stringency_head
+        self._filter_responses = (
+            self.filter_decay * self._filter_responses
+            + delta_t[:, None]
+            - self.filter_tail_decay * self._delta_stringency_level[head][:, None]
+        )
+        self._delta_stringency_level[head] = delta_t
+        self._delta_stringency_head = (head + 1) % self.filter_len
+
+        # Rather than modulating the unemployment params, modulate the responses
+        # (same effect)
+        return (
+            np.sum(self.filter_weights * self._filter_responses, axis=1)
+            * self._unemployment_modulation
+        )
 
     # --- Scenario-specific ---
     def economy_step(
@@ -1514,17 +1636,17 @@ class CovidAndEconomyEnvironment(BaseEnvironment):
 
         return dS_t, dI_t, dR_t, dV_t
 
-    def load_model_constants(self, path_to_model_constants):
-        filename = "model_constants.json"
-        assert filename in os.listdir(path_to_model_constants), (
-            "Unable to locate '{}' in '{}'.\nPlease run the "
-            "'gather_real_world_data.ipynb' notebook first".format(
-                filename, path_to_model_constants
+    def load_model_constants(self, path_to_model_constants, model_constants_dict=None):
+        if model_constants_dict is None:
+            filename = "model_constants.json"
+            assert filename in os.listdir(path_to_model_constants), (
+                "Unable to locate '{}' in '{}'.\nPlease run the "
+                "'gather_real_world_data.ipynb' notebook first".format(
+                    filename, path_to_model_constants
+                )
             )
-        )
-        with open(os.path.join(path_to_model_constants, filename), "r") as fp:
-            model_constants_dict = json.load(fp)
-        fp.close()
+            with open(os.path.join(path_to_model_constants, filename), "r") as fp:
+                model_constants_dict = json.load(fp)
 
         self.date_format = model_constants_dict["DATE_FORMAT"]
         self.us_state_idx_to_state_name = model_constants_dict[
@@ -1541,17 +1663,17 @@ class CovidAndEconomyEnvironment(BaseEnvironment):
             model_constants_dict["GDP_PER_CAPITA"]
         )
 
-    def load_fitted_params(self, path_to_fitted_params):
-        filename = "fitted_params.json"
-        assert filename in os.listdir(path_to_fitted_params), (
-            "Unable to locate '{}' in '{}'.\nIf you ran the "
-            "'gather_real_world_data.ipynb' notebook to download the latest "
-            "real-world data, please also run the "
-            "'fit_parameters.ipynb' notebook.".format(filename, path_to_fitted_params)
-        )
-        with open(os.path.join(path_to_fitted_params, filename), "r") as fp:
-            fitted_params_dict = json.load(fp)
-        fp.close()
+    def load_fitted_params(self, path_to_fitted_params, fitted_params_dict=None):
+        if fitted_params_dict is None:
+            filename = "fitted_params.json"
+            assert filename in os.listdir(path_to_fitted_params), (
+                "Unable to locate '{}' in '{}'.\nIf you ran the "
+                "'gather_real_world_data.ipynb' notebook to download the latest "
+                "real-world data, please also run the 'fit_parameters.ipynb' "
+                "notebook.".format(filename, path_to_fitted_params)
+            )
+            with open(os.path.join(path_to_fitted_params, filename), "r") as fp:
+                fitted_params_dict = json.load(fp)
         self.policy_start_date = datetime.strptime(
             fitted_params_dict["POLICY_START_DATE"], self.date_format
         )
@@ -0,0 +1,138 @@
+# Copyright (c) 2021, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+Parameter sensitivity sweeps of the COVID-19 simulation.
+
+run_modulation_sweep evaluates a grid of parameter modulations (see
+CovidAndEconomyEnvironment.set_parameter_modulations) under fixed policies, with
+each grid point as one environment ("lane") of a
+VectorizedCovidAndEconomyEnvironment.
+"""
+
+import itertools
+
+import numpy as np
+
+from ai_economist.foundation.scenarios.covid19.covid19_vectorized_env import (
+    VectorizedCovidAndEconomyEnvironment,
+)
+
+
+def modulation_grid(beta_intercept=(1.0,), beta_slope=(1.0,), unemployment=(1.0,)):
+    """
+    Return all the combinations of the given modulation values, as an
+    [n_lanes, 3] array of (beta_intercept, beta_slope, unemployment) modulations.
+    """
+    return np.array(
+        list(itertools.product(beta_intercept, beta_slope, unemployment)),
+        dtype=np.float64,
+    ).reshape(-1, 3)
+
+
+def _lane_actions(actions, n_lanes, shape):
+    """Broadcast actions shared by all lanes to [n_lanes, *shape]."""
+    if actions is None:
+        return None
+    actions = np.asarray(actions)
+    if actions.shape == shape:
+        actions = np.broadcast_to(actions, (n_lanes,) + shape)
+    assert actions.shape == (n_lanes,) + shape, (actions.shape, (n_lanes,) + shape)
+    return actions
+
+
+def run_modulation_sweep(
+    env_config,
+    modulations,
+    agent_actions=None,
+    planner_actions=None,
+    batch_size=128,
+):
+    """
+    Simulate one episode for each set of parameter modulations.
+
+    The lanes are simulated batch_size at a time. The policies are fixed: either
+    the real-world policies (if env_config sets use_real_world_policies) or the
+    given action sequences. These are applied as given, whatever the action masks.
+
+    Args:
+        env_config (dict): Configuration of CovidAndEconomyEnvironment (see
+            VectorizedCovidAndEconomyEnvironment).
+        modulations (ndarray): [n_lanes, 3] array of (beta_intercept, beta_slope,
+            unemployment) modulations; see modulation_grid.
+        agent_actions (ndarray): Stringency level actions, shaped
+            [episode_length, n_agents] (shared by all lanes) or
+            [n_lanes, episode_length, n_agents]. If None, the agents always take the
+            NO-OP action.
+        planner_actions (ndarray): Subsidy level actions, shaped [episode_length]
+            or [n_lanes, episode_length]. If None, the planner always takes the
+            NO-OP action.
+        batch_size (int): Maximum number of lanes simulated together.
+
+    Returns:
+        Dictionary of per-lane results:
+            "deaths", "unemployed", "productivity": [n_lanes, episode_length + 1,
+                n_agents] arrays of the Deaths, Unemployed and Postsubsidy
+                Productivity global states.
+            "agent_rewards": [n_lanes, episode_length, n_agents] array.
+            "planner_rewards": [n_lanes, episode_length] array.
+    """
+    modulations = np.asarray(modulations, dtype=np.float64)
+    assert modulations.ndim == 2 and modulations.shape[1] == 3
+    n_lanes = len(modulations)
+    assert n_lanes >= 1
+    assert batch_size >= 1
+
+    vec_env = VectorizedCovidAndEconomyEnvironment(
+        env_config, n_envs=min(batch_size, n_lanes), auto_reset=False
+    )
+    n_envs = vec_env.n_envs
+    episode_length = vec_env.episode_length
+    n_agents = vec_env.n_agents
+    agent_actions = _lane_actions(agent_actions, n_lanes, (episode_length, n_agents))
+    planner_actions = _lane_actions(planner_actions, n_lanes, (episode_length,))
+
+    results = {
+        "deaths": np.zeros((n_lanes, episode_length + 1, n_agents), np.float32),
+        "unemployed": np.zeros((n_lanes, episode_length + 1, n_agents), np.float32),
+        "productivity": np.zeros((n_lanes, episode_length + 1, n_agents), np.float32),
+        "agent_rewards": np.zeros((n_lanes, episode_length, n_agents), np.float32),
+        "planner_rewards": np.zeros((n_lanes, episode_length), np.float32),
+    }
+
+    for start in range(0, n_lanes, n_envs):
+        # Pad the last batch with copies of its last lane
+        lanes = np.minimum(np.arange(start, start + n_envs), n_lanes - 1)
+        n_batch_lanes = min(n_envs, n_lanes - start)
+
+        vec_env.reset()
+        vec_env.set_parameter_modulations(
+            beta_intercept=modulations[lanes, 0],
+            beta_slope=modulations[lanes, 1],
+            unemployment=modulations[lanes, 2],
+        )
+        for t in range(episode_length):
+            _, rew, _, _ = vec_env.step(
+                None if agent_actions is None else agent_actions[lanes, t],
+                None if planner_actions is None else planner_actions[lanes, t],
+            )
+            results["agent_rewards"][start : start + n_batch_lanes, t] = rew["a"][
+                :n_batch_lanes
+            ]
+            results["planner_rewards"][start : start + n_batch_lanes, t] = rew["p"][
+                :n_batch_lanes
+            ]
+
+        for key, state_key in [
+            ("deaths", "Deaths"),
+            ("unemployed", "Unemployed"),
+            ("productivity", "Postsubsidy Productivity"),
+        ]:
+            results[key][start : start + n_batch_lanes] = vec_env.global_state[
+                state_key
+            ][:n_batch_lanes]
+
+    return results
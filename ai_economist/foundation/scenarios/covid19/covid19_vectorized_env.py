@@ -0,0 +1,805 @@
+# Copyright (c) 2021, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+Batched CPU implementation of CovidAndEconomyEnvironment.
+
+VectorizedCovidAndEconomyEnvironment advances N copies of the COVID-19 and economy
+simulation in lockstep with NumPy: the SIR, unemployment, economy and reward models
+and the ControlUSStateOpenCloseStatus, FederalGovernmentSubsidy and
+VaccinationCampaign components operate on [N, num_us_states] arrays, like the CUDA
+kernels of covid19_env_step.cu and covid19_components_step.cu do on the GPU.
+"""
+
+from datetime import datetime
+
+import numpy as np
+
+from ai_economist.foundation.scenarios.covid19.covid19_env import (
+    CovidAndEconomyEnvironment,
+)
+
+_COMPONENTS = (
+    "ControlUSStateOpenCloseStatus",
+    "FederalGovernmentSubsidy",
+    "VaccinationCampaign",
+)
+
+_GLOBAL_STATE_KEYS = (
+    "Susceptible",
+    "Infected",
+    "Recovered",
+    "Deaths",
+    "Unemployed",
+    "Vaccinated",
+    "Stringency Level",
+    "Subsidy Level",
+    "Subsidy",
+    "Postsubsidy Productivity",
+)
+
+
+def softplus(x, beta=1, threshold=20):
+    """
+    Numpy implementation of softplus (see CovidAndEconomyEnvironment).
+    """
+    return 1 / beta * np.log(1 + np.exp(beta * x)) * (beta * x <= threshold) + x * (
+        beta * x > threshold
+    )
+
+
+class VectorizedCovidAndEconomyEnvironment:
+    """
+    Holds N copies of CovidAndEconomyEnvironment and advances all of them with a
+    single call, without a GPU.
+
+    The model constants (fitted parameters, real-world data, reward normalization)
+    come from a template CovidAndEconomyEnvironment built from env_config, whose
+    single-environment CPU path is the reference for this implementation. The
+    results match it up to floating point rounding: the unemployment filter
+    responses are always updated recursively (as with unemployment_filter set to
+    "recursive").
+
+    Actions are supplied as integer arrays (single action mode only):
+        agent_actions: [N, n_agents] stringency level actions (0 is the NO-OP).
+        planner_actions: [N] subsidy level actions (0 is the NO-OP).
+
+    Observations are returned as {"a": {key: array}, "p": {key: array}}, with the
+    keys of the collated (and not flattened) observations of the template
+    environment and a leading [N] dimension. Rewards are returned as
+    {"a": [N, n_agents] array, "p": [N] array}.
+
+    Example:
+        from ai_economist.foundation.scenarios.covid19.covid19_vectorized_env import (
+            VectorizedCovidAndEconomyEnvironment,
+        )
+
+        vec_env = VectorizedCovidAndEconomyEnvironment(env_config, n_envs=64)
+        obs = vec_env.reset()
+        agent_actions = np.zeros((64, vec_env.n_agents), dtype=np.int32)
+        obs, rew, done, info = vec_env.step(agent_actions)
+        obs["a"]["world-agent_state"].shape  # --> [64, 6, n_agents]
+
+    Args:
+        env_config (dict): Configuration of CovidAndEconomyEnvironment (a
+            "scenario_name" entry, if any, is ignored). Its components must be
+            among the COVID-19 components, and its observations must not be
+            flattened.
+        n_envs (int): Number of environment copies to hold.
+        auto_reset (bool): Whether to reset the environments as soon as their
+            episode completes. If True (default), the observations returned at the
+            end of an episode are the observations of the new episode.
+    """
+
+    def __init__(self, env_config=None, n_envs=1, auto_reset=True):
+        assert isinstance(env_config, dict)
+        env_kwargs = {k: v for k, v in env_config.items() if k != "scenario_name"}
+        # Observations are batched as dictionaries of arrays
+        assert not env_kwargs.get("flatten_observations", True)
+        assert env_kwargs.get("flatten_masks", True)
+        assert not env_kwargs.get("multi_action_mode_agents", False)
+        assert not env_kwargs.get("multi_action_mode_planner", True)
+
+        self.n_envs = int(n_envs)
+        assert self.n_envs >= 1
+        self.auto_reset = bool(auto_reset)
+
+        env = CovidAndEconomyEnvironment(**env_kwargs)
+        self.env = env
+        self.n_agents = env.n_agents
+        self.episode_length = env.episode_length
+        self.num_us_states = env.num_us_states
+        self.use_real_world_data = env.use_real_world_data
+        self.use_real_world_policies = env.use_real_world_policies
+        self._time_scale = (
+            self.episode_length if env._allow_observation_scaling else 1.0
+        )
+
+        # Components
+        # ----------
+        self.component_names = [component.name for component in env._components]
+        for name in self.component_names:
+            if name not in _COMPONENTS:
+                raise NotImplementedError(
+                    "Component {} is not supported by {}".format(
+                        name, type(self).__name__
+                    )
+                )
+        self._stringency = env._components_dict.get("ControlUSStateOpenCloseStatus")
+        self._subsidy = env._components_dict.get("FederalGovernmentSubsidy")
+        self._vaccination = env._components_dict.get("VaccinationCampaign")
+
+        if self._stringency is not None:
+            if self._stringency.n_stringency_levels != env.num_stringency_levels:
+                raise ValueError(
+                    "The environment was not configured correctly. For the given "
+                    "model fit, you need to set the number of stringency levels to "
+                    "be {}".format(env.num_stringency_levels)
+                )
+        if self._subsidy is not None:
+            self.max_daily_subsidy_per_state = (
+                env.us_state_population
+                * self._subsidy.max_annual_subsidy_per_person
+                / 365
+            )
+            self._real_world_subsidy_levels = None
+        if self._vaccination is not None:
+            self._vaccination.generate_observations()  # (Sets _t_first_delivery)
+
+        # Unemployment
+        # ------------
+        # (See CovidAndEconomyEnvironment.recursive_filter_response)
+        self.filter_len = int(env.filter_len)
+        self.num_filters = env.num_filters
+
+        # State
+        # -----
+        n, t, s = self.n_envs, self.episode_length + 1, self.num_us_states
+        self.timestep = 0
+        self.global_state = {
+            key: np.zeros((n, t, s), dtype=env.np_float_dtype)
+            for key in _GLOBAL_STATE_KEYS
+        }
+        # Changes of the stringency levels over the last filter_len timesteps, as a
+        # ring buffer (the oldest change is at _delta_stringency_head)
+        self._delta_stringency_level = np.zeros((n, self.filter_len, s))
+        self._delta_stringency_head = 0
+        self._last_stringency_level = np.zeros((n, s))
+        # [N, state, filter] filter responses
+        self._filter_responses = np.zeros((n, s, self.num_filters))
+
+        self.action_in_cooldown_until = np.zeros((n, s), dtype=np.int64)
+        self.current_subsidy_level = np.zeros(n, dtype=env.np_int_dtype)
+        self.total_subsidy = np.zeros(n)
+        self.vaccines_available = np.zeros((n, s), dtype=env.np_int_dtype)
+        self.total_vaccinated = np.zeros((n, s), dtype=env.np_int_dtype)
+        self.agent_health_index = np.zeros((n, s), dtype=env.np_float_dtype)
+        self.agent_economic_index = np.zeros((n, s), dtype=env.np_float_dtype)
+        self.planner_health_index = np.zeros(n, dtype=env.np_float_dtype)
+        self.planner_economic_index = np.zeros(n, dtype=env.np_float_dtype)
+
+        self._beta_intercepts_modulation = np.ones(n)
+        self._beta_slopes_modulation = np.ones(n)
+        self._unemployment_modulation = np.ones(n)
+
+        self._agent_index = np.tile(
+            np.eye(self.n_agents, dtype=env.np_int_dtype), (n, 1, 1)
+        )
+
+    @property
+    def current_date(self):
+        """Date of the current timestep."""
+        return datetime.fromordinal(self.env.start_date.toordinal() + self.timestep)
+
+    def set_parameter_modulations(
+        self, beta_intercept=None, beta_slope=None, unemployment=None
+    ):
+        """
+        Apply parameter modulations, which will be in effect until the next reset
+        (see CovidAndEconomyEnvironment.set_parameter_modulations).
+
+        Each modulation is either a float, applied to all the environments, or an
+        array with one value per environment.
+        """
+        for value, modulation in [
+            (beta_intercept, self._beta_intercepts_modulation),
+            (beta_slope, self._beta_slopes_modulation),
+            (unemployment, self._unemployment_modulation),
+        ]:
+            if value is None:
+                continue
+            value = np.asarray(value, dtype=np.float64)
+            assert value.ndim == 0 or value.shape == (self.n_envs,)
+            assert np.all(value >= 0)
+            modulation[:] = value
+
+    # Dynamics
+    # --------
+
+    def sir_step(self, S_tm1, I_tm1, stringency_level_tmk, num_vaccines_available_t):
+        """
+        Simulates the SIR infection model of each environment, with [N, states]
+        arrays (see CovidAndEconomyEnvironment.sir_step).
+        """
+        env = self.env
+        float_dtype = env.np_float_dtype
+        intercepts = env.beta_intercepts * self._beta_intercepts_modulation.astype(
+            float_dtype
+        )[:, None]
+        slopes = env.beta_slopes * self._beta_slopes_modulation.astype(float_dtype)[
+            :, None
+        ]
+        beta_i = (intercepts + slopes * stringency_level_tmk).astype(float_dtype)
+
+        small_number = 1e-10  # used to prevent indeterminate cases
+        susceptible_fraction_vaccinated = np.minimum(
+            np.ones((self.num_us_states), dtype=env.np_int_dtype),
+            num_vaccines_available_t / (S_tm1 + small_number),
+        ).astype(float_dtype)
+        vaccinated_t = np.minimum(num_vaccines_available_t, S_tm1)
+
+        # S -> I; dS
+        neighborhood_SI_over_N = (S_tm1 / env.us_state_population) * I_tm1
+        dS_t = (
+            -beta_i * neighborhood_SI_over_N * (1 - susceptible_fraction_vaccinated)
+            - vaccinated_t
+        ).astype(float_dtype)
+
+        # I -> R; dR
+        dR_t = (env.gamma * I_tm1 + vaccinated_t).astype(float_dtype)
+
+        # dI from d(S + I + R) = 0
+        dI_t = -dS_t - dR_t
+
+        dV_t = vaccinated_t.astype(float_dtype)
+
+        return dS_t, dI_t, dR_t, dV_t
+
+    def unemployment_step(self, current_stringency_level):
+        """
+        Computes the unemployment of each environment, given its [N, states] current
+        stringency levels (see CovidAndEconomyEnvironment.unemployment_step).
+        """
+        env = self.env
+        delta_t = current_stringency_level - self._last_stringency_level
+        self._last_stringency_level[:] = current_stringency_level
+
+        head = self._delta_stringency_head
+        self._filter_responses *= env.filter_decay
+        self._filter_responses += delta_t[..., None]
+        self._filter_responses -= (
+            env.filter_tail_decay * self._delta_stringency_level[:, head, :, None]
+        )
+        self._delta_stringency_level[:, head] = delta_t
+        self._delta_stringency_head = (head + 1) % self.filter_len
+
+        filter_response = np.sum(env.filter_weights * self._filter_responses, axis=-1)
+        excess_unemployment = softplus(
+            filter_response * self._unemployment_modulation[:, None], beta=1
+        )
+
+        # Add excess unemployment to baseline unemployment
+        unemployment_rate = excess_unemployment + self.env.unemployment_bias
+
+        # Convert the rate (which is a percent) to raw numbers for output
+        return unemployment_rate * self.env.us_state_population / 100
+
+    def economy_step(self, infected, deaths, unemployed):
+        """
+        Computes the production of each environment, with [N, states] arrays (see
+        CovidAndEconomyEnvironment.economy_step).
+        """
+        env = self.env
+        return env.economy_step(
+            env.us_state_population,
+            infected=infected,
+            deaths=deaths,
+            unemployed=unemployed,
+            infection_too_sick_to_work_rate=env.infection_too_sick_to_work_rate,
+            population_between_age_18_65=env.pop_between_age_18_65,
+        )
+
+    def _stringency_step(self, agent_actions):
+        t = self.timestep
+        component = self._stringency
+        if self.use_real_world_policies:
+            # Use the action taken in the previous timestep
+            actions = np.broadcast_to(
+                self.env.world.real_world_stringency_policy[t - 1],
+                (self.n_envs, self.num_us_states),
+            )
+        elif agent_actions is None:
+            actions = np.zeros((self.n_envs, self.num_us_states), dtype=np.int64)
+        else:
+            actions = agent_actions
+        assert np.all((0 <= actions) & (actions <= component.n_stringency_levels))
+
+        # We only update the stringency level if the action is not a NO-OP.
+        stringency_level = self.global_state["Stringency Level"]
+        stringency_level[:, t] = stringency_level[:, t - 1] * (actions == 0) + actions
+
+        # Set the next time until action cooldown (see ControlUSStateOpenCloseStatus)
+        cooldown_ends = t == self.action_in_cooldown_until + 1
+        self.action_in_cooldown_until += cooldown_ends * np.where(
+            actions == 0, 1, component.action_cooldown_period
+        )
+
+    def _subsidy_step(self, planner_actions):
+        t = self.timestep
+        component = self._subsidy
+        if self.use_real_world_policies:
+            # The real-world subsidies are the same in all the environments
+            if self._real_world_subsidy_levels is None:
+                subsidy_amount_per_level = (
+                    self.env.us_population
+                    * component.max_annual_subsidy_per_person
+                    / component.num_subsidy_levels
+                    * component.subsidy_interval
+                    / 365
+                )
+                levels = np.zeros(self.episode_length + 1)
+                for t_idx in range(self.episode_length):
+                    amount = self.env.world.real_world_subsidy[t_idx].item()
+                    if amount > 0:
+                        levels[t_idx : t_idx + component.subsidy_interval] += np.round(
+                            amount / subsidy_amount_per_level
+                        )
+                self._real_world_subsidy_levels = levels
+            subsidy_level = np.full(self.n_envs, self._real_world_subsidy_levels[t - 1])
+        elif (t - 1) % component.subsidy_interval == 0:
+            # The other actions are masked out
+            if planner_actions is None:
+                subsidy_level = np.zeros(self.n_envs, dtype=np.int64)
+            else:
+                subsidy_level = planner_actions
+        else:
+            subsidy_level = self.current_subsidy_level
+
+        assert np.all(
+            (0 <= subsidy_level) & (subsidy_level <= component.num_subsidy_levels)
+        )
+        self.current_subsidy_level = subsidy_level.astype(self.env.np_int_dtype)
+
+        subsidy_level_frac = self.current_subsidy_level / component.num_subsidy_levels
+        daily_statewise_subsidy = (
+            subsidy_level_frac[:, None] * self.max_daily_subsidy_per_state
+        )
+        self.global_state["Subsidy"][:, t] = daily_statewise_subsidy
+        self.total_subsidy += np.sum(daily_statewise_subsidy, axis=-1)
+
+    def _vaccination_step(self):
+        t = self.timestep
+        component = self._vaccination
+        if t < component.time_when_vaccine_delivery_begins:
+            return
+        if (t % component.delivery_interval) != 0:
+            return
+        self.vaccines_available += component.num_vaccines_per_delivery
+
+    def scenario_step(self):
+        """
+        Update the SIR, unemployment and productivity numbers of each environment
+        (see CovidAndEconomyEnvironment.scenario_step).
+        """
+        env = self.env
+        data = env._real_world_data
+        start = env.start_date_index
+        t = self.timestep
+        state = self.global_state
+
+        # SIR
+        # ---
+        if self.use_real_world_data:
+            S_t = np.maximum(data["susceptible"][start + t], 0)
+            I_t = np.maximum(data["infected"][start + t], 0)
+            R_t = np.maximum(data["recovered"][start + t], 0)
+            V_t = np.maximum(data["vaccinated"][start + t], 0)
+            D_t = np.maximum(data["deaths"][start + t], 0)
+        else:
+            if t - env.beta_delay < 0:
+                if start + t - env.beta_delay < 0:
+                    stringency_level_tmk = np.ones(self.num_us_states)
+                else:
+                    stringency_level_tmk = data["policy"][start + t - env.beta_delay]
+            else:
+                stringency_level_tmk = state["Stringency Level"][:, t - env.beta_delay]
+            stringency_level_tmk = stringency_level_tmk.astype(env.np_int_dtype)
+
+            # Vaccination: agents always use whatever vaccines they can
+            num_vaccines_available_t = self.vaccines_available.copy()
+            self.total_vaccinated += num_vaccines_available_t
+            self.vaccines_available[:] = 0
+
+            S_tm1 = state["Susceptible"][:, t - 1]
+            I_tm1 = state["Infected"][:, t - 1]
+            R_tm1 = state["Recovered"][:, t - 1]
+            V_tm1 = state["Vaccinated"][:, t - 1]
+            dS, dI, dR, dV = self.sir_step(
+                S_tm1, I_tm1, stringency_level_tmk, num_vaccines_available_t
+            )
+            S_t = np.maximum(S_tm1 + dS, 0)
+            I_t = np.maximum(I_tm1 + dI, 0)
+            R_t = np.maximum(R_tm1 + dR, 0)
+            V_t = np.maximum(V_tm1 + dV, 0)
+            D_t = env.death_rate * (R_t - V_t)
+
+        state["Susceptible"][:, t] = S_t
+        state["Infected"][:, t] = I_t
+        state["Recovered"][:, t] = R_t
+        state["Deaths"][:, t] = D_t
+        state["Vaccinated"][:, t] = V_t
+
+        # Unemployment
+        # ------------
+        if self.use_real_world_data:
+            num_unemployed_t = data["unemployed"][start + t]
+            # (Keep the stringency level history up to date all the same)
+            self.unemployment_step(state["Stringency Level"][:, t])
+        else:
+            num_unemployed_t = self.unemployment_step(state["Stringency Level"][:, t])
+        state["Unemployed"][:, t] = num_unemployed_t
+
+        # Productivity
+        # ------------
+        productivity_t = self.economy_step(I_t, D_t, num_unemployed_t)
+        state["Postsubsidy Productivity"][:, t] = (
+            productivity_t + state["Subsidy"][:, t]
+        )
+
+    def compute_reward(self):
+        """
+        Compute the rewards of the agents ([N, n_agents] array) and the planner ([N]
+        array) of each environment (see CovidAndEconomyEnvironment.compute_reward).
+        """
+        env = self.env
+        float_dtype = env.np_float_dtype
+        t = self.timestep
+
+        def crra_nonlinearity(x, eta):
+            annual_x = env.num_days_in_an_year * x
+            annual_x_clipped = np.clip(annual_x, 0.1, 3)
+            annual_crra = 1 + (annual_x_clipped ** (1 - eta) - 1) / (1 - eta)
+            return annual_crra / env.num_days_in_an_year
+
+        def min_max_normalization(x, min_x, max_x):
+            eps = 1e-10
+            return (x - min_x) / (max_x - min_x + eps)
+
+        def get_weighted_average(
+            health_index_weightage,
+            health_index,
+            economic_index_weightage,
+            economic_index,
+        ):
+            return (
+                health_index_weightage * health_index
+                + economic_index_weightage * economic_index
+            ) / (health_index_weightage + economic_index_weightage)
+
+        deaths = self.global_state["Deaths"]
+        marginal_deaths = deaths[:, t] - deaths[:, t - 1]
+        subsidy_t = self.global_state["Subsidy"][:, t]
+        postsubsidy_productivity_t = self.global_state["Postsubsidy Productivity"][:, t]
+
+        # Agents
+        # ------
+        marginal_agent_health_index = (
+            -marginal_deaths.astype(float_dtype)
+            * env.value_of_life
+            / env.agents_health_norm
+        ).astype(float_dtype)
+        marginal_agent_economic_index = crra_nonlinearity(
+            postsubsidy_productivity_t / env.agents_economic_norm,
+            env.economic_reward_crra_eta,
+        ).astype(float_dtype)
+
+        marginal_agent_health_index = min_max_normalization(
+            marginal_agent_health_index,
+            env.min_marginal_agent_health_index,
+            env.max_marginal_agent_health_index,
+        ).astype(float_dtype)
+        marginal_agent_economic_index = min_max_normalization(
+            marginal_agent_economic_index,
+            env.min_marginal_agent_economic_index,
+            env.max_marginal_agent_economic_index,
+        ).astype(float_dtype)
+
+        agent_rewards = get_weighted_average(
+            env.weightage_on_marginal_agent_health_index,
+            marginal_agent_health_index,
+            env.weightage_on_marginal_agent_economic_index,
+            marginal_agent_economic_index,
+        )
+        self.agent_health_index += marginal_agent_health_index
+        self.agent_economic_index += marginal_agent_economic_index
+
+        # National level
+        # --------------
+        marginal_planner_health_index = (
+            -np.sum(marginal_deaths, axis=-1).astype(float_dtype)
+            * env.value_of_life
+            / env.planner_health_norm
+        )
+        cost_of_subsidy_t = (1 + env.risk_free_interest_rate) * np.sum(
+            subsidy_t, axis=-1
+        )
+        marginal_planner_economic_index = crra_nonlinearity(
+            (np.sum(postsubsidy_productivity_t, axis=-1) - cost_of_subsidy_t)
+            / env.planner_economic_norm,
+            env.economic_reward_crra_eta,
+        )
+
+        marginal_planner_health_index = min_max_normalization(
+            marginal_planner_health_index,
+            env.min_marginal_planner_health_index,
+            env.max_marginal_planner_health_index,
+        )
+        marginal_planner_economic_index = min_max_normalization(
+            marginal_planner_economic_index,
+            env.min_marginal_planner_economic_index,
+            env.max_marginal_planner_economic_index,
+        )
+        self.planner_health_index += marginal_planner_health_index
+        self.planner_economic_index += marginal_planner_economic_index
+
+        planner_rewards = get_weighted_average(
+            env.weightage_on_marginal_planner_health_index,
+            marginal_planner_health_index,
+            env.weightage_on_marginal_planner_economic_index,
+            marginal_planner_economic_index,
+        )
+
+        return {
+            "a": agent_rewards / env.reward_normalization_factor,
+            "p": planner_rewards / env.reward_normalization_factor,
+        }
+
+    # Observations
+    # ------------
+
+    def _generate_masks(self):
+        n, s, t = self.n_envs, self.num_us_states, self.timestep
+        agent_masks = [np.ones((n, 1, s))]
+        planner_masks = [np.ones((n, 1))]
+        for name in self.component_names:
+            if name == "ControlUSStateOpenCloseStatus":
+                n_levels = self._stringency.n_stringency_levels
+                if self.use_real_world_policies:
+                    agent_masks.append(np.ones((n, n_levels, s)))
+                else:
+                    in_cooldown = t < self.action_in_cooldown_until
+                    agent_masks.append(
+                        np.repeat(~in_cooldown[:, None], n_levels, axis=1)
+                    )
+            elif name == "FederalGovernmentSubsidy":
+                component = self._subsidy
+                mask_value = (
+                    self.use_real_world_policies
+                    or t % component.subsidy_interval == 0
+                )
+                planner_masks.append(
+                    np.full((n, component.num_subsidy_levels), int(mask_value))
+                )
+        return (
+            np.concatenate(agent_masks, axis=1).astype(np.float32),
+            np.concatenate(planner_masks, axis=1).astype(np.float32),
+        )
+
+    def generate_observations(self):
+        """
+        Return the observations of each environment, as {"a": {key: array},
+        "p": {key: array}} (see CovidAndEconomyEnvironment.generate_observations and
+        the generate_observations method of the components).
+        """
+        env = self.env
+        n, s, t = self.n_envs, self.num_us_states, self.timestep
+        state = self.global_state
+
+        agent_state = np.stack(
+            [
+                state[feature][:, t]
+                for feature in [
+                    "Susceptible",
+                    "Infected",
+                    "Recovered",
+                    "Deaths",
+                    "Vaccinated",
+                    "Unemployed",
+                ]
+            ],
+            axis=1,
+        ) / env.us_state_population[None]
+        postsubsidy_productivity = (
+            state["Postsubsidy Productivity"][:, t] / env.maximum_productivity_t
+        )
+        t_beta = t - env.beta_delay + 1
+        if t_beta < 0:
+            lagged_stringency_level = np.broadcast_to(
+                env._real_world_data["policy"][env.start_date_index + t_beta], (n, s)
+            )
+        else:
+            lagged_stringency_level = state["Stringency Level"][:, t_beta]
+        lagged_stringency_level = lagged_stringency_level / env.num_stringency_levels
+
+        obs_a = {
+            "world-agent_index": self._agent_index,
+            "world-agent_state": agent_state,
+            "world-agent_postsubsidy_productivity": postsubsidy_productivity,
+            "world-lagged_stringency_level": lagged_stringency_level,
+            "time": np.full((n, s), t / self._time_scale),
+        }
+        obs_p = {
+            "world-agent_state": agent_state,
+            "world-agent_postsubsidy_productivity": postsubsidy_productivity,
+            "world-lagged_stringency_level": lagged_stringency_level,
+            "time": np.full((n, 1), t / self._time_scale),
+        }
+
+        for name in self.component_names:
+            prefix = name + "-"
+            if name == "ControlUSStateOpenCloseStatus":
+                indicators = (
+                    state["Stringency Level"][:, t]
+                    / self._stringency.n_stringency_levels
+                )
+                obs_a[prefix + "agent_policy_indicators"] = indicators
+                obs_p[prefix + "agent_policy_indicators"] = indicators
+            elif name == "FederalGovernmentSubsidy":
+                component = self._subsidy
+                t_since_last_subsidy = t % component.subsidy_interval
+                t_until_next_subsidy = (
+                    component.subsidy_interval - t_since_last_subsidy
+                ) / component.subsidy_interval
+                subsidy_level = (
+                    self.current_subsidy_level / component.num_subsidy_levels
+                )
+                obs_a[prefix + "t_until_next_subsidy"] = np.full(
+                    (n, s), t_until_next_subsidy
+                )
+                obs_a[prefix + "current_subsidy_level"] = np.repeat(
+                    subsidy_level[:, None], s, axis=1
+                )
+                obs_p[prefix + "t_until_next_subsidy"] = np.full(
+                    n, t_until_next_subsidy
+                )
+                obs_p[prefix + "current_subsidy_level"] = subsidy_level
+            elif name == "VaccinationCampaign":
+                component = self._vaccination
+                next_t = t + 1
+                if next_t <= component._t_first_delivery:
+                    t_until_next_vac = np.minimum(
+                        1,
+                        (component._t_first_delivery - next_t)
+                        / component.delivery_interval,
+                    )
+                    next_vax_rate = 0.0
+                else:
+                    t_since_last_vac = next_t % component.delivery_interval
+                    t_until_next_vac = component.delivery_interval - t_since_last_vac
+                    next_vax_rate = component.daily_vaccines_per_million_people / 1e6
+                t_until_next_vac = t_until_next_vac / component.delivery_interval
+                obs_a[prefix + "t_until_next_vaccines"] = np.full(
+                    (n, s), t_until_next_vac
+                )
+                obs_p[prefix + "t_until_next_vaccines"] = np.full(n, t_until_next_vac)
+                if component.observe_rate:
+                    obs_a[prefix + "next_vaccination_rate"] = np.full(
+                        (n, s), next_vax_rate
+                    )
+                    obs_p[prefix + "next_vaccination_rate"] = np.full(
+                        n, next_vax_rate
+                    )
+
+        obs_a["action_mask"], obs_p["action_mask"] = self._generate_masks()
+        return {"a": obs_a, "p": obs_p}
+
+    # Core control of environment execution
+    # -------------------------------------
+
+    def reset(self):
+        """
+        Reset all N environments.
+
+        Returns:
+            obs (dict): {"a": {key: [N, ...] array}, "p": {key: [N, ...] array}}
+        """
+        env = self.env
+        data = env._real_world_data
+        start = env.start_date_index
+        self.timestep = 0
+
+        for array in self.global_state.values():
+            array[:] = 0
+        recovered_0 = data["recovered"][start]
+        for key, value in [
+            ("Susceptible", data["susceptible"][start]),
+            ("Infected", data["infected"][start]),
+            ("Recovered", recovered_0),
+            ("Deaths", recovered_0 * env.death_rate),
+            ("Unemployed", data["unemployed"][start]),
+            ("Vaccinated", data["vaccinated"][start]),
+            ("Stringency Level", data["policy"][start]),
+        ]:
+            self.global_state[key][:, 0] = value
+
+        # Stringency level history, padded with stringency levels of 1 (fully open,
+        # as before the pandemic)
+        history = np.pad(
+            data["policy"][: start + 1],
+            [(self.filter_len, 0), (0, 0)],
+            constant_values=1,
+        )[-(self.filter_len + 1) :]
+        delta_stringency_level = history[1:] - history[:-1]
+        self._delta_stringency_level[:] = delta_stringency_level
+        self._delta_stringency_head = 0
+        self._last_stringency_level[:] = history[-1]
+        self._filter_responses[:] = np.einsum(
+            "ts,ft->sf",
+            delta_stringency_level.astype(np.float64),
+            env.unemp_conv_filters[0].astype(np.float64),
+        )
+
+        self.action_in_cooldown_until[:] = 0
+        self.current_subsidy_level[:] = 0
+        self.total_subsidy[:] = 0
+        self.vaccines_available[:] = 0
+        self.total_vaccinated[:] = 0
+        for index in [
+            self.agent_health_index,
+            self.agent_economic_index,
+            self.planner_health_index,
+            self.planner_economic_index,
+        ]:
+            index[:] = 0
+
+        # Reset any manually set parameter modulations
+        self._beta_intercepts_modulation[:] = 1
+        self._beta_slopes_modulation[:] = 1
+        self._unemployment_modulation[:] = 1
+
+        return self.generate_observations()
+
+    def step(self, agent_actions=None, planner_actions=None):
+        """
+        Advance all N environments by one timestep.
+
+        Args:
+            agent_actions (ndarray): Integer array of stringency level actions,
+                shaped [N, n_agents]. If None, all agents take the NO-OP action.
+            planner_actions (ndarray): Integer array of subsidy level actions,
+                shaped [N]. If None, the planner takes the NO-OP action.
+
+        Returns:
+            obs (dict): {"a": {key: [N, ...] array}, "p": {key: [N, ...] array}}
+            rew (dict): {"a": [N, n_agents] array, "p": [N] array}
+            done (ndarray): [N] boolean array.
+            info (list): Length-N list of (empty) info dictionaries.
+        """
+        if agent_actions is not None:
+            agent_actions = np.asarray(agent_actions)
+            assert agent_actions.shape == (self.n_envs, self.n_agents)
+        if planner_actions is not None:
+            planner_actions = np.asarray(planner_actions)
+            assert planner_actions.shape == (self.n_envs,)
+
+        self.timestep += 1
+        for name in self.component_names:
+            if name == "ControlUSStateOpenCloseStatus":
+                self._stringency_step(agent_actions)
+            elif name == "FederalGovernmentSubsidy":
+                self._subsidy_step(planner_actions)
+            elif name == "VaccinationCampaign":
+                self._vaccination_step()
+        self.scenario_step()
+
+        obs = self.generate_observations()
+        rew = self.compute_reward()
+        done = np.full(self.n_envs, self.timestep >= self.episode_length)
+        info = [{} for _ in range(self.n_envs)]
+
+        if done[0] and self.auto_reset:
+            obs = self.reset()
+        return obs, rew, done, info
@@ -287,32 +287,35 @@ class OneStepEconomy(BaseEnvironment):
             curr_optimization_metric (dict): A dictionary of {agent.idx: metric}
                 with an entry for each agent (including the planner) in the env.
         """
-        curr_optimization_metric = {}
-
         coin_endowments = np.array([agent.total_endowment("Coin") for agent in agents])
 
         pretax_incomes = np.array([agent.state["production"] for agent in agents])
 
+        total_labor = np.array([agent.state["endogenous"]["Labor"] for agent in agents])
+
         # Optimization metric for agents:
-        for agent in agents:
-            if self.agent_reward_type == "isoelastic_coin_minus_labor":
-                assert 0.0 <= isoelastic_eta <= 1.0
-                curr_optimization_metric[
-                    agent.idx
-                ] = rewards.isoelastic_coin_minus_labor(
-                    coin_endowment=agent.total_endowment("Coin"),
-                    total_labor=agent.state["endogenous"]["Labor"],
-                    isoelastic_eta=isoelastic_eta,
-                    labor_coefficient=labor_coefficient,
-                )
-            elif self.agent_reward_type == "coin_minus_labor_cost":
-                assert labor_exponent > 1.0
-                curr_optimization_metric[agent.idx] = rewards.coin_minus_labor_cost(
-                    coin_endowment=agent.total_endowment("Coin"),
-                    total_labor=agent.state["endogenous"]["Labor"],
-                    labor_exponent=labor_exponent,
-                    labor_coefficient=labor_coefficient,
-                )
+        if self.agent_reward_type == "isoelastic_coin_minus_labor":
+            assert 0.0 <= isoelastic_eta <= 1.0
+            utilities = rewards.isoelastic_coin_minus_labor(
+                coin_endowment=coin_endowments,
+                total_labor=total_labor,
+                isoelastic_eta=isoelastic_eta,
+                labor_coefficient=labor_coefficient,
+            )
+        elif self.agent_reward_type == "coin_minus_labor_cost":
+            assert labor_exponent > 1.0
+            utilities = rewards.coin_minus_labor_cost(
+                coin_endowment=coin_endowments,
+                total_labor=total_labor,
+                labor_exponent=labor_exponent,
+                labor_coefficient=labor_coefficient,
+            )
+        else:
+            print("No valid agent reward selected!")
+            raise NotImplementedError
+        curr_optimization_metric = {
+            agent.idx: utility for agent, utility in zip(agents, utilities.tolist())
+        }
         # Optimization metric for the planner:
         if self.planner_reward_type == "coin_eq_times_productivity":
             curr_optimization_metric[
@@ -326,9 +329,7 @@ class OneStepEconomy(BaseEnvironment):
                 self.world.planner.idx
             ] = rewards.inv_income_weighted_utility(
                 coin_endowments=pretax_incomes,  # coin_endowments,
-                utilities=np.array(
-                    [curr_optimization_metric[agent.idx] for agent in agents]
-                ),
+                utilities=utilities,
             )
         else:
             print("No valid planner reward selected!")
@@ -8,10 +8,10 @@ from copy import deepcopy
 from pathlib import Path
 
 import numpy as np
-from scipy import signal
 
 from ai_economist.foundation.base.base_env import BaseEnvironment, scenario_registry
 from ai_economist.foundation.scenarios.utils import rewards, social_metrics
+from ai_economist.foundation.scenarios.utils.regeneration import ResourceRegenerator
 
 
 @scenario_registry.add
@@ -126,6 +126,7 @@ class LayoutFromFile(BaseEnvironment):
         )
         assert 0 <= self.layout_specs["Wood"]["regen_weight"] <= 1
         assert 0 <= self.layout_specs["Stone"]["regen_weight"] <= 1
+        self._regenerators = None
 
         # How much coin do agents begin with at upon reset
         self.starting_agent_coin = float(starting_agent_coin)
@@ -178,12 +179,11 @@ class LayoutFromFile(BaseEnvironment):
             assert bm.skill_dist == "pareto"
             pmsm = bm.payment_max_skill_multiplier
 
-            # Temporarily switch to a fixed seed for controlling randomness
-            seed_state = np.random.get_state()
-            np.random.seed(seed=1)
+            # Use a fixed seed for controlling randomness
+            fixed_rng = np.random.RandomState(seed=1)
 
             # Generate a batch (100000) of num_agents (sorted/clipped) Pareto samples.
-            pareto_samples = np.random.pareto(4, size=(100000, self.n_agents))
+            pareto_samples = fixed_rng.pareto(4, size=(100000, self.n_agents))
             clipped_skills = np.minimum(pmsm, (pmsm - 1) * pareto_samples + 1)
             sorted_clipped_skills = np.sort(clipped_skills, axis=1)
             # The skill level of the i-th skill-ranked agent is the average of the
@@ -191,8 +191,6 @@ class LayoutFromFile(BaseEnvironment):
             average_ranked_skills = sorted_clipped_skills.mean(axis=0)
             self._avg_ranked_skill = average_ranked_skills * bm.payment
 
-            np.random.set_state(seed_state)
-
             # Fill in the starting location associated with each skill rank
             starting_ranked_locs = [
                 # Worst group of agents goes in top right
@@ -274,47 +272,24 @@ class LayoutFromFile(BaseEnvironment):
             curr_optimization_metric (dict): A dictionary of {agent.idx: metric}
                 with an entry for each agent (including the planner) in the env.
         """
-        curr_optimization_metric = {}
+        coin_endowments = self.world.total_endowment("Coin")
         # (for agents)
-        for agent in self.world.agents:
-            curr_optimization_metric[agent.idx] = rewards.isoelastic_coin_minus_labor(
-                coin_endowment=agent.total_endowment("Coin"),
-                total_labor=agent.state["endogenous"]["Labor"],
-                isoelastic_eta=self.isoelastic_eta,
-                labor_coefficient=self.energy_weight * self.energy_cost,
-            )
+        utilities = rewards.isoelastic_coin_minus_labor(
+            coin_endowment=coin_endowments,
+            total_labor=self.world.endogenous("Labor"),
+            isoelastic_eta=self.isoelastic_eta,
+            labor_coefficient=self.energy_weight * self.energy_cost,
+        )
+        curr_optimization_metric = dict(enumerate(utilities.tolist()))
         # (for the planner)
-        if self.planner_reward_type == "coin_eq_times_productivity":
-            curr_optimization_metric[
-                self.world.planner.idx
-            ] = rewards.coin_eq_times_productivity(
-                coin_endowments=np.array(
-                    [agent.total_endowment("Coin") for agent in self.world.agents]
-                ),
+        curr_optimization_metric[self.world.planner.idx] = float(
+            rewards.planner_social_welfare(
+                self.planner_reward_type,
+                coin_endowments=coin_endowments,
+                utilities=utilities,
                 equality_weight=1 - self.mixing_weight_gini_vs_coin,
             )
-        elif self.planner_reward_type == "inv_income_weighted_coin_endowments":
-            curr_optimization_metric[
-                self.world.planner.idx
-            ] = rewards.inv_income_weighted_coin_endowments(
-                coin_endowments=np.array(
-                    [agent.total_endowment("Coin") for agent in self.world.agents]
-                )
-            )
-        elif self.planner_reward_type == "inv_income_weighted_utility":
-            curr_optimization_metric[
-                self.world.planner.idx
-            ] = rewards.inv_income_weighted_utility(
-                coin_endowments=np.array(
-                    [agent.total_endowment("Coin") for agent in self.world.agents]
-                ),
-                utilities=np.array(
-                    [curr_optimization_metric[agent.idx] for agent in self.world.agents]
-                ),
-            )
-        else:
-            print("No valid planner reward selected!")
-            raise NotImplementedError
+        )
         return curr_optimization_metric
 
     # The following methods must be implemented for each scenario
@@ -327,6 +302,9 @@ class LayoutFromFile(BaseEnvironment):
 
         Here, reset to the layout in the fixed layout file
         """
+        # The source blocks change, so regeneration gets re-indexed on the next step
+        self._regenerators = None
+
         self.world.maps.clear()
         for landmark, landmark_map in self._source_maps.items():
             self.world.maps.set(landmark, landmark_map)
@@ -358,12 +336,12 @@ class LayoutFromFile(BaseEnvironment):
         }
 
         for agent in self.world.agents:
-            r = np.random.randint(0, self.world_size[0])
-            c = np.random.randint(0, self.world_size[1])
+            r = self.rng.integers(0, self.world_size[0])
+            c = self.rng.integers(0, self.world_size[1])
             n_tries = 0
             while not self.world.can_agent_occupy(r, c, agent):
-                r = np.random.randint(0, self.world_size[0])
-                c = np.random.randint(0, self.world_size[1])
+                r = self.rng.integers(0, self.world_size[0])
+                c = self.rng.integers(0, self.world_size[1])
                 n_tries += 1
                 if n_tries > 200:
                     raise TimeoutError
@@ -383,31 +361,34 @@ class LayoutFromFile(BaseEnvironment):
 
         resources = ["Wood", "Stone"]
 
+        # Index the source blocks (which are fixed within an episode) once per reset.
+        if self._regenerators is None:
+            self._regenerators = {
+                resource: ResourceRegenerator(
+                    source_blocks=self.world.maps.get(resource + "SourceBlock"),
+                    halfwidth=self.layout_specs[resource]["regen_halfwidth"],
+                    weight=self.layout_specs[resource]["regen_weight"],
+                    max_health=self.layout_specs[resource]["max_health"],
+                )
+                for resource in resources
+            }
+
+        # Only source-block tiles can respawn.
         for resource in resources:
-            d = 1 + (2 * self.layout_specs[resource]["regen_halfwidth"])
-            kernel = (
-                self.layout_specs[resource]["regen_weight"] * np.ones((d, d)) / (d ** 2)
+            respawn_idx, new_health = self._regenerators[resource].step(
+                self.world.maps.get(resource), self.rng
             )
+            self.world.maps.set_points(resource, respawn_idx, new_health)
 
-            resource_map = self.world.maps.get(resource)
-            resource_source_blocks = self.world.maps.get(resource + "SourceBlock")
-            spawnable = (
-                self.world.maps.empty + resource_map + resource_source_blocks
-            ) > 0
-            spawnable *= resource_source_blocks > 0
+    # The resource regenerators are rebuilt from the (restored) maps
+    _state_exclude = BaseEnvironment._state_exclude + ("_regenerators",)
 
-            health = np.maximum(resource_map, resource_source_blocks)
-            respawn = np.random.rand(*health.shape) < signal.convolve2d(
-                health, kernel, "same"
-            )
-            respawn *= spawnable
+    # Layout parameters that stay fixed during an episode
+    _fork_shared = BaseEnvironment._fork_shared + ("layout_specs", "_source_maps")
 
-            self.world.maps.set(
-                resource,
-                np.minimum(
-                    resource_map + respawn, self.layout_specs[resource]["max_health"]
-                ),
-            )
+    def set_state(self, state):
+        super().set_state(state)
+        self._regenerators = None
 
     def generate_observations(self):
         """
@@ -431,13 +412,15 @@ class LayoutFromFile(BaseEnvironment):
         config) as well as the inventory of each of the mobile agents.
         """
         obs = {}
-        curr_map = self.world.maps.state
+        if self._planner_gets_spatial_info or self._full_observability:
+            # Copy, since the maps state is a view that reflects future changes
+            curr_map = np.array(self.world.maps.state)
 
-        owner_map = self.world.maps.owner_state
-        loc_map = self.world.loc_map
-        agent_idx_maps = np.concatenate([owner_map, loc_map[None, :, :]], axis=0)
-        agent_idx_maps += 2
-        agent_idx_maps[agent_idx_maps == 1] = 0
+            owner_map = self.world.maps.owner_state
+            loc_map = self.world.loc_map
+            agent_idx_maps = np.concatenate([owner_map, loc_map[None, :, :]], axis=0)
+            agent_idx_maps += 2
+            agent_idx_maps[agent_idx_maps == 1] = 0
 
         agent_locs = {
             str(agent.idx): {
@@ -477,34 +460,21 @@ class LayoutFromFile(BaseEnvironment):
                 self._mobile_agent_observation_range
             )  # View halfwidth (only applicable without full observability)
 
-            padded_map = np.pad(
-                curr_map,
-                [(0, 1), (w, w), (w, w)],
-                mode="constant",
-                constant_values=[(0, 1), (0, 0), (0, 0)],
-            )
-
-            padded_idx = np.pad(
-                agent_idx_maps,
-                [(0, 0), (w, w), (w, w)],
-                mode="constant",
-                constant_values=[(0, 0), (0, 0), (0, 0)],
+            # Gather all the agents' windows at once from the padded map buffers
+            visible_maps, visible_idxs = self.world.maps.egocentric_windows(
+                [agent.loc for agent in self.world.agents], w
             )
 
-            for agent in self.world.agents:
-                r, c = [c + w for c in agent.loc]
-                visible_map = padded_map[
-                    :, (r - w) : (r + w + 1), (c - w) : (c + w + 1)
-                ]
-                visible_idx = np.array(
-                    padded_idx[:, (r - w) : (r + w + 1), (c - w) : (c + w + 1)]
-                )
-
-                visible_idx[visible_idx == int(agent.idx) + 2] = 1
+            # Same encoding as the full agent_idx_maps (with 0 for padding), with
+            # each agent's own index relabeled to 1
+            agent_idxs = np.array([int(agent.idx) for agent in self.world.agents])
+            visible_idxs = np.where(visible_idxs >= 0, visible_idxs + 2, 0)
+            visible_idxs[visible_idxs == agent_idxs[:, None, None, None] + 2] = 1
 
+            for i, agent in enumerate(self.world.agents):
                 sidx = str(agent.idx)
 
-                obs[sidx] = {"map": visible_map, "idx_map": visible_idx}
+                obs[sidx] = {"map": visible_maps[i], "idx_map": visible_idxs[i]}
                 obs[sidx].update(agent_locs[sidx])
                 obs[sidx].update(agent_invs[sidx])
 
@@ -535,7 +505,8 @@ class LayoutFromFile(BaseEnvironment):
 
         # "curr_optimization_metric" hasn't been updated yet, so it gives us the
         # utility from the last step.
-        utility_at_end_of_last_time_step = deepcopy(self.curr_optimization_metric)
+        # (It is replaced, never modified in place, so no copy is needed.)
+        utility_at_end_of_last_time_step = self.curr_optimization_metric
 
         # compute current objectives and store the values
         self.curr_optimization_metric = self.get_current_optimization_metrics()
@@ -604,9 +575,7 @@ class LayoutFromFile(BaseEnvironment):
         """
         metrics = dict()
 
-        coin_endowments = np.array(
-            [agent.total_endowment("Coin") for agent in self.world.agents]
-        )
+        coin_endowments = self.world.total_endowment("Coin")
         metrics["social/productivity"] = social_metrics.get_productivity(
             coin_endowments
         )
@@ -746,7 +715,7 @@ class SplitLayout(LayoutFromFile):
         assert bm.skill_dist == "pareto"
         pmsm = bm.payment_max_skill_multiplier
         # Generate a batch (100000) of num_agents (sorted/clipped) Pareto samples.
-        pareto_samples = np.random.pareto(4, size=(100000, self.n_agents))
+        pareto_samples = self.rng.pareto(4, size=(100000, self.n_agents))
         clipped_skills = np.minimum(pmsm, (pmsm - 1) * pareto_samples + 1)
         sorted_clipped_skills = np.sort(clipped_skills, axis=1)
         # The skill level of the i-th skill-ranked agent is the average of the
@@ -781,12 +750,12 @@ class SplitLayout(LayoutFromFile):
             else:
                 r_min, r_max = self._water_line + 1, self.world_size[0]
 
-            r = np.random.randint(r_min, r_max)
-            c = np.random.randint(0, self.world_size[1])
+            r = self.rng.integers(r_min, r_max)
+            c = self.rng.integers(0, self.world_size[1])
             n_tries = 0
             while not self.world.can_agent_occupy(r, c, agent):
-                r = np.random.randint(r_min, r_max)
-                c = np.random.randint(0, self.world_size[1])
+                r = self.rng.integers(r_min, r_max)
+                c = self.rng.integers(0, self.world_size[1])
                 n_tries += 1
                 if n_tries > 200:
                     raise TimeoutError
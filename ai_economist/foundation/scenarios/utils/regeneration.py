@@ -0,0 +1,123 @@
+# Copyright (c) 2020, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+import numpy as np
+
+
+class ResourceRegenerator:
+    """Stochastic regeneration of a resource, evaluated only on its source blocks.
+
+    Each step, every source-block tile respawns one unit of resource with
+    probability equal to the regen kernel response at that tile, i.e.
+        regen_weight * mean(health over the (1 + 2 * halfwidth)^2 window),
+    where health = max(resource, source block), and the window is zero-padded at the
+    map edges. This is the distribution of
+        rand(H, W) < convolve2d(health, kernel, "same"), restricted to source blocks,
+    but only the tiles that can respawn (and their windows) are ever touched.
+
+    The window sums are cached and updated incrementally: each step, the health
+    inside the source-block windows is compared to the cached health, and only the
+    windows containing tiles that changed (consumed or regrown) are updated.
+
+    Args:
+        source_blocks (ndarray): [H, W] source-block map of the resource. Tiles with
+            a positive value can respawn. Build a new regenerator whenever the
+            source-block map changes (e.g. on reset).
+        halfwidth (int): Regen halfwidth; the kernel width is 1 + (2 * halfwidth).
+        weight (float): Regen weight (respawn probability per unit of health in the
+            window, averaged over the window).
+        max_health (float): Maximum amount of resource a tile can hold.
+    """
+
+    def __init__(self, source_blocks, halfwidth, weight, max_health):
+        source_blocks = np.asarray(source_blocks)
+        assert source_blocks.ndim == 2
+        self.shape = source_blocks.shape
+        self.halfwidth = int(halfwidth)
+        assert self.halfwidth >= 0
+        d = 1 + (2 * self.halfwidth)
+        self.kernel_value = float(weight) * 1.0 / (d ** 2)
+        self.max_health = max_health
+
+        # Tiles that can respawn
+        self.source_idx = np.flatnonzero(source_blocks > 0)
+        n_sources = len(self.source_idx)
+
+        # Flat indices of the (in-bounds) tiles in each source tile's window
+        offsets = np.arange(-self.halfwidth, self.halfwidth + 1)
+        rows, cols = np.unravel_index(self.source_idx, self.shape)
+        window_rows = np.repeat(rows[:, None] + offsets[None, :], d, axis=1)
+        window_cols = np.tile(cols[:, None] + offsets[None, :], (1, d))
+        in_bounds = (
+            (window_rows >= 0)
+            & (window_rows < self.shape[0])
+            & (window_cols >= 0)
+            & (window_cols < self.shape[1])
+        )
+        window_idx = window_rows * self.shape[1] + window_cols
+
+        # The influence set: all tiles inside some source tile's window.
+        self.influence_idx, window_pos = np.unique(
+            window_idx[in_bounds], return_inverse=True
+        )
+        self._source_health = source_blocks.ravel()[self.influence_idx]
+
+        # For each influence tile, which source tiles' windows contain it
+        # (CSR-style: sources of tile k are _influenced[_ptr[k]:_ptr[k + 1]]).
+        source_of_pos = np.repeat(np.arange(n_sources), d * d)[in_bounds.ravel()]
+        order = np.argsort(window_pos, kind="stable")
+        self._influenced = source_of_pos[order]
+        self._ptr = np.searchsorted(
+            window_pos[order], np.arange(len(self.influence_idx) + 1)
+        )
+
+        self._health = None
+        self._window_sums = np.zeros(n_sources)
+
+    def _update_window_sums(self, resource_map):
+        health = np.maximum(
+            np.take(resource_map, self.influence_idx), self._source_health
+        )
+
+        if self._health is None:
+            self._window_sums[:] = 0
+            np.add.at(
+                self._window_sums,
+                self._influenced,
+                np.repeat(health, np.diff(self._ptr)),
+            )
+        else:
+            for k in np.flatnonzero(health != self._health):
+                self._window_sums[
+                    self._influenced[self._ptr[k] : self._ptr[k + 1]]
+                ] += (health[k] - self._health[k])
+
+        self._health = health
+
+    def respawn_probabilities(self, resource_map):
+        """Return the respawn probability of each source tile (see source_idx)."""
+        self._update_window_sums(resource_map)
+        return self._window_sums * self.kernel_value
+
+    def step(self, resource_map, rng):
+        """Sample which source tiles respawn, given the current resource map.
+
+        Args:
+            resource_map (ndarray): [H, W] map of the resource.
+            rng (np.random.Generator): The random number stream to sample from.
+
+        Returns:
+            respawn_idx (ndarray): Flat indices of the tiles that respawn.
+            new_health (ndarray): The resource value of those tiles after
+                respawning (capped at max_health).
+        """
+        probabilities = self.respawn_probabilities(resource_map)
+        respawn = rng.random(len(probabilities)) < probabilities
+        respawn_idx = self.source_idx[respawn]
+        new_health = np.minimum(
+            np.take(resource_map, respawn_idx) + 1, self.max_health
+        )
+        return respawn_idx, new_health
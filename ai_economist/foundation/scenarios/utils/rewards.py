@@ -8,6 +8,10 @@ import numpy as np
 
 from ai_economist.foundation.scenarios.utils import social_metrics
 
+# Utilities are computed elementwise and social welfare along the last axis, so the
+# functions below also accept batches of agent quantities shaped [..., n_agents]
+# (e.g. [n_envs, n_timesteps, n_agents]).
+
 
 def isoelastic_coin_minus_labor(
     coin_endowment, total_labor, isoelastic_eta, labor_coefficient
@@ -35,7 +39,7 @@ def isoelastic_coin_minus_labor(
 
     # Utility from coin endowment
     if isoelastic_eta == 1.0:  # dangerous
-        util_c = np.log(np.max(1, coin_endowment))
+        util_c = np.log(np.maximum(1, coin_endowment))
     else:  # isoelastic_eta >= 0
         util_c = (coin_endowment ** (1 - isoelastic_eta) - 1) / (1 - isoelastic_eta)
 
@@ -87,14 +91,14 @@ def coin_eq_times_productivity(coin_endowments, equality_weight):
 
     Args:
         coin_endowments (ndarray): The array of coin endowments for each of the
-            agents in the simulated economy.
+            agents in the simulated economy (the last axis indexes the agents).
         equality_weight (float): Constant that determines how productivity is scaled
             by coin equality. Must be between 0 (SW = prod) and 1 (SW = prod * eq).
 
     Returns:
-        Product of coin equality and productivity (float).
+        Product of coin equality and productivity (float, or ndarray if batched).
     """
-    n_agents = len(coin_endowments)
+    n_agents = np.shape(coin_endowments)[-1]
     prod = social_metrics.get_productivity(coin_endowments) / n_agents
     equality = equality_weight * social_metrics.get_equality(coin_endowments) + (
         1 - equality_weight
@@ -107,14 +111,14 @@ def inv_income_weighted_coin_endowments(coin_endowments):
 
     Args:
         coin_endowments (ndarray): The array of coin endowments for each of the
-            agents in the simulated economy.
+            agents in the simulated economy (the last axis indexes the agents).
 
     Returns:
-        Weighted average coin endowment (float).
+        Weighted average coin endowment (float, or ndarray if batched).
     """
     pareto_weights = 1 / np.maximum(coin_endowments, 1)
-    pareto_weights = pareto_weights / np.sum(pareto_weights)
-    return np.sum(coin_endowments * pareto_weights)
+    pareto_weights = pareto_weights / np.sum(pareto_weights, axis=-1, keepdims=True)
+    return np.sum(coin_endowments * pareto_weights, axis=-1)
 
 
 def inv_income_weighted_utility(coin_endowments, utilities):
@@ -122,13 +126,45 @@ def inv_income_weighted_utility(coin_endowments, utilities):
 
     Args:
         coin_endowments (ndarray): The array of coin endowments for each of the
-            agents in the simulated economy.
+            agents in the simulated economy (the last axis indexes the agents).
         utilities (ndarray): The array of utilities for each of the agents in the
-            simulated economy.
+            simulated economy (same shape as coin_endowments).
 
     Returns:
-        Weighted average utility (float).
+        Weighted average utility (float, or ndarray if batched).
     """
     pareto_weights = 1 / np.maximum(coin_endowments, 1)
-    pareto_weights = pareto_weights / np.sum(pareto_weights)
-    return np.sum(utilities * pareto_weights)
+    pareto_weights = pareto_weights / np.sum(pareto_weights, axis=-1, keepdims=True)
+    return np.sum(utilities * pareto_weights, axis=-1)
+
+
+def planner_social_welfare(
+    planner_reward_type, coin_endowments, utilities, equality_weight
+):
+    """Social welfare optimized by the planner, selected by name.
+
+    Args:
+        planner_reward_type (str): The name of the social welfare function; one of
+            "coin_eq_times_productivity", "inv_income_weighted_coin_endowments" or
+            "inv_income_weighted_utility".
+        coin_endowments (ndarray): The array of coin endowments for each of the
+            agents in the simulated economy (the last axis indexes the agents).
+        utilities (ndarray): The array of utilities for each of the agents in the
+            simulated economy (same shape as coin_endowments).
+        equality_weight (float): See coin_eq_times_productivity.
+
+    Returns:
+        Social welfare (float, or ndarray if batched).
+    """
+    if planner_reward_type == "coin_eq_times_productivity":
+        return coin_eq_times_productivity(
+            coin_endowments=coin_endowments, equality_weight=equality_weight
+        )
+    if planner_reward_type == "inv_income_weighted_coin_endowments":
+        return inv_income_weighted_coin_endowments(coin_endowments=coin_endowments)
+    if planner_reward_type == "inv_income_weighted_utility":
+        return inv_income_weighted_utility(
+            coin_endowments=coin_endowments, utilities=utilities
+        )
+    print("No valid planner reward selected!")
+    raise NotImplementedError
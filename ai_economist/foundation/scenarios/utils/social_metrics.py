@@ -14,36 +14,30 @@ def get_gini(endowments):
 
     Args:
         endowments (ndarray): The array of endowments for each of the agents in the
-            simulated economy.
+            simulated economy. Can be batched: the last axis indexes the agents, any
+            leading axes (e.g. environments, timesteps) are kept.
 
     Returns:
-        Normalized Gini index for the distribution of endowments (float). A value of 1
-            indicates everything belongs to 1 agent (perfect inequality), whereas a
-            value of 0 indicates all agents have equal endowments (perfect equality).
+        Normalized Gini index for the distribution of endowments (float, or ndarray
+            shaped endowments.shape[:-1] if batched). A value of 1 indicates
+            everything belongs to 1 agent (perfect inequality), whereas a value of 0
+            indicates all agents have equal endowments (perfect equality).
 
     Note:
-        Uses a slightly different method depending on the number of agents. For fewer
-        agents (<30), uses an exact but slow method. Switches to using a much faster
-        method for more agents, where both methods produce approximately equivalent
-        results.
+        The sum of absolute pairwise differences is computed exactly from the sorted
+        endowments, in O(n log n): with x sorted in increasing order,
+            sum_ij |x_i - x_j| = 2 * sum_i (2i - n + 1) * x_i    (i = 0, ..., n - 1).
     """
-    n_agents = len(endowments)
+    endowments = np.asarray(endowments, dtype=np.float64)
+    n_agents = endowments.shape[-1]
 
-    if n_agents < 30:  # Slower. Accurate for all n.
-        diff_ij = np.abs(
-            endowments.reshape((n_agents, 1)) - endowments.reshape((1, n_agents))
-        )
-        diff = np.sum(diff_ij)
-        norm = 2 * n_agents * endowments.sum(axis=0)
-        unscaled_gini = diff / (norm + 1e-10)
-        gini = unscaled_gini / ((n_agents - 1) / n_agents)
-        return gini
-
-    # Much faster. Slightly overestimated for low n.
-    s_endows = np.sort(endowments)
-    return 1 - (2 / (n_agents + 1)) * np.sum(
-        np.cumsum(s_endows) / (np.sum(s_endows) + 1e-10)
-    )
+    sorted_endowments = np.sort(endowments, axis=-1)
+    ranks = 2 * np.arange(n_agents) - n_agents + 1
+    diff = 2 * np.sum(ranks * sorted_endowments, axis=-1)
+    norm = 2 * n_agents * np.sum(sorted_endowments, axis=-1)
+    unscaled_gini = diff / (norm + 1e-10)
+    gini = unscaled_gini / ((n_agents - 1) / n_agents)
+    return gini
 
 
 def get_equality(endowments):
@@ -51,13 +45,13 @@ def get_equality(endowments):
 
     Args:
         endowments (ndarray): The array of endowments for each of the agents in the
-            simulated economy.
+            simulated economy (the last axis indexes the agents, see get_gini).
 
     Returns:
-        Normalized equality index for the distribution of endowments (float). A value
-            of 0 indicates everything belongs to 1 agent (perfect inequality),
-            whereas a value of 1 indicates all agents have equal endowments (perfect
-            equality).
+        Normalized equality index for the distribution of endowments (float, or
+            ndarray if batched). A value of 0 indicates everything belongs to 1 agent
+            (perfect inequality), whereas a value of 1 indicates all agents have
+            equal endowments (perfect equality).
     """
     return 1 - get_gini(endowments)
 
@@ -67,9 +61,9 @@ def get_productivity(coin_endowments):
 
     Args:
         coin_endowments (ndarray): The array of coin endowments for each of the
-            agents in the simulated economy.
+            agents in the simulated economy (the last axis indexes the agents).
 
     Returns:
-        Total coin endowment (float).
+        Total coin endowment (float, or ndarray if batched).
     """
-    return np.sum(coin_endowments)
+    return np.sum(coin_endowments, axis=-1)
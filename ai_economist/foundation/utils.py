@@ -10,9 +10,9 @@ import sys
 from hashlib import sha512
 
 import lz4.frame
-from Crypto.PublicKey import RSA
 
 from ai_economist.foundation.base.base_env import BaseEnvironment
+from ai_economist.foundation.base.dense_log import DENSE_LOG_MAGIC, DenseLog
 
 
 def save_episode_log(game_object, filepath, compression_level=16):
@@ -25,21 +25,30 @@ def save_episode_log(game_object, filepath, compression_level=16):
     elif compression_level > 16:
         compression_level = 16
 
+    dense_log = game_object.previous_episode_dense_log
+    if isinstance(dense_log, DenseLog):
+        dense_log.save(filepath, compression_level=compression_level)
+        return
+
     with lz4.frame.open(
         filepath, mode="wb", compression_level=compression_level
     ) as log_file:
-        log_bytes = bytes(
-            json.dumps(
-                game_object.previous_episode_dense_log, ensure_ascii=False
-            ).encode("utf-8")
-        )
+        log_bytes = bytes(json.dumps(dense_log, ensure_ascii=False).encode("utf-8"))
         log_file.write(log_bytes)
 
 
 def load_episode_log(filepath):
-    """Load the dense log saved at provided filepath"""
+    """Load the dense log saved at provided filepath.
+
+    Logs saved in the (columnar) DenseLog format are returned as a DenseLog;
+    older, JSON-encoded logs as a dictionary. Loading a log never executes code."""
     with lz4.frame.open(filepath, mode="rb") as log_file:
-        log_bytes = log_file.read()
+        log_bytes = log_file.read(len(DENSE_LOG_MAGIC))
+        if log_bytes == DENSE_LOG_MAGIC:
+            return DenseLog(path=filepath)
+        if not log_bytes.startswith(b"{"):
+            raise ValueError("'{}' is not a dense log file".format(filepath))
+        log_bytes += log_file.read()
     return json.loads(log_bytes)
 
 
@@ -52,6 +61,8 @@ def verify_activation_code():
     path_to_activation_code_dir = os.path.dirname(os.path.abspath(__file__))
 
     def validate_activation_code(code, msg=b"covid19 code activation"):
+        from Crypto.PublicKey import RSA
+
         filepath = os.path.abspath(
             os.path.join(
                 path_to_activation_code_dir,
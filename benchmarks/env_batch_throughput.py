@@ -0,0 +1,151 @@
+# Copyright (c) 2020, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+Throughput benchmark: EnvironmentBatch vs. N independent env objects.
+
+Both paths advance N environments with random (valid-index) actions and end up with
+observations batched as [N, n_agents, ...] arrays, which is what a batched policy
+consumes. Example:
+
+    python -m benchmarks.env_batch_throughput --n-envs 16 --n-steps 200
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from ai_economist import foundation
+from ai_economist.foundation.env_batch import EnvironmentBatch
+
+ENV_CONFIGS = {
+    "uniform": {
+        "scenario_name": "uniform/simple_wood_and_stone",
+        "components": [
+            ("Build", {}),
+            ("ContinuousDoubleAuction", {"max_num_orders": 5}),
+            ("Gather", {}),
+            ("PeriodicBracketTax", {}),
+        ],
+        "n_agents": 4,
+        "world_size": [25, 25],
+        "episode_length": 1000,
+        "multi_action_mode_agents": False,
+        "multi_action_mode_planner": True,
+        "flatten_observations": True,
+        "flatten_masks": True,
+        "starting_agent_coin": 10,
+    },
+    "hetero_layout": {
+        "scenario_name": "layout_from_file/hetero_agents",
+        "components": [
+            ("Build", {}),
+            ("ContinuousDoubleAuction", {"max_num_orders": 5}),
+            ("Gather", {}),
+            ("PeriodicBracketTax", {}),
+        ],
+        "n_agents": 4,
+        "world_size": [25, 25],
+        "episode_length": 1000,
+        "env_layout_file": "quadrant_25x25_20each_30clump.txt",
+        "mobile_agent_class": "HeteroMobileAgent",
+        "env_weighting": [0.0, 0.0, 0.5, 1.0],
+        "equ_weighting": [0.0, 0.0, 0.5, 1.0],
+        "multi_action_mode_agents": False,
+        "multi_action_mode_planner": True,
+        "flatten_observations": True,
+        "flatten_masks": True,
+        "starting_agent_coin": 10,
+    },
+}
+
+
+def sample_actions(n_envs, n_agents, agent_n_actions, planner_action_dims):
+    agent_actions = np.random.randint(0, agent_n_actions, size=(n_envs, n_agents))
+    planner_actions = np.floor(
+        np.random.rand(n_envs, len(planner_action_dims)) * planner_action_dims
+    ).astype(np.int32)
+    return agent_actions, planner_actions
+
+
+def run_independent(env_config, n_envs, n_steps):
+    kwargs = {k: v for k, v in env_config.items() if k != "scenario_name"}
+    envs = [
+        foundation.make_env_instance(env_config["scenario_name"], **kwargs)
+        for _ in range(n_envs)
+    ]
+    for env in envs:
+        env.reset()
+    agent_n_actions = envs[0].world.agents[0].action_spaces
+    planner_action_dims = envs[0].world.planner.action_spaces
+    n_agents = envs[0].n_agents
+
+    t0 = time.time()
+    for _ in range(n_steps):
+        agent_actions, planner_actions = sample_actions(
+            n_envs, n_agents, agent_n_actions, planner_action_dims
+        )
+        batch = []
+        for env_idx, env in enumerate(envs):
+            actions = {str(i): agent_actions[env_idx, i] for i in range(n_agents)}
+            actions["p"] = planner_actions[env_idx]
+            obs, _, done, _ = env.step(actions)
+            if done["__all__"]:
+                obs = env.reset()
+            batch.append(np.stack([obs[str(i)]["flat"] for i in range(n_agents)]))
+        np.stack(batch)
+    return n_envs * n_steps / (time.time() - t0)
+
+
+def run_env_batch(env_config, n_envs, n_steps):
+    env_batch = EnvironmentBatch(env_config, n_envs=n_envs)
+    env_batch.reset()
+    env = env_batch.envs[0]
+    agent_n_actions = env.world.agents[0].action_spaces
+    planner_action_dims = env.world.planner.action_spaces
+
+    t0 = time.time()
+    for _ in range(n_steps):
+        agent_actions, planner_actions = sample_actions(
+            n_envs, env_batch.n_agents, agent_n_actions, planner_action_dims
+        )
+        env_batch.step(agent_actions, planner_actions)
+    return n_envs * n_steps / (time.time() - t0)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default="uniform", choices=sorted(ENV_CONFIGS))
+    parser.add_argument("--n-envs", type=int, default=16)
+    parser.add_argument("--n-steps", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    env_config = ENV_CONFIGS[args.config]
+
+    np.random.seed(args.seed)
+    independent_sps = run_independent(env_config, args.n_envs, args.n_steps)
+    np.random.seed(args.seed)
+    env_batch_sps = run_env_batch(env_config, args.n_envs, args.n_steps)
+
+    print(
+        json.dumps(
+            {
+                "config": args.config,
+                "n_envs": args.n_envs,
+                "n_steps": args.n_steps,
+                "independent_env_steps_per_sec": independent_sps,
+                "env_batch_steps_per_sec": env_batch_sps,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,439 @@
+# Copyright (c) 2020, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+Simulator benchmark suite: throughput, reset time and memory of single environments,
+swept over scenarios, component mixes and configuration options.
+
+Each case (scenario, component mix, n_agents, world size, episode length, dense
+logging on/off, flattened/unflattened observations) is measured in two passes over
+the same pre-sampled random (valid-index) actions:
+    - a timing pass: steps per second (excluding the resets between episodes) and
+      the median reset time;
+    - a memory pass, under tracemalloc (which also traces numpy allocations): the
+      memory held by the environment after construction and reset, the peak of the
+      additional memory used while stepping, and the net number of memory blocks
+      allocated by the interpreter over the pass (which grows with any per-step
+      state that is never released, e.g. logs).
+Options that don't apply to a scenario (i.e. the world size of the COVID-19
+simulation) are fixed to the scenario's value, and duplicate cases are dropped.
+
+Results are written as JSON, along with the environment they were measured in, and
+the slope of log(step time) vs. log(n_agents) of every sweep over n_agents (1 for
+linear scaling). Examples:
+
+    python -m benchmarks.simulator_throughput --output before.json
+    python -m benchmarks.simulator_throughput --scenarios uniform --n-agents 4 16 64 \\
+        --world-sizes 25 40 --dense-log off --baseline before.json
+
+The COVID-19 simulation is only included if its activation code has been saved
+(see ai_economist/foundation/utils.py); otherwise its cases are reported as skipped.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from ai_economist import foundation
+
+WOOD_AND_STONE_MIXES = {
+    "build_gather": [("Build", {}), ("Gather", {})],
+    "market": [
+        ("Build", {}),
+        ("ContinuousDoubleAuction", {"max_num_orders": 5}),
+        ("Gather", {}),
+    ],
+    "full": [
+        ("Build", {}),
+        ("ContinuousDoubleAuction", {"max_num_orders": 5}),
+        ("Gather", {}),
+        ("PeriodicBracketTax", {}),
+    ],
+}
+
+# Layout files (in the scenarios' map_txt directories) for each world size
+LAYOUT_FILES = {
+    15: "env-pure_and_mixed-15x15.txt",
+    25: "quadrant_25x25_20each_30clump.txt",
+    40: "quadrant_40x40_50each.txt",
+}
+
+
+def _hetero_weights(n_agents):
+    return np.linspace(0.0, 1.0, n_agents).tolist()
+
+
+def _hetero_layout_config(world_size, n_agents):
+    if world_size not in LAYOUT_FILES:
+        return None  # No layout file for this world size
+    return {
+        "env_layout_file": LAYOUT_FILES[world_size],
+        "mobile_agent_class": "HeteroMobileAgent",
+        "env_weighting": _hetero_weights(n_agents),
+        "equ_weighting": _hetero_weights(n_agents),
+    }
+
+
+COVID19_CONFIG = {
+    "components": [
+        {"ControlUSStateOpenCloseStatus": {"action_cooldown_period": 28}},
+        {
+            "FederalGovernmentSubsidy": {
+                "num_subsidy_levels": 20,
+                "subsidy_interval": 90,
+                "max_annual_subsidy_per_person": 20000,
+            }
+        },
+        {
+            "VaccinationCampaign": {
+                "daily_vaccines_per_million_people": 3000,
+                "delivery_interval": 1,
+                "vaccine_delivery_start_date": "2021-01-12",
+            }
+        },
+    ],
+    "multi_action_mode_agents": False,
+    "multi_action_mode_planner": False,
+    "collate_agent_step_and_reset_data": True,
+    "start_date": "2020-03-22",
+}
+
+
+# name: (scenario_name, component mixes, fixed options, scenario config builder)
+# Fixed options override the swept ones; the builder returns the scenario-specific
+# config for (world_size, n_agents) or None if the combination is not supported.
+SCENARIOS = {
+    "uniform": (
+        "uniform/simple_wood_and_stone",
+        WOOD_AND_STONE_MIXES,
+        {},
+        lambda world_size, n_agents: {"starting_agent_coin": 10},
+    ),
+    "hetero_layout": (
+        "layout_from_file/hetero_agents",
+        {"full": WOOD_AND_STONE_MIXES["full"]},
+        {},
+        _hetero_layout_config,
+    ),
+    "split_layout": (
+        "split_layout/simple_wood_and_stone",
+        # (This scenario sets skills by rank from the Pareto skill distribution)
+        {
+            "full": [("Build", {"skill_dist": "pareto"})]
+            + WOOD_AND_STONE_MIXES["full"][1:]
+        },
+        {},
+        _hetero_layout_config,
+    ),
+    "one_step_economy": (
+        "one-step-economy",
+        {
+            "labor_tax": [
+                ("PeriodicBracketTax", {"period": 1}),
+                ("SimpleLabor", {}),
+            ]
+        },
+        {"world_size": 1, "episode_length": 2},
+        lambda world_size, n_agents: {},
+    ),
+    "covid19": (
+        "CovidAndEconomySimulation",
+        {"default": None},  # Components are part of the scenario config
+        {"world_size": 1, "n_agents": 51},
+        lambda world_size, n_agents: COVID19_CONFIG,
+    ),
+}
+
+
+def covid_unavailable_reason():
+    """Return why the COVID-19 simulation can't be benchmarked, or None if it can."""
+    foundation_dir = os.path.dirname(os.path.abspath(foundation.__file__))
+    if not os.path.isfile(os.path.join(foundation_dir, "activation_code.txt")):
+        return "no saved activation code (see ai_economist/foundation/utils.py)"
+    try:
+        foundation.scenarios.get("CovidAndEconomySimulation")
+    except ImportError as error:
+        return "cannot import the scenario ({})".format(error)
+    return None
+
+
+def iterate_cases(args):
+    """Yield the (deduplicated) benchmark cases selected by the arguments."""
+    seen = set()
+    sweep = list(
+        itertools.product(
+            args.n_agents,
+            args.world_sizes,
+            args.episode_lengths,
+            args.dense_log,
+            args.flatten,
+        )
+    )
+    for name in args.scenarios:
+        scenario_name, mixes, fixed, _ = SCENARIOS[name]
+        for mix in mixes:
+            if args.mixes and mix not in args.mixes:
+                continue
+            for n_agents, world_size, episode_length, dense_log, flatten in sweep:
+                case = dict(
+                    scenario=name,
+                    scenario_name=scenario_name,
+                    mix=mix,
+                    n_agents=n_agents,
+                    world_size=world_size,
+                    episode_length=episode_length,
+                    dense_log=dense_log == "on",
+                    flatten_observations=flatten == "on",
+                )
+                case.update(fixed)
+                case["id"] = case_id(case)
+                if case["id"] not in seen:
+                    seen.add(case["id"])
+                    yield case
+
+
+def case_id(case):
+    return "{scenario}/{mix}/n{n_agents}/w{world_size}/T{episode_length}".format(
+        **case
+    ) + "/dense={}/flat={}".format(
+        int(case["dense_log"]), int(case["flatten_observations"])
+    )
+
+
+def make_env(case):
+    """Return the environment of a case, or None if the case is not supported."""
+    _, mixes, _, scenario_config = SCENARIOS[case["scenario"]]
+    config = scenario_config(case["world_size"], case["n_agents"])
+    if config is None:
+        return None
+    config = dict(config)
+    components = mixes[case["mix"]]
+    if components is not None:
+        config["components"] = components
+    return foundation.make_env_instance(
+        scenario_name=case["scenario_name"],
+        n_agents=case["n_agents"],
+        world_size=[case["world_size"], case["world_size"]],
+        episode_length=case["episode_length"],
+        flatten_observations=case["flatten_observations"],
+        **config
+    )
+
+
+def sample_actions(env, n_steps, rng):
+    """Return [n_steps, n_agents(, n_subactions)] agent actions and n_steps planner
+    actions, drawn uniformly from the action spaces."""
+    agent_spaces = env.world.agents[0].action_spaces
+    planner_spaces = env.world.planner.action_spaces
+    agent_actions = rng.randint(
+        0, agent_spaces, size=(n_steps, env.n_agents) + np.shape(agent_spaces)
+    )
+    planner_actions = rng.randint(
+        0, planner_spaces, size=(n_steps,) + np.shape(planner_spaces)
+    )
+    return agent_actions, planner_actions
+
+
+def run_steps(env, case, agent_actions, planner_actions):
+    """Step through the actions (resetting between episodes) and return the time
+    spent stepping and the reset times."""
+    step_time = 0.0
+    reset_times = []
+    for t in range(len(agent_actions)):
+        start = time.perf_counter()
+        _, _, done, _ = env.step(agent_actions[t], planner_actions=planner_actions[t])
+        step_time += time.perf_counter() - start
+        if done["__all__"]:
+            start = time.perf_counter()
+            env.reset(force_dense_logging=case["dense_log"])
+            reset_times.append(time.perf_counter() - start)
+    return step_time, reset_times
+
+
+def run_case(case, n_steps, n_resets, seed):
+    """Measure a case (see module docstring) and return its results."""
+    rng = np.random.RandomState(seed)
+    np.random.seed(seed)
+
+    start = time.perf_counter()
+    env = make_env(case)
+    if env is None:
+        return dict(case, skipped="unsupported configuration")
+    construct_time = time.perf_counter() - start
+
+    reset_times = []
+    for _ in range(n_resets):
+        start = time.perf_counter()
+        env.reset(force_dense_logging=case["dense_log"])
+        reset_times.append(time.perf_counter() - start)
+
+    agent_actions, planner_actions = sample_actions(env, n_steps, rng)
+    step_time, episode_reset_times = run_steps(
+        env, case, agent_actions, planner_actions
+    )
+    reset_times += episode_reset_times
+
+    # Memory pass, with a fresh environment
+    del env
+    np.random.seed(seed)
+    tracemalloc.start()
+    env = make_env(case)
+    env.reset(force_dense_logging=case["dense_log"])
+    env_memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    blocks = sys.getallocatedblocks()
+    run_steps(env, case, agent_actions, planner_actions)
+    net_allocated_blocks = sys.getallocatedblocks() - blocks
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return dict(
+        case,
+        n_steps=n_steps,
+        steps_per_sec=n_steps / step_time,
+        agent_steps_per_sec=n_steps * case["n_agents"] / step_time,
+        step_time_us=step_time / n_steps * 1e6,
+        construct_time_ms=construct_time * 1e3,
+        reset_time_ms=float(np.median(reset_times)) * 1e3,
+        env_memory_bytes=env_memory,
+        step_peak_memory_bytes=peak_memory - env_memory,
+        net_allocated_blocks=net_allocated_blocks,
+    )
+
+
+def scaling_exponents(results):
+    """Return {sweep: slope of log(step time) vs. log(n_agents)} for every group of
+    cases that only differ by n_agents (with at least 2 of them)."""
+    groups = {}
+    for result in results:
+        if "skipped" in result:
+            continue
+        key = result["id"].replace("/n{}/".format(result["n_agents"]), "/n*/")
+        groups.setdefault(key, []).append(result)
+    exponents = {}
+    for key, group in sorted(groups.items()):
+        if len(group) < 2:
+            continue
+        log_n = np.log([r["n_agents"] for r in group])
+        log_t = np.log([r["step_time_us"] for r in group])
+        exponents[key] = float(np.polyfit(log_n, log_t, 1)[0])
+    return exponents
+
+
+def environment_info():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return dict(
+        commit=commit,
+        python=platform.python_version(),
+        numpy=np.__version__,
+        platform=platform.platform(),
+        processor=platform.processor(),
+        time=time.strftime("%Y-%m-%dT%H:%M:%S"),
+    )
+
+
+def compare(results, baseline):
+    """Print the steps/sec and peak memory of results relative to a baseline."""
+    baseline = {r["id"]: r for r in baseline["results"] if "skipped" not in r}
+    print("{:<70} {:>10} {:>10}".format("case", "speedup", "memory"))
+    for result in results:
+        before = baseline.get(result["id"])
+        if before is None or "skipped" in result:
+            continue
+        print(
+            "{:<70} {:>9.2f}x {:>9.2f}x".format(
+                result["id"],
+                result["steps_per_sec"] / before["steps_per_sec"],
+                max(result["step_peak_memory_bytes"], 1)
+                / max(before["step_peak_memory_bytes"], 1),
+            )
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--scenarios", nargs="+", default=sorted(SCENARIOS), choices=sorted(SCENARIOS)
+    )
+    parser.add_argument(
+        "--mixes", nargs="+", default=None, help="Component mixes (default: all)"
+    )
+    parser.add_argument("--n-agents", nargs="+", type=int, default=[4, 16])
+    parser.add_argument("--world-sizes", nargs="+", type=int, default=[25])
+    parser.add_argument("--episode-lengths", nargs="+", type=int, default=[1000])
+    parser.add_argument(
+        "--dense-log", nargs="+", default=["off", "on"], choices=["off", "on"]
+    )
+    parser.add_argument(
+        "--flatten", nargs="+", default=["on", "off"], choices=["on", "off"]
+    )
+    parser.add_argument("--n-steps", type=int, default=200)
+    parser.add_argument("--n-resets", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None, help="JSON file (default: stdout)")
+    parser.add_argument(
+        "--baseline", default=None, help="JSON results to compare against"
+    )
+    args = parser.parse_args()
+
+    skip_reasons = {}
+    if "covid19" in args.scenarios:
+        reason = covid_unavailable_reason()
+        if reason is not None:
+            skip_reasons["covid19"] = reason
+
+    results = []
+    for case in iterate_cases(args):
+        if case["scenario"] in skip_reasons:
+            result = dict(case, skipped=skip_reasons[case["scenario"]])
+        else:
+            result = run_case(case, args.n_steps, args.n_resets, args.seed)
+        print(
+            "{:<70} {}".format(
+                case["id"],
+                result.get("skipped")
+                or "{:.1f} steps/sec".format(result["steps_per_sec"]),
+            ),
+            file=sys.stderr,
+        )
+        results.append(result)
+
+    report = dict(
+        environment=environment_info(),
+        arguments=vars(args),
+        results=results,
+        scaling_exponents=scaling_exponents(results),
+    )
+    if args.output is None:
+        print(json.dumps(report, indent=2))
+    else:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline, "r") as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# Copyright (c) 2020, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+Environment configuration and helpers shared by the unit tests
+"""
+
+import os
+
+from ai_economist import foundation
+
+ACTIVATION_CODE_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(foundation.__file__)), "activation_code.txt"
+)
+
+# A COVID-19 simulation (which needs a saved activation code, see
+# ai_economist/foundation/utils.py)
+COVID19_ENV_CONFIG = {
+    "collate_agent_step_and_reset_data": True,
+    "components": [
+        {"ControlUSStateOpenCloseStatus": {"action_cooldown_period": 28}},
+        {
+            "FederalGovernmentSubsidy": {
+                "num_subsidy_levels": 20,
+                "subsidy_interval": 90,
+                "max_annual_subsidy_per_person": 20000,
+            }
+        },
+        {
+            "VaccinationCampaign": {
+                "daily_vaccines_per_million_people": 3000,
+                "delivery_interval": 1,
+                "vaccine_delivery_start_date": "2021-01-12",
+            }
+        },
+    ],
+    "economic_reward_crra_eta": 2,
+    "episode_length": 200,
+    "flatten_masks": True,
+    "flatten_observations": False,
+    "health_priority_scaling_agents": 0.3,
+    "health_priority_scaling_planner": 0.45,
+    "infection_too_sick_to_work_rate": 0.1,
+    "multi_action_mode_agents": False,
+    "multi_action_mode_planner": False,
+    "n_agents": 51,
+    "path_to_data_and_fitted_params": "",
+    "pop_between_age_18_65": 0.6,
+    "risk_free_interest_rate": 0.03,
+    "world_size": [1, 1],
+    "start_date": "2020-03-22",
+    "use_real_world_data": False,
+    "use_real_world_policies": False,
+}
+
+COMPONENTS = [
+    ("Build", {}),
+    ("ContinuousDoubleAuction", {"max_num_orders": 5}),
+    ("Gather", {}),
+    ("PeriodicBracketTax", {"period": 10}),
+]
+
+
+def env_config(**overrides):
+    """
+    Return the configuration of a small wood and stone environment (4 agents, 15x15
+    world), with the given entries overridden.
+    """
+    config = {
+        "scenario_name": "uniform/simple_wood_and_stone",
+        "components": list(COMPONENTS),
+        "n_agents": 4,
+        "world_size": [15, 15],
+        "episode_length": 100,
+        "flatten_observations": True,
+    }
+    config.update(overrides)
+    return config
+
+
+def make_env(**overrides):
+    """Create an environment from env_config(**overrides)."""
+    return foundation.make_env_instance(**env_config(**overrides))
+
+
+def random_actions(env, rng):
+    """Return a dictionary of random (valid-index) actions of all the agents,
+    drawn from rng (an np.random.RandomState)."""
+    actions = {
+        str(agent.idx): rng.randint(agent.action_spaces) for agent in env.world.agents
+    }
+    actions["p"] = [rng.randint(n) for n in env.world.planner.action_spaces]
+    return actions
+
+
+def play_episode(env, rng, **reset_kwargs):
+    """Reset env and step it through an episode of random actions."""
+    env.reset(**reset_kwargs)
+    for _ in range(env.episode_length):
+        env.step(random_actions(env, rng))
+    return env
@@ -0,0 +1,99 @@
+# Copyright (c) 2020, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+Unit tests for stepping environments with arrays of actions
+"""
+
+import unittest
+
+import numpy as np
+
+from tests.helpers import make_env, random_actions
+
+
+def make_logged_env(**kwargs):
+    env = make_env(episode_length=40, seed=1, **kwargs)
+    env.reset(force_dense_logging=True)
+    return env
+
+
+def random_action_arrays(env, rng):
+    """Return random ([n_agents(, n_subactions)] agent array, planner list)."""
+    actions = random_actions(env, rng)
+    agent_actions = np.array([actions[str(agent.idx)] for agent in env.world.agents])
+    return agent_actions, actions["p"]
+
+
+class TestActionArrays(unittest.TestCase):
+    """Arrays of actions are equivalent to dictionaries of actions"""
+
+    def check_equivalence(self, **kwargs):
+        dict_env = make_logged_env(**kwargs)
+        array_env = make_logged_env(**kwargs)
+        rng = np.random.RandomState(0)
+        for _ in range(dict_env.episode_length):
+            agent_actions, planner_actions = random_action_arrays(dict_env, rng)
+            actions = {str(i): a for i, a in enumerate(agent_actions)}
+            obs, rew, done, _ = dict_env.step(dict(actions, p=planner_actions))
+            array_obs, array_rew, array_done, _ = array_env.step(
+                agent_actions, planner_actions=planner_actions
+            )
+            for k in obs:
+                np.testing.assert_array_equal(obs[k]["flat"], array_obs[k]["flat"])
+            self.assertEqual(rew, array_rew)
+            self.assertEqual(done, array_done)
+
+        dense_log = dict_env.previous_episode_dense_log.to_dict()
+        array_dense_log = array_env.previous_episode_dense_log.to_dict()
+        self.assertEqual(dense_log["actions"], array_dense_log["actions"])
+        self.assertEqual(dense_log["states"], array_dense_log["states"])
+
+        # Array actions are recorded for replay
+        replayed_log = array_env.replay(array_env.previous_episode_replay_log, 30)
+        self.assertEqual(list(replayed_log["actions"]), dense_log["actions"][30:])
+
+    def test_single_action_mode(self):
+        """
+        Agent actions index the combined action space
+        """
+        self.check_equivalence()
+
+    def test_multi_action_mode(self):
+        """
+        Agent actions hold one index per action subspace
+        """
+        self.check_equivalence(
+            multi_action_mode_agents=True, multi_action_mode_planner=True
+        )
+
+    def test_action_table(self):
+        """
+        Agents' action dictionaries are views of the world's action table
+        """
+        env = make_logged_env()
+        agent = env.world.agents[2]
+        single_action_map = agent.single_action_map
+        index = max(single_action_map)
+        action_name, action = single_action_map[index]
+
+        actions = np.zeros(env.n_agents, dtype=np.int64)
+        actions[2] = index
+        env.world.action_table.parse_actions(actions)
+        self.assertEqual(agent.action[action_name], action)
+        self.assertEqual(sum(agent.action.values()), action)
+        self.assertEqual(env.world.actions(action_name).tolist(), [0, 0, action, 0])
+        self.assertIsNone(env.world.actions("Unknown"))
+
+        agent.reset_actions()
+        self.assertFalse(env.world.action_table.data.any())
+
+        with self.assertRaises(IndexError):
+            env.step(np.full(env.n_agents, index + 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
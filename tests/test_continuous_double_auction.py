@@ -0,0 +1,181 @@
+# Copyright (c) 2020, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+Regression tests for the ContinuousDoubleAuction order book: random order streams
+are replayed through the OrderBook and through a reference copy of the original
+list-based matching logic, which must agree on every trade.
+"""
+
+import unittest
+
+import numpy as np
+
+from ai_economist.foundation.components.continuous_double_auction import OrderBook
+
+
+class ReferenceOrderBook:
+    """The original (sort-and-rescan) order book logic of ContinuousDoubleAuction."""
+
+    def __init__(self, n_agents, price_floor, price_ceiling):
+        self.n_agents = n_agents
+        self.price_floor = price_floor
+        n_prices = 1 + price_ceiling - price_floor
+        self.bids = []
+        self.asks = []
+        self.bid_hists = np.zeros((n_agents, n_prices))
+        self.ask_hists = np.zeros((n_agents, n_prices))
+        self.n_orders = [0 for _ in range(n_agents)]
+
+    def add_bid(self, buyer, price):
+        self.bids.append({"buyer": buyer, "bid": int(price), "bid_lifetime": 0})
+        self.bid_hists[buyer, price - self.price_floor] += 1
+        self.n_orders[buyer] += 1
+
+    def add_ask(self, seller, price):
+        self.asks.append({"seller": seller, "ask": int(price), "ask_lifetime": 0})
+        self.ask_hists[seller, price - self.price_floor] += 1
+        self.n_orders[seller] += 1
+
+    def match_orders(self):
+        matches = []
+        possible_match = [True for _ in range(self.n_agents)]
+        keep_checking = True
+
+        bids = sorted(
+            self.bids, key=lambda b: (b["bid"], b["bid_lifetime"]), reverse=True
+        )
+        asks = sorted(self.asks, key=lambda a: (a["ask"], -a["ask_lifetime"]))
+
+        while any(possible_match) and keep_checking:
+            idx_bid, idx_ask = 0, 0
+            while True:
+                if idx_bid >= len(bids):
+                    keep_checking = False
+                    break
+                if not possible_match[bids[idx_bid]["buyer"]]:
+                    idx_bid += 1
+                elif idx_ask >= len(asks):
+                    possible_match[bids[idx_bid]["buyer"]] = False
+                    break
+                elif asks[idx_ask]["seller"] == bids[idx_bid]["buyer"]:
+                    idx_ask += 1
+                elif bids[idx_bid]["bid"] < asks[idx_ask]["ask"]:
+                    possible_match[bids[idx_bid]["buyer"]] = False
+                    break
+                else:
+                    bid = bids.pop(idx_bid)
+                    ask = asks.pop(idx_ask)
+                    self.bid_hists[bid["buyer"], bid["bid"] - self.price_floor] -= 1
+                    self.ask_hists[ask["seller"], ask["ask"] - self.price_floor] -= 1
+                    self.n_orders[bid["buyer"]] -= 1
+                    self.n_orders[ask["seller"]] -= 1
+                    matches.append((bid, ask))
+                    break
+
+        self.bids = bids
+        self.asks = asks
+        return matches
+
+    def age_orders(self, order_duration):
+        expired_bids, expired_asks = [], []
+
+        bids_ = []
+        for bid in self.bids:
+            bid["bid_lifetime"] += 1
+            if bid["bid_lifetime"] <= order_duration:
+                bids_.append(bid)
+            else:
+                self.bid_hists[bid["buyer"], bid["bid"] - self.price_floor] -= 1
+                self.n_orders[bid["buyer"]] -= 1
+                expired_bids.append((bid["buyer"], bid["bid"]))
+
+        asks_ = []
+        for ask in self.asks:
+            ask["ask_lifetime"] += 1
+            if ask["ask_lifetime"] <= order_duration:
+                asks_.append(ask)
+            else:
+                self.ask_hists[ask["seller"], ask["ask"] - self.price_floor] -= 1
+                self.n_orders[ask["seller"]] -= 1
+                expired_asks.append((ask["seller"], ask["ask"]))
+
+        self.bids = bids_
+        self.asks = asks_
+        return expired_bids, expired_asks
+
+
+class TestOrderBook(unittest.TestCase):
+    """Replay random order streams through the new and the reference order book"""
+
+    def replay(self, seed, n_agents, max_bid_ask, order_duration, n_steps, p_order):
+        rng = np.random.RandomState(seed)
+        book = OrderBook(n_agents, 0, max_bid_ask)
+        reference = ReferenceOrderBook(n_agents, 0, max_bid_ask)
+
+        n_trades = 0
+        for _ in range(n_steps):
+            # Orders are created agent by agent, as in component_step
+            for agent_idx in range(n_agents):
+                if rng.rand() < p_order:
+                    price = rng.randint(max_bid_ask + 1)
+                    book.add_bid(agent_idx, price)
+                    reference.add_bid(agent_idx, price)
+                if rng.rand() < p_order:
+                    price = rng.randint(max_bid_ask + 1)
+                    book.add_ask(agent_idx, price)
+                    reference.add_ask(agent_idx, price)
+
+            matches = book.match_orders()
+            self.assertEqual(matches, reference.match_orders())
+            n_trades += len(matches)
+
+            expired = book.age_orders(order_duration)
+            expired_reference = reference.age_orders(order_duration)
+            for orders, reference_orders in zip(expired, expired_reference):
+                self.assertEqual(sorted(orders), sorted(reference_orders))
+            self.assertEqual(book.bids, reference.bids)
+            self.assertEqual(book.asks, reference.asks)
+            self.assertTrue(np.array_equal(book.bid_hists, reference.bid_hists))
+            self.assertTrue(np.array_equal(book.ask_hists, reference.ask_hists))
+            self.assertTrue(np.array_equal(book.bid_total, reference.bid_hists.sum(0)))
+            self.assertTrue(np.array_equal(book.ask_total, reference.ask_hists.sum(0)))
+            self.assertEqual(book.n_orders, reference.n_orders)
+
+        return n_trades
+
+    def test_random_order_streams(self):
+        """
+        The trades and the open orders match the reference implementation
+        """
+        for seed in range(10):
+            n_trades = self.replay(
+                seed,
+                n_agents=2 + seed % 5,
+                max_bid_ask=3 + seed,
+                order_duration=1 + 3 * seed,
+                n_steps=200,
+                p_order=0.2 + 0.07 * seed,
+            )
+            self.assertGreater(n_trades, 0)
+
+    def test_order_expiry(self):
+        """
+        Orders expire after order_duration steps, whichever side they are on
+        """
+        book = OrderBook(2, 0, 5)
+        book.add_ask(0, 5)
+        book.add_bid(1, 2)
+        self.assertEqual(book.match_orders(), [])
+        for _ in range(3):
+            self.assertEqual(book.age_orders(3), ([], []))
+        self.assertEqual(book.age_orders(3), ([(1, 2)], [(0, 5)]))
+        self.assertEqual(book.n_orders, [0, 0])
+        self.assertEqual(book.bids + book.asks, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+# Copyright (c) 2021, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+Unit tests for the compiled cache of the COVID-19 data and fitted model
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from ai_economist.foundation.scenarios.covid19 import covid19_data
+
+DATA_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "../ai_economist/datasets/covid19_datasets/data_and_fitted_params",
+)
+
+
+class TestCovid19Data(unittest.TestCase):
+    """Cached model data is read-only and identical to the data files"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.tmp_dir, "cache")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_cache(self):
+        """
+        The cache bundle is built once and memory-mapped read-only
+        """
+        reference = covid19_data.load_model_data(DATA_DIR, cache_dir=None)
+        model_data = covid19_data.load_model_data(DATA_DIR, cache_dir=self.cache_dir)
+
+        bundles = os.listdir(self.cache_dir)
+        self.assertEqual(
+            bundles, ["bundle_" + covid19_data.input_files_hash(DATA_DIR)]
+        )
+        for key in ["model_constants", "fitted_params"]:
+            self.assertEqual(model_data[key], reference[key])
+        for key in ["real_world_data", "unemployment_filters"]:
+            self.assertEqual(sorted(model_data[key]), sorted(reference[key]))
+            for name, array in model_data[key].items():
+                self.assertIsInstance(array, np.memmap)
+                self.assertFalse(array.flags.writeable)
+                self.assertEqual(array.dtype, reference[key][name].dtype)
+                np.testing.assert_array_equal(array, reference[key][name])
+
+        # Loading again reuses the data of this process
+        self.assertIs(
+            covid19_data.load_model_data(DATA_DIR, cache_dir=self.cache_dir),
+            model_data,
+        )
+
+    def test_changed_input_files(self):
+        """
+        Changing an input file builds a new bundle
+        """
+        data_dir = os.path.join(self.tmp_dir, "data")
+        shutil.copytree(DATA_DIR, data_dir)
+        covid19_data.load_model_data(data_dir, cache_dir=self.cache_dir)
+
+        fitted_params_file = os.path.join(data_dir, covid19_data.FITTED_PARAMS_FILE)
+        with open(fitted_params_file, "r") as fp:
+            fitted_params = json.load(fp)
+        fitted_params["FILTER_LEN"] = 300
+        with open(fitted_params_file, "w") as fp:
+            json.dump(fitted_params, fp)
+
+        model_data = covid19_data.load_model_data(data_dir, cache_dir=self.cache_dir)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+        self.assertEqual(
+            model_data["unemployment_filters"]["unemp_conv_filters"].shape[-1], 300
+        )
+
+    @unittest.skipUnless(hasattr(os, "getuid"), "no POSIX file ownership")
+    def test_private_cache(self):
+        """
+        The cache is per-user, and bundles writable by others are not trusted
+        """
+        environ = dict(os.environ)
+        try:
+            os.environ["XDG_CACHE_HOME"] = self.tmp_dir
+            self.assertEqual(
+                covid19_data.default_cache_dir(),
+                os.path.join(self.tmp_dir, "ai_economist", "covid19"),
+            )
+        finally:
+            os.environ.clear()
+            os.environ.update(environ)
+
+        covid19_data.load_model_data(DATA_DIR, cache_dir=self.cache_dir)
+        self.assertEqual(os.stat(self.cache_dir).st_mode & 0o777, 0o700)
+
+        # (Another process, so that the data isn't reused)
+        covid19_data._loaded_model_data.clear()
+        bundle_dir = os.path.join(self.cache_dir, os.listdir(self.cache_dir)[0])
+        os.chmod(bundle_dir, 0o777)
+        with self.assertRaises(PermissionError):
+            covid19_data.load_model_data(DATA_DIR, cache_dir=self.cache_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
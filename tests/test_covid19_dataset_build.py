@@ -0,0 +1,238 @@
+# Copyright (c) 2021, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+Unit tests for the offline build of the COVID-19 real-world data
+"""
+
+import csv
+import functools
+import http.server
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import numpy as np
+
+from ai_economist.datasets.covid19_datasets import build_real_world_data as build
+
+STATES = sorted(build.US_STATE_TO_FIPS)
+
+
+def write_csv(path, header, rows):
+    with open(path, "w", newline="") as fp:
+        writer = csv.writer(fp)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def write_raw_files(raw_dir, rng):
+    """Write small raw files, in the formats of the sources, for all the states."""
+    os.makedirs(os.path.join(raw_dir, "bls"))
+    policy_dates = np.arange("2020-03-01", "2020-06-09", dtype="datetime64[D]")
+    rows = [["United States", "NAT_GOV", "20200301", "50"]]
+    for state in STATES:
+        name = "Washington DC" if state == "District of Columbia" else state
+        for date in policy_dates:
+            index = "" if rng.rand() < 0.1 else "{:.2f}".format(rng.uniform(0, 100))
+            rows.append([name, "STATE_WIDE", str(date).replace("-", ""), index])
+    write_csv(
+        os.path.join(raw_dir, "OxCGRT_US_latest.csv"),
+        ["RegionName", "Jurisdiction", "Date", "StringencyIndex"],
+        rows,
+    )
+
+    death_dates = np.arange("2020-02-01", "2020-07-01", dtype="datetime64[D]")
+    rows = []
+    for state in STATES:
+        for county in range(2):
+            deaths = np.cumsum(rng.randint(0, 50, size=len(death_dates)))
+            rows.append([state, county, rng.randint(1e5, 1e7)] + deaths.tolist())
+    write_csv(
+        os.path.join(raw_dir, "time_series_covid19_deaths_US.csv"),
+        ["Province_State", "Admin2", "Population"]
+        + [
+            "{}/{}/{}".format(d.month, d.day, d.year % 2000)
+            for d in death_dates.astype(object)
+        ],
+        rows,
+    )
+
+    rows = []
+    for state in STATES:
+        name = "New York State" if state == "New York" else state
+        for day, date in enumerate(policy_dates[10:]):
+            value = "" if day % 3 == 1 else str(1000 * day)
+            rows.append([str(date), name, value])
+    write_csv(
+        os.path.join(raw_dir, "us_state_vaccinations.csv"),
+        ["date", "location", "people_fully_vaccinated"],
+        rows,
+    )
+
+    for (relative_path, _), state in zip(build.raw_files("unemployment"), STATES):
+        rows = "".join(
+            "<tr><th>2020</th><th>{}</th><td>x</td><td>{:.1f}(P)</td></tr>".format(
+                month, rng.uniform(3, 15)
+            )
+            for month in ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul"]
+        )
+        with open(os.path.join(raw_dir, relative_path), "w") as fp:
+            fp.write(
+                "<html><body><table><tr><td>Series</td></tr></table>"
+                "<table><tr><th>Year</th><th>Period</th></tr>{}"
+                "<tr><td>footnotes</td></tr></table></body></html>".format(rows)
+            )
+
+
+def load_outputs(output_dir):
+    with np.load(os.path.join(output_dir, "real_world_data.npz")) as data:
+        return {key: data[key] for key in data}
+
+
+class TestCovid19DatasetBuild(unittest.TestCase):
+    """The real-world data is built offline, reprocessing only changed sources"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.raw_dir = os.path.join(self.tmp_dir, "raw")
+        self.output_dir = os.path.join(self.tmp_dir, "output")
+        write_raw_files(self.raw_dir, np.random.RandomState(0))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_build(self):
+        """
+        The built data has the layout read by the simulation
+        """
+        processed = build.build_real_world_data(self.raw_dir, self.output_dir)
+        self.assertEqual(processed, list(build.SOURCES))
+
+        data = load_outputs(self.output_dir)
+        self.assertEqual(
+            sorted(data),
+            sorted(
+                [
+                    "policy",
+                    "subsidy",
+                    "deaths",
+                    "vaccinated",
+                    "smoothed_deaths",
+                    "susceptible",
+                    "infected",
+                    "recovered",
+                    "beta",
+                    "unemployment",
+                    "unemployed",
+                ]
+            ),
+        )
+        self.assertEqual(data["policy"].shape, (100, 51))
+        self.assertEqual(data["policy"].dtype, np.int64)
+        self.assertEqual(data["subsidy"].shape, (100, 1))
+        self.assertEqual(data["subsidy"][45, 0], 274e9)  # (2020-04-15)
+        self.assertTrue(np.all((data["policy"] >= 1) & (data["policy"] <= 10)))
+
+        policies = build.load_artifact(
+            os.path.join(self.output_dir, "artifacts"), "policies"
+        )
+        self.assertEqual(policies["states"].tolist(), STATES)
+        index = policies["stringency_index"]
+        for state_idx in range(len(STATES)):
+            for t in range(1, len(index)):
+                if np.isnan(index[t, state_idx]):
+                    index[t, state_idx] = index[t - 1, state_idx]
+        index[np.isnan(index)] = 0
+        np.testing.assert_array_equal(data["policy"], build.discretize(index))
+
+        deaths = build.load_artifact(
+            os.path.join(self.output_dir, "artifacts"), "deaths"
+        )
+        # The death data starts on 2020-02-01, the policy data on 2020-03-01
+        np.testing.assert_array_equal(data["deaths"], deaths["deaths"][29:129])
+        np.testing.assert_array_equal(data["vaccinated"][:10], 0)
+        np.testing.assert_array_equal(data["vaccinated"][10:13, 0], [0, 1000, 2000])
+        population = np.array(deaths["population"], dtype=np.float64)
+        np.testing.assert_allclose(
+            data["unemployed"], data["unemployment"] * population / 100
+        )
+        self.assertTrue(np.all(data["unemployment"][:31] != data["unemployment"][31]))
+
+        # SIR numbers are consistent with the (smoothed) deaths
+        np.testing.assert_allclose(
+            data["recovered"],
+            data["smoothed_deaths"] / build.SIR_MORTALITY + data["vaccinated"],
+        )
+        total = data["susceptible"] + data["infected"] + data["recovered"]
+        valid = np.isfinite(total)
+        self.assertTrue(valid[40:60].all())
+        np.testing.assert_allclose(
+            total[valid], np.broadcast_to(population, total.shape)[valid]
+        )
+
+    def test_incremental_build(self):
+        """
+        Only the sources whose raw files changed are processed again
+        """
+        build.build_real_world_data(self.raw_dir, self.output_dir, max_workers=1)
+        data = load_outputs(self.output_dir)
+        self.assertEqual(
+            build.build_real_world_data(self.raw_dir, self.output_dir, max_workers=1),
+            [],
+        )
+
+        path = os.path.join(self.raw_dir, "us_state_vaccinations.csv")
+        with open(path, "a") as fp:
+            fp.write("2020-06-08,Alabama,99999\n")
+        self.assertEqual(
+            build.build_real_world_data(self.raw_dir, self.output_dir, max_workers=1),
+            ["vaccinations"],
+        )
+        self.assertEqual(load_outputs(self.output_dir)["vaccinated"][-1, 0], 99999)
+
+        # Corrupted artifacts are processed again, with the same content
+        artifact_dir = os.path.join(self.output_dir, "artifacts")
+        np.savez(os.path.join(artifact_dir, "deaths.npz"), deaths=np.zeros(1))
+        self.assertEqual(
+            build.build_real_world_data(self.raw_dir, self.output_dir, max_workers=1),
+            ["deaths"],
+        )
+        np.testing.assert_array_equal(
+            load_outputs(self.output_dir)["deaths"], data["deaths"]
+        )
+
+    def test_fetch_from_mirror(self):
+        """
+        Raw files are downloaded from a (local) mirror
+        """
+        handler = functools.partial(
+            http.server.SimpleHTTPRequestHandler, directory=self.raw_dir
+        )
+        handler.log_message = lambda *args: None
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            fetched_dir = os.path.join(self.tmp_dir, "fetched")
+            build.fetch_raw_files(
+                fetched_dir, base_url="http://127.0.0.1:{}/".format(server.server_port)
+            )
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        for source in build.SOURCES:
+            self.assertEqual(
+                build.input_hash(fetched_dir, source, {}),
+                build.input_hash(self.raw_dir, source, {}),
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+# Copyright (c) 2021, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+Unit tests for the parameter sensitivity sweeps of the COVID-19 simulation
+"""
+
+import os
+import unittest
+
+import numpy as np
+
+from tests.helpers import ACTIVATION_CODE_FILE
+from tests.helpers import COVID19_ENV_CONFIG as ENV_CONFIG
+
+
+@unittest.skipUnless(
+    os.path.isfile(ACTIVATION_CODE_FILE),
+    "no saved activation code (see ai_economist/foundation/utils.py)",
+)
+class TestCovid19Sweep(unittest.TestCase):
+    """Each lane of a sweep matches a single modulated environment"""
+
+    def test_sweep(self):
+        """
+        Lanes match single environments, across batches
+        """
+        from ai_economist.foundation.scenarios.covid19.covid19_env import (
+            CovidAndEconomyEnvironment,
+        )
+        from ai_economist.foundation.scenarios.covid19.covid19_sweep import (
+            modulation_grid,
+            run_modulation_sweep,
+        )
+
+        modulations = modulation_grid([0.8, 1.2], [1.0], [0.5, 1.0, 1.5])
+        self.assertEqual(modulations.shape, (6, 3))
+        np.testing.assert_array_equal(modulations[1], [0.8, 1.0, 1.0])
+
+        episode_length = ENV_CONFIG["episode_length"]
+        rng = np.random.RandomState(0)
+        agent_actions = rng.randint(11, size=(episode_length, 51)) * (
+            rng.rand(episode_length, 51) < 0.05
+        )
+        planner_actions = rng.randint(21, size=(len(modulations), episode_length))
+        results = run_modulation_sweep(
+            ENV_CONFIG, modulations, agent_actions, planner_actions, batch_size=4
+        )
+
+        for lane, (beta_intercept, beta_slope, unemployment) in enumerate(modulations):
+            env = CovidAndEconomyEnvironment(**ENV_CONFIG)
+            env.reset()
+            env.set_parameter_modulations(
+                beta_intercept=beta_intercept,
+                beta_slope=beta_slope,
+                unemployment=unemployment,
+            )
+            for t in range(episode_length):
+                _, rew, _, _ = env.step(
+                    agent_actions[t], planner_actions=int(planner_actions[lane, t])
+                )
+                np.testing.assert_allclose(
+                    results["agent_rewards"][lane, t], rew["a"], rtol=1e-4
+                )
+                np.testing.assert_allclose(
+                    results["planner_rewards"][lane, t], rew["p"], rtol=1e-4
+                )
+            for key, state_key in [
+                ("deaths", "Deaths"),
+                ("unemployed", "Unemployed"),
+                ("productivity", "Postsubsidy Productivity"),
+            ]:
+                np.testing.assert_allclose(
+                    results[key][lane], env.world.global_state[state_key], rtol=1e-4
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()
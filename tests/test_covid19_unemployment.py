@@ -0,0 +1,75 @@
+# Copyright (c) 2021, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+Unit tests for the recursive unemployment filters of the COVID-19 simulation
+"""
+
+import os
+import unittest
+
+import numpy as np
+
+from tests.helpers import ACTIVATION_CODE_FILE
+from tests.helpers import COVID19_ENV_CONFIG as ENV_CONFIG
+
+
+@unittest.skipUnless(
+    os.path.isfile(ACTIVATION_CODE_FILE),
+    "no saved activation code (see ai_economist/foundation/utils.py)",
+)
+class TestCovid19Unemployment(unittest.TestCase):
+    """Recursive filter responses match the convolution over the history"""
+
+    def test_recursive_filter(self):
+        """
+        Unemployment agrees with the convolution beyond the filter length
+        """
+        from ai_economist.foundation.scenarios.covid19.covid19_env import (
+            CovidAndEconomyEnvironment,
+        )
+
+        # Longer than the filter window, with parameter modulations
+        episode_length = 800
+        envs = [
+            CovidAndEconomyEnvironment(
+                **dict(
+                    ENV_CONFIG,
+                    episode_length=episode_length,
+                    unemployment_filter=unemployment_filter,
+                )
+            )
+            for unemployment_filter in ["convolution", "verify"]
+        ]
+        for env in envs:
+            env.reset()
+            self.assertEqual(len(env.stringency_level_history), env.filter_len + 1)
+
+        rng = np.random.RandomState(0)
+        for t in range(episode_length - 1):
+            agent_actions = rng.randint(11, size=51) * (rng.rand(51) < 0.05)
+            if t == 300:
+                for env in envs:
+                    env.set_parameter_modulations(unemployment=1.5)
+            for env in envs:
+                env.step(agent_actions, planner_actions=0)
+
+        reference_env, env = envs
+        np.testing.assert_allclose(
+            env.world.global_state["Unemployed"],
+            reference_env.world.global_state["Unemployed"],
+            rtol=1e-5,
+        )
+        self.assertEqual(env.stringency_level_history.shape, (env.filter_len + 1, 51))
+
+        # Diverged recursive responses are reported, even without asserts
+        env._filter_responses += 1.0
+        with self.assertRaises(RuntimeError):
+            env.step(np.zeros(51, dtype=np.int64), planner_actions=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
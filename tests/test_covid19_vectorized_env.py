@@ -0,0 +1,106 @@
+# Copyright (c) 2021, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+Unit tests for the batched CPU implementation of the COVID-19 simulation
+"""
+
+import os
+import unittest
+
+import numpy as np
+
+from tests.helpers import ACTIVATION_CODE_FILE
+from tests.helpers import COVID19_ENV_CONFIG as ENV_CONFIG
+
+
+@unittest.skipUnless(
+    os.path.isfile(ACTIVATION_CODE_FILE),
+    "no saved activation code (see ai_economist/foundation/utils.py)",
+)
+class TestCovid19VectorizedEnv(unittest.TestCase):
+    """The batched simulation matches independent CovidAndEconomyEnvironments"""
+
+    def test_consistency(self):
+        """
+        Observations, rewards and states match those of single environments
+        """
+        from ai_economist.foundation.scenarios.covid19.covid19_env import (
+            CovidAndEconomyEnvironment,
+        )
+        from ai_economist.foundation.scenarios.covid19.covid19_vectorized_env import (
+            VectorizedCovidAndEconomyEnvironment,
+        )
+
+        n_envs = 3
+        vec_env = VectorizedCovidAndEconomyEnvironment(
+            ENV_CONFIG, n_envs=n_envs, auto_reset=False
+        )
+        envs = [CovidAndEconomyEnvironment(**ENV_CONFIG) for _ in range(n_envs)]
+
+        def check_obs(vec_obs, obs):
+            for key in ["a", "p"]:
+                self.assertEqual(list(vec_obs[key]), list(obs[0][key]))
+                for env_idx in range(n_envs):
+                    for name, value in obs[env_idx][key].items():
+                        np.testing.assert_allclose(
+                            vec_obs[key][name][env_idx], value, rtol=1e-5, atol=1e-6
+                        )
+
+        # Each environment has its own parameter modulations
+        modulations = np.array([0.8, 1.0, 1.3])
+        vec_obs = vec_env.reset()
+        vec_env.set_parameter_modulations(
+            beta_intercept=modulations, unemployment=modulations[::-1]
+        )
+        obs = []
+        for env_idx, env in enumerate(envs):
+            obs.append(env.reset())
+            env.set_parameter_modulations(
+                beta_intercept=modulations[env_idx],
+                unemployment=modulations[::-1][env_idx],
+            )
+        check_obs(vec_obs, obs)
+
+        rng = np.random.RandomState(0)
+        env_idx = np.arange(n_envs)
+        for _ in range(vec_env.episode_length):
+            # Random actions, among those allowed by the action masks
+            agent_actions = rng.randint(11, size=(n_envs, vec_env.n_agents))
+            agent_actions *= (
+                vec_obs["a"]["action_mask"][
+                    env_idx[:, None], agent_actions, np.arange(vec_env.n_agents)
+                ]
+                > 0
+            )
+            planner_actions = rng.randint(21, size=n_envs)
+            planner_actions *= (
+                vec_obs["p"]["action_mask"][env_idx, planner_actions] > 0
+            )
+
+            vec_obs, vec_rew, vec_done, _ = vec_env.step(
+                agent_actions, planner_actions
+            )
+            results = [
+                env.step(agent_actions[i], planner_actions=int(planner_actions[i]))
+                for i, env in enumerate(envs)
+            ]
+            check_obs(vec_obs, [result[0] for result in results])
+            for i, (_, rew, done, _) in enumerate(results):
+                np.testing.assert_allclose(vec_rew["a"][i], rew["a"], rtol=1e-4)
+                np.testing.assert_allclose(vec_rew["p"][i], rew["p"], rtol=1e-4)
+                self.assertEqual(vec_done[i], done["__all__"])
+
+        self.assertTrue(vec_done.all())
+        for i, env in enumerate(envs):
+            for key, value in env.world.global_state.items():
+                np.testing.assert_allclose(
+                    vec_env.global_state[key][i], value, rtol=1e-4, atol=1e-3
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+# Copyright (c) 2020, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+Unit tests for the columnar dense log
+"""
+
+import json
+import os
+import pickle
+import tempfile
+import unittest
+
+import lz4.frame
+import numpy as np
+
+from ai_economist import foundation
+from ai_economist.foundation.base.dense_log import DenseLog
+from tests import helpers
+
+
+def play_episode(seed, **kwargs):
+    """Play a dense-logged episode with random actions and return the env."""
+    env = helpers.make_env(
+        components=helpers.COMPONENTS[:3],
+        episode_length=60,
+        world_dense_log_frequency=7,
+        seed=seed,
+        **kwargs
+    )
+    return helpers.play_episode(
+        env, np.random.RandomState(seed), force_dense_logging=True
+    )
+
+
+class TestDenseLog(unittest.TestCase):
+    """Tests of the DenseLogWriter/DenseLog round trip"""
+
+    def test_format(self):
+        """
+        The dense log reads like the nested dictionary format
+        """
+        env = play_episode(1)
+        dense_log = env.previous_episode_dense_log
+        self.assertIsInstance(dense_log, DenseLog)
+
+        n_steps = env.episode_length
+        self.assertEqual(len(dense_log["states"]), n_steps + 1)
+        self.assertEqual(len(dense_log["world"]), n_steps + 1)
+        self.assertEqual(len(dense_log["actions"]), n_steps)
+        self.assertEqual(len(dense_log["rewards"]), n_steps)
+        for t, world in enumerate(dense_log["world"][:-1]):
+            self.assertEqual(world == {}, t % 7 != 0)
+        self.assertEqual(
+            dense_log["world"][-1]["Wood"],
+            env.world.maps.get("Wood").tolist(),
+        )
+
+        final_states = dense_log["states"][-1]
+        for agent in env.all_agents:
+            self.assertEqual(final_states[str(agent.idx)], agent.state.copy())
+        self.assertIn("Build", dense_log)
+
+        # The whole log is JSON-serializable
+        json.dumps(dense_log.to_dict())
+
+    def test_streaming_and_saving(self):
+        """
+        Streamed, saved and in-memory logs are identical
+        """
+        dense_log = play_episode(2).previous_episode_dense_log.to_dict()
+
+        with tempfile.TemporaryDirectory() as log_dir:
+            env = play_episode(2, dense_log_directory=log_dir)
+            streamed_log = env.previous_episode_dense_log
+            self.assertTrue(os.path.isfile(streamed_log.path))
+            self.assertEqual(streamed_log.to_dict(), dense_log)
+
+            filepath = os.path.join(log_dir, "episode.lz4")
+            foundation.utils.save_episode_log(env, filepath)
+            self.assertEqual(
+                foundation.utils.load_episode_log(filepath).to_dict(), dense_log
+            )
+
+            # Logs saved as JSON can still be loaded
+            with lz4.frame.open(filepath, mode="wb") as log_file:
+                log_file.write(json.dumps(dense_log).encode("utf-8"))
+            self.assertEqual(foundation.utils.load_episode_log(filepath), dense_log)
+
+            # Other files (e.g. pickles) are rejected without being deserialized
+            with lz4.frame.open(filepath, mode="wb") as log_file:
+                log_file.write(pickle.dumps(dense_log))
+            with self.assertRaises(ValueError):
+                foundation.utils.load_episode_log(filepath)
+            with self.assertRaises(ValueError):
+                DenseLog(path=filepath).to_dict()
+
+    def test_partial_log(self):
+        """
+        The current dense log can be read during the episode
+        """
+        env = play_episode(3)
+        env.reset(force_dense_logging=True)
+        for _ in range(10):
+            env.step({})
+        dense_log = env.dense_log
+        self.assertEqual(len(dense_log["states"]), 10)
+        self.assertEqual(len(dense_log["rewards"]), 10)
+        self.assertEqual(
+            dense_log["actions"][-1], {str(a.idx): {} for a in env.all_agents}
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
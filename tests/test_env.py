@@ -9,6 +9,9 @@ Unit tests for the wood and stone scenario + basic components
 """
 
 import unittest
+from copy import deepcopy
+
+import numpy as np
 
 from ai_economist import foundation
 
@@ -106,6 +109,134 @@ class TestEnv(unittest.TestCase):
         # Assert that __all__ is in done
         assert "__all__" in done
 
+    def test_agent_state_table(self):
+        """
+        Unit tests for the array-backed agent state and the world accessors
+        """
+        env = CreateEnv().env
+        env.reset()
+        world = env.world
+
+        # Per-agent views and population arrays refer to the same storage
+        world.agents[1].state["inventory"]["Coin"] += 5
+        world.inventory("Coin")[2] += 3
+        self.assertEqual(
+            list(world.inventory("Coin")),
+            [agent.inventory["Coin"] for agent in world.agents],
+        )
+        self.assertEqual(world.agents[2].inventory["Coin"], 13)
+        self.assertEqual(world.total_endowment("Coin")[1], 15)
+
+        # Snapshots are plain dictionaries
+        snapshot = world.agents[0].state.copy()
+        self.assertIsInstance(snapshot["inventory"], dict)
+        self.assertNotIn("loc", world.planner.state)
+
+    def test_reuse_observation_buffers(self):
+        """
+        Unit tests for the preallocated flat observation buffers
+        """
+        create_env = CreateEnv()
+        env_config = dict(create_env.env_config, flatten_observations=True)
+        first_obs, obs = [], []
+        for reuse_observation_buffers in [False, True]:
+            env = foundation.make_env_instance(
+                **env_config, reuse_observation_buffers=reuse_observation_buffers
+            )
+            env.seed(1)
+            first_obs.append(env.reset())
+            obs.append(env.step({})[0])
+        self.assertEqual(first_obs[1]["0"]["flat"].dtype, np.float32)
+
+        for aidx in obs[0]:
+            self.assertTrue(np.array_equal(obs[0][aidx]["flat"], obs[1][aidx]["flat"]))
+            # Reused buffers are returned again; fresh ones are not
+            self.assertIs(obs[1][aidx]["flat"], first_obs[1][aidx]["flat"])
+            self.assertIsNot(obs[0][aidx]["flat"], first_obs[0][aidx]["flat"])
+
+    def test_persistent_map_tensors(self):
+        """
+        Unit tests for the map tensors maintained in place by Maps
+        """
+        env = CreateEnv().env
+        env.reset()
+        maps = env.world.maps
+        for _ in range(50):
+            actions = {
+                str(agent.idx): np.random.randint(agent.action_spaces)
+                for agent in env.world.agents
+            }
+            version = maps.version
+            env.step(actions)
+            self.assertGreaterEqual(maps.version, version)
+
+            self.assertTrue(
+                np.array_equal(
+                    maps.state,
+                    np.stack([maps.get(k) for k in maps.keys()]).astype(np.float32),
+                )
+            )
+            self.assertTrue(
+                np.array_equal(
+                    maps.owner_state,
+                    np.stack([maps.get(k, owner=True) for k in ["House"]]),
+                )
+            )
+            loc_map = -np.ones(env.world.world_size, dtype=np.int16)
+            for agent in env.world.agents:
+                loc_map[agent.loc[0], agent.loc[1]] = agent.idx
+            self.assertTrue(np.array_equal(env.world.loc_map, loc_map))
+
+        # The tensors are read-only views
+        self.assertFalse(maps.state.flags.writeable)
+
+    def test_egocentric_windows(self):
+        """
+        Unit tests for the agent windows gathered from the padded map buffers
+        """
+        env = CreateEnv().env
+        obs = env.reset()
+        maps = env.world.maps
+        w = env._mobile_agent_observation_range
+        for _ in range(50):
+            # Reference: pad the full maps and slice each agent's window
+            padded_map = np.pad(
+                maps.state,
+                [(0, 1), (w, w), (w, w)],
+                mode="constant",
+                constant_values=[(0, 1), (0, 0), (0, 0)],
+            )
+            agent_idx_maps = np.concatenate([maps.owner_state, maps.loc_map[None]])
+            agent_idx_maps += 2
+            agent_idx_maps[agent_idx_maps == 1] = 0
+            padded_idx = np.pad(agent_idx_maps, [(0, 0), (w, w), (w, w)])
+            for agent in env.world.agents:
+                r, c = agent.loc
+                visible_idx = np.array(
+                    padded_idx[:, r : r + 2 * w + 1, c : c + 2 * w + 1]
+                )
+                visible_idx[visible_idx == agent.idx + 2] = 1
+                agent_obs = obs[str(agent.idx)]
+                self.assertTrue(
+                    np.array_equal(
+                        agent_obs["world-map"],
+                        padded_map[:, r : r + 2 * w + 1, c : c + 2 * w + 1],
+                    )
+                )
+                self.assertTrue(np.array_equal(agent_obs["world-idx_map"], visible_idx))
+
+            actions = {
+                str(agent.idx): np.random.randint(agent.action_spaces)
+                for agent in env.world.agents
+            }
+            obs, _, _, _ = env.step(actions)
+
+        # Copies of the maps keep the tensors inside their own padded buffers
+        maps_copy = deepcopy(maps)
+        maps_copy.set_point("Wood", 0, 0, 2)
+        self.assertEqual(maps_copy.state[maps_copy._state_lookup["Wood"], 0, 0], 2)
+        self.assertTrue(np.shares_memory(maps_copy.state, maps_copy._padded_state))
+
 
 if __name__ == "__main__":
     unittest.main()
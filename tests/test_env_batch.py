@@ -0,0 +1,224 @@
+# Copyright (c) 2020, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+Unit tests for the environment batch
+"""
+
+import unittest
+
+import numpy as np
+
+from ai_economist.foundation.env_batch import EnvironmentBatch
+from ai_economist.foundation.scenarios import scenario_registry
+from tests.helpers import env_config
+
+ENV_CONFIG = env_config(
+    episode_length=5, multi_action_mode_planner=True, starting_agent_coin=10
+)
+
+HETERO_ENV_CONFIG = env_config(
+    scenario_name="layout_from_file/hetero_agents",
+    world_size=[25, 25],
+    episode_length=25,
+    env_layout_file="quadrant_25x25_20each_30clump.txt",
+    mobile_agent_class="HeteroMobileAgent",
+    env_weighting=[0.0, 0.0, 0.5, 1.0],
+    equ_weighting=[0.0, 0.0, 0.5, 1.0],
+    multi_action_mode_planner=True,
+    starting_agent_coin=10,
+)
+
+
+def make_independent_envs(config, n_envs, seed):
+    """The environments of EnvironmentBatch(config, n_envs, seed), as independent
+    environments."""
+    scenario_class = scenario_registry.get(config["scenario_name"])
+    kwargs = {k: v for k, v in config.items() if k != "scenario_name"}
+    return [
+        scenario_class(**dict(kwargs, seed=env_seed))
+        for env_seed in np.random.SeedSequence(seed).spawn(n_envs)
+    ]
+
+
+class TestEnvironmentBatch(unittest.TestCase):
+    """Unit test for batched reset and step"""
+
+    def test_reset_and_step(self):
+        n_envs = 3
+        env_batch = EnvironmentBatch(ENV_CONFIG, n_envs=n_envs, seed=1)
+        n_agents = ENV_CONFIG["n_agents"]
+
+        obs = env_batch.reset()
+        self.assertEqual(obs["a"]["flat"].shape[:2], (n_envs, n_agents))
+        self.assertEqual(obs["p"]["flat"].shape[0], n_envs)
+        self.assertEqual(
+            env_batch.inventory.shape, (n_envs, n_agents, len(env_batch.resources))
+        )
+        np.testing.assert_array_equal(env_batch.total_endowment("Coin"), 10)
+        for env_idx, env in enumerate(env_batch.envs):
+            for agent in env.world.agents:
+                np.testing.assert_array_equal(
+                    env_batch.locs[env_idx, agent.idx], agent.loc
+                )
+
+        agent_actions = np.zeros((n_envs, n_agents), dtype=np.int32)
+        for t in range(ENV_CONFIG["episode_length"]):
+            obs, rew, done, info = env_batch.step(agent_actions)
+            self.assertEqual(rew["a"].shape, (n_envs, n_agents))
+            self.assertEqual(rew["p"].shape, (n_envs,))
+            self.assertEqual(len(info), n_envs)
+
+        # Every environment completed its episode and was reset.
+        self.assertTrue(done.all())
+        self.assertTrue(all("metrics" in env_info for env_info in info))
+        self.assertTrue(all(env.world.timestep == 0 for env in env_batch.envs))
+        self.assertEqual(env_batch.maps.shape[:2], (n_envs, len(env_batch.map_keys)))
+        np.testing.assert_array_equal(
+            env_batch.maps[1], env_batch.envs[1].world.maps.state
+        )
+
+    def test_state_is_shared_with_envs(self):
+        env_batch = EnvironmentBatch(ENV_CONFIG, n_envs=2, seed=1)
+        env_batch.reset()
+        env = env_batch.envs[1]
+
+        env_batch.inventory[1, 2, env_batch.resources.index("Wood")] = 3
+        self.assertEqual(env.world.agents[2].inventory["Wood"], 3)
+        env.world.agents[0].state["endogenous"]["Labor"] = 7
+        self.assertEqual(env_batch.endogenous_state[1, 0, 0], 7)
+
+        env.world.maps.set_point("Wood", 0, 0, 2)
+        self.assertEqual(env_batch.maps[1, env_batch.map_keys.index("Wood"), 0, 0], 2)
+        self.assertEqual(env_batch.maps[0, env_batch.map_keys.index("Wood"), 0, 0], 0)
+
+    def assert_obs_match(self, obs, env_idx, env_obs):
+        """Check the observations of env env_idx of a batch against env_obs."""
+        for i in range(obs["a"]["flat"].shape[1]):
+            for k, v in EnvironmentBatch._flat_items(env_obs[str(i)]):
+                np.testing.assert_array_equal(obs["a"][k][env_idx, i], v)
+        for k, v in EnvironmentBatch._flat_items(env_obs["p"]):
+            np.testing.assert_array_equal(obs["p"][k][env_idx], v)
+
+    def assert_steps_like_independent_envs(self, config, n_envs=3, n_steps=60, seed=2):
+        """Step EnvironmentBatch(config) and the same environments independently
+        with the same random actions, and check that they match exactly."""
+        env_batch = EnvironmentBatch(config, n_envs=n_envs, seed=seed)
+        envs = make_independent_envs(config, n_envs, seed)
+        n_agents = env_batch.n_agents
+
+        obs = env_batch.reset()
+        for env_idx, env in enumerate(envs):
+            self.assert_obs_match(obs, env_idx, env.reset())
+        self.assertTrue(env_batch._batched)
+
+        # Give the agents resources to build with
+        for resource in ["Wood", "Stone"]:
+            env_batch.inventory[..., env_batch.resources.index(resource)] += 5
+            for env in envs:
+                for agent in env.world.agents:
+                    agent.state["inventory"][resource] += 5
+
+        agent = envs[0].world.agents[0]
+        planner = envs[0].world.planner
+        rng = np.random.default_rng(seed)
+        n_builds = 0
+        for _ in range(n_steps):
+            shape = (n_envs, n_agents)
+            if env_batch.multi_action_mode_agents:
+                shape += (len(agent.action_spaces),)
+            agent_actions = rng.integers(0, agent.action_spaces, size=shape)
+            planner_actions = None
+            if env_batch.multi_action_mode_planner:
+                planner_actions = rng.integers(
+                    0, planner.action_spaces, size=(n_envs, len(planner.action_spaces))
+                )
+
+            obs, rew, done, info = env_batch.step(agent_actions, planner_actions)
+            for env_idx, env in enumerate(envs):
+                env_obs, env_rew, env_done, _ = env.step(
+                    agent_actions[env_idx],
+                    planner_actions=(
+                        None if planner_actions is None else planner_actions[env_idx]
+                    ),
+                )
+                n_builds += len(env.get_component("Build").builds[-1])
+                self.assertEqual(done[env_idx], env_done["__all__"])
+                if env_done["__all__"]:
+                    metrics = env.metrics
+                    self.assertEqual(info[env_idx]["metrics"].keys(), metrics.keys())
+                    for k, v in metrics.items():
+                        np.testing.assert_equal(info[env_idx]["metrics"][k], v)
+                    env_obs = env.reset()
+
+                self.assert_obs_match(obs, env_idx, env_obs)
+                for i in range(n_agents):
+                    self.assertEqual(rew["a"][env_idx, i], np.float32(env_rew[str(i)]))
+                self.assertEqual(rew["p"][env_idx], np.float32(env_rew["p"]))
+
+                np.testing.assert_array_equal(
+                    env_batch.maps[env_idx], env.world.maps.state
+                )
+                for i, env_agent in enumerate(env.world.agents):
+                    np.testing.assert_array_equal(
+                        env_batch.locs[env_idx, i], env_agent.loc
+                    )
+                    for k, v in env_agent.inventory.items():
+                        self.assertEqual(
+                            env_batch.inventory[
+                                env_idx, i, env_batch.resources.index(k)
+                            ],
+                            v,
+                        )
+                    for k, v in env_agent.escrow.items():
+                        self.assertEqual(
+                            env_batch.escrow[env_idx, i, env_batch.resources.index(k)],
+                            v,
+                        )
+
+        self.assertGreater(n_builds, 0)
+        for batch_env, env in zip(env_batch.envs, envs):
+            self.assertEqual(batch_env._completions, env._completions)
+            self.assertEqual(batch_env.world.maps.version, env.world.maps.version)
+            self.assertEqual(
+                repr(batch_env.get_component("Gather").gathers),
+                repr(env.get_component("Gather").gathers),
+            )
+            self.assertEqual(
+                batch_env.get_component("ContinuousDoubleAuction").executed_trades,
+                env.get_component("ContinuousDoubleAuction").executed_trades,
+            )
+            # The random number streams were used in the same way
+            self.assertEqual(batch_env.rng.random(), env.rng.random())
+            self.assertEqual(batch_env.world.rng.random(), env.world.rng.random())
+
+    def test_steps_like_independent_envs(self):
+        self.assert_steps_like_independent_envs(
+            env_config(episode_length=25, starting_agent_coin=10)
+        )
+
+    def test_multi_action_mode_and_full_observability(self):
+        self.assert_steps_like_independent_envs(
+            env_config(
+                episode_length=25,
+                multi_action_mode_agents=True,
+                multi_action_mode_planner=True,
+                full_observability=True,
+            )
+        )
+
+    def test_hetero_agents_layout(self):
+        self.assert_steps_like_independent_envs(HETERO_ENV_CONFIG, n_steps=50)
+
+    def test_dense_logged_episodes(self):
+        # Every other episode is dense-logged, and stepped env by env
+        self.assert_steps_like_independent_envs(
+            env_config(episode_length=25, starting_agent_coin=10, dense_log_frequency=2)
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+# Copyright (c) 2020, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+Unit tests for the process-pool environment executor
+"""
+
+import unittest
+
+import numpy as np
+
+from ai_economist.foundation.env_batch import EnvironmentBatch
+from ai_economist.foundation.env_pool import EnvPool
+from tests.helpers import env_config
+
+ENV_CONFIG = env_config(
+    episode_length=5, multi_action_mode_planner=True, starting_agent_coin=10
+)
+
+
+class TestEnvPool(unittest.TestCase):
+    """Unit test for stepping environments in worker processes"""
+
+    def test_matches_env_batch(self):
+        """
+        Workers produce the same data as an EnvironmentBatch with the same seed
+        """
+        n_agents = ENV_CONFIG["n_agents"]
+        rng = np.random.RandomState(0)
+        agent_actions = rng.randint(0, 5, size=(12, 5, n_agents))
+        planner_actions = np.zeros((12, 5, 7), dtype=np.int64)
+
+        # Expected results: the same environments, in a single process
+        env_batch = EnvironmentBatch(ENV_CONFIG, n_envs=5, seed=1)
+        expected = [env_batch.reset()["a"]["flat"].copy()]
+        for t in range(len(agent_actions)):
+            obs, rew, done, _ = env_batch.step(agent_actions[t], planner_actions[t])
+            expected.append(
+                (obs["a"]["flat"].copy(), obs["p"]["flat"].copy())
+                + (rew["a"].copy(), rew["p"].copy(), done.copy())
+            )
+
+        # The environments don't depend on how they are split across workers
+        for n_workers in [2, 3]:
+            with EnvPool(ENV_CONFIG, n_envs=5, n_workers=n_workers, seed=1) as pool:
+                self.assertEqual(pool.n_workers, n_workers)
+                obs = pool.reset()
+                np.testing.assert_array_equal(obs["a"]["flat"], expected[0])
+
+                for t in range(len(agent_actions)):
+                    pool.step_async(agent_actions[t], planner_actions[t])
+                    obs, rew, done, info = pool.step_wait()
+                    results = [obs["a"]["flat"], obs["p"]["flat"], rew["a"], rew["p"]]
+                    for i, result in enumerate(results + [done]):
+                        np.testing.assert_array_equal(result, expected[t + 1][i])
+                    self.assertEqual(len(info), 5)
+                    self.assertEqual(done.all(), t % 5 == 4)
+
+    def test_seeds(self):
+        """
+        Pools with different seeds don't share random number streams
+        """
+        pools = [
+            EnvPool(ENV_CONFIG, n_envs=4, n_workers=2, seed=seed) for seed in [1, 2]
+        ]
+        try:
+            obs = [pool.reset()["a"]["flat"].copy() for pool in pools]
+        finally:
+            for pool in pools:
+                pool.close()
+        for i in range(4):
+            for j in range(4):
+                self.assertFalse(np.array_equal(obs[0][i], obs[1][j]))
+
+    def test_worker_error(self):
+        """
+        Errors in the workers are raised in the main process
+        """
+        with EnvPool(ENV_CONFIG, n_envs=2, n_workers=2) as pool:
+            pool.reset()
+            with self.assertRaises(RuntimeError):
+                pool.step(np.full((2, ENV_CONFIG["n_agents"]), 10 ** 6))
+
+
+if __name__ == "__main__":
+    unittest.main()
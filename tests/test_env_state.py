@@ -0,0 +1,173 @@
+# Copyright (c) 2020, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+Unit tests for environment snapshots (get_state/set_state)
+"""
+
+import datetime
+import pickle
+import unittest
+from copy import deepcopy
+
+import numpy as np
+
+from ai_economist.foundation.base.env_state import MAGIC, pack_state, unpack_state
+from tests.helpers import make_env, random_actions
+
+
+class TestEnvState(unittest.TestCase):
+    """Tests of the environment snapshot API"""
+
+    def assert_steps_equal(self, steps_a, steps_b):
+        for (obs_a, rew_a, done_a, _), (obs_b, rew_b, done_b, _) in zip(
+            steps_a, steps_b
+        ):
+            for k in obs_a:
+                np.testing.assert_array_equal(obs_a[k]["flat"], obs_b[k]["flat"])
+            self.assertEqual(rew_a, rew_b)
+            self.assertEqual(done_a, done_b)
+
+    def test_round_trip(self):
+        """
+        An environment restored from a snapshot continues identically
+        """
+        rng = np.random.RandomState(0)
+        env = make_env()
+        env.seed(1)
+        env.reset()
+        for _ in range(35):
+            env.step(random_actions(env, rng))
+        state = env.get_state()
+        self.assertTrue(state.startswith(MAGIC))
+
+        actions = [random_actions(env, rng) for _ in range(30)]
+        expected = [env.step(a) for a in actions]
+        expected_states = [agent.state.copy() for agent in env.all_agents]
+
+        # Restore into another environment, in the middle of a different episode
+        other_env = make_env()
+        other_env.seed(2)
+        other_env.reset()
+        for _ in range(10):
+            other_env.step(random_actions(other_env, rng))
+        other_env.set_state(state)
+        self.assertEqual(other_env.world.timestep, 35)
+        self.assert_steps_equal(expected, [other_env.step(a) for a in actions])
+        self.assertEqual(
+            [agent.state.copy() for agent in other_env.all_agents], expected_states
+        )
+
+        # And rewind the original environment
+        env.set_state(state)
+        self.assert_steps_equal(expected, [env.step(a) for a in actions])
+
+    def test_fork(self):
+        """
+        Branches continue from the current state with common random numbers
+        """
+        env = make_env(
+            components=[
+                ("Build", {}),
+                ("Gather", {}),
+                (
+                    "PeriodicBracketTax",
+                    {
+                        "period": 10,
+                        "tax_model": "model_wrapper",
+                        "tax_rules": [[0.0] * 7, [0.3] * 7, [0.6] * 7],
+                        "shifts": [-0.1, 0.0, 0.1],
+                    },
+                ),
+            ]
+        )
+        env.seed(1)
+        env.reset()
+        rng = np.random.RandomState(0)
+        for _ in range(10):
+            env.step(dict(random_actions(env, rng), p=[0, 0]))
+
+        # Compare the tax rules for the next tax period
+        branches = env.fork(3)
+        random_state = env.rng.bit_generator.state
+        actions = [dict(random_actions(env, rng), p=[0, 0]) for _ in range(10)]
+
+        def run_tax_period(branch, rule):
+            """Step through the tax period under rule, giving the agents taxable
+            income just before the taxes are collected."""
+            branch.step(dict(actions[0], p=[rule, 1]))
+            for branch_actions in actions[1:-1]:
+                branch.step(branch_actions)
+            for agent in branch.world.agents:
+                agent.inventory["Coin"] += 10 * (agent.idx + 1)
+            pre_tax_states = [deepcopy(agent.state) for agent in branch.world.agents]
+            branch.step(actions[-1])
+            taxes = branch.get_component("PeriodicBracketTax").taxes[-1]
+            return taxes, pre_tax_states
+
+        outcomes = []
+        for rule, branch in enumerate(branches):
+            self.assertIsNot(branch.world, env.world)
+            outcomes.append(run_tax_period(branch, rule))
+
+            # Stepping a branch leaves the environment and its RNG streams alone
+            self.assertEqual(env.world.timestep, 10)
+            self.assertEqual(env.rng.bit_generator.state, random_state)
+            self.assertEqual(len(env.get_component("PeriodicBracketTax").taxes), 10)
+
+        # Branches share the random draws, so they reach the same pre-tax state and
+        # only the taxes paid differ
+        for _, pre_tax_states in outcomes[1:]:
+            self.assertEqual(pre_tax_states, outcomes[0][1])
+        for rate, (taxes, _) in zip([0.0, 0.3, 0.6], outcomes):
+            self.assertEqual(taxes["schedule"][0], rate)
+            for agent in env.world.agents:
+                agent_taxes = taxes[str(agent.idx)]
+                self.assertGreaterEqual(agent_taxes["income"], 10 * (agent.idx + 1))
+                self.assertAlmostEqual(
+                    agent_taxes["tax_paid"], rate * agent_taxes["income"]
+                )
+        self.assertEqual(outcomes[0][0]["0"]["income"], outcomes[2][0]["0"]["income"])
+        self.assertNotEqual(
+            outcomes[0][0]["0"]["tax_paid"], outcomes[2][0]["0"]["tax_paid"]
+        )
+
+        taxes, pre_tax_states = run_tax_period(env, 2)
+        self.assertEqual(pre_tax_states, outcomes[2][1])
+        self.assertEqual(taxes["schedule"].tolist(), [0.6] * 7)
+        for agent in env.world.agents:
+            self.assertEqual(taxes[str(agent.idx)], outcomes[2][0][str(agent.idx)])
+
+    def test_format(self):
+        """
+        Snapshots store plain data without pickling
+        """
+        state = {
+            "array": np.arange(6, dtype=np.int16).reshape(2, 3),
+            "empty": np.zeros((0, 3)),
+            "scalar": np.float32(1.5),
+            "levels": [{3: (1, 0)}, {}],
+            "date": datetime.datetime(2020, 3, 22),
+            "nested": {"a": [1, 2.5, None, "x", b"\x00\x01"], (1, 2): True},
+        }
+        restored = unpack_state(pack_state(state))
+        self.assertEqual(restored.keys(), state.keys())
+        np.testing.assert_array_equal(restored["array"], state["array"])
+        self.assertEqual(restored["array"].dtype, np.int16)
+        self.assertTrue(restored["array"].flags.writeable)
+        self.assertEqual(restored["empty"].shape, (0, 3))
+        self.assertEqual(restored["scalar"].dtype, np.float32)
+        for k in ["levels", "date", "nested"]:
+            self.assertEqual(restored[k], state[k])
+
+        with self.assertRaises(TypeError):
+            pack_state({"env": make_env()})
+        with self.assertRaises(ValueError):
+            unpack_state(pickle.dumps(state))
+
+
+if __name__ == "__main__":
+    unittest.main()
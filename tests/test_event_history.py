@@ -0,0 +1,115 @@
+# Copyright (c) 2020, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+Unit tests for the bounded event histories of components
+"""
+
+import unittest
+from collections import deque
+
+import numpy as np
+
+from tests import helpers
+
+
+def run_episode(**kwargs):
+    """Play an episode with random actions, in which agents trade, build and pay
+    taxes."""
+    env = helpers.make_env(episode_length=200, starting_agent_coin=10, seed=7, **kwargs)
+    env.reset(force_dense_logging=True)
+    for agent in env.world.agents:
+        agent.state["inventory"]["Wood"] = 20
+        agent.state["inventory"]["Stone"] = 20
+    rng = np.random.RandomState(7)
+    for _ in range(env.episode_length):
+        env.step(helpers.random_actions(env, rng))
+    return env
+
+
+class TestEventHistory(unittest.TestCase):
+    """Components keep running metrics, and optionally only recent events"""
+
+    def test_bounded_history(self):
+        """
+        Bounded histories keep the last events and do not change the metrics
+        """
+        full_env = run_episode()
+        env = run_episode(event_history_length=8)
+
+        self.assertEqual(full_env.metrics, env.metrics)
+
+        for name, attr in [
+            ("Build", "builds"),
+            ("ContinuousDoubleAuction", "executed_trades"),
+            ("Gather", "gathers"),
+            ("PeriodicBracketTax", "taxes"),
+        ]:
+            full_history = getattr(full_env.get_component(name), attr)
+            history = getattr(env.get_component(name), attr)
+            self.assertIsInstance(history, deque)
+            self.assertEqual(len(full_history), env.episode_length)
+            self.assertEqual(len(history), 8)
+            self.assertEqual(str(list(history)), str(full_history[-8:]))
+
+            shorthand = env.get_component(name).shorthand
+            dense_log = env.previous_episode_dense_log.to_dict()
+            self.assertEqual(len(dense_log[shorthand]), 8)
+
+        # Running totals match the full history (and aren't trivially zero)
+        self.assertGreater(full_env.metrics["Trade/n_trades"], 0)
+        self.assertGreater(full_env.metrics["PeriodicTax/avg_effective_tax_rate"], 0)
+        trades = full_env.get_component("ContinuousDoubleAuction").executed_trades
+        self.assertEqual(
+            full_env.metrics["Trade/n_trades"],
+            sum(len(step_trades) for step_trades in trades),
+        )
+        builds = full_env.get_component("Build").builds
+        for agent in full_env.world.agents:
+            self.assertEqual(
+                full_env.metrics["Build/{}/n_builds".format(agent.idx)],
+                sum(b["builder"] == agent.idx for step in builds for b in step),
+            )
+        self.assertGreater(
+            sum(
+                full_env.metrics["Build/{}/n_builds".format(agent.idx)]
+                for agent in full_env.world.agents
+            ),
+            0,
+        )
+
+        tax = full_env.get_component("PeriodicBracketTax")
+        rates = [
+            tax_day[str(agent.idx)]["effective_rate"]
+            for tax_day in tax.taxes
+            if tax_day
+            for agent in full_env.world.agents
+        ]
+        self.assertAlmostEqual(
+            full_env.metrics["PeriodicTax/avg_effective_tax_rate"],
+            np.mean(rates),
+        )
+
+    def test_snapshot(self):
+        """
+        Bounded histories are saved and restored with the environment state
+        """
+        env = run_episode(event_history_length=3)
+        state = env.get_state()
+        taxes = env.get_component("PeriodicBracketTax").taxes
+
+        other = run_episode(event_history_length=3)
+        other.reset()
+        other.set_state(state)
+        restored = other.get_component("PeriodicBracketTax").taxes
+        self.assertIsInstance(restored, deque)
+        self.assertEqual(restored.maxlen, 3)
+        self.assertEqual(str(list(restored)), str(list(taxes)))
+        self.assertEqual(other.metrics, env.metrics)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+# Copyright (c) 2020, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+Unit tests for the random number streams of environments
+"""
+
+import unittest
+
+import numpy as np
+
+from tests import helpers
+
+COMPONENTS = [
+    ("Build", {"skill_dist": "pareto"}),
+    ("Gather", {"skill_dist": "pareto"}),
+    ("PeriodicBracketTax", {"period": 10}),
+]
+
+
+def make_env(components=COMPONENTS, **kwargs):
+    return helpers.make_env(components=components, episode_length=30, **kwargs)
+
+
+def play(env, rng, n_steps):
+    """Step env with random actions and return the resulting observations."""
+    results = []
+    for _ in range(n_steps):
+        obs, _, _, _ = env.step(helpers.random_actions(env, rng))
+        results.append(obs["p"]["flat"].copy())
+    return results
+
+
+class TestRandomStreams(unittest.TestCase):
+    """Environments draw from their own, seeded random number streams"""
+
+    def test_independent_environments(self):
+        """
+        Interleaved environments are unaffected by each other and by np.random
+        """
+        env_a, env_b = make_env(seed=1), make_env(seed=1)
+        env_a.reset()
+        expected = play(env_a, np.random.RandomState(0), 20)
+
+        env_b.reset()
+        other_env = make_env(seed=2)
+        other_env.reset()
+        rng, other_rng = np.random.RandomState(0), np.random.RandomState(1)
+        results = []
+        for _ in range(20):
+            np.random.seed(0)
+            results.extend(play(env_b, rng, 1))
+            play(other_env, other_rng, 1)
+        np.testing.assert_array_equal(results, expected)
+
+    def test_episode_seed(self):
+        """
+        An episode only depends on its episode seed and the actions
+        """
+        env = make_env(seed=1)
+        env.reset()
+        play(env, np.random.RandomState(0), 30)
+        env.reset()
+        episode_seed = env.replay_log["reset"]["episode_seed"]
+        expected = play(env, np.random.RandomState(0), 10)
+        fresh_env = make_env(seed=3)
+        fresh_env.reset(episode_seed=episode_seed)
+        results = play(fresh_env, np.random.RandomState(0), 10)
+        np.testing.assert_array_equal(results, expected)
+
+    def test_component_streams(self):
+        """
+        Adding a component does not change the draws of the others
+        """
+        env = make_env(seed=1)
+        extended_env = make_env(components=COMPONENTS + [("SimpleLabor", {})], seed=1)
+        env.reset()
+        extended_env.reset()
+        for key in env.world.maps.keys():
+            np.testing.assert_array_equal(
+                env.world.maps.get(key), extended_env.world.maps.get(key)
+            )
+        for agent, extended_agent in zip(env.world.agents, extended_env.world.agents):
+            self.assertEqual(agent.loc, extended_agent.loc)
+            for k in ["build_skill", "bonus_gather_prob"]:
+                self.assertEqual(agent.state[k], extended_agent.state[k])
+
+
+if __name__ == "__main__":
+    unittest.main()
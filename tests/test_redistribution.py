@@ -0,0 +1,80 @@
+# Copyright (c) 2020, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+Unit tests for the batched tax computations of PeriodicBracketTax
+"""
+
+import unittest
+
+import numpy as np
+
+from ai_economist import foundation
+
+
+class TestPeriodicBracketTax(unittest.TestCase):
+    """Compare the batched tax computations to their per-income counterparts"""
+
+    def setUp(self):
+        self.env = foundation.make_env_instance(
+            scenario_name="uniform/simple_wood_and_stone",
+            components=[("Gather", {}), ("PeriodicBracketTax", {"period": 10})],
+            n_agents=4,
+            world_size=[15, 15],
+            episode_length=100,
+        )
+        self.env.reset()
+        self.tax = self.env.get_component("PeriodicBracketTax")
+
+    def test_batched_rates_and_taxes(self):
+        """
+        Bracket indices, marginal rates and taxes due match the scalar methods
+        """
+        rng = np.random.RandomState(0)
+        self.tax.curr_rate_indices = list(
+            rng.randint(self.tax.n_disc_rates, size=self.tax.n_brackets)
+        )
+        incomes = np.concatenate(
+            [
+                rng.uniform(-50, 800, size=200),
+                self.tax.bracket_cutoffs,
+                [-1e-9, 0.0, 1e6],
+            ]
+        )
+
+        bracket_idx = self.tax.income_bracket_indices(incomes)
+        marginal_rates = self.tax.marginal_rates(incomes)
+        taxes_due = self.tax.batch_taxes_due(incomes)
+        for i, income in enumerate(incomes):
+            self.assertEqual(
+                self.tax.bracket_cutoffs[bracket_idx[i]], self.tax.income_bin(income)
+            )
+            self.assertEqual(marginal_rates[i], self.tax.marginal_rate(income))
+            self.assertEqual(taxes_due[i], self.tax.taxes_due(income))
+
+    def test_enact_taxes(self):
+        """
+        Collected taxes are redistributed and reported per agent
+        """
+        self.tax.curr_rate_indices = [10 for _ in range(self.tax.n_brackets)]
+        self.env.world.inventory("Coin")[:] = [0, 20, 200, 2000]
+
+        self.tax.enact_taxes()
+        tax_day = self.tax.taxes[-1]
+        tax_paid = [tax_day[str(i)]["tax_paid"] for i in range(4)]
+        self.assertEqual(tax_paid, [0.0, 10.0, 100.0, 1000.0])
+        self.assertEqual(tax_day["0"]["lump_sum"], 277.5)
+        self.assertEqual(self.tax.total_collected_taxes, 1110.0)
+        self.assertEqual(
+            list(self.env.world.inventory("Coin")), [277.5, 287.5, 377.5, 1277.5]
+        )
+        self.assertEqual(
+            list(self.tax.last_coin), list(self.env.world.total_endowment("Coin"))
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+# Copyright (c) 2020, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+Unit tests for the source-block resource regeneration
+"""
+
+import unittest
+
+import numpy as np
+from scipy import signal
+
+from ai_economist.foundation.scenarios.utils.regeneration import ResourceRegenerator
+
+
+class TestResourceRegenerator(unittest.TestCase):
+    """Compare respawn probabilities to the full-grid convolution"""
+
+    def test_respawn_probabilities(self):
+        """
+        Respawn probabilities match convolve2d on source blocks, as the resource
+        map gets consumed and regrows
+        """
+        rng = np.random.RandomState(0)
+        for halfwidth in range(4):
+            d = 1 + (2 * halfwidth)
+            kernel = 0.05 * np.ones((d, d)) / (d ** 2)
+
+            source_blocks = (rng.rand(12, 17) < 0.3).astype(np.float64)
+            resource_map = source_blocks * rng.randint(0, 3, size=(12, 17))
+            regenerator = ResourceRegenerator(
+                source_blocks, halfwidth=halfwidth, weight=0.05, max_health=2
+            )
+
+            for _ in range(20):
+                health = np.maximum(resource_map, source_blocks)
+                expected = signal.convolve2d(health, kernel, "same")[source_blocks > 0]
+                np.testing.assert_allclose(
+                    regenerator.respawn_probabilities(resource_map),
+                    expected,
+                    rtol=1e-12,
+                )
+
+                # Consume and regrow some tiles
+                resource_map = np.maximum(
+                    0, resource_map + rng.randint(-1, 2, size=resource_map.shape)
+                )
+
+    def test_step(self):
+        """
+        Only source blocks respawn, up to max_health
+        """
+        source_blocks = np.zeros((5, 5))
+        source_blocks[1:3, 1:4] = 1
+        resource_map = np.zeros((5, 5))
+        resource_map[4, 4] = 1
+        regenerator = ResourceRegenerator(
+            source_blocks, halfwidth=1, weight=1.0, max_health=1
+        )
+
+        respawn_idx, new_health = regenerator.step(
+            resource_map, np.random.default_rng(0)
+        )
+        self.assertTrue(np.all(source_blocks.ravel()[respawn_idx] > 0))
+        self.assertTrue(np.all(new_health == 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
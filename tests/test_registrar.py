@@ -0,0 +1,75 @@
+# Copyright (c) 2020, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+Unit tests for the lazy registration of scenarios and components
+"""
+
+import subprocess
+import sys
+import unittest
+
+from ai_economist import foundation
+
+CHECK_LAZY_IMPORT = """
+import sys
+
+import ai_economist.foundation as foundation
+
+deferred = ["scipy", "Crypto", "GPUtil", "warp_drive"]
+loaded = [
+    name
+    for name in sys.modules
+    if name.split(".")[0] in deferred
+    or name.startswith("ai_economist.foundation.components.")
+    or name.startswith("ai_economist.foundation.scenarios.")
+]
+assert not loaded, loaded
+
+assert foundation.components.has("Gather")
+assert "ai_economist.foundation.components.move" not in sys.modules
+foundation.components.get("Gather")
+assert "ai_economist.foundation.components.move" in sys.modules
+assert "ai_economist.foundation.components.build" not in sys.modules
+"""
+
+
+class TestRegistrar(unittest.TestCase):
+    """Registries declare their entries up front and import them on demand"""
+
+    def test_lazy_import(self):
+        """
+        Importing foundation imports no scenario or component module
+        """
+        subprocess.run([sys.executable, "-c", CHECK_LAZY_IMPORT], check=True)
+
+    def test_declared_modules(self):
+        """
+        Names shared by several built-in modules resolve to their declared module
+        """
+        from ai_economist.foundation.scenarios.simple_wood_and_stone import (  # noqa
+            dynamic_layout,
+            layout_from_file,
+        )
+
+        prefix = "ai_economist.foundation.scenarios."
+        for name, module in [
+            ("uniform/simple_wood_and_stone", "hetero_agents.dynamic_layout"),
+            ("split_layout/simple_wood_and_stone", "hetero_agents.layout_from_file"),
+            (
+                "layout_from_file/simple_wood_and_stone",
+                "simple_wood_and_stone.layout_from_file",
+            ),
+        ]:
+            self.assertEqual(foundation.scenarios.get(name).__module__, prefix + module)
+
+        self.assertIn("CovidAndEconomySimulation", foundation.scenarios.entries)
+        with self.assertRaises(KeyError):
+            foundation.scenarios.get("Unknown")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+# Copyright (c) 2020, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+Unit tests for episode replay from replay logs
+"""
+
+import unittest
+
+import numpy as np
+
+from tests import helpers
+
+
+def play_episode(**kwargs):
+    """Play a dense-logged episode with random actions and return the env."""
+    env = helpers.make_env(
+        episode_length=50, world_dense_log_frequency=5, seed=1, **kwargs
+    )
+    return helpers.play_episode(env, np.random.RandomState(1), force_dense_logging=True)
+
+
+class TestReplay(unittest.TestCase):
+    """Replayed windows of an episode match its dense log"""
+
+    def check_replay(self, env):
+        dense_log = env.previous_episode_dense_log.to_dict()
+        replay_log = env.previous_episode_replay_log
+        for start, end in [(0, 50), (17, 33), (40, 50), (20, 20)]:
+            replayed_log = env.replay(replay_log, start, end)
+            self.assertEqual(
+                list(replayed_log["states"]), dense_log["states"][start : end + 1]
+            )
+            self.assertEqual(
+                list(replayed_log["world"])[: end - start],
+                dense_log["world"][start:end],
+            )
+            self.assertEqual(
+                list(replayed_log["actions"]), dense_log["actions"][start:end]
+            )
+            self.assertEqual(
+                list(replayed_log["rewards"]), dense_log["rewards"][start:end]
+            )
+
+        # Replay leaves the logs of the previous episode alone
+        self.assertEqual(env.previous_episode_dense_log.to_dict(), dense_log)
+        self.assertIs(env.previous_episode_replay_log, replay_log)
+
+    def test_replay(self):
+        """
+        Replay from the episode seed of the replay log
+        """
+        self.check_replay(play_episode())
+
+    def test_checkpoint_replay(self):
+        """
+        Replay from the checkpoints of the replay log
+        """
+        env = play_episode(replay_checkpoint_frequency=10)
+        replay_log = env.previous_episode_replay_log
+        self.assertEqual(list(replay_log["reset"].keys()), ["episode_seed"])
+        self.assertEqual(sorted(replay_log["checkpoints"]), [0, 10, 20, 30, 40])
+        self.check_replay(env)
+
+    def test_seed_state_replay_log(self):
+        """
+        Replay logs that record numpy random states are rejected
+        """
+        env = play_episode()
+        replay_log = {
+            "reset": dict(seed_state=np.random.get_state()),
+            "step": [
+                dict(actions=step["actions"], seed_state=np.random.get_state())
+                for step in env.previous_episode_replay_log["step"]
+            ],
+        }
+        with self.assertRaisesRegex(ValueError, "seed_state"):
+            env.replay(replay_log)
+
+
+if __name__ == "__main__":
+    unittest.main()
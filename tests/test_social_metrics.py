@@ -0,0 +1,93 @@
+# Copyright (c) 2020, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+Unit tests for the batched social welfare and reward functions
+"""
+
+import unittest
+
+import numpy as np
+
+from ai_economist.foundation.scenarios.utils import rewards, social_metrics
+
+
+def pairwise_gini(endowments):
+    """Gini index from the O(n^2) sum of absolute pairwise differences."""
+    n_agents = len(endowments)
+    diff = np.sum(np.abs(endowments[:, None] - endowments[None, :]))
+    norm = 2 * n_agents * np.sum(endowments)
+    return diff / (norm + 1e-10) / ((n_agents - 1) / n_agents)
+
+
+class TestSocialMetrics(unittest.TestCase):
+    """Batched metrics match their per-economy values"""
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.coin = rng.pareto(2.0, size=(3, 5, 40)) * 10
+        self.coin[0, 0] = 0
+        self.coin[0, 1] = 7
+        self.labor = rng.uniform(0, 50, size=self.coin.shape)
+
+    def test_gini(self):
+        """
+        The sort-based Gini index is exact for any number of agents
+        """
+        for n_agents in [2, 4, 29, 30, 40]:
+            coin = self.coin[..., :n_agents]
+            gini = social_metrics.get_gini(coin)
+            self.assertEqual(gini.shape, coin.shape[:-1])
+            for idx in np.ndindex(*coin.shape[:-1]):
+                self.assertAlmostEqual(gini[idx], pairwise_gini(coin[idx]))
+            np.testing.assert_allclose(
+                social_metrics.get_equality(coin), 1 - gini, atol=1e-12
+            )
+
+        self.assertIsInstance(social_metrics.get_gini([1, 2, 3]), float)
+        self.assertAlmostEqual(social_metrics.get_gini([0, 0, 0, 12]), 1.0)
+        self.assertAlmostEqual(social_metrics.get_equality([3, 3, 3]), 1.0)
+
+    def test_batched_rewards(self):
+        """
+        Welfare functions reduce the last axis of [..., n_agents] arrays
+        """
+        utilities = rewards.isoelastic_coin_minus_labor(
+            self.coin, self.labor, isoelastic_eta=0.23, labor_coefficient=0.1
+        )
+        for planner_reward_type in [
+            "coin_eq_times_productivity",
+            "inv_income_weighted_coin_endowments",
+            "inv_income_weighted_utility",
+        ]:
+            welfare = rewards.planner_social_welfare(
+                planner_reward_type, self.coin, utilities, equality_weight=0.5
+            )
+            self.assertEqual(welfare.shape, self.coin.shape[:-1])
+            for idx in np.ndindex(*self.coin.shape[:-1]):
+                self.assertAlmostEqual(
+                    welfare[idx],
+                    rewards.planner_social_welfare(
+                        planner_reward_type,
+                        self.coin[idx],
+                        utilities[idx],
+                        equality_weight=0.5,
+                    ),
+                )
+
+        with self.assertRaises(NotImplementedError):
+            rewards.planner_social_welfare("unknown", self.coin, utilities, 0.5)
+
+        log_utilities = rewards.isoelastic_coin_minus_labor(
+            self.coin, self.labor, isoelastic_eta=1.0, labor_coefficient=0.1
+        )
+        np.testing.assert_allclose(
+            log_utilities, np.log(np.maximum(1, self.coin)) - 0.1 * self.labor
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+# Copyright (c) 2020, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+Unit tests for the step profiler
+"""
+
+import json
+import unittest
+
+import numpy as np
+
+from ai_economist.foundation.base.step_profiler import (
+    StepProfiler,
+    merge_profile_reports,
+)
+from tests import helpers
+
+
+def make_env(**kwargs):
+    return helpers.make_env(
+        components=[
+            ("Build", {}),
+            ("Gather", {}),
+            ("PeriodicBracketTax", {"period": 10}),
+        ],
+        episode_length=20,
+        **kwargs
+    )
+
+
+class TestStepProfiler(unittest.TestCase):
+    """Unit tests for StepProfiler and BaseEnvironment.profile_report"""
+
+    def test_env_report(self):
+        """
+        Profiled environments report each phase of reset and step
+        """
+        self.assertIsNone(make_env().profile_report())
+
+        env = make_env(profile_steps=True)
+        env.reset()
+        for _ in range(env.episode_length):
+            env.step()
+        report = env.profile_report()
+        json.dumps(report)
+
+        self.assertEqual(report["reset"]["count"], 1)
+        self.assertEqual(report["step"]["count"], env.episode_length)
+        for phase in [
+            "parse_actions",
+            "component_step/Build",
+            "component_step/Gather",
+            "scenario_step",
+            "compute_reward",
+        ]:
+            self.assertEqual(report[phase]["count"], env.episode_length)
+        for phase in ["observations/scenario", "masks/Gather", "masks"]:
+            self.assertEqual(report[phase]["count"], env.episode_length + 1)
+        self.assertEqual(report["finalize_logs"]["count"], 1)
+
+        # Phases are part of their step
+        step_ns = report["step"]["total_ns"]
+        self.assertLess(report["component_step/Gather"]["total_ns"], step_ns)
+        self.assertLess(report["masks/Gather"]["total_ns"], report["masks"]["total_ns"])
+
+        metrics = env.previous_episode_metrics
+        self.assertIn("profile/component_step/Build/mean_us", metrics)
+        self.assertIn("profile/scenario_step/p99_us", metrics)
+
+        env.profile_report(clear=True)
+        self.assertEqual(env.profile_report(), {})
+
+    def test_statistics(self):
+        """
+        Percentiles are estimated from the histogram, and reports can be merged
+        """
+        durations = np.arange(1, 1001) * 1000
+        profiler = StepProfiler()
+        for duration in durations:
+            profiler.add("phase", profiler.clock() - int(duration))
+        report = profiler.report()["phase"]
+
+        self.assertEqual(report["count"], 1000)
+        self.assertGreaterEqual(report["min_ns"], 1000)
+        self.assertAlmostEqual(report["mean_us"], durations.mean() / 1000, delta=50)
+        for q in [50, 90, 99]:
+            expected = np.percentile(durations, q) / 1000
+            self.assertAlmostEqual(
+                report["p{}_us".format(q)] / expected, 1.0, delta=0.13
+            )
+
+        merged = merge_profile_reports(
+            [profiler.report(), profiler.report(), {"other": report}]
+        )
+        self.assertEqual(merged["phase"]["count"], 2000)
+        self.assertEqual(merged["phase"]["total_ns"], 2 * report["total_ns"])
+        self.assertEqual(merged["phase"]["p90_us"], report["p90_us"])
+        self.assertEqual(merged["other"]["histogram"], report["histogram"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -156,17 +156,29 @@ class RLlibEnvWrapper(MultiAgentEnv):
             return "game_object.pkl"
         return "game_object_{:03d}.pkl".format(self.env_id)
 
+    @property
+    def state_file(self):
+        if self.env_id is None:
+            return "game_object.state"
+        return "game_object_{:03d}.state".format(self.env_id)
+
     def save_game_object(self, save_dir):
         assert os.path.isdir(save_dir)
-        path = os.path.join(save_dir, self.pickle_file)
+        path = os.path.join(save_dir, self.state_file)
         with open(path, "wb") as F:
-            pickle.dump(self.env, F)
+            F.write(self.env.get_state())
 
     def load_game_object(self, save_dir):
         assert os.path.isdir(save_dir)
-        path = os.path.join(save_dir, self.pickle_file)
+        path = os.path.join(save_dir, self.state_file)
+        if not os.path.isfile(path):
+            # Snapshot saved by pickling the whole environment object
+            path = os.path.join(save_dir, self.pickle_file)
+            with open(path, "rb") as F:
+                self.env = pickle.load(F)
+            return
         with open(path, "rb") as F:
-            self.env = pickle.load(F)
+            self.env.set_state(F.read())
 
     @property
     def n_agents(self):
@@ -180,6 +192,11 @@ class RLlibEnvWrapper(MultiAgentEnv):
         last_completion_metrics["completions"] = int(self.env._completions)
         return last_completion_metrics
 
+    def profile_report(self, clear=False):
+        """Phase timings of the environment, if created with profile_steps=True.
+        Combine the reports of all rollout workers with merge_profile_reports."""
+        return self.env.profile_report(clear=clear)
+
     def get_seed(self):
         return int(self._seed)
 
@@ -202,6 +219,7 @@ class RLlibEnvWrapper(MultiAgentEnv):
         seed = int(seed2)
         np.random.seed(seed2)
         random.seed(seed2)
+        self.env.seed(seed2)
         self._seed = seed2
 
     def reset(self, *args, **kwargs):